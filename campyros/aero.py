@@ -1,4 +1,4 @@
-import scipy.interpolate, csv
+import scipy.interpolate, csv, copy
 import matplotlib.pyplot as plt
 import numpy as np
 
@@ -85,6 +85,35 @@ class AeroData:
             self.Mach_grid, self.alpha_grid, self.COP_grid
         )
 
+    def perturbed(
+        self,
+        ref_area=None,
+        pitch_damping_coefficient=None,
+        roll_damping_coefficient=None,
+        error=None,
+    ):
+        """Returns a copy with different scalar parameters that shares the tables and interpolators with this object, so it is very cheap to make (e.g. for each run of a statistical model).
+
+        Args:
+            ref_area (float, optional): Reference area used to normalise coefficients (m^2). Defaults to None (unchanged).
+            pitch_damping_coefficient (float, optional): Pitch damping coefficient. Defaults to None (unchanged).
+            roll_damping_coefficient (float, optional): Roll damping coefficient. Defaults to None (unchanged).
+            error (dict, optional): Multipliers for CA, CN and COP. Defaults to None (unchanged).
+
+        Returns:
+            AeroData: The perturbed copy.
+        """
+        new = copy.copy(self)
+        if ref_area is not None:
+            new.ref_area = ref_area
+        if pitch_damping_coefficient is not None:
+            new.pitch_damping_coefficient = pitch_damping_coefficient
+        if roll_damping_coefficient is not None:
+            new.roll_damping_coefficient = roll_damping_coefficient
+        if error is not None:
+            new.error = error
+        return new
+
     def CA(self, Mach, alpha):
         return self.error["CA"] * self.CA_func(Mach, alpha)
 
@@ -219,50 +248,64 @@ class AeroData:
         Returns:
             AeroData: AeroData object.
         """
-        with open(csv_directory) as csvfile:
-            aero_data = csv.reader(csvfile)
-
-            Mach_raw = []
-            alpha_raw = []
-            CA_raw = []
-            COP_raw = []
-            CN_raw = []
-
-            # Extract the raw data from the .csv file
-            next(aero_data)
-            for row in aero_data:
-                Mach_raw.append(float(row[0]))
-                alpha_raw.append(float(row[1]))
-                CA_raw.append(float(row[5]))
-                COP_raw.append(float(row[12]))
-                CN_raw.append(float(row[8]))
-
-        # The data has length 7499 when it should be 7500 (3x2500).  We'll just add the last datapoint on twice.
-        Mach_raw.append(Mach_raw[-1])
-        alpha_raw.append(alpha_raw[-1])
-        CA_raw.append(CA_raw[-1])
-        COP_raw.append(COP_raw[-1])
-        CN_raw.append(CN_raw[-1])
-
-        # Convert alpha from degrees to radians
-        alpha_raw = np.array(alpha_raw) * np.pi / 180
-
-        # Convert COP from inches to m
-        COP_raw = np.array(COP_raw) * 0.0254
-
         return AeroData.from_lists(
-            CA_raw,
-            CN_raw,
-            COP_raw,
-            Mach_raw,
-            alpha_raw,
-            ref_area,
-            pitch_damping_coefficient,
-            roll_damping_coefficient,
-            error,
+            **read_rasaero(csv_directory),
+            ref_area=ref_area,
+            pitch_damping_coefficient=pitch_damping_coefficient,
+            roll_damping_coefficient=roll_damping_coefficient,
+            error=error,
         )
 
 
+def read_rasaero(csv_directory):
+    """Reads the raw coefficient tables from a RASAero II .CSV file, so they can be parsed once and used to make several AeroData objects with AeroData.from_lists.
+
+    Args:
+        csv_directory (string): Directory to .CSV file.
+
+    Returns:
+        dict: Lists with keys CA_list, CN_list, COP_list (m), Mach_list and alpha_list (rad), matching the arguments of AeroData.from_lists.
+    """
+    with open(csv_directory) as csvfile:
+        aero_data = csv.reader(csvfile)
+
+        Mach_raw = []
+        alpha_raw = []
+        CA_raw = []
+        COP_raw = []
+        CN_raw = []
+
+        # Extract the raw data from the .csv file
+        next(aero_data)
+        for row in aero_data:
+            Mach_raw.append(float(row[0]))
+            alpha_raw.append(float(row[1]))
+            CA_raw.append(float(row[5]))
+            COP_raw.append(float(row[12]))
+            CN_raw.append(float(row[8]))
+
+    # The data has length 7499 when it should be 7500 (3x2500).  We'll just add the last datapoint on twice.
+    Mach_raw.append(Mach_raw[-1])
+    alpha_raw.append(alpha_raw[-1])
+    CA_raw.append(CA_raw[-1])
+    COP_raw.append(COP_raw[-1])
+    CN_raw.append(CN_raw[-1])
+
+    # Convert alpha from degrees to radians
+    alpha_raw = np.array(alpha_raw) * np.pi / 180
+
+    # Convert COP from inches to m
+    COP_raw = np.array(COP_raw) * 0.0254
+
+    return {
+        "CA_list": CA_raw,
+        "CN_list": CN_raw,
+        "COP_list": COP_raw,
+        "Mach_list": Mach_raw,
+        "alpha_list": alpha_raw,
+    }
+
+
 def pitch_damping_coefficient(length, radius, fin_number, area_per_fin):
     """Gives approximate values for the pitch damping coefficient. Uses equations (3.59) and (3.60) from the OpenRocket documentation.
 
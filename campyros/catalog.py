@@ -0,0 +1,279 @@
+"""
+Fast queries over the runs of a stored campaign, e.g. the runs where the parachute failed and the rocket landed more
+than 5 km away, or the 20 runs with the highest max q.
+
+Notes
+-----
+
+- The catalog is one table of every run's sampled inputs and summary metrics (see campyros.store), indexed by run
+  number, plus "landing_range" (the distance of the landing from the launch site) if the landing is stored.
+- Each column gets a sorted index the first time it's queried, so range and equality conditions are binary searches
+  rather than scans. Arbitrary expressions go through pandas' DataFrame.query.
+- Queries return run numbers. Trajectories are only read for the runs asked for: the catalog keeps the campaign's
+  trajectories as a raw array (trajectory.npy) which is memory mapped, so only the rows of those runs are read from
+  disk.
+- The table and trajectory file are cached next to the campaign and rebuilt when the campaign file changes. While a
+  campaign is running (it has shards that haven't been compacted) the catalog is built in memory instead.
+
+"""
+import os
+import numpy as np
+import pandas as pd
+
+from .store import (
+    CampaignStore,
+    CAMPAIGN_FILE,
+    CATALOG_FILE,
+    TRAJECTORY_FILE,
+    TRAJECTORY_COLUMNS,
+)
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+
+class Catalog:
+    """Table of every run of a campaign with indexed queries
+
+    Parameters
+    ----------
+    store : CampaignStore or string
+        The campaign or its folder
+
+    Attributes
+    ----------
+    store : CampaignStore
+        The campaign
+    table : pandas dataframe
+        Sampled inputs and summary metrics of every run, indexed by run number. Inputs with the same name as a
+        summary metric are prefixed with "input_"
+    """
+
+    def __init__(self, store):
+        self.store = store if isinstance(store, CampaignStore) else CampaignStore(store)
+        data = self._load()
+        self._offsets = data["offsets"]
+        self._trajectory = data.get("trajectory")
+        ids = data["ids"]
+        summary_names = list(data["summary_names"])
+        input_names = [
+            "input_%s" % name if name in summary_names else name
+            for name in data["input_names"]
+        ]
+        self.table = pd.DataFrame(
+            np.concatenate([data["inputs"], data["summary"]], axis=1),
+            index=pd.Index(ids, name="run"),
+            columns=input_names + summary_names,
+        )
+        if "landing_x" in summary_names and "landing_y" in summary_names:
+            self.table["landing_range"] = np.hypot(
+                self.table["landing_x"], self.table["landing_y"]
+            )
+        self._ids = ids
+        self._indexes = {}
+
+    def _stamp(self):
+        """Identifies the version of the campaign file the cache was built from"""
+        stats = os.stat(os.path.join(self.store.path, CAMPAIGN_FILE))
+        return np.array([stats.st_mtime_ns, stats.st_size])
+
+    def _load(self):
+        """Reads the cached table, building it (and the trajectory file) if it's missing or out of date"""
+        campaign = os.path.join(self.store.path, CAMPAIGN_FILE)
+        catalog = os.path.join(self.store.path, CATALOG_FILE)
+        if len(self.store.shards()) > 0 or not os.path.isfile(campaign):
+            return self.store.load()
+        if os.path.isfile(catalog):
+            with np.load(catalog) as f:
+                data = {key: f[key] for key in f.files}
+            if np.array_equal(data["stamp"], self._stamp()):
+                return data
+        data = self.store.load()
+        trajectory = data.pop("trajectory")
+        # Written before the table, so a table is never newer than its trajectories
+        tmp = os.path.join(self.store.path, ".%s.tmp.npy" % os.getpid())
+        np.save(tmp, trajectory)
+        os.replace(tmp, os.path.join(self.store.path, TRAJECTORY_FILE))
+        self.store._save(catalog, stamp=self._stamp(), **data)
+        return data
+
+    @property
+    def columns(self):
+        """Names of the columns that can be queried"""
+        return list(self.table.columns)
+
+    def __len__(self):
+        return len(self.table)
+
+    def index(self, column):
+        """Sorted index of a column, built the first time it's needed
+
+        Parameters
+        ----------
+        column : string
+            Column name
+
+        Returns
+        -------
+        numpy array, numpy array
+            The column's values in ascending order (NaN last), and the run number of each
+        """
+        if column not in self._indexes:
+            if column not in self.table:
+                raise KeyError(
+                    "No column %s, the catalog has %s" % (column, self.columns)
+                )
+            values = self.table[column].to_numpy()
+            order = np.argsort(values, kind="stable")
+            self._indexes[column] = (values[order], self._ids[order])
+        return self._indexes[column]
+
+    def range(self, column, low=None, high=None):
+        """Runs with a column between two values (inclusive)
+
+        Parameters
+        ----------
+        column : string
+            Column name
+        low : float, optional
+            Smallest value, defaults to None (no lower limit)
+        high : float, optional
+            Largest value, defaults to None (no upper limit)
+
+        Returns
+        -------
+        numpy array
+            Sorted run numbers
+        """
+        values, ids = self.index(column)
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        if high is None:
+            # NaNs are sorted last and never match
+            end = len(values) - np.count_nonzero(np.isnan(values))
+        else:
+            end = np.searchsorted(values, high, side="right")
+        return np.sort(ids[start:end])
+
+    def where(self, **conditions):
+        """Runs that meet every condition, using the column indexes
+
+        Parameters
+        ----------
+        **conditions
+            column=value for runs with exactly that value, or column=(low, high) for runs between the two
+            (inclusive, either can be None for no limit), e.g. where(parachute_failed=1, landing_range=(5000, None))
+
+        Returns
+        -------
+        numpy array
+            Sorted run numbers
+        """
+        matches = np.sort(self._ids)
+        for column, condition in conditions.items():
+            if isinstance(condition, (tuple, list)):
+                low, high = condition
+            else:
+                low = high = condition
+            matches = np.intersect1d(
+                matches, self.range(column, low, high), assume_unique=True
+            )
+        return matches
+
+    def query(self, expression):
+        """Runs that meet any condition pandas can evaluate on the table
+
+        Parameters
+        ----------
+        expression : string
+            Condition on the columns, see pandas.DataFrame.query, e.g. "parachute_failed == 1 and landing_x > 5000"
+
+        Returns
+        -------
+        numpy array
+            Sorted run numbers
+        """
+        return np.sort(self.table.query(expression).index.to_numpy())
+
+    def top(self, column, n=20, largest=True):
+        """Runs with the highest (or lowest) values of a column
+
+        Parameters
+        ----------
+        column : string
+            Column name
+        n : int, optional
+            Number of runs, defaults to 20
+        largest : bool, optional
+            Highest values if True, otherwise lowest, defaults to True
+
+        Returns
+        -------
+        numpy array
+            Run numbers, the most extreme first
+        """
+        values, ids = self.index(column)
+        finite = len(values) - np.count_nonzero(np.isnan(values))
+        if largest == True:
+            return ids[:finite][::-1][:n]
+        return ids[:finite][:n]
+
+    def rows(self, ids):
+        """Inputs and summary metrics of some runs
+
+        Parameters
+        ----------
+        ids : list
+            Run numbers
+
+        Returns
+        -------
+        pandas dataframe
+            Rows of the table
+        """
+        return self.table.loc[ids]
+
+    def trajectories(self, ids):
+        """Trajectories of some runs, only reading those runs from disk
+
+        Parameters
+        ----------
+        ids : list
+            Run numbers
+
+        Returns
+        -------
+        dict
+            Trajectory of each run (columns as campyros.store.TRAJECTORY_COLUMNS), empty for runs stored with only
+            their summary
+        """
+        if self._trajectory is None:
+            self._trajectory = np.load(
+                os.path.join(self.store.path, TRAJECTORY_FILE), mmap_mode="r"
+            )
+        positions = np.searchsorted(self._ids, ids)
+        if np.any(positions >= len(self._ids)) or np.any(
+            self._ids[np.minimum(positions, len(self._ids) - 1)] != ids
+        ):
+            raise KeyError("Runs %s aren't stored" % list(np.setdiff1d(ids, self._ids)))
+        return {
+            id: np.array(
+                self._trajectory[self._offsets[n] : self._offsets[n + 1]]
+            ).reshape(-1, len(TRAJECTORY_COLUMNS))
+            for id, n in zip(ids, positions)
+        }
@@ -0,0 +1,244 @@
+"""
+Robust file downloading, used to fetch the wind forcast data.
+
+Notes
+-----
+
+- All requests go through one pooled requests.Session so repeated downloads reuse their connections
+- Data is streamed to "<file>.part" and only renamed to "<file>" once it has been validated, so a file at the
+  final path is always complete. An interrupted download is resumed from the .part file with a HTTP range request.
+
+"""
+import hashlib
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+_session = None
+_session_lock = threading.Lock()
+
+# Status codes that are worth trying again, anything else >= 400 is treated as fatal
+RETRY_STATUS = [408, 429, 500, 502, 503, 504]
+
+
+class DownloadError(RuntimeError):
+    """Raised when a file could not be downloaded and validated within the retry budget"""
+
+
+class _Incomplete(Exception):
+    """The transfer stopped early or hit a temporary server error, worth retrying"""
+
+
+class _Fatal(Exception):
+    """The server refused the request, retrying won't help"""
+
+
+def get_session(pool_maxsize=10):
+    """Returns the shared requests session, creating it on first use
+
+    Parameters
+    ----------
+    pool_maxsize : int, optional
+        Maximum number of pooled connections per host, only used when the session is created, defaults to 10
+
+    Returns
+    -------
+    requests.Session
+        Shared session
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+def sha256sum(path, chunk_size=1 << 20):
+    """Returns the hex sha256 digest of a file
+
+    Parameters
+    ----------
+    path : string
+        File to hash
+    chunk_size : int, optional
+        Bytes read at a time, defaults to 1MB
+
+    Returns
+    -------
+    string
+        Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def download_file(
+    url,
+    path,
+    session=None,
+    retries=5,
+    backoff=1.0,
+    timeout=(10, 60),
+    chunk_size=1 << 16,
+    expected_size=None,
+    sha256=None,
+    validate=None,
+):
+    """Downloads url to path, retrying and resuming interrupted transfers
+
+    Notes
+    -----
+    Attempt n (counting from 0) waits backoff * 2**(n-1) seconds before starting. If a partial file exists it
+    is resumed with a range request, if the server ignores the range the download starts again from the beginning.
+    Once the transfer finishes the size is checked against the Content-Length/Content-Range and expected_size, the
+    hash against sha256 and the file passed to validate before it is atomically moved into place.
+    Only failed or truncated transfers are retried. A complete download with the wrong content (longer than
+    expected_size, the wrong hash or rejected by validate) raises DownloadError straight away, as the server would
+    send the same again, e.g. the error page NOMADS returns with HTTP 200 for a date it doesn't have.
+
+    Parameters
+    ----------
+    url : string
+        Address to download
+    path : string
+        Destination file, parent directories are created if needed
+    session : requests.Session, optional
+        Session to use, defaults to the shared pooled session
+    retries : int, optional
+        Number of retries after the first attempt, defaults to 5
+    backoff : float, optional
+        Base backoff time /s, defaults to 1
+    timeout : float or tuple, optional
+        Connect and read timeouts passed to requests /s, defaults to (10, 60)
+    chunk_size : int, optional
+        Bytes written at a time, defaults to 64kB
+    expected_size : int, optional
+        Expected file size /bytes, defaults to None (not checked)
+    sha256 : string, optional
+        Expected hex sha256 digest, defaults to None (not checked)
+    validate : callable, optional
+        Called with the path of the downloaded data, should return True if the content is complete, defaults to None
+
+    Returns
+    -------
+    string
+        path
+    """
+    if session is None:
+        session = get_session()
+    directory = os.path.dirname(path)
+    if directory != "":
+        os.makedirs(directory, exist_ok=True)
+    part = "%s.part" % path
+
+    last_error = None
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            time.sleep(backoff * 2 ** (attempt - 1))
+        try:
+            _fetch(url, part, session, timeout, chunk_size)
+        except _Fatal as e:
+            raise DownloadError("Downloading %s failed: %s" % (url, e)) from None
+        except (requests.exceptions.RequestException, _Incomplete) as e:
+            last_error = e
+            continue
+
+        size = os.path.getsize(part)
+        if expected_size is not None and size < expected_size:
+            # Truncated without the server saying how long it should be, resume it
+            last_error = "received %s of %s bytes" % (size, expected_size)
+            continue
+        problem = _check(part, expected_size, sha256, validate)
+        if problem is None:
+            os.replace(part, path)
+            return path
+        # The content is wrong rather than truncated so trying again would not help
+        os.remove(part)
+        raise DownloadError("Downloading %s failed: %s" % (url, problem))
+
+    raise DownloadError(
+        "Downloading %s failed after %s attempts: %s" % (url, retries + 1, last_error)
+    )
+
+
+def _fetch(url, part, session, timeout, chunk_size):
+    """Streams url into part, resuming if it already has some data. Raises _Incomplete if the transfer stops early."""
+    offset = os.path.getsize(part) if os.path.isfile(part) else 0
+    headers = {"Range": "bytes=%s-" % offset} if offset > 0 else {}
+
+    with session.get(url, stream=True, timeout=timeout, headers=headers) as r:
+        if r.status_code == 416:
+            # Our partial file doesn't match what the server has, start again
+            os.remove(part)
+            raise _Incomplete("range not satisfiable")
+        if r.status_code in RETRY_STATUS:
+            raise _Incomplete("HTTP %s" % r.status_code)
+        if r.status_code >= 400:
+            raise _Fatal("HTTP %s" % r.status_code)
+
+        if r.status_code == 206:
+            mode = "ab"
+            total = _content_range_total(r.headers.get("Content-Range"))
+        else:
+            mode = "wb"
+            offset = 0
+            total = None
+        if total is None and "Content-Length" in r.headers:
+            total = offset + int(r.headers["Content-Length"])
+
+        with open(part, mode) as f:
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    f.write(chunk)
+
+    if total is not None and os.path.getsize(part) < total:
+        raise _Incomplete("received %s of %s bytes" % (os.path.getsize(part), total))
+
+
+def _content_range_total(content_range):
+    """Total length from a "bytes start-end/total" header, None if unknown"""
+    if content_range is None or "/" not in content_range:
+        return None
+    total = content_range.rsplit("/", 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+
+def _check(part, expected_size, sha256, validate):
+    """Returns a description of the first failed check, or None if the file is good"""
+    size = os.path.getsize(part)
+    if expected_size is not None and size != expected_size:
+        return "expected %s bytes but got %s" % (expected_size, size)
+    if sha256 is not None and sha256sum(part) != sha256.lower():
+        return "sha256 mismatch"
+    if validate is not None and not validate(part):
+        return "downloaded file failed validation"
+    return None
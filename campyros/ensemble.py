@@ -0,0 +1,1081 @@
+"""
+Lockstep integration of many rockets at once, for stochastic campaigns.
+
+Notes
+-----
+
+- Every member keeps its own time, step size and flight phase, but all the members take their steps together, so each
+  stage of the integrator is one vectorised evaluation of the equations of motion for the whole ensemble rather than
+  a Python call per rocket. Members are dropped from the arrays as they land.
+- The equations of motion, events and step size control (the SciPy DOP853 integrator) are the same as Rocket.run, so a
+  member follows the same trajectory as the rocket run on its own, to within the integrator tolerance. Both end the
+  step a rocket leaves the rail in exactly at the end of the rail, so the rail exit doesn't depend on the steps taken.
+- Differences from Rocket.run:
+    - Mass properties and thrust are tabulated on a grid of every data time (each interval split in refine) and
+      linearly interpolated. Mass and thrust are exact, the centre of gravity and inertias are to within the
+      tabulation error.
+    - The orientation (b2imat) isn't recorded, the Mach number and dynamic pressure at each output step are instead.
+    - Aerodynamic coefficients use bilinear interpolation of the AeroData tables, clamped at the edges, which is what
+      AeroData's interp2d functions do. Custom CA_func/CN_func/COP_func aren't used.
+- PointMass runs the same rockets as point masses (3-DOF), far cheaper but only an approximation. It is the low
+  fidelity model of multi-fidelity campaigns (see StatisticalModel.run_multi_fidelity).
+
+"""
+import time
+import numpy as np
+from ambiance import Atmosphere, CONST
+from scipy.integrate import DOP853
+from scipy.spatial.transform import Rotation
+
+from .constants import r_earth, ang_vel_earth, f
+from .main import RunStatus
+from .transforms import lla2i, i2lla, i2l_matrices, pos_i2l, vel_i2l
+from .wind import EnsembleWind
+from .turbulence import TurbulentWind, interpolate_gusts
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# Step size control, as scipy.integrate.DOP853
+SAFETY = 0.9
+MIN_FACTOR = 0.2
+MAX_FACTOR = 10
+ERROR_EXPONENT = -1 / (DOP853.error_estimator_order + 1)
+T_BOUND = 1000  # Rocket.run integrates to 1000 s whatever max_time is
+# Halvings of the step when finding where a member leaves the rail, enough to find it to well below the tolerance
+RAIL_BISECTIONS = 60
+
+
+def cross(a, b):
+    """Cross products of rows of vectors, quicker than np.cross for a few vectors"""
+    a, b = np.broadcast_arrays(a, b)
+    return np.column_stack(
+        [
+            a[:, 1] * b[:, 2] - a[:, 2] * b[:, 1],
+            a[:, 2] * b[:, 0] - a[:, 0] * b[:, 2],
+            a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0],
+        ]
+    )
+
+
+def launch_frame(pos_i, vel_i, launch_site, time):
+    """Positions and velocities in the launch frame for a whole trajectory at once, as pos_i2l and vel_i2l
+
+    Parameters
+    ----------
+    pos_i : numpy array
+        Positions in the inertial frame, shape (n, 3) /m
+    vel_i : numpy array
+        Velocities in the inertial frame, shape (n, 3) /m/s
+    launch_site : LaunchSite
+        Launch site
+    time : numpy array
+        Time since ignition of each row /s
+
+    Returns
+    -------
+    numpy array, numpy array
+        Positions /m and velocities /m/s in the launch frame
+    """
+    return pos_i2l(pos_i, launch_site, time), vel_i2l(vel_i, launch_site, time)
+
+
+def bilinear(x_grid, y_grid, table, x, y):
+    """Bilinear interpolation of a table, clamped at the edges (the same as scipy.interpolate.interp2d's linear kind)
+
+    Parameters
+    ----------
+    x_grid : numpy array
+        Increasing x values of the table columns
+    y_grid : numpy array
+        Increasing y values of the table rows
+    table : numpy array
+        Values, shape (..., len(y_grid), len(x_grid))
+    x : numpy array
+        x of each point
+    y : numpy array
+        y of each point
+
+    Returns
+    -------
+    numpy array
+        Interpolated values, shape (..., n)
+    """
+    x = np.clip(x, x_grid[0], x_grid[-1])
+    y = np.clip(y, y_grid[0], y_grid[-1])
+    i = np.clip(np.searchsorted(x_grid, x, side="right") - 1, 0, len(x_grid) - 2)
+    j = np.clip(np.searchsorted(y_grid, y, side="right") - 1, 0, len(y_grid) - 2)
+    fx = (x - x_grid[i]) / (x_grid[i + 1] - x_grid[i])
+    fy = (y - y_grid[j]) / (y_grid[j + 1] - y_grid[j])
+    return (1 - fy) * ((1 - fx) * table[..., j, i] + fx * table[..., j, i + 1]) + fy * (
+        (1 - fx) * table[..., j + 1, i] + fx * table[..., j + 1, i + 1]
+    )
+
+
+class _WindBatch:
+    """Evaluates the winds of all the members at once
+
+    Members that share a wind (or an ensemble forcast, with different members) are evaluated in one get_winds call,
+    and turbulent gusts are interpolated together from a stack of every member's profile.
+    """
+
+    def __init__(self, winds):
+        self.bases, keys = [], {}
+        base_rows, members, profiles = [], [], []
+        gusts = {}
+        for wind in winds:
+            if isinstance(wind, TurbulentWind):
+                key = (len(wind.gusts), wind.resolution)
+                gusts.setdefault(key, []).append(wind.gusts)
+                profiles.append((key, len(gusts[key]) - 1))
+                wind = wind.wind
+            else:
+                profiles.append(None)
+            if isinstance(wind, EnsembleWind):
+                if wind.data is None:
+                    wind.preload()
+                key = id(wind.data)
+                members.append(wind.member)
+            else:
+                key = id(wind)
+                members.append(-1)
+            if key not in keys:
+                keys[key] = len(self.bases)
+                self.bases.append(wind)
+            base_rows.append(keys[key])
+
+        self.gusts = [(np.array(stack), key[1]) for key, stack in gusts.items()]
+        stacks = {key: n for n, key in enumerate(gusts)}
+        self.rows = {
+            "wind_base": np.array(base_rows, dtype=int),
+            "wind_member": np.array(members, dtype=int),
+            "gust_stack": np.array(
+                [-1 if p is None else stacks[p[0]] for p in profiles], dtype=int
+            ),
+            "gust_profile": np.array(
+                [-1 if p is None else p[1] for p in profiles], dtype=int
+            ),
+        }
+
+    def __call__(self, p, lat, long, alt, time):
+        """Winds [x,y,z] /m/s in the launch frame, for the members described by the row arrays in p"""
+        out = np.empty((len(alt), 3))
+        for n in np.unique(p["wind_base"]):
+            rows = p["wind_base"] == n
+            if isinstance(self.bases[n], EnsembleWind):
+                out[rows] = self.bases[n].get_winds(
+                    lat[rows], long[rows], alt[rows], time[rows], p["wind_member"][rows]
+                )
+            elif hasattr(self.bases[n], "get_winds"):
+                out[rows] = self.bases[n].get_winds(
+                    lat[rows], long[rows], alt[rows], time[rows]
+                )
+            else:
+                out[rows] = [
+                    self.bases[n].get_wind(*point)
+                    for point in zip(lat[rows], long[rows], alt[rows], time[rows])
+                ]
+        for n in np.unique(p["gust_stack"][p["gust_stack"] >= 0]):
+            rows = p["gust_stack"] == n
+            gusts, resolution = self.gusts[n]
+            out[rows] += interpolate_gusts(
+                gusts, resolution, alt[rows], p["gust_profile"][rows]
+            )
+        return out
+
+
+class Ensemble:
+    """Runs several rockets together, in lockstep, with vectorised equations of motion
+
+    Note
+    ----
+    Intended for Monte Carlo campaigns where the rockets are perturbed copies of each other, the speed up comes from
+    evaluating all the members at once so it grows with the number of members (a few hundred is a good size). See the
+    module notes for the differences from Rocket.run.
+
+    Parameters
+    ----------
+    rockets : list
+        Rocket objects, set up but not run
+    refine : int, optional
+        Number of intervals each interval of the mass and thrust data times is split into for the mass property
+        tables, defaults to 8
+
+    Attributes
+    ----------
+    rockets : list
+        The members
+    grid : numpy array
+        Times of the mass property and thrust tables /s
+    failures : dict
+        Error message for each member (index in rockets) that failed in the last run
+    status : list
+        campyros.main.RunStatus of each member in the last run
+    """
+
+    # The vectors at the start of the state that are in the outputs
+    recorded = ["pos_i", "vel_i", "w_b"]
+
+    def __init__(self, rockets, refine=8):
+        self.rockets = list(rockets)
+        self.failures = {}
+
+        times = {}
+        for rocket in self.rockets:
+            for component in [rocket.motor] + rocket.mass_model.variables:
+                if hasattr(component, "time_array"):
+                    times[id(component.time_array)] = component.time_array
+        grid = np.unique(np.concatenate([np.ravel(t) for t in times.values()]))
+        fractions = np.arange(1, refine) / refine
+        self.grid = np.unique(
+            np.concatenate(
+                [grid, (grid[:-1, None] + np.diff(grid)[:, None] * fractions).ravel()]
+            )
+        )
+
+        # Aero tables are shared between perturbed copies, so there is normally only one group
+        self.aero_groups, groups = [], {}
+        for rocket in self.rockets:
+            key = id(rocket.aero.CA_grid)
+            if key not in groups:
+                groups[key] = len(self.aero_groups)
+                aero = rocket.aero
+                self.aero_groups.append(
+                    (
+                        np.asarray(aero.Mach_grid, dtype=float),
+                        np.asarray(aero.alpha_grid, dtype=float),
+                        np.array([aero.CA_grid, aero.CN_grid, aero.COP_grid]),
+                    )
+                )
+        self._aero_group = [groups[id(rocket.aero.CA_grid)] for rocket in self.rockets]
+
+    def _initial_state(self):
+        """Arrays of everything about each member, all with the member as the first axis"""
+        rockets = self.rockets
+        grid = self.grid
+        n = len(rockets)
+
+        def column(get):
+            return np.array([get(rocket) for rocket in rockets], dtype=float)
+
+        mass_table = np.zeros((n, len(grid), 5))
+        for row, rocket in enumerate(rockets):
+            model = rocket.mass_model
+            for k, prop in enumerate(
+                [model.mass, model.cog, model.ixx, model.iyy, model.izz]
+            ):
+                mass_table[row, :, k] = prop(grid)
+
+        y = np.zeros((n, 18))
+        for row, rocket in enumerate(rockets):
+            y[row, :3] = rocket.pos_i
+            y[row, 3:6] = rocket.vel_i
+            y[row, 6:9] = rocket.w_b
+            y[row, 9:] = rocket.b2i.as_matrix().T.ravel()
+
+        thrust_vector = np.array([rocket.thrust_vector for rocket in rockets], float)
+        chutes = [rocket.parachute for rocket in rockets]
+        constant_chute = np.array(
+            [not chute.variable_main_c_d for chute in chutes], dtype=bool
+        )
+        p = {
+            "index": np.arange(n),
+            "t": column(lambda r: r.time),
+            "y": y,
+            "rtol": np.maximum(column(lambda r: r.rtol), 100 * np.finfo(float).eps),
+            "atol": column(lambda r: r.atol),
+            "variable_time": np.array([r.variable_time for r in rockets], bool),
+            "h_fixed": column(lambda r: r.h),
+            "rejected": np.zeros(n, dtype=bool),
+            # Phase of flight
+            "on_rail": np.array([r.on_rail for r in rockets], dtype=bool),
+            "deployed": np.array([r.parachute_deployed for r in rockets], bool),
+            "alt_record": column(lambda r: r.alt_record),
+            "poll_watch": column(lambda r: r.alt_poll_watch),
+            "poll_interval": column(lambda r: r.alt_poll_watch_interval),
+            # Launch site and environment
+            "site_lat": column(lambda r: r.launch_site.lat),
+            "site_longi": column(lambda r: r.launch_site.longi),
+            "site_alt": column(lambda r: r.launch_site.alt),
+            "rail_length": column(lambda r: r.launch_site.rail_length),
+            "gravity": column(lambda r: r.env_vars["gravity"]),
+            "density": column(lambda r: r.env_vars["density"]),
+            "pressure": column(lambda r: r.env_vars["pressure"]),
+            "speed_of_sound": column(lambda r: r.env_vars["speed_of_sound"]),
+            # Aerodynamics
+            "aero_group": np.array(self._aero_group, dtype=int),
+            "ref_area": column(lambda r: r.aero.ref_area),
+            "roll_damping": column(lambda r: r.aero.roll_damping_coefficient),
+            "pitch_damping": column(lambda r: r.aero.pitch_damping_coefficient),
+            "aero_error": np.array(
+                [[r.aero.error[k] for k in ["CA", "CN", "COP"]] for r in rockets],
+                dtype=float,
+            ).reshape(n, 3),
+            # Motor and mass
+            "burn_time": column(lambda r: r.motor.time_array[-1]),
+            "motor_pos": column(lambda r: r.motor.pos),
+            "exit_area": column(lambda r: r.motor.exit_area),
+            "motor_pressure": column(lambda r: r.motor.ambient_pressure),
+            "thrust_direction": thrust_vector
+            / np.linalg.norm(thrust_vector, axis=1)[:, None],
+            "thrust_table": np.array([r.motor.thrust(grid) for r in rockets]),
+            "mass_table": mass_table,
+            # Parachute, variable drag coefficients are looked up member by member
+            "chute": np.array(chutes, dtype=object),
+            "chute_constant": constant_chute,
+            "chute_active": np.array(
+                [
+                    not (chute.variable_main_c_d == False and chute.main_c_d == 0)
+                    for chute in chutes
+                ],
+                dtype=bool,
+            ),
+            "main_alt": column(lambda r: r.parachute.main_alt),
+            "main_s": column(lambda r: r.parachute.main_s),
+            "drogue_s": column(lambda r: r.parachute.drogue_s),
+            "main_c_d": np.array(
+                [c.main_c_d if k else np.nan for c, k in zip(chutes, constant_chute)]
+            ),
+            "drogue_c_d": np.array(
+                [c.drogue_c_d if k else np.nan for c, k in zip(chutes, constant_chute)]
+            ),
+        }
+        self._winds = _WindBatch([rocket.launch_site.wind for rocket in rockets])
+        p.update(self._winds.rows)
+        return p
+
+    def _lookup(self, table, time):
+        """Linear interpolation of each member's row of a table on self.grid, clamped at the ends like np.interp"""
+        grid = self.grid
+        i = np.clip(np.searchsorted(grid, time, side="right") - 1, 0, len(grid) - 2)
+        w = np.clip((time - grid[i]) / (grid[i + 1] - grid[i]), 0, 1)
+        rows = np.arange(len(time))
+        if table.ndim == 3:
+            w = w[:, None]
+        return (1 - w) * table[rows, i] + w * table[rows, i + 1]
+
+    def _air(self, time, pos_i, vel_i, p):
+        """Altitude, atmosphere and air relative velocity of every member
+
+        Returns
+        -------
+        numpy array
+            Altitude, clipped to the atmosphere model's range /m
+        dict
+            "density" /kg/m^3, "pressure" /Pa and "speed_of_sound" /m/s of the air (with the environment errors),
+            "air_speed" /m/s, "mach" and dynamic pressure "q" /Pa
+        numpy array
+            Velocity relative to the wind in the inertial frame /m/s
+        """
+        lat, long, alt = i2lla(pos_i, time)
+        alt = np.clip(alt, -5000, 81020)
+
+        # Each Atmosphere property looks up the layers again, so only get them once (same formulas as ambiance)
+        atmosphere = Atmosphere(alt)
+        temperature = atmosphere.temperature
+        pressure = atmosphere.pressure
+        speed_of_sound = np.sqrt(CONST.kappa * CONST.R * temperature)
+        air = {
+            "density": pressure / (CONST.R * temperature) * p["density"],
+            "pressure": pressure * p["pressure"],
+            "speed_of_sound": speed_of_sound * p["speed_of_sound"],
+        }
+
+        i2l = i2l_matrices(p["site_lat"], p["site_longi"], time)
+        air_velocity_i = vel_i - cross([0, 0, ang_vel_earth], pos_i)
+        v_relative_wind_l = np.einsum("nij,nj->ni", i2l, air_velocity_i) - self._winds(
+            p, lat, long, alt, time
+        )
+        v_relative_wind_i = np.einsum("nji,nj->ni", i2l, v_relative_wind_l)
+        air["air_speed"] = np.linalg.norm(v_relative_wind_i, axis=1)
+        air["q"] = 0.5 * air["density"] * air["air_speed"] ** 2
+        air["mach"] = air["air_speed"] / air["speed_of_sound"]
+        return alt, air, v_relative_wind_i
+
+    def _parachute(self, p, alt, air, v_relative_wind_i, F_i):
+        """Adds the parachute drag of the members under a parachute to F_i, returns which members they are"""
+        chute = p["deployed"] & p["chute_active"]
+        if np.any(chute):
+            main = alt < p["main_alt"]
+            c_d = np.where(main, p["main_c_d"], p["drogue_c_d"])
+            ref_area = np.where(main, p["main_s"], p["drogue_s"])
+            for row in np.flatnonzero(chute & ~p["chute_constant"]):
+                c_d[row], ref_area[row] = p["chute"][row].get(
+                    alt[row], air["mach"][row]
+                )
+            F_i[chute] = (-0.5 * air["q"] * ref_area * c_d / air["air_speed"])[
+                chute, None
+            ] * v_relative_wind_i[chute]
+        return chute
+
+    def fdot(self, time, y, p):
+        """Rates of change of the state of every member, the vectorised version of Rocket.fdot
+
+        Parameters
+        ----------
+        time : numpy array
+            Time since ignition of each member /s
+        y : numpy array
+            State of each member, shape (n, 18), in the order of Rocket.fdot's fn
+        p : dict
+            Member arrays, see _initial_state
+
+        Returns
+        -------
+        numpy array
+            Rate of change of the state, shape (n, 18)
+        numpy array
+            Mach number
+        numpy array
+            Dynamic pressure /Pa
+        """
+        n = len(time)
+        pos_i, vel_i, w_b = y[:, 0:3], y[:, 3:6], y[:, 6:9]
+        b2i = Rotation.from_matrix(y[:, 9:].reshape(n, 3, 3).transpose(0, 2, 1))
+        b2i = b2i.as_matrix()
+        w_i = np.einsum("nij,nj->ni", b2i, w_b)
+
+        mass, cog, ixx, iyy, izz = self._lookup(p["mass_table"], time).T
+        alt, air, v_relative_wind_i = self._air(time, pos_i, vel_i, p)
+        v_relative_wind_b = np.einsum("nji,nj->ni", b2i, v_relative_wind_i)
+        air_speed, q, mach = air["air_speed"], air["q"], air["mach"]
+        ambient_density = air["density"]
+
+        F_i = np.zeros((n, 3))
+        F_b = np.zeros((n, 3))
+        M_b = np.zeros((n, 3))
+
+        chute = self._parachute(p, alt, air, v_relative_wind_i, F_i)
+        body = ~chute
+        if np.any(body):
+            u = v_relative_wind_b[body] / air_speed[body, None]
+            # Rounding can put the cosine just past ±1 when the airflow is along the body axis
+            alpha = abs(np.arccos(np.clip(u[:, 0], -1, 1)))
+            coefficients = np.zeros((np.count_nonzero(body), 3))
+            groups = p["aero_group"][body]
+            for group in np.unique(groups):
+                rows = groups == group
+                Mach_grid, alpha_grid, tables = self.aero_groups[group]
+                coefficients[rows] = bilinear(
+                    Mach_grid, alpha_grid, tables, mach[body][rows], alpha[rows]
+                ).T
+            CA, CN, cop = (coefficients * p["aero_error"][body]).T
+            qA = q[body] * p["ref_area"][body]
+            F_aero_b = np.zeros(u.shape)
+            F_aero_b[:, 0] = -CA * qA * np.sign(v_relative_wind_b[body, 0])
+            F_aero_b[:, 1] = -CN * qA * u[:, 1]
+            F_aero_b[:, 2] = -CN * qA * u[:, 2]
+            r_cop_cog = -(cop - cog[body])
+            F_b[body] += F_aero_b
+            M_b[body, 1] += -r_cop_cog * F_aero_b[:, 2]
+            M_b[body, 2] += r_cop_cog * F_aero_b[:, 1]
+            damping = np.column_stack(
+                [p["roll_damping"], p["pitch_damping"], p["pitch_damping"]]
+            )[body]
+            M_b[body] += (
+                -np.sign(w_b[body])
+                * ambient_density[body, None]
+                * w_b[body] ** 2
+                * damping
+            )
+
+        # Motor
+        burning = time < p["burn_time"]
+        if np.any(burning):
+            thrust = (
+                self._lookup(p["thrust_table"][burning], time[burning])
+                + (p["motor_pressure"] - air["pressure"])[burning]
+                * p["exit_area"][burning]
+            )
+            mass_table = p["mass_table"][burning][:, :, 0]
+            mdot = (
+                self._lookup(mass_table, time[burning] + 1)
+                - self._lookup(mass_table, time[burning] - 1)
+            ) / 2
+            F_thrust_b = thrust[:, None] * p["thrust_direction"][burning]
+            r_engine_cog = -(p["motor_pos"][burning] - cog[burning])
+            F_b[burning] += F_thrust_b
+            M_b[burning, 1] += -r_engine_cog * F_thrust_b[:, 2]
+            M_b[burning, 2] += r_engine_cog * F_thrust_b[:, 1]
+            M_b[burning, 1:] += (mdot * (cog[burning] - p["motor_pos"][burning]) ** 2)[
+                :, None
+            ] * w_b[burning, 1:]
+
+        # Gravity
+        F_i += (
+            -p["gravity"] * 3.986004418e14 * mass / np.linalg.norm(pos_i, axis=1) ** 3
+        )[:, None] * pos_i
+
+        acc_i = (F_i + np.einsum("nij,nj->ni", b2i, F_b)) / mass[:, None]
+        wdot_b = np.column_stack(
+            [
+                (M_b[:, 0] + (iyy - izz) * w_b[:, 1] * w_b[:, 2]) / ixx,
+                (M_b[:, 1] + (izz - ixx) * w_b[:, 2] * w_b[:, 0]) / iyy,
+                (M_b[:, 2] + (ixx - iyy) * w_b[:, 0] * w_b[:, 1]) / izz,
+            ]
+        )
+        rail = p["on_rail"]
+        if np.any(rail):
+            xb_i = b2i[rail, :, 0]
+            xb_i = xb_i / np.linalg.norm(xb_i, axis=1)[:, None]
+            acc_i[rail] = np.sum(acc_i[rail] * xb_i, axis=1)[:, None] * xb_i
+            wdot_b[rail] = 0
+
+        out = np.empty((n, 18))
+        out[:, 0:3] = vel_i
+        out[:, 3:6] = acc_i
+        out[:, 6:9] = wdot_b
+        for k in range(3):
+            out[:, 9 + 3 * k : 12 + 3 * k] = cross(w_i, y[:, 9 + 3 * k : 12 + 3 * k])
+        return out, mach, q
+
+    def _initial_step(self, p, f0):
+        """Initial step sizes, scipy.integrate._ivp.common.select_initial_step for each member"""
+        y0, t0 = p["y"], p["t"]
+        scale = p["atol"][:, None] + abs(y0) * p["rtol"][:, None]
+        rms = lambda x: np.linalg.norm(x, axis=1) / np.sqrt(x.shape[1])
+        d0 = rms(y0 / scale)
+        d1 = rms(f0 / scale)
+        h0 = np.where(
+            (d0 < 1e-5) | (d1 < 1e-5), 1e-6, 0.01 * d0 / np.maximum(d1, 1e-300)
+        )
+        f1 = self.fdot(t0 + h0, y0 + h0[:, None] * f0, p)[0]
+        d2 = rms((f1 - f0) / scale) / h0
+        with np.errstate(divide="ignore"):
+            h1 = np.where(
+                (d1 <= 1e-15) & (d2 <= 1e-15),
+                np.maximum(1e-6, h0 * 1e-3),
+                (0.01 / np.maximum(d1, d2)) ** (1 / (DOP853.error_estimator_order + 1)),
+            )
+        return np.minimum(100 * h0, h1)
+
+    def _rail_distance(self, p, rows, t, pos_i):
+        """Rocket.rail_distance of the members in rows, at times t and inertial positions pos_i"""
+        site_i = lla2i(
+            p["site_lat"][rows], p["site_longi"][rows], p["site_alt"][rows], t
+        )
+        pos_l = np.einsum(
+            "nij,nj->ni",
+            i2l_matrices(p["site_lat"][rows], p["site_longi"][rows], t),
+            pos_i - site_i.T,
+        )
+        pos_l[:, 2] -= p["site_alt"][rows]
+        return np.linalg.norm(pos_l, axis=1)
+
+    def _leave_rail(self, p, rows, t, h, k, y_new, f_new):
+        """Rocket.leave_rail for the members in rows, which passed the end of the rail in the step from t of length h
+
+        Note
+        ----
+        The crossing is found by bisecting the step's DOP853 dense output (to far below the integrator tolerance), the
+        members then start again from there off the rail, with a new initial step as a new SciPy integrator would.
+
+        Returns
+        -------
+        numpy array
+            Time of each crossing /s
+        numpy array
+            State at each crossing
+        tuple
+            What fdot gives at the crossings, off the rail
+        numpy array
+            Initial step size of each member from the crossing /s
+        """
+        members = {key: value[rows] for key, value in p.items()}
+        t, h, y = t[rows], h[rows], p["y"][rows]
+        stages = DOP853.A_EXTRA.shape[1]
+        K = np.zeros((stages, len(rows), y.shape[1]))
+        K[: DOP853.n_stages + 1] = k[:, rows]
+        for s, (a, c) in enumerate(
+            zip(DOP853.A_EXTRA, DOP853.C_EXTRA), start=DOP853.n_stages + 1
+        ):
+            dy = np.tensordot(a[:s], K[:s], axes=(0, 0)) * h[:, None]
+            K[s] = self.fdot(t + c * h, y + dy, members)[0]
+        # Interpolating polynomial, as scipy.integrate.DOP853.dense_output
+        delta = y_new[rows] - y
+        F = [
+            delta,
+            h[:, None] * K[0] - delta,
+            2 * delta - h[:, None] * (f_new[rows] + K[0]),
+        ] + list(h[:, None] * np.tensordot(DOP853.D, K, axes=(1, 0)))
+
+        def dense(x):
+            out = np.zeros_like(y)
+            for i, term in enumerate(reversed(F)):
+                out += term
+                out *= x[:, None] if i % 2 == 0 else 1 - x[:, None]
+            return out + y
+
+        low, high = np.zeros(len(rows)), np.ones(len(rows))
+        for _ in range(RAIL_BISECTIONS):
+            x = (low + high) / 2
+            past = (
+                self._rail_distance(p, rows, t + x * h, dense(x)[:, :3])
+                >= p["rail_length"][rows]
+            )
+            high = np.where(past, x, high)
+            low = np.where(past, low, x)
+        x = (low + high) / 2
+        rail_time, rail_state = t + x * h, dense(x)
+
+        members["on_rail"][:] = False
+        members["t"], members["y"] = rail_time, rail_state
+        rates = self.fdot(rail_time, rail_state, members)
+        return rail_time, rail_state, rates, self._initial_step(members, rates[0])
+
+    def _check_phase(self, p, fresh, alt):
+        """Rocket.check_phase for the members about to start a step, returns which left the rail and opened parachutes"""
+        cleared = np.zeros(len(alt), dtype=bool)
+        rail = np.flatnonzero(fresh & p["on_rail"])
+        if len(rail) > 0:
+            distance = self._rail_distance(p, rail, p["t"][rail], p["y"][rail, :3])
+            cleared[rail] = distance >= p["rail_length"][rail]
+            p["on_rail"][cleared] = False
+
+        poll = fresh & ~p["deployed"] & (p["poll_watch"] < p["t"] - p["poll_interval"])
+        deploy = poll & (p["alt_record"] > alt)
+        p["deployed"][deploy] = True
+        record = poll & ~deploy
+        p["poll_watch"][record] = p["t"][record]
+        p["alt_record"][record] = alt[record]
+        return cleared, deploy
+
+    def run(
+        self,
+        max_time=1000,
+        debug=False,
+        max_steps=None,
+        max_evaluations=None,
+        max_wall_time=None,
+    ):
+        """Runs every member until it lands (or reaches max_time)
+
+        Note
+        ----
+        The budgets are as Rocket.run's, for each member, a member that uses up one fails (with its status set) and
+        the rest carry on. The wall time of each step is shared equally between the members taking it, so a member's
+        wall time is its share of the ensemble's, and max_wall_time means the same as it does for Rocket.run.
+
+        Parameters
+        ----------
+        max_time : float, optional
+            Maximum time to run each member for /s, defaults to 1000
+        debug : bool, optional
+            Print the progress every 100 steps, defaults to False
+        max_steps : int, optional
+            Maximum number of accepted steps of each member, defaults to None (no limit)
+        max_evaluations : int, optional
+            Maximum number of evaluations of each member's equations of motion, defaults to None (no limit)
+        max_wall_time : float, optional
+            Maximum time to spend running each member /s of real time, defaults to None (no limit)
+
+        Returns
+        -------
+        list
+            For each member None if it failed (see the failures attribute), otherwise a dict of arrays with a row per
+            output step: "time", "pos_i", "vel_i", "w_b" (not for PointMass), "mach", "q" and "events" (a list of the
+            events at each step, as Rocket.run)
+        """
+        clock = time.perf_counter()
+        self.failures = {}
+        self.status = [RunStatus.LANDED] * len(self.rockets)
+        p = self._initial_state()
+        p["f"], _, _ = self.fdot(p["t"], p["y"], p)
+        p["h_abs"] = self._initial_step(p, p["f"])
+        n = len(p["t"])
+        # As scipy counts them, the initial derivative and step size take one evaluation each and each attempt n_stages
+        p["steps"] = np.zeros(n, dtype=int)
+        p["evaluations"] = np.full(n, 2)
+        p["min_step"] = np.zeros(n)
+        p["fresh"] = np.ones(n, dtype=bool)
+        p["cleared"] = np.zeros(n, dtype=bool)
+        p["deploy"] = np.zeros(n, dtype=bool)
+        p["wall_time"] = np.zeros(n)
+
+        A, B, C, E3, E5 = DOP853.A, DOP853.B, DOP853.C, DOP853.E3, DOP853.E5
+        states = p["y"].shape[1]
+        K = np.empty((DOP853.n_stages + 1, n, states))
+        records = []
+        count = 0
+
+        def drop(p, gone):
+            return {key: value[~gone] for key, value in p.items()}
+
+        def fail(p, rows, message, status=RunStatus.FAILED):
+            for row in np.flatnonzero(rows):
+                self.failures[int(p["index"][row])] = message % p["t"][row]
+                self.status[int(p["index"][row])] = status
+            return drop(p, rows)
+
+        budgets = [
+            (max_steps, "steps", RunStatus.MAX_STEPS),
+            (max_evaluations, "evaluations", RunStatus.MAX_EVALUATIONS),
+            (max_wall_time, "wall_time", RunStatus.MAX_WALL_TIME),
+        ]
+
+        while len(p["t"]) > 0:
+            now = time.perf_counter()
+            p["wall_time"] += (now - clock) / len(p["t"])
+            clock = now
+            # Members starting a new step, as the loop in Rocket.run
+            fresh = p["fresh"]
+            alt = i2lla(p["y"][:, :3], p["t"])[2]
+            landed = fresh & ((alt < 0) | (p["t"] >= max_time))
+            if np.any(landed):
+                for row in np.flatnonzero(landed & (alt >= 0)):
+                    self.status[int(p["index"][row])] = RunStatus.MAX_TIME
+                p = drop(p, landed)
+                alt, fresh = alt[~landed], p["fresh"]
+                if len(p["t"]) == 0:
+                    break
+            # Budgets are checked between steps, as Rocket.run
+            over = np.zeros(len(fresh), dtype=bool)
+            for limit, key, status in budgets:
+                if limit is not None:
+                    spent = fresh & ~over & (p[key] >= limit)
+                    over |= spent
+                    for row in np.flatnonzero(spent):
+                        self.status[int(p["index"][row])] = status
+            if np.any(over):
+                for row in np.flatnonzero(over):
+                    index = int(p["index"][row])
+                    self.failures[index] = "Stopped at t=%s s, %s" % (
+                        p["t"][row],
+                        self.status[index].value,
+                    )
+                p = drop(p, over)
+                alt, fresh = alt[~over], p["fresh"]
+                if len(p["t"]) == 0:
+                    break
+            fixed = fresh & ~p["variable_time"]
+            p["h_abs"][fixed] = p["h_fixed"][fixed]
+            # Events are recorded with the step that is eventually accepted
+            cleared, deploy = self._check_phase(p, fresh, alt)
+            p["cleared"] = np.where(fresh, cleared, p["cleared"])
+            p["deploy"] = np.where(fresh, deploy, p["deploy"])
+            t = p["t"]
+            min_step = 10 * abs(np.nextafter(t, np.inf) - t)
+            p["min_step"][fresh] = min_step[fresh]
+            p["h_abs"][fresh] = np.maximum(p["h_abs"], p["min_step"])[fresh]
+
+            # A shorter step can't help a member whose state itself isn't finite
+            broken = ~np.isfinite(p["h_abs"]) | ~np.all(
+                np.isfinite(p["y"]) & np.isfinite(p["f"]), axis=1
+            )
+            if np.any(broken):
+                p = fail(p, broken, "Non-finite state at t=%s s")
+                if len(p["t"]) == 0:
+                    break
+                t = p["t"]
+            too_small = p["h_abs"] < p["min_step"]
+            if np.any(too_small):
+                p = fail(p, too_small, "Step size became too small at t=%s s")
+                if len(p["t"]) == 0:
+                    break
+                t = p["t"]
+
+            # One DOP853 step attempt for every member
+            t_new = np.minimum(t + p["h_abs"], T_BOUND)
+            h = t_new - t
+            p["h_abs"] = abs(h)
+            y, m = p["y"], len(t)
+            k = K[:, :m]
+            k[0] = p["f"]
+            for s in range(1, DOP853.n_stages):
+                dy = np.tensordot(A[s, :s], k[:s], axes=(0, 0)) * h[:, None]
+                k[s] = self.fdot(t + C[s] * h, y + dy, p)[0]
+            y_new = y + h[:, None] * np.tensordot(B, k[:-1], axes=(0, 0))
+            f_new, mach, q = self.fdot(t_new, y_new, p)
+            k[-1] = f_new
+            p["evaluations"] += DOP853.n_stages
+
+            scale = (
+                p["atol"][:, None] + np.maximum(abs(y), abs(y_new)) * p["rtol"][:, None]
+            )
+            err5 = np.sum((np.tensordot(E5, k, axes=(0, 0)) / scale) ** 2, axis=1)
+            err3 = np.sum((np.tensordot(E3, k, axes=(0, 0)) / scale) ** 2, axis=1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                error_norm = np.where(
+                    (err5 == 0) & (err3 == 0),
+                    0.0,
+                    abs(h) * err5 / np.sqrt((err5 + 0.01 * err3) * states),
+                )
+                growth = SAFETY * error_norm ** ERROR_EXPONENT
+
+            # A non-finite trial step is rejected and shrunk as much as possible, as scipy does
+            diverged = ~np.isfinite(error_norm) | ~np.all(np.isfinite(y_new), axis=1)
+            accepted = (error_norm < 1) & ~diverged
+            factor = np.where(
+                error_norm == 0, MAX_FACTOR, np.minimum(MAX_FACTOR, growth)
+            )
+            factor = np.where(p["rejected"], np.minimum(1, factor), factor)
+            shrink = np.where(diverged, MIN_FACTOR, np.maximum(MIN_FACTOR, growth))
+            p["h_abs"] *= np.where(accepted, factor, shrink)
+            p["rejected"] = ~accepted
+            p["fresh"] = accepted
+
+            # Members that passed the end of the rail stop there, as Rocket.run
+            rail = np.flatnonzero(accepted & p["on_rail"])
+            if len(rail) > 0:
+                rail = rail[
+                    self._rail_distance(p, rail, t_new[rail], y_new[rail, :3])
+                    >= p["rail_length"][rail]
+                ]
+            if len(rail) > 0:
+                rail_time, rail_state, rates, h_abs = self._leave_rail(
+                    p, rail, t, h, k, y_new, f_new
+                )
+                t_new[rail], y_new[rail] = rail_time, rail_state
+                f_new[rail], mach[rail], q[rail] = rates
+                p["h_abs"][rail] = h_abs
+                p["on_rail"][rail] = False
+                p["cleared"][rail] = True
+                # The dense output's extra stages, and a new integrator's initial derivative and step
+                p["evaluations"][rail] += DOP853.A_EXTRA.shape[0] + 2
+
+            p["t"] = np.where(accepted, t_new, t)
+            p["steps"] += accepted
+            p["y"][accepted] = y_new[accepted]
+            p["f"][accepted] = f_new[accepted]
+            records.append(
+                (
+                    p["index"][accepted],
+                    t_new[accepted],
+                    y_new[accepted, : 3 * len(self.recorded)],
+                    mach[accepted],
+                    q[accepted],
+                    p["cleared"][accepted],
+                    p["deploy"][accepted],
+                )
+            )
+            if debug == True and count % 100 == 0 and len(p["t"]) > 0:
+                print(
+                    "Step {}: {} members flying, t={:.2f} to {:.2f} s".format(
+                        count, len(p["t"]), np.min(p["t"]), np.max(p["t"])
+                    )
+                )
+            count += 1
+
+        return self._outputs(records)
+
+    def _outputs(self, records):
+        """Splits the rows recorded at each step into a trajectory per member"""
+        if len(records) == 0:
+            return [None] * len(self.rockets)
+        columns = [np.concatenate(column) for column in zip(*records)]
+        index, time, state, mach, q, cleared, deploy = columns
+        order = np.argsort(index, kind="stable")
+        index, time, state = index[order], time[order], state[order]
+        mach, q, cleared, deploy = mach[order], q[order], cleared[order], deploy[order]
+        bounds = np.searchsorted(index, np.arange(len(self.rockets) + 1))
+
+        outputs = []
+        for member in range(len(self.rockets)):
+            if member in self.failures:
+                outputs.append(None)
+                continue
+            rows = slice(bounds[member], bounds[member + 1])
+            events = [[] for _ in range(bounds[member + 1] - bounds[member])]
+            for row in np.flatnonzero(cleared[rows]):
+                events[row].append("Cleared rail")
+            for row in np.flatnonzero(deploy[rows]):
+                events[row].append("Parachute deployed")
+            output = {"time": time[rows]}
+            for k, name in enumerate(self.recorded):
+                output[name] = state[rows, 3 * k : 3 * k + 3]
+            output.update({"mach": mach[rows], "q": q[rows], "events": events})
+            outputs.append(output)
+        return outputs
+
+
+class PointMass(Ensemble):
+    """Runs several rockets together as point masses (3-DOF), a cheap approximation of Ensemble for multi-fidelity
+    campaigns
+
+    Note
+    ----
+    Each rocket is a point mass with a pointing direction that turns towards the relative wind (weathercocks) rather
+    than a rigid body, so there is no pitch or roll dynamics. The mass, thrust, axial drag (CA at zero angle of
+    attack), parachutes, wind, atmosphere and gravity are the same as the 6-DOF model, and it is held on the rail the
+    same way. A thrust misalignment pushes the rocket sideways with the force it would have once trimmed against the
+    aerodynamic moment. The flights aren't a replacement for the 6-DOF ones but they are strongly correlated with
+    them, which is what a control variate needs.
+
+    Parameters
+    ----------
+    rockets : list
+        Rocket objects, set up but not run
+    refine : int, optional
+        Number of intervals each interval of the mass and thrust data times is split into for the mass and thrust
+        tables, defaults to 8
+    rtol : float, optional
+        Relative tolerance of the integration, defaults to 1e-5. None uses each rocket's own
+    weathercock : float, optional
+        Rate the pointing direction turns towards the relative wind, as a fraction of the rocket's weathercock
+        frequency sqrt(q*ref_area*dCN/dalpha*static_margin/iyy), defaults to 0.25. A real rocket overshoots and
+        oscillates about the wind so follows it more slowly than its frequency suggests, and lower values filter
+        gusts the way its inertia does. None points straight into the relative wind.
+    max_trim : float, optional
+        Largest angle of attack a thrust misalignment trims the rocket at /rad, the trim angle is unbounded at low
+        speeds, defaults to 0.02
+    """
+
+    recorded = ["pos_i", "vel_i"]
+
+    def __init__(self, rockets, refine=8, rtol=1e-5, weathercock=0.25, max_trim=0.02):
+        super().__init__(rockets, refine)
+        self.rtol = rtol
+        self.weathercock = weathercock
+        self.max_trim = max_trim
+
+    def _initial_state(self):
+        p = super()._initial_state()
+        # The body doesn't rotate on the rail (w_b is held at zero) so the rail is fixed in the inertial frame
+        body_axes = p["y"][:, 9:].reshape(-1, 3, 3)
+        p["rail_direction"] = (
+            body_axes[:, 0] / np.linalg.norm(body_axes[:, 0], axis=1)[:, None]
+        )
+        p["body_y"] = body_axes[:, 1]
+        p["body_z"] = body_axes[:, 2]
+        # Position, velocity and pointing direction
+        p["y"] = np.concatenate([p["y"][:, :6], p["rail_direction"]], axis=1)
+        if self.rtol is not None:
+            p["rtol"][:] = self.rtol
+        return p
+
+    def fdot(self, time, y, p):
+        """Rates of change of the state of every member
+
+        Parameters
+        ----------
+        time : numpy array
+            Time since ignition of each member /s
+        y : numpy array
+            State of each member, shape (n, 9), position, velocity and pointing direction in the inertial frame
+        p : dict
+            Member arrays, see _initial_state
+
+        Returns
+        -------
+        numpy array
+            Rate of change of the state, shape (n, 9)
+        numpy array
+            Mach number
+        numpy array
+            Dynamic pressure /Pa
+        """
+        n = len(time)
+        pos_i, vel_i = y[:, 0:3], y[:, 3:6]
+        mass, cog, ixx, iyy, izz = self._lookup(p["mass_table"], time).T
+        alt, air, v_relative_wind_i = self._air(time, pos_i, vel_i, p)
+
+        F_i = np.zeros((n, 3))
+        chute = self._parachute(p, alt, air, v_relative_wind_i, F_i)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            wind_direction = v_relative_wind_i / air["air_speed"][:, None]
+        wind_direction[~np.isfinite(wind_direction)] = 0
+        rail = p["on_rail"]
+        if self.weathercock is None:
+            pointing = wind_direction
+        else:
+            pointing = y[:, 6:9] / np.linalg.norm(y[:, 6:9], axis=1)[:, None]
+        direction = np.where(rail[:, None], p["rail_direction"], pointing)
+
+        # Zero angle of attack coefficients, and the normal force slope for the weathercocking and trim
+        coefficients = np.zeros((n, 3))
+        slope = np.zeros(n)
+        for group in np.unique(p["aero_group"]):
+            rows = p["aero_group"] == group
+            Mach_grid, alpha_grid, tables = self.aero_groups[group]
+            mach = air["mach"][rows]
+            coefficients[rows] = bilinear(
+                Mach_grid, alpha_grid, tables, mach, np.zeros(len(mach))
+            ).T
+            slope[rows] = (
+                bilinear(
+                    Mach_grid,
+                    alpha_grid,
+                    tables[1],
+                    mach,
+                    np.full(len(mach), alpha_grid[1]),
+                )
+                / alpha_grid[1]
+            )
+        CA, _, cop = (coefficients * p["aero_error"]).T
+        slope = slope * p["aero_error"][:, 1]
+        qA = air["q"] * p["ref_area"]
+        # There is no trim for an unstable rocket, it is treated as having the usual one calibre static margin
+        margin = np.maximum(cop - cog, 2 * np.sqrt(p["ref_area"] / np.pi))
+
+        body = ~chute
+        along = np.sign(np.sum(v_relative_wind_i * direction, axis=1))
+        F_i[body] += (-CA * qA * along)[body, None] * direction[body]
+
+        burning = time < p["burn_time"]
+        if np.any(burning):
+            thrust = np.zeros(n)
+            thrust[burning] = (
+                self._lookup(p["thrust_table"][burning], time[burning])
+                + (p["motor_pressure"] - air["pressure"])[burning]
+                * p["exit_area"][burning]
+            )
+            F_i += (thrust * p["thrust_direction"][:, 0])[:, None] * direction
+
+            # Trimmed with the thrust moment balancing the normal force moment, the rocket is pushed sideways by the
+            # normal force, the sideways thrust, and the thrust tilted by the angle of attack
+            trim = burning & body & ~rail
+            lateral = (
+                p["thrust_direction"][trim, 1:2] * p["body_y"][trim]
+                + p["thrust_direction"][trim, 2:3] * p["body_z"][trim]
+            )
+            lateral -= (
+                np.sum(lateral * direction[trim], axis=1)[:, None] * direction[trim]
+            )
+            misalignment = np.maximum(np.linalg.norm(lateral, axis=1), 1e-12)
+            lever = p["motor_pos"][trim] - cog[trim]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                alpha = thrust[trim] * lever / (qA[trim] * slope[trim] * margin[trim])
+            alpha = np.where(np.isfinite(alpha), alpha, np.inf)
+            alpha = np.minimum(alpha, self.max_trim / misalignment)
+            gain = 1 - lever / margin[trim] - alpha
+            F_i[trim] += (thrust[trim] * gain)[:, None] * lateral
+
+        F_i += (
+            -p["gravity"] * 3.986004418e14 * mass / np.linalg.norm(pos_i, axis=1) ** 3
+        )[:, None] * pos_i
+        acc_i = F_i / mass[:, None]
+        if np.any(rail):
+            xb_i = p["rail_direction"][rail]
+            acc_i[rail] = np.sum(acc_i[rail] * xb_i, axis=1)[:, None] * xb_i
+
+        out = np.zeros((n, 9))
+        out[:, 0:3] = vel_i
+        out[:, 3:6] = acc_i
+        if self.weathercock is not None:
+            frequency = np.sqrt(np.maximum(qA * slope * margin / iyy, 0))
+            turn = (
+                wind_direction
+                - np.sum(wind_direction * pointing, axis=1)[:, None] * pointing
+            )
+            turning = body & ~rail
+            out[turning, 6:9] = (self.weathercock * frequency)[turning, None] * turn[
+                turning
+            ]
+        return out, air["mach"], air["q"]
@@ -0,0 +1,397 @@
+"""
+Importance sampling for rare events, like landing outside the range safety area.
+
+Notes
+-----
+
+- A campaign's runs are set by their standard normal draws (the design matrix, see campyros.sampling), so sampling
+  rare events more often just means drawing the influential ones from shifted normals. Each run is then weighted by
+  the likelihood ratio p(z)/q(z) of the campaign's distribution to the one it was drawn from, which makes the weighted
+  estimates unbiased.
+- The shift is found with one step of the cross entropy method: it is the (weighted) mean draw of the pilot runs that
+  came closest to (or went furthest past) the boundary of the landing area. Runs heading for different edges get
+  different shifts, mixed in proportion to how many pilot runs went each way. Uniform and discrete inputs, like the rail
+  yaw or a parachute failure, are driven by standard normal draws too so they are shifted the same way.
+- The sampling distribution is a defensive mixture, a fraction of the runs are drawn from the campaign's own
+  distribution. This bounds the weights (by 1/defensive) so a poor shift can't make the estimate blow up, it just
+  makes it converge more slowly.
+- A campaign's sampling distribution is stored in its manifest ("importance", see mixture) so the weights can
+  always be recomputed from the stored design.
+- Confidence intervals use the normal approximation of the weighted mean, they are only meaningful once a few tens
+  of runs have landed outside the area.
+
+"""
+import numpy as np
+import pandas as pd
+import scipy.stats
+from matplotlib.path import Path
+
+from .store import CampaignStore
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# The draws that normally dominate where the rocket lands, in campyros.statistical.StatisticalModel's names
+IMPORTANCE_VARIABLES = [
+    "rail_yaw",
+    "rail_pitch",
+    "thrust_x",
+    "thrust_y",
+    "thrust_z",
+    "parachute_failed",
+    "ensemble_member",
+]
+
+
+def polygon_distance(points, polygon, return_edge=False):
+    """Signed distance of points from a polygon's boundary, positive outside
+
+    Parameters
+    ----------
+    points : numpy array
+        Points [x,y], shape (n, 2)
+    polygon : numpy array
+        Vertices [x,y] in order, shape (m, 2)
+    return_edge : bool, optional
+        Also return the nearest edge to each point (edge i goes from vertex i to i+1), defaults to False
+
+    Returns
+    -------
+    numpy array
+        Distance of each point from the nearest edge, negative inside the polygon
+    numpy array
+        Nearest edge to each point, only if return_edge is True
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    polygon = np.asarray(polygon, dtype=float)
+    start, end = polygon, np.roll(polygon, -1, axis=0)
+    edge = end - start
+    # Nearest point on each edge to each point
+    along = np.einsum("nmk,mk->nm", points[:, None] - start, edge) / np.sum(
+        edge ** 2, axis=1
+    )
+    nearest = start + np.clip(along, 0, 1)[:, :, None] * edge
+    distances = np.linalg.norm(points[:, None] - nearest, axis=2)
+    distance = np.min(distances, axis=1)
+    inside = Path(polygon).contains_points(points)
+    signed = np.where(inside, -distance, distance)
+    if return_edge == True:
+        return signed, np.argmin(distances, axis=1)
+    return signed
+
+
+def cross_entropy_shift(design, scores, elite=0.1, weights=None, groups=None):
+    """Mean shifts of the draws towards the rare event, from a pilot campaign
+
+    Parameters
+    ----------
+    design : numpy array
+        Draws of the pilot runs, a row per run and a column per variable to shift
+    scores : numpy array
+        How far each run went towards the event, e.g. polygon_distance of the landing. The event is a score above 0
+    elite : float, optional
+        Fraction of the runs with the highest scores that the shifts are the mean of, defaults to 0.1. If more runs
+        than that reached the event only they are used
+    weights : numpy array, optional
+        Likelihood ratio weight of each run, if the pilot campaign was importance sampled itself, defaults to None
+    groups : numpy array, optional
+        Which way each run went towards the event (e.g. the nearest edge of the polygon), each group of elite runs
+        gets its own shift. Defaults to None (one shift)
+
+    Returns
+    -------
+    numpy array
+        Mean of each shifted component (a row per group) for each variable
+    numpy array
+        Fraction of the shifted runs in each component, the weighted share of the elite runs
+    """
+    design = np.asarray(design, dtype=float)
+    scores = np.asarray(scores, dtype=float)
+    weights = np.ones(len(scores)) if weights is None else np.asarray(weights, float)
+    groups = np.zeros(len(scores), int) if groups is None else np.asarray(groups)
+    threshold = min(np.nanquantile(scores, 1 - elite), 0.0)
+    chosen = scores >= threshold
+    shifts, fractions = [], []
+    for group in np.unique(groups[chosen]):
+        members = chosen & (groups == group)
+        shifts.append(np.average(design[members], axis=0, weights=weights[members]))
+        fractions.append(np.sum(weights[members]))
+    return np.array(shifts), np.array(fractions) / np.sum(fractions)
+
+
+def mixture(settings, names):
+    """Components of an importance sampling distribution
+
+    Parameters
+    ----------
+    settings : dict
+        The distribution, {"shift": {variable: mean in each component}, "fractions": fraction of the shifted runs in
+        each component, "defensive": fraction of the runs that aren't shifted}. "fractions" can be left out for one
+        component, whose means can then be numbers
+    names : list
+        Design variables, the columns of the design
+
+    Returns
+    -------
+    list
+        Column of each shifted variable
+    numpy array
+        Mean of each component (a row each) for each shifted variable
+    numpy array
+        Fraction of the shifted runs in each component
+    """
+    shifted = list(settings["shift"])
+    shifts = np.column_stack(
+        [np.atleast_1d(np.asarray(settings["shift"][name], float)) for name in shifted]
+    )
+    fractions = np.asarray(settings.get("fractions", [1.0]), dtype=float)
+    return [list(names).index(name) for name in shifted], shifts, fractions
+
+
+def mixture_component(rows, seed, defensive, fractions=(1.0,)):
+    """Which component of the importance sampling mixture each row of a design is drawn from
+
+    Parameters
+    ----------
+    rows : numpy array
+        Row numbers (from 0), each row's choice only depends on its number so designs can be extended
+    seed : int
+        Campaign seed
+    defensive : float
+        Fraction of the rows drawn from the campaign's own distribution
+    fractions : list, optional
+        Fraction of the shifted rows in each component, defaults to (1.0,)
+
+    Returns
+    -------
+    numpy array
+        Component of each row, -1 for the rows that aren't shifted
+    """
+    u = np.array([np.random.default_rng([seed, row, 2]).random() for row in rows])
+    bounds = defensive + (1 - defensive) * np.cumsum(fractions)
+    component = np.minimum(np.searchsorted(bounds, u, side="right"), len(bounds) - 1)
+    return np.where(u < defensive, -1, component)
+
+
+def shifted_design(design, columns, shifts, fractions, defensive, seed, start=0):
+    """Moves rows of a standard normal design to the importance sampling mixture
+
+    Parameters
+    ----------
+    design : numpy array
+        Standard normal draws, a row per run
+    columns : list
+        Column of each shifted variable
+    shifts : numpy array
+        Mean of each component (a row each) for each shifted variable
+    fractions : numpy array
+        Fraction of the shifted rows in each component
+    defensive : float
+        Fraction of the rows left as they are
+    seed : int
+        Campaign seed
+    start : int, optional
+        Row number of the first row, defaults to 0
+
+    Returns
+    -------
+    numpy array
+        Design drawn from the mixture
+    """
+    design = np.array(design, dtype=float)
+    shifts = np.atleast_2d(np.asarray(shifts, dtype=float))
+    component = mixture_component(
+        np.arange(start, start + len(design)), seed, defensive, fractions
+    )
+    moved = component >= 0
+    design[np.ix_(moved, columns)] += shifts[component[moved]]
+    return design
+
+
+def likelihood_ratio(design, columns, shifts, fractions, defensive):
+    """Importance weight p(z)/q(z) of each run, for the mixture of shifted_design
+
+    Parameters
+    ----------
+    design : numpy array
+        Draws of each run, a row per run
+    columns : list
+        Column of each shifted variable
+    shifts : numpy array
+        Mean of each component (a row each) for each shifted variable
+    fractions : numpy array
+        Fraction of the shifted rows in each component
+    defensive : float
+        Fraction of the rows drawn from the campaign's own distribution
+
+    Returns
+    -------
+    numpy array
+        Weight of each run, at most 1/defensive
+    """
+    z = np.asarray(design, dtype=float)[:, columns]
+    shifts = np.atleast_2d(np.asarray(shifts, dtype=float))
+    # Ratio of each shifted normal's density to the standard one, the other variables cancel
+    log_ratio = z @ shifts.T - np.sum(shifts ** 2, axis=1) / 2
+    return 1 / (defensive + (1 - defensive) * np.exp(log_ratio) @ np.asarray(fractions))
+
+
+def exceedance_probability(events, weights=None, level=0.95):
+    """Probability of an event from (importance sampled) runs, with its confidence interval
+
+    Parameters
+    ----------
+    events : numpy array
+        Whether the event happened in each run
+    weights : numpy array, optional
+        Likelihood ratio weight of each run, defaults to None (plain sampling)
+    level : float, optional
+        Confidence level, defaults to 0.95
+
+    Returns
+    -------
+    dict
+        "probability", "std_error", the confidence "interval" (low, high, clipped to [0,1]), the number of "hits"
+        (runs with the event), "runs" and "effective_runs" (the number of plain runs the weights are worth)
+    """
+    events = np.asarray(events, dtype=bool)
+    weights = np.ones(len(events)) if weights is None else np.asarray(weights, float)
+    n = len(events)
+    terms = weights * events
+    probability = np.mean(terms)
+    std_error = np.std(terms, ddof=1) / np.sqrt(n) if n > 1 else np.nan
+    half = scipy.stats.norm.ppf(0.5 + level / 2) * std_error
+    return {
+        "probability": probability,
+        "std_error": std_error,
+        "interval": (max(probability - half, 0.0), min(probability + half, 1.0)),
+        "hits": int(np.sum(events)),
+        "runs": n,
+        "effective_runs": np.sum(weights) ** 2 / np.sum(weights ** 2),
+    }
+
+
+def campaign_weights(store):
+    """Likelihood ratio weight of each run of a stored campaign
+
+    Parameters
+    ----------
+    store : CampaignStore or string
+        The campaign or its folder
+
+    Returns
+    -------
+    pandas Series
+        Weight of each run (by run number), all 1 if the campaign wasn't importance sampled
+    """
+    if not isinstance(store, CampaignStore):
+        store = CampaignStore(store)
+    design = store.design()
+    settings = (store.manifest() or {}).get("importance")
+    if settings is None:
+        return pd.Series(1.0, index=design.index)
+    columns, shifts, fractions = mixture(settings, design.columns)
+    weights = likelihood_ratio(
+        design.to_numpy(), columns, shifts, fractions, settings["defensive"]
+    )
+    return pd.Series(weights, index=design.index)
+
+
+def pilot_shift(store, polygon, variables=None, elite=0.1, defensive=0.1):
+    """Importance sampling distribution for landing outside a polygon, from a pilot campaign
+
+    Note
+    ----
+    The elite pilot runs are grouped by the edge of the polygon they landed nearest, so a rocket that can leave the
+    area on either side gets a shifted component for each (see cross_entropy_shift).
+
+    Parameters
+    ----------
+    store : CampaignStore or string
+        The pilot campaign or its folder, it needs the landing_x and landing_y metrics
+    polygon : numpy array
+        Vertices [x,y] of the landing area, in the launch frame
+    variables : list, optional
+        Draws to shift, defaults to None (those of IMPORTANCE_VARIABLES the campaign has)
+    elite : float, optional
+        Fraction of the runs the shifts are the mean of, defaults to 0.1
+    defensive : float, optional
+        Fraction of the runs that aren't shifted, defaults to 0.1
+
+    Returns
+    -------
+    dict
+        The distribution, see mixture
+    """
+    if not isinstance(store, CampaignStore):
+        store = CampaignStore(store)
+    design = store.design()
+    if variables is None:
+        variables = [name for name in IMPORTANCE_VARIABLES if name in design.columns]
+    if len(variables) == 0:
+        raise ValueError(
+            "No variables to shift, the campaign has none of %s" % IMPORTANCE_VARIABLES
+        )
+    summary = store.summary()
+    scores, edges = polygon_distance(
+        summary[["landing_x", "landing_y"]].to_numpy(), polygon, return_edge=True
+    )
+    shifts, fractions = cross_entropy_shift(
+        design.loc[summary.index, variables].to_numpy(),
+        scores,
+        elite=elite,
+        weights=campaign_weights(store).loc[summary.index].to_numpy(),
+        groups=edges,
+    )
+    return {
+        "shift": {name: shifts[:, n].tolist() for n, name in enumerate(variables)},
+        "fractions": fractions.tolist(),
+        "defensive": defensive,
+    }
+
+
+def campaign_exceedance(store, polygon, level=0.95):
+    """Probability of landing outside a polygon, from a stored (importance sampled or plain) campaign
+
+    Note
+    ----
+    Failed runs are left out, if there are many of them the estimate is biased.
+
+    Parameters
+    ----------
+    store : CampaignStore or string
+        The campaign or its folder, it needs the landing_x and landing_y metrics
+    polygon : numpy array
+        Vertices [x,y] of the landing area, in the launch frame
+    level : float, optional
+        Confidence level, defaults to 0.95
+
+    Returns
+    -------
+    dict
+        See exceedance_probability
+    """
+    if not isinstance(store, CampaignStore):
+        store = CampaignStore(store)
+    summary = store.summary()
+    outside = (
+        polygon_distance(summary[["landing_x", "landing_y"]].to_numpy(), polygon) > 0
+    )
+    weights = campaign_weights(store).loc[summary.index].to_numpy()
+    return exceedance_probability(outside, weights, level)
@@ -26,6 +26,7 @@ Coordinate systems:
 """
 
 import csv
+import enum
 import warnings
 import os
 import sys
@@ -39,6 +40,7 @@ import pandas as pd
 import scipy.interpolate as interpolate
 import scipy.misc
 import scipy.integrate as integrate
+import scipy.optimize as optimize
 from scipy.spatial.transform import Rotation
 import numexpr as ne
 
@@ -58,7 +60,7 @@ from .transforms import (
     pos_i2alt,
 )
 
-from .wind import Wind
+from .wind import Wind, ForecastWind, EnsembleWind, load_wind
 
 __copyright__ = """
     Copyright 2021 Jago Strong-Wright & Daniel Gibbons
@@ -99,6 +101,48 @@ def warning_on_one_line(message, category, filename, lineno, file=None, line=Non
 warnings.formatwarning = warning_on_one_line
 
 
+class RunStatus(enum.Enum):
+    """How a run of Rocket.run (or a member of campyros.ensemble.Ensemble) ended.
+    Attributes:
+        LANDED: Reached the ground.
+        MAX_TIME: Still flying at max_time.
+        MAX_STEPS: Stopped after taking max_steps integration steps.
+        MAX_EVALUATIONS: Stopped after max_evaluations evaluations of the equations of motion.
+        MAX_WALL_TIME: Stopped after running for max_wall_time seconds.
+        FAILED: The integration failed (only for Ensemble members, Rocket.run raises an error).
+    """
+
+    LANDED = "landed"
+    MAX_TIME = "max_time"
+    MAX_STEPS = "max_steps"
+    MAX_EVALUATIONS = "max_evaluations"
+    MAX_WALL_TIME = "max_wall_time"
+    FAILED = "failed"
+
+    @property
+    def budget_exceeded(self):
+        """bool: True if the run was stopped by one of its budgets rather than finishing."""
+        return self in (
+            RunStatus.MAX_STEPS,
+            RunStatus.MAX_EVALUATIONS,
+            RunStatus.MAX_WALL_TIME,
+        )
+
+
+class BudgetExceeded(RuntimeError):
+    """Raised for a run that was stopped by one of its budgets, e.g. by the statistical model so the run is recorded as failed.
+    Args:
+        status (RunStatus): Which budget was exceeded.
+        message (str): Description of the run.
+    Attributes:
+        status (RunStatus): Which budget was exceeded.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
 class Parachute:
     def __init__(
         self, main_s, main_c_d, drogue_s, drogue_c_d, main_alt, attach_distance=0.0
@@ -200,8 +244,13 @@ class LaunchSite:
         wind_data_loc (str, optional): Directory to store wind data files in. Defaults to "data/wind/gfs".
         run_date (str, optional): Date to collect real wind data for, in the format "YYYYMMDD". Defaults to the current date.
         forcast_time (str, optional): Forcast run time, must be "00", "06", "12" or "18". Defaults to "00".
-        forcast_plus_time (str, optional): Hours forcast forward from forcast time, must be three digits between 000 and 123 (?). Defaults to "000".
+        forcast_plus_time (str or list, optional): Hours forcast forward from forcast time, must be three digits between 000 and 123 (?). Can also be a list of forcast hours (as ints), in which case the wind is interpolated between them in time. Defaults to "000".
         fast_wind (bool, optional): ???. Defaults to False.
+        launch_time (float, optional): Time of ignition in hours after the forcast run time, only used if forcast_plus_time is a list. Defaults to the first forcast hour.
+        wind (optional): Wind object (e.g. a member of an EnsembleWind) to use instead of making one from the wind arguments. Defaults to None.
+    Note:
+        The wind data is only downloaded and decoded on the first wind query, so launch sites that are only used for
+        coordinate transforms or plotting are cheap to make. Call preload() to load it up front.
     Attributes:
         rail_length (float): Length of the launch rail (m)
         rail_yaw (float): Yaw angle of the launch rail (deg), using a right-hand rotation rule out the launch frame z-axis. "rail_yaw = 0" points South, "rail_yaw = 90" points East.
@@ -209,7 +258,7 @@ class LaunchSite:
         alt (float): Launch site altitude (m)
         longi (float): Launch site longitude (deg)
         lat (float): Launch site latitude (deg)
-        wind (Wind): Wind object containing wind data.
+        wind (Wind, ForecastWind or EnsembleWind): Wind object containing wind data.
     """
 
     def __init__(
@@ -227,6 +276,8 @@ class LaunchSite:
         forcast_time="00",
         forcast_plus_time="000",
         fast_wind=False,
+        launch_time=None,
+        wind=None,
     ):
         self.rail_length = rail_length
         self.rail_yaw = rail_yaw
@@ -234,17 +285,30 @@ class LaunchSite:
         self.alt = alt + 1e-5
         self.longi = longi
         self.lat = lat
-        self.wind = Wind(
-            longi,
-            lat,
-            variable=variable_wind,
-            default=default_wind,
-            data_loc=wind_data_loc,
-            run_date=run_date,
-            forcast_time=forcast_time,
-            forcast_plus_time=forcast_plus_time,
-            fast=fast_wind,
-        )
+        if wind is None:
+            self.wind = load_wind(
+                longi,
+                lat,
+                forcast_plus_time=forcast_plus_time,
+                launch_time=launch_time,
+                variable=variable_wind,
+                default=default_wind,
+                data_loc=wind_data_loc,
+                run_date=run_date,
+                forcast_time=forcast_time,
+                fast=fast_wind,
+            )
+        else:
+            self.wind = wind
+
+    def preload(self):
+        """Loads the wind data now rather than on the first wind query.
+
+        Returns:
+            LaunchSite: self
+        """
+        self.wind.preload()
+        return self
 
 
 class Rocket:
@@ -441,7 +505,7 @@ class Rocket:
         v_relative_wind_i = direction_l2i(
             (
                 i2airspeed(pos_i, vel_i, self.launch_site, time)
-                - self.launch_site.wind.get_wind(lat, long, alt)
+                - self.launch_site.wind.get_wind(lat, long, alt, time)
             ),
             self.launch_site,
             time,
@@ -461,7 +525,10 @@ class Rocket:
 
         else:
             # Aerodynamic forces and moments from the rocket body
-            alpha = np.arccos(np.dot(v_relative_wind_b / air_speed, [1, 0, 0]))
+            # Rounding can put the cosine just past ±1 when the airflow is along the body axis
+            alpha = np.arccos(
+                np.clip(np.dot(v_relative_wind_b / air_speed, [1, 0, 0]), -1, 1)
+            )
             cop = self.aero.COP(mach, abs(alpha))
             r_cop_cog_b = (cop - cog) * np.array([-1, 0, 0])
 
@@ -609,12 +676,26 @@ class Rocket:
             ]
         )
 
-    def run(self, max_time=1000, debug=False, to_json=False):
+    def run(
+        self,
+        max_time=1000,
+        debug=False,
+        to_json=False,
+        max_steps=None,
+        max_evaluations=None,
+        max_wall_time=None,
+    ):
         """Runs the rocket trajectory simulation. Uses the SciPy DOP853 O(h^8) integrator.
+        Notes:
+            - The budgets are checked between steps, once one is used up the run stops there and returns what it has so far. How it ended is in the "status" of the returned DataFrame's attrs (and self.status), along with the number of "steps" and "evaluations".
+            - A pathological run (e.g. the steps growing very long near the ground) can otherwise take a very long time, the budgets stop it holding up a Monte Carlo worker.
         Args:
             max_time (float, optional): Maximum time to run the simulation for (s). Defaults to 1000.
             debug (bool, optional): If True, data will be printed to the console to aid with debugging. Defaults to False.
             to_json (str, optional): Directory to export a .json file to, containing the results of the simulation. If False, no .json file will be produced. Defaults to False.
+            max_steps (int, optional): Maximum number of accepted integration steps. Defaults to None (no limit).
+            max_evaluations (int, optional): Maximum number of evaluations of fdot. Defaults to None (no limit).
+            max_wall_time (float, optional): Maximum time to spend running (s of real time). Defaults to None (no limit).
         Returns:
             pandas.DataFrame: pandas DataFrame containing the fundamental trajectory results. Most information can be derived from this in post processing.
                 "time" (array): List of times that all the data corresponds to (s).
@@ -623,9 +704,11 @@ class Rocket:
                 "b2imat" (array): List of rotation matrices for going from the body to inertial coordinate system (i.e. a record of rocket orientation).
                 "w_b" (array): List of angular velocity vectors, in body coordinates [x_b, y_b, z_b] (rad/s).
                 "events" (array): List of useful events.
+            The DataFrame's attrs has the RunStatus ("status"), number of steps ("steps") and fdot evaluations ("evaluations").
         """
         if debug == True:
             print("Running simulation")
+        start = time.perf_counter()
 
         xb_i = self.b2i.as_matrix()[:, 0]
         yb_i = self.b2i.as_matrix()[:, 1]
@@ -657,15 +740,49 @@ class Rocket:
         )
         record = pd.DataFrame({})  # Set up the pandas dataframe
         c = 0  # Counter used when printing debug information
+        spent = 0  # Evaluations of the integrators before the current one
+        self.status = RunStatus.LANDED
 
         # Integration process
         while pos_i2alt(self.pos_i, self.time) >= 0 and self.time < max_time:
+            if max_steps is not None and c >= max_steps:
+                self.status = RunStatus.MAX_STEPS
+            elif (
+                max_evaluations is not None
+                and spent + integrator.nfev >= max_evaluations
+            ):
+                self.status = RunStatus.MAX_EVALUATIONS
+            elif (
+                max_wall_time is not None
+                and time.perf_counter() - start >= max_wall_time
+            ):
+                self.status = RunStatus.MAX_WALL_TIME
+            if self.status != RunStatus.LANDED:
+                if debug == True:
+                    print(
+                        "Stopped at t={:.2f} s, {} ({} steps, {} evaluations)".format(
+                            self.time, self.status.value, c, spent + integrator.nfev
+                        )
+                    )
+                break
             if self.variable_time == False:
                 integrator.h_abs = self.h
 
             # Check for events, e.g. rail departure or parachute deployment
             events = self.check_phase(debug=debug)
             integrator.step()
+            if (
+                self.on_rail == True
+                and self.rail_distance(integrator.y[:3], integrator.t)
+                >= self.launch_site.rail_length
+            ):
+                # End the step where the rocket leaves the rail, rather than holding it on the rail for the rest of it
+                spent += integrator.nfev
+                integrator = self.leave_rail(integrator)
+                events.append("Cleared rail")
+                left_rail = True
+            else:
+                left_rail = False
             self.pos_i = np.array([integrator.y[0], integrator.y[1], integrator.y[2]])
             self.vel_i = np.array([integrator.y[3], integrator.y[4], integrator.y[5]])
             self.w_b = np.array([integrator.y[6], integrator.y[7], integrator.y[8]])
@@ -684,7 +801,7 @@ class Rocket:
             else:
                 lat, long, alt = i2lla(self.pos_i, self.time)
                 wind_inertial = vel_l2i(
-                    self.launch_site.wind.get_wind(lat, long, alt),
+                    self.launch_site.wind.get_wind(lat, long, alt, self.time),
                     self.launch_site,
                     self.time,
                 )
@@ -702,8 +819,10 @@ class Rocket:
             self.i2b = self.b2i.inv()
 
             self.time = integrator.t
-            if self.variable_time == True:
+            if self.variable_time == True and integrator.h_previous is not None:
                 self.h = integrator.h_previous
+            if left_rail == True and debug == True:
+                self.print_rail_exit()
 
             # Data to add to the pandas dataframe
             new_row = {
@@ -729,6 +848,13 @@ class Rocket:
                 )
             c += 1
 
+        if self.status == RunStatus.LANDED and self.time >= max_time:
+            if pos_i2alt(self.pos_i, self.time) >= 0:
+                self.status = RunStatus.MAX_TIME
+        record.attrs.update(
+            {"status": self.status, "steps": c, "evaluations": spent + integrator.nfev}
+        )
+
         # Export a JSON if required
         if to_json != False:
             # Convert the DataFrame to a dict first, the in-built Python JSON library works better than panda's does I think
@@ -743,11 +869,60 @@ class Rocket:
 
         return record
 
+    def rail_distance(self, pos_i, time):
+        """Distance the rocket has travelled from the launch site, i.e. along the rail while it's on it.
+        Args:
+            pos_i (array): Position in inertial coordinates [x_i, y_i, z_i] (m).
+            time (float): Time since launch (s).
+        Returns:
+            float: Distance (m).
+        """
+        # Remember that the 'l' coordinate system has its origin at alt=0.
+        rocket_pos_l = pos_i2l(pos_i, self.launch_site, time)
+        launch_site_pos_l = np.array([0.0, 0.0, self.launch_site.alt])
+        return np.linalg.norm(rocket_pos_l - launch_site_pos_l)
+
+    def leave_rail(self, integrator):
+        """Cuts the integrator's last step short at the time the rocket reached the end of the rail, and carries on from there off the rail.
+        Notes:
+            - The crossing is found on the step's dense output, so the rail exit doesn't depend on how long the step happened to be.
+        Args:
+            integrator (scipy.integrate.DOP853): Integrator that has just taken the step the rocket passed the end of the rail in.
+        Returns:
+            scipy.integrate.DOP853: New integrator, starting at the end of the rail.
+        """
+        dense = integrator.dense_output()
+        rail_time = optimize.brentq(
+            lambda t: self.rail_distance(dense(t)[:3], t)
+            - self.launch_site.rail_length,
+            integrator.t_old,
+            integrator.t,
+        )
+        self.on_rail = False
+        return integrate.DOP853(
+            self.fdot, rail_time, dense(rail_time), 1000, atol=self.atol, rtol=self.rtol
+        )
+
+    def print_rail_exit(self):
+        """Prints the time, altitude and thrust to weight ratio the rocket left the rail at"""
+        alt = pos_i2alt(self.pos_i, self.time)
+        ambient_pressure = Atmosphere(alt).pressure[0] * self.env_vars["pressure"]
+        thrust = (
+            self.motor.thrust(self.time)
+            + (self.motor.ambient_pressure - ambient_pressure) * self.motor.exit_area
+        )
+        weight = 9.81 * self.mass_model.mass(self.time)
+
+        print(
+            "Cleared rail at t={:.2f} s with alt={:.2f} m and TtW={:.2f}".format(
+                self.time, alt, thrust / weight
+            )
+        )
+
     def check_phase(self, debug=False):
         """Check what phase of flight the rocket is in, e.g. on the rail, off the rail, or with the parachute open.
         Notes:
-            - Since this only checks after each time step, there may be a very short period where the rocket is orientated as if it is still on the rail, when it shouldn't be.
-            - For this reason, it may look like the rocket leaves the rail at an altitude greater than the rail length.
+            - Rocket.run ends the step the rocket leaves the rail in at the end of the rail (see leave_rail), so the rail check here only catches a rocket that starts past the end of it.
         Args:
             debug (bool, optional): If True, a message is printed when the rocket leaves the rail. Defaults to False.
         Returns:
@@ -757,34 +932,16 @@ class Rocket:
 
         # Rail check
         if self.on_rail == True:
-            # Check how far we've travelled - remember that the 'l' coordinate system has its origin at alt=0.
-            rocket_pos_l = pos_i2l(self.pos_i, self.launch_site, self.time)
-            launch_site_pos_l = np.array([0.0, 0.0, self.launch_site.alt])
-
-            flight_distance = np.linalg.norm(rocket_pos_l - launch_site_pos_l)
-
             # Check if we've left the rail yet
-            if flight_distance >= self.launch_site.rail_length:
+            if (
+                self.rail_distance(self.pos_i, self.time)
+                >= self.launch_site.rail_length
+            ):
                 self.on_rail = False
                 events.append("Cleared rail")
 
                 if debug == True:
-                    alt = pos_i2alt(self.pos_i, self.time)
-                    ambient_pressure = (
-                        Atmosphere(alt).pressure[0] * self.env_vars["pressure"]
-                    )
-                    thrust = (
-                        self.motor.thrust(self.time)
-                        + (self.motor.ambient_pressure - ambient_pressure)
-                        * self.motor.exit_area
-                    )
-                    weight = 9.81 * self.mass_model.mass(self.time)
-
-                    print(
-                        "Cleared rail at t={:.2f} s with alt={:.2f} m and TtW={:.2f}".format(
-                            self.time, alt, thrust / weight
-                        )
-                    )
+                    self.print_rail_exit()
 
         # Parachute check
         if self.parachute_deployed == False:
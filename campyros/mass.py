@@ -75,6 +75,8 @@ class LiquidTank:
     - Cylindrical fuel tank
     - Inviscid liquid, so the liquid does not contribute to ixx
     - Vapour does not contribute to moments of inertia
+
+    The *_scale arguments multiply the corresponding data without copying it, for cheap perturbations in stochastic analyses.
     """
 
     def __init__(
@@ -86,9 +88,17 @@ class LiquidTank:
         pos_bottom,
         vmass_array=None,
         vden_array=None,
+        lmass_scale=1.0,
+        lden_scale=1.0,
+        vmass_scale=1.0,
+        vden_scale=1.0,
     ):
         self.lmass_array = lmass_array  # Liquid masses (kg)
         self.lden_array = lden_array  # Liquid densities (kg/m^3)
+        self.lmass_scale = lmass_scale
+        self.lden_scale = lden_scale
+        self.vmass_scale = vmass_scale
+        self.vden_scale = vden_scale
         self.time_array = (
             time_array  # Times since ignition for mass and density datapoints (s)
         )
@@ -108,16 +118,16 @@ class LiquidTank:
             )
 
     def lmass(self, time):
-        return np.interp(time, self.time_array, self.lmass_array)
+        return self.lmass_scale * np.interp(time, self.time_array, self.lmass_array)
 
     def vmass(self, time):
-        return np.interp(time, self.time_array, self.vmass_array)
+        return self.vmass_scale * np.interp(time, self.time_array, self.vmass_array)
 
     def lden(self, time):
-        return np.interp(time, self.time_array, self.lden_array)
+        return self.lden_scale * np.interp(time, self.time_array, self.lden_array)
 
     def vden(self, time):
-        return np.interp(time, self.time_array, self.vden_array)
+        return self.vden_scale * np.interp(time, self.time_array, self.vden_array)
 
     def lvol(self, time):
         return self.lmass(time) / self.lden(time)
@@ -172,10 +182,15 @@ class SolidFuel:
     Assumes:
     - Fuel grain is shaped like an annular cylinder
     - Burning the fuel simply increases the inner radius of the cylinder, uniformly
+
+    mass_scale multiplies the mass data without copying it, for cheap perturbations in stochastic analyses.
     """
 
-    def __init__(self, mass_array, time_array, den, r_out, l, pos_bottom):
+    def __init__(
+        self, mass_array, time_array, den, r_out, l, pos_bottom, mass_scale=1.0
+    ):
         self.mass_array = mass_array  # Solid fuel masses (kg)
+        self.mass_scale = mass_scale
         self.time_array = time_array  # Times since ignition for mass datapoints (s)
 
         self.den = den  # Density of solid fuel grain (kg/m^3)
@@ -187,7 +202,7 @@ class SolidFuel:
         return self.pos_bottom - self.l / 2
 
     def mass(self, time):
-        return np.interp(time, self.time_array, self.mass_array)
+        return self.mass_scale * np.interp(time, self.time_array, self.mass_array)
 
     def r_in(self, time):
         return (self.r_out ** 2 - self.mass(time) / (np.pi * self.den * self.l)) ** 0.5
@@ -348,6 +363,10 @@ class MassModel:
         pos_bottom,
         vmass_array=None,
         vden_array=None,
+        lmass_scale=1.0,
+        lden_scale=1.0,
+        vmass_scale=1.0,
+        vden_scale=1.0,
     ):
         self.variables.append(
             LiquidTank(
@@ -358,12 +377,20 @@ class MassModel:
                 pos_bottom,
                 vmass_array=None,
                 vden_array=None,
+                lmass_scale=lmass_scale,
+                lden_scale=lden_scale,
+                vmass_scale=vmass_scale,
+                vden_scale=vden_scale,
             )
         )
 
-    def add_solidfuel(self, mass_array, time_array, den, r_out, l, pos_bottom):
+    def add_solidfuel(
+        self, mass_array, time_array, den, r_out, l, pos_bottom, mass_scale=1.0
+    ):
         self.variables.append(
-            SolidFuel(mass_array, time_array, den, r_out, l, pos_bottom)
+            SolidFuel(
+                mass_array, time_array, den, r_out, l, pos_bottom, mass_scale=mass_scale
+            )
         )
 
     def add_cylindricalapproximation(self, mass_array, time_array, r, l):
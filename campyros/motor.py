@@ -3,6 +3,7 @@ import csv
 import scipy.interpolate
 import matplotlib.pyplot as plt
 import pandas as pd
+import copy
 
 __copyright__ = """
 
@@ -35,6 +36,7 @@ class Motor:
         exit_area (float): Nozzle exit area (m^2).
         pos (float): Distance between the nose tip and the point at which the thrust acts (m).
         ambient_pressure (float, optional): Ambient pressure used to obtain the thrust_array data (Pa). Defaults to 1e5.
+        thrust_scale (float, optional): Multiplier applied to the thrust, used for stochastic analyses. Defaults to 1.
 
     Attributes:
         thrust_array (list): Thrust data (N).
@@ -42,10 +44,19 @@ class Motor:
         exit_area (float): Nozzle exit area (m^2).
         pos (float): Distance between the nose tip and the point at which the thrust acts (m).
         ambient_pressure (float, optional): Ambient pressure used to obtain the thrust_array data (Pa).
+        thrust_scale (float): Multiplier applied to the thrust.
 
     """
 
-    def __init__(self, thrust_array, time_array, exit_area, pos, ambient_pressure=1e5):
+    def __init__(
+        self,
+        thrust_array,
+        time_array,
+        exit_area,
+        pos,
+        ambient_pressure=1e5,
+        thrust_scale=1.0,
+    ):
 
         self.thrust_array = thrust_array  # Thrust data (N)
         self.time_array = (
@@ -54,6 +65,7 @@ class Motor:
         self.pos = pos  # Distance between the nose tip and the point at which the thrust acts (m)
         self.exit_area = exit_area  # Nozzle exit area (m^2)
         self.ambient_pressure = ambient_pressure  # Ambient pressure used to obtain the thrust_array data (Pa)
+        self.thrust_scale = thrust_scale  # Multiplier applied to the thrust
 
     def thrust(self, time):
         """Function for calculating the thrust at a given time, with an ambient pressure of self.ambient_pressure.
@@ -64,7 +76,20 @@ class Motor:
         Returns:
             float: Thrust (N).
         """
-        return np.interp(time, self.time_array, self.thrust_array)
+        return self.thrust_scale * np.interp(time, self.time_array, self.thrust_array)
+
+    def perturbed(self, thrust_scale):
+        """Returns a copy with the thrust scaled that shares the thrust data with this object, so it is very cheap to make.
+
+        Args:
+            thrust_scale (float): Multiplier applied to the thrust (on top of any this motor already has).
+
+        Returns:
+            Motor: The perturbed copy.
+        """
+        new = copy.copy(self)
+        new.thrust_scale = self.thrust_scale * thrust_scale
+        return new
 
     @staticmethod
     def from_novus(csv_directory, pos):
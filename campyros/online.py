@@ -0,0 +1,481 @@
+"""
+Statistics that are updated as the results of a stochastic campaign arrive, so the dispersion can be watched (and the
+campaign stopped) without waiting for it to finish or reading the results back.
+
+Notes
+-----
+
+- Means and covariances use Welford's algorithm, generalised to merging batches (Chan et al.), which avoids the
+  cancellation of the naive sum of squares method.
+- The reservoir keeps a uniform random sample of a fixed number of trajectories however many runs there are
+  (Algorithm R).
+- Confidence intervals use the normal approximation for means and standard deviations and order statistics for
+  quantiles, so they only mean much once there are a few tens of runs.
+
+"""
+import numpy as np
+import scipy.stats
+import matplotlib.pyplot as plt
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+
+class RunningStats:
+    """Running mean and covariance of a vector quantity
+
+    Parameters
+    ----------
+    dims : int
+        Length of the vectors
+
+    Attributes
+    ----------
+    n : int
+        Number of samples so far
+    mean : numpy array
+        Mean of the samples
+    m2 : numpy array
+        Sum of the outer products of the deviations from the mean
+    """
+
+    def __init__(self, dims):
+        self.n = 0
+        self.mean = np.zeros(dims)
+        self.m2 = np.zeros((dims, dims))
+
+    def update(self, samples):
+        """Adds one sample or a batch of them, samples containing NaN are ignored
+
+        Parameters
+        ----------
+        samples : numpy array
+            A vector or an array with a row per sample
+        """
+        samples = np.atleast_2d(np.asarray(samples, dtype=float))
+        samples = samples[~np.any(np.isnan(samples), axis=1)]
+        if len(samples) == 0:
+            return
+        mean = samples.mean(axis=0)
+        deviation = samples - mean
+        self._combine(len(samples), mean, deviation.T @ deviation)
+
+    def merge(self, other):
+        """Adds the samples summarised by another RunningStats
+
+        Parameters
+        ----------
+        other : RunningStats
+            Statistics of the other samples
+        """
+        if other.n > 0:
+            self._combine(other.n, other.mean, other.m2)
+
+    def _combine(self, n, mean, m2):
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + m2 + np.outer(delta, delta) * self.n * n / total
+        self.n = total
+
+    @property
+    def cov(self):
+        """Sample covariance matrix, NaN with fewer than two samples"""
+        if self.n < 2:
+            return np.full(self.m2.shape, np.nan)
+        return self.m2 / (self.n - 1)
+
+    @property
+    def std(self):
+        """Sample standard deviation of each component"""
+        return np.sqrt(np.diag(self.cov))
+
+    def confidence_interval(self, level=0.95):
+        """Confidence interval of the mean of each component, from the normal approximation
+
+        Parameters
+        ----------
+        level : float, optional
+            Confidence level, defaults to 0.95
+
+        Returns
+        -------
+        numpy array, numpy array
+            Lower and upper bounds
+        """
+        half_width = scipy.stats.norm.ppf(0.5 + level / 2) * self.std / np.sqrt(self.n)
+        return self.mean - half_width, self.mean + half_width
+
+
+class Reservoir:
+    """Uniform random sample of a fixed size from a stream of items
+
+    Parameters
+    ----------
+    size : int
+        Number of items to keep
+    seed : int, optional
+        Seed for choosing the items, defaults to None (random)
+
+    Attributes
+    ----------
+    items : list
+        The sample
+    seen : int
+        Number of items offered so far
+    """
+
+    def __init__(self, size, seed=None):
+        self.size = size
+        self.items = []
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, item):
+        """Offers an item to the sample
+
+        Parameters
+        ----------
+        item : object
+            Item to (maybe) keep
+        """
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+        else:
+            index = self.rng.integers(self.seen)
+            if index < self.size:
+                self.items[index] = item
+
+
+def ellipse(mean, cov, sigma=1, points=100):
+    """Outline of the sigma ellipse of a 2D normal distribution
+
+    Parameters
+    ----------
+    mean : numpy array
+        Centre [x,y]
+    cov : numpy array
+        2x2 covariance matrix
+    sigma : float, optional
+        Number of standard deviations, defaults to 1
+    points : int, optional
+        Number of points around the outline, defaults to 100
+
+    Returns
+    -------
+    numpy array
+        Points on the outline, a row per point
+    """
+    values, vectors = np.linalg.eigh(cov)
+    t = np.linspace(0, 2 * np.pi, points)
+    circle = np.stack([np.cos(t), np.sin(t)])
+    return (
+        vectors @ (sigma * np.sqrt(np.clip(values, 0, None))[:, None] * circle)
+    ).T + mean
+
+
+class DispersionMonitor:
+    """Running landing and apogee dispersion of a campaign, with a sample of the trajectories
+
+    Parameters
+    ----------
+    reservoir_size : int, optional
+        Number of trajectories to keep, defaults to 20
+    seed : int, optional
+        Seed for choosing the trajectories, defaults to None (random)
+
+    Attributes
+    ----------
+    landing : RunningStats
+        Landing position [x,y] /m
+    apogee : RunningStats
+        Apogee position [x,y,alt] /m
+    trajectories : Reservoir
+        Sample of the stored trajectories
+    landings : list
+        Every landing position [x,y] /m, for quantiles
+    """
+
+    def __init__(self, reservoir_size=20, seed=None):
+        self.landing = RunningStats(2)
+        self.apogee = RunningStats(3)
+        self.trajectories = Reservoir(reservoir_size, seed)
+        self.landings = []
+        self.figure = None
+
+    def update(self, summary, trajectory=None):
+        """Adds the result of a run
+
+        Parameters
+        ----------
+        summary : dict
+            Summary metrics of the run, uses landing_x/y and apogee_x/y/alt if they are there
+        trajectory : numpy array, optional
+            Trajectory of the run (columns as campyros.store.TRAJECTORY_COLUMNS), defaults to None (not stored)
+        """
+        nan = np.nan
+        landing = [summary.get("landing_x", nan), summary.get("landing_y", nan)]
+        self.landing.update(landing)
+        if not np.any(np.isnan(landing)):
+            self.landings.append(landing)
+        self.apogee.update(
+            [
+                summary.get("apogee_x", nan),
+                summary.get("apogee_y", nan),
+                summary.get("apogee_alt", nan),
+            ]
+        )
+        if trajectory is not None:
+            self.trajectories.add(trajectory)
+
+    def report(self, level=0.95):
+        """Returns a one line summary of the dispersion so far
+
+        Parameters
+        ----------
+        level : float, optional
+            Confidence level for the intervals of the means, defaults to 0.95
+
+        Returns
+        -------
+        string
+            Summary
+        """
+        if self.landing.n < 2 or self.apogee.n < 2:
+            return "not enough runs for dispersion statistics yet"
+        landing_low, landing_high = self.landing.confidence_interval(level)
+        apogee_low, apogee_high = self.apogee.confidence_interval(level)
+        return "landing x %.0f±%.0f m, y %.0f±%.0f m (sd %.0f, %.0f m), apogee %.0f±%.0f m (sd %.0f m), %.0f%% CIs" % (
+            self.landing.mean[0],
+            (landing_high - landing_low)[0] / 2,
+            self.landing.mean[1],
+            (landing_high - landing_low)[1] / 2,
+            self.landing.std[0],
+            self.landing.std[1],
+            self.apogee.mean[2],
+            (apogee_high - apogee_low)[2] / 2,
+            self.apogee.std[2],
+            100 * level,
+        )
+
+    def plot(self, sigma=3, level=0.95, pause=0.001):
+        """Draws (or redraws) the landing ellipses with the confidence region of the mean, and the sampled
+        trajectories' altitude
+
+        Parameters
+        ----------
+        sigma : int, optional
+            Draws the 1 to sigma ellipses, defaults to 3
+        level : float, optional
+            Confidence level for the region around the mean landing point, defaults to 0.95
+        pause : float, optional
+            Time given to the GUI to draw /s, defaults to 0.001
+
+        Returns
+        -------
+        matplotlib figure
+            The figure
+        """
+        if self.figure is None or not plt.fignum_exists(self.figure.number):
+            self.figure, _ = plt.subplots(1, 2, figsize=(12, 5))
+        ground, height = self.figure.axes
+        ground.clear()
+        height.clear()
+
+        for trajectory in self.trajectories.items:
+            ground.plot(trajectory[:, 1], trajectory[:, 2], color="grey", alpha=0.3)
+            height.plot(trajectory[:, 0], trajectory[:, 3], color="grey", alpha=0.3)
+        if self.landing.n >= 2:
+            cov = self.landing.cov
+            for sig in range(1, sigma + 1):
+                outline = ellipse(self.landing.mean, cov, sig)
+                ground.plot(
+                    outline[:, 0],
+                    outline[:, 1],
+                    label="%s $\\sigma$" % sig,
+                    linewidth=1,
+                )
+            # The confidence region of the mean shrinks like 1/sqrt(n)
+            radius = np.sqrt(scipy.stats.chi2.ppf(level, 2))
+            outline = ellipse(self.landing.mean, cov / self.landing.n, radius)
+            ground.fill(
+                outline[:, 0],
+                outline[:, 1],
+                color="black",
+                alpha=0.3,
+                label="%.0f%% CI of mean" % (100 * level),
+            )
+        if self.apogee.n >= 2:
+            low, high = self.apogee.confidence_interval(level)
+            height.axhspan(low[2], high[2], color="black", alpha=0.3)
+            height.axhline(self.apogee.mean[2], color="black", label="Mean apogee")
+        ground.scatter(0, 0, marker="x", color="red", label="Launch site")
+        ground.set_xlabel("South/m")
+        ground.set_ylabel("East/m")
+        ground.set_title("%s landings" % self.landing.n)
+        ground.legend()
+        height.set_xlabel("Time/s")
+        height.set_ylabel("Altitude/m")
+        if self.apogee.n >= 2:
+            height.legend()
+        if pause > 0:
+            plt.pause(pause)
+        return self.figure
+
+
+class StoppingRule:
+    """Decides when a campaign has converged, from the confidence intervals of the landing statistics
+
+    Note
+    ----
+    Every tolerance that is given has to be met. The landing radius is measured from the mean landing point. The
+    standard deviations and the correlation together cover the whole landing covariance, i.e. the size, shape and
+    angle of the dispersion ellipse.
+
+    Parameters
+    ----------
+    landing_mean : float, optional
+        Tolerance on the half width of the confidence interval of the mean landing x and y /m, defaults to None
+    landing_std : float, optional
+        Tolerance on the half width of the confidence interval of the landing x and y standard deviations /m, defaults
+        to None
+    landing_correlation : float, optional
+        Tolerance on the half width of the confidence interval of the correlation of the landing x and y (Fisher's z
+        interval), defaults to None
+    landing_quantile : list, optional
+        [quantile, tolerance], tolerance on the half width of the confidence interval of that quantile of the landing
+        radius /m, e.g. [0.99, 20]. Defaults to None
+    level : float, optional
+        Confidence level, defaults to 0.95
+    check_every : int, optional
+        Number of runs between checks, defaults to 100
+    min_runs : int, optional
+        Never stop with fewer runs than this, defaults to 100
+
+    Attributes
+    ----------
+    reason : string
+        Why the last check passed or failed
+    """
+
+    def __init__(
+        self,
+        landing_mean=None,
+        landing_std=None,
+        landing_correlation=None,
+        landing_quantile=None,
+        level=0.95,
+        check_every=100,
+        min_runs=100,
+    ):
+        if all(
+            tolerance is None
+            for tolerance in [
+                landing_mean,
+                landing_std,
+                landing_correlation,
+                landing_quantile,
+            ]
+        ):
+            raise ValueError("At least one convergence tolerance must be given")
+        self.landing_mean = landing_mean
+        self.landing_std = landing_std
+        self.landing_correlation = landing_correlation
+        self.landing_quantile = landing_quantile
+        self.level = level
+        self.check_every = check_every
+        self.min_runs = max(min_runs, 2)
+        self.reason = "not checked yet"
+        self.checked = 0
+
+    def due(self, finished):
+        """Whether it is time for a check
+
+        Parameters
+        ----------
+        finished : int
+            Number of runs finished so far
+
+        Returns
+        -------
+        bool
+            True if check_every runs have finished since the last check
+        """
+        return finished >= self.min_runs and finished - self.checked >= self.check_every
+
+    def check(self, monitor, finished=None):
+        """Checks whether the tolerances are met
+
+        Parameters
+        ----------
+        monitor : DispersionMonitor
+            Statistics of the campaign so far
+        finished : int, optional
+            Number of runs finished so far, recorded for due(), defaults to None (the number of landings)
+
+        Returns
+        -------
+        bool
+            True if the campaign has converged
+        """
+        landing = monitor.landing
+        self.checked = landing.n if finished is None else finished
+        if landing.n < self.min_runs:
+            self.reason = "only %s of at least %s landings" % (landing.n, self.min_runs)
+            return False
+
+        z = scipy.stats.norm.ppf(0.5 + self.level / 2)
+        widths = []
+        if self.landing_mean is not None:
+            low, high = landing.confidence_interval(self.level)
+            widths.append(("mean", np.max(high - low) / 2, self.landing_mean, " m"))
+        if self.landing_std is not None:
+            # Standard error of a normal sample's standard deviation
+            width = z * np.max(landing.std) / np.sqrt(2 * (landing.n - 1))
+            widths.append(("standard deviation", width, self.landing_std, " m"))
+        if self.landing_correlation is not None:
+            cov = landing.cov
+            with np.errstate(invalid="ignore", divide="ignore"):
+                correlation = cov[0, 1] / np.sqrt(cov[0, 0] * cov[1, 1])
+            if landing.n > 3 and np.isfinite(correlation):
+                # Fisher's z transform of the correlation is close to normal with standard error 1/sqrt(n-3)
+                fisher = np.arctanh(np.clip(correlation, -1 + 1e-12, 1 - 1e-12))
+                half = z / np.sqrt(landing.n - 3)
+                width = (np.tanh(fisher + half) - np.tanh(fisher - half)) / 2
+            else:
+                width = np.inf
+            widths.append(("correlation", width, self.landing_correlation, ""))
+        if self.landing_quantile is not None:
+            quantile, tolerance = self.landing_quantile
+            radii = np.sort(
+                np.linalg.norm(np.array(monitor.landings) - landing.mean, axis=1)
+            )
+            n = len(radii)
+            low = int(scipy.stats.binom.ppf((1 - self.level) / 2, n, quantile))
+            high = int(scipy.stats.binom.ppf((1 + self.level) / 2, n, quantile))
+            width = (radii[min(high, n - 1)] - radii[max(low - 1, 0)]) / 2
+            widths.append(("%.3g quantile radius" % quantile, width, tolerance, " m"))
+
+        self.reason = ", ".join(
+            "landing %s ±%.3g%s (tolerance %.3g%s)"
+            % (name, width, unit, tolerance, unit)
+            for name, width, tolerance, unit in widths
+        )
+        return all(width <= tolerance for _, width, tolerance, _ in widths)
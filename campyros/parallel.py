@@ -0,0 +1,695 @@
+"""
+Execution backends for running many independent simulations, used by the statistical model.
+
+Notes
+-----
+
+- Every backend has the same interface: submit(func, *args) returns a concurrent.futures.Future and shutdown() waits
+  for everything to finish, so the code using them doesn't need to know which one it has.
+- ProcessPoolBackend only needs the standard library so works on any machine, RayBackend can spread work across a
+  cluster if ray is installed and SerialBackend runs everything in the calling process which is easiest to debug.
+- Inputs that are the same for every task (e.g. the whole statistical model with its aero tables, motor data and
+  wind field) should be put in shared storage once with backend.share(obj) and the small handle it returns passed to
+  the tasks instead, so the cost of sending a task doesn't depend on the size of the inputs. The process pool puts the
+  pickled object in a multiprocessing.shared_memory block and ray uses its object store.
+- run_tasks keeps a bounded number of tasks submitted at once so a big campaign doesn't queue thousands of pickled
+  tasks, retries tasks that fail (e.g. because a worker died) and reports progress as they finish.
+- Each simulation mostly does small numpy operations so multithreaded BLAS doesn't help, and with one process per
+  core it oversubscribes the CPU badly. The process pool limits BLAS to one thread per worker by default.
+
+"""
+import os
+import pickle
+import time
+import traceback
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+try:
+    import ray
+
+    RAY_AVAILABLE = True
+except ImportError:
+    RAY_AVAILABLE = False
+
+try:
+    import threadpoolctl
+except ImportError:
+    threadpoolctl = None
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# Environment variables read by the common BLAS/OpenMP libraries when they are loaded
+BLAS_THREAD_VARIABLES = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+]
+
+
+def limit_blas_threads(threads):
+    """Limits the number of threads BLAS (and numexpr) use in this process
+
+    Note
+    ----
+    The environment variables only affect libraries loaded afterwards, e.g. in a newly spawned process. Libraries that
+    are already loaded (e.g. when a worker is forked) can only be limited if threadpoolctl is installed.
+
+    Parameters
+    ----------
+    threads : int
+        Number of threads
+    """
+    for variable in BLAS_THREAD_VARIABLES:
+        os.environ[variable] = str(threads)
+    if threadpoolctl is not None:
+        threadpoolctl.threadpool_limits(threads)
+
+
+def seed_task(seed, task_id):
+    """Seeds numpy's global random state for one task
+
+    Note
+    ----
+    The state is derived from both the campaign seed and the task id with a SeedSequence, so each task gets an
+    independent stream that is the same no matter which worker runs it or how tasks are grouped into chunks.
+
+    Parameters
+    ----------
+    seed : int
+        Campaign seed
+    task_id : int
+        Task number
+    """
+    np.random.seed(np.random.SeedSequence([seed, task_id]).generate_state(4))
+
+
+def new_seed():
+    """Returns a fresh random campaign seed
+
+    Returns
+    -------
+    int
+        Seed
+    """
+    return int(np.random.SeedSequence().entropy % 2 ** 63)
+
+
+def chunks(items, size):
+    """Splits a list into consecutive chunks
+
+    Parameters
+    ----------
+    items : list
+        Items to split
+    size : int
+        Items per chunk, the last chunk may be smaller
+
+    Returns
+    -------
+    list
+        List of chunks
+    """
+    return [items[n : n + size] for n in range(0, len(items), size)]
+
+
+# Objects already unpickled from shared memory in this process, by block name
+_shared_objects = {}
+
+
+def _evict_released(keep=None):
+    """Forgets the objects unpickled in this process whose shared memory block has since been released
+
+    Parameters
+    ----------
+    keep : string, optional
+        Name of a block not to check, defaults to None
+    """
+    for name in list(_shared_objects):
+        if name == keep:
+            continue
+        try:
+            block = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            # release() unlinked it, no more tasks will ask for it
+            del _shared_objects[name]
+        else:
+            block.close()
+
+
+class LocalObject:
+    """Handle to a shared object for the serial backend, which just holds the object
+
+    Parameters
+    ----------
+    obj : object
+        The object
+    """
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def get(self):
+        """Returns the object
+
+        Returns
+        -------
+        object
+            The object
+        """
+        return self.obj
+
+
+class SharedMemoryObject:
+    """Handle to an object pickled into a shared memory block, this is all that needs to be sent to a worker
+
+    Parameters
+    ----------
+    name : string
+        Name of the shared memory block
+    size : int
+        Size of the pickled object /bytes
+    """
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+    def get(self):
+        """Returns the object, it is only unpickled the first time each process asks for it
+
+        Note
+        ----
+        Each process gets its own copy when it unpickles it, so changes made by a task (e.g. wind data loaded on demand)
+        stay in that worker and are seen by later tasks there. The copies of objects that have been released are
+        dropped whenever a worker gets a shared object, so a long lived pool (e.g. a Scheduler's) only keeps the
+        objects that are still in use.
+
+        Returns
+        -------
+        object
+            The object
+        """
+        _evict_released(keep=self.name)
+        if self.name not in _shared_objects:
+            block = shared_memory.SharedMemory(name=self.name)
+            try:
+                _shared_objects[self.name] = pickle.loads(block.buf[: self.size])
+            finally:
+                block.close()
+        return _shared_objects[self.name]
+
+
+class RayObject:
+    """Handle to an object in ray's object store
+
+    Parameters
+    ----------
+    ref : ray.ObjectRef
+        Reference to the object
+    """
+
+    def __init__(self, ref):
+        self.ref = ref
+
+    def get(self):
+        """Returns the object
+
+        Returns
+        -------
+        object
+            The object
+        """
+        return ray.get(self.ref)
+
+
+class SerialBackend:
+    """Runs each task immediately in the calling process
+
+    Attributes
+    ----------
+    workers : int
+        Always 1
+    """
+
+    def __init__(self):
+        self.workers = 1
+
+    def submit(self, func, *args):
+        """Runs func(*args)
+
+        Parameters
+        ----------
+        func : callable
+            Function to run
+        *args
+            Arguments for func
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Already finished future holding the result or exception
+        """
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def share(self, obj):
+        """Makes an object available to tasks without sending it with each one
+
+        Parameters
+        ----------
+        obj : object
+            Object that tasks will only read
+
+        Returns
+        -------
+        LocalObject
+            Handle to pass to tasks, call .get() in the task to get the object
+        """
+        return LocalObject(obj)
+
+    def release(self, shared):
+        """Frees a shared object once no more tasks need it
+
+        Parameters
+        ----------
+        shared : LocalObject
+            Handle from share()
+        """
+
+    def shutdown(self):
+        """Nothing to clean up"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+
+class ProcessPoolBackend(SerialBackend):
+    """Runs tasks in a pool of worker processes with concurrent.futures
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of worker processes, defaults to None (one per CPU available to this process)
+    blas_threads : int, optional
+        BLAS threads per worker, None to leave it alone, defaults to 1
+    mp_context : string, optional
+        multiprocessing start method ("fork", "spawn" or "forkserver"), defaults to None (the platform default)
+
+    Attributes
+    ----------
+    workers : int
+        Number of worker processes
+    executor : concurrent.futures.ProcessPoolExecutor
+        The pool
+    """
+
+    def __init__(self, workers=None, blas_threads=1, mp_context=None):
+        if workers is None:
+            workers = (
+                len(os.sched_getaffinity(0))
+                if hasattr(os, "sched_getaffinity")
+                else os.cpu_count()
+            )
+        self.workers = workers
+        if mp_context is not None:
+            import multiprocessing
+
+            mp_context = multiprocessing.get_context(mp_context)
+        self.mp_context = mp_context
+        self.blas_threads = blas_threads
+        self.executor = self._make_executor()
+        self.blocks = []
+
+    def _make_executor(self):
+        if self.blas_threads is None:
+            initializer, initargs = None, ()
+        else:
+            initializer, initargs = limit_blas_threads, (self.blas_threads,)
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=self.mp_context,
+            initializer=initializer,
+            initargs=initargs,
+        )
+
+    def submit(self, func, *args):
+        """Queues func(*args) to run in a worker
+
+        Note
+        ----
+        If a worker died (e.g. was killed for using too much memory) the pool is broken, tasks that were running fail
+        with BrokenProcessPool and the pool is replaced the next time something is submitted.
+
+        Parameters
+        ----------
+        func : callable
+            Function to run, must be picklable (i.e. defined at the top level of a module)
+        *args
+            Arguments for func, must be picklable
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Future for the result
+        """
+        try:
+            return self.executor.submit(func, *args)
+        except BrokenProcessPool:
+            self.executor.shutdown(wait=False)
+            self.executor = self._make_executor()
+            return self.executor.submit(func, *args)
+
+    def share(self, obj):
+        """Pickles an object into shared memory once so tasks only need to be sent a small handle
+
+        Parameters
+        ----------
+        obj : object
+            Object that tasks will only read, must be picklable
+
+        Returns
+        -------
+        SharedMemoryObject
+            Handle to pass to tasks, call .get() in the task to get the object
+        """
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        block = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        block.buf[: len(data)] = data
+        self.blocks.append(block)
+        return SharedMemoryObject(block.name, len(data))
+
+    def release(self, shared):
+        """Frees the shared memory behind a shared object once no more tasks need it
+
+        Note
+        ----
+        The workers drop their copies of the object the next time they get a shared object.
+
+        Parameters
+        ----------
+        shared : SharedMemoryObject
+            Handle from share()
+        """
+        for block in self.blocks:
+            if block.name == shared.name:
+                block.close()
+                block.unlink()
+                self.blocks.remove(block)
+                return
+
+    def shutdown(self):
+        """Waits for queued tasks to finish, stops the workers and frees the shared memory"""
+        self.executor.shutdown(wait=True)
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+class RayBackend(SerialBackend):
+    """Runs tasks as ray remote functions
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of CPUs to start ray with if it isn't already running, defaults to None (ray's default)
+    local_mode : bool, optional
+        Start ray in local mode (everything in this process), defaults to False
+
+    Attributes
+    ----------
+    workers : int
+        Number of CPUs in the ray cluster
+    """
+
+    def __init__(self, workers=None, local_mode=False):
+        if RAY_AVAILABLE == False:
+            raise ImportError(
+                "ray is not installed, use the process pool backend or `pip install ray`"
+            )
+        if not ray.is_initialized():
+            if workers is not None:
+                ray.init(num_cpus=workers, local_mode=local_mode)
+            else:
+                ray.init(local_mode=local_mode)
+        self.workers = int(ray.cluster_resources().get("CPU", 1))
+        self._remotes = {}
+
+    def submit(self, func, *args):
+        """Starts func(*args) as a ray task
+
+        Parameters
+        ----------
+        func : callable
+            Function to run
+        *args
+            Arguments for func
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Future for the result
+        """
+        if func not in self._remotes:
+            self._remotes[func] = ray.remote(func)
+        return self._remotes[func].remote(*args).future()
+
+    def share(self, obj):
+        """Puts an object in ray's object store once so tasks only need to be sent a reference
+
+        Parameters
+        ----------
+        obj : object
+            Object that tasks will only read
+
+        Returns
+        -------
+        RayObject
+            Handle to pass to tasks, call .get() in the task to get the object
+        """
+        return RayObject(ray.put(obj))
+
+    def shutdown(self):
+        """Leaves ray running since it may be shared with other work"""
+
+
+class Progress:
+    """Prints how far through a campaign is, at most every interval seconds
+
+    Parameters
+    ----------
+    total : int
+        Number of items
+    name : string, optional
+        What the items are called, defaults to "runs"
+    interval : float, optional
+        Minimum time between reports /s, defaults to 5
+    stream : callable, optional
+        Called with each report, defaults to print
+
+    Attributes
+    ----------
+    done : int
+        Items finished so far (including failures)
+    failed : int
+        Items that failed so far
+    """
+
+    def __init__(self, total, name="runs", interval=5, stream=print):
+        self.total = total
+        self.name = name
+        self.interval = interval
+        self.stream = stream
+        self.done = 0
+        self.failed = 0
+        self.start = time.time()
+        self.last = None
+
+    def update(self, done=1, failed=0):
+        """Counts finished items and reports if enough time has passed (or everything is finished)
+
+        Parameters
+        ----------
+        done : int, optional
+            Number of items finished, defaults to 1
+        failed : int, optional
+            How many of those failed, defaults to 0
+        """
+        self.done += done
+        self.failed += failed
+        now = time.time()
+        if (
+            self.done >= self.total
+            or self.last is None
+            or now - self.last >= self.interval
+        ):
+            self.last = now
+            self.stream(self.report())
+
+    def report(self):
+        """Returns a one line summary of progress
+
+        Returns
+        -------
+        string
+            Summary
+        """
+        elapsed = time.time() - self.start
+        if 0 < self.done < self.total:
+            eta = ", about %.0f s left" % (
+                elapsed / self.done * (self.total - self.done)
+            )
+        else:
+            eta = ""
+        return "%s/%s %s finished (%s failed) in %.0f s%s" % (
+            self.done,
+            self.total,
+            self.name,
+            self.failed,
+            elapsed,
+            eta,
+        )
+
+
+def run_tasks(
+    backend, func, tasks, max_in_flight=None, retries=2, on_done=None, stop=None
+):
+    """Runs func(*args) for every args in tasks, keeping a bounded number submitted at once
+
+    Note
+    ----
+    A task that raises is submitted again up to retries times, after that the error is recorded and the rest carry on.
+    This only returns once every task has finished or failed, or stop returned True and the tasks already submitted
+    have finished.
+
+    Parameters
+    ----------
+    backend : SerialBackend, ProcessPoolBackend or RayBackend
+        Where to run the tasks
+    func : callable
+        Function to run
+    tasks : list
+        Tuple of arguments for each task
+    max_in_flight : int, optional
+        Maximum number of tasks submitted but not finished, defaults to None (twice the number of workers)
+    retries : int, optional
+        Number of times to resubmit a failed task, defaults to 2
+    on_done : callable, optional
+        Called as on_done(index, result, error) when each task finishes, error is None if it succeeded and result is None
+        if it failed. Defaults to None
+    stop : callable, optional
+        Called before submitting more tasks, if it returns True no more are submitted (those left have a result of
+        None and aren't failures). Defaults to None
+
+    Returns
+    -------
+    list, dict
+        Result of each task (None if it failed), error message for each failed task by index
+    """
+    if max_in_flight is None:
+        max_in_flight = 2 * backend.workers
+    results = [None] * len(tasks)
+    failures = {}
+    attempts = [0] * len(tasks)
+    waiting = list(range(len(tasks)))[::-1]
+    in_flight = {}
+
+    while len(waiting) > 0 or len(in_flight) > 0:
+        if stop is not None and len(waiting) > 0 and stop():
+            waiting = []
+            if len(in_flight) == 0:
+                break
+        while len(waiting) > 0 and len(in_flight) < max_in_flight:
+            index = waiting.pop()
+            attempts[index] += 1
+            in_flight[backend.submit(func, *tasks[index])] = index
+
+        done, _ = concurrent.futures.wait(
+            in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        for future in done:
+            index = in_flight.pop(future)
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                if attempts[index] <= retries:
+                    waiting.append(index)
+                    continue
+                failures[index] = "".join(
+                    traceback.format_exception(type(e), e, e.__traceback__)
+                )
+                if on_done is not None:
+                    on_done(index, None, failures[index])
+                continue
+            if on_done is not None:
+                on_done(index, results[index], None)
+    return results, failures
+
+
+BACKENDS = {
+    "serial": SerialBackend,
+    "process": ProcessPoolBackend,
+    "ray": RayBackend,
+}
+
+
+def get_backend(backend="auto", workers=None, **kwargs):
+    """Makes an execution backend
+
+    Parameters
+    ----------
+    backend : string or backend object, optional
+        "serial", "process", "ray", "auto" (ray if installed, otherwise a process pool) or an existing backend which
+        is returned unchanged, defaults to "auto"
+    workers : int, optional
+        Number of workers, defaults to None (one per CPU)
+    **kwargs
+        Passed to the backend
+
+    Returns
+    -------
+    SerialBackend, ProcessPoolBackend or RayBackend
+        The backend
+    """
+    if not isinstance(backend, str):
+        return backend
+    if backend == "auto":
+        backend = "ray" if RAY_AVAILABLE else "process"
+    if backend not in BACKENDS:
+        raise ValueError(
+            "Backend must be one of %s or 'auto', not %s" % (list(BACKENDS), backend)
+        )
+    if backend == "serial":
+        return SerialBackend()
+    return BACKENDS[backend](workers, **kwargs)
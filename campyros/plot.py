@@ -92,24 +92,11 @@ def plot_ypr(simulation_output, rocket):
     # Get data
     output_dict = simulation_output.to_dict(orient="list")
 
-    yaw = []
-    pitch = []
-    roll = []
-    z_l = []
-    for (
-        index,
-        row,
-    ) in simulation_output.iterrows():  # this is ugly but proper way not working
-        ypr = Rotation.from_matrix(row["b2imat"]).as_euler("zyx")
-    altitude = []
-    time = output_dict["time"]
-
-    for i in range(len(time)):
-        ypr = Rotation.from_matrix(output_dict["b2imat"][i]).as_euler("zyx")
-        yaw.append(ypr[0])
-        pitch.append(ypr[1])
-        roll.append(ypr[2])
-        z_l.append(pos_i2l(np.array(row["pos_i"]), rocket.launch_site, row["time"])[2])
+    time = np.array(output_dict["time"])
+    yaw, pitch, roll = (
+        Rotation.from_matrix(np.stack(output_dict["b2imat"])).as_euler("zyx").T
+    )
+    z_l = pos_i2l(np.stack(output_dict["pos_i"]), rocket.launch_site, time)[:, 2]
     fig, axs = plt.subplots(2, 2)
 
     axs[0, 0].plot(simulation_output["time"], [fix_ypr(n) for n in yaw])
@@ -160,12 +147,9 @@ def plot_launch_trajectory_3d(
     pos_i_array = np.stack(
         simulation_output["pos_i"], axis=0
     )  # np.stack(Series, axis=0) will convert a panda Series into a numpy ndarray.
-    pos_l_array = np.zeros(pos_i_array.shape)
-
-    for i in range(len(pos_l_array)):
-        pos_l_array[i] = pos_i2l(
-            pos_i_array[i], rocket.launch_site, simulation_output["time"][i]
-        )
+    pos_l_array = pos_i2l(
+        pos_i_array, rocket.launch_site, np.array(simulation_output["time"])
+    )
     x_l = pos_l_array[:, 0]
     y_l = pos_l_array[:, 1]
     z_l = pos_l_array[:, 2]
@@ -202,11 +186,9 @@ def plot_launch_trajectory_3d(
         xb_i_array = b2imat[:, :, 0]
 
         # Convert inertial orientations into launch site ones
-        xb_l_array = np.zeros(xb_i_array.shape)
-        for i in range(len(xb_i_array)):
-            xb_l_array[i] = direction_i2l(
-                xb_i_array[i], rocket.launch_site, simulation_output["time"][i]
-            )
+        xb_l_array = direction_i2l(
+            xb_i_array, rocket.launch_site, np.array(simulation_output["time"])
+        )
 
         u = xb_l_array[:, 0]
         v = xb_l_array[:, 1]
@@ -229,7 +211,7 @@ def plot_launch_trajectory_3d(
     set_axes_equal_3d(ax)
 
     ax.legend()
-    
+
     st.pyplot(fig)
 
 
@@ -251,12 +233,9 @@ def plot_altitude_time(simulation_output, rocket):
     pos_i_array = np.stack(
         simulation_output["pos_i"], axis=0
     )  # np.stack(Series, axis=0) will convert a panda Series into a numpy ndarray
-    pos_l_array = np.zeros(pos_i_array.shape)
-
-    for i in range(len(pos_l_array)):
-        pos_l_array[i] = pos_i2l(
-            pos_i_array[i], rocket.launch_site, simulation_output["time"][i]
-        )
+    pos_l_array = pos_i2l(
+        pos_i_array, rocket.launch_site, np.array(simulation_output["time"])
+    )
 
     x_l = pos_l_array[:, 0]
     y_l = pos_l_array[:, 1]
@@ -266,12 +245,9 @@ def plot_altitude_time(simulation_output, rocket):
     vel_i_array = np.stack(
         simulation_output["vel_i"], axis=0
     )  # np.stack(Series, axis=0) will convert a panda Series into a numpy ndarray
-    vel_l_array = np.zeros(pos_i_array.shape)
-
-    for i in range(len(pos_l_array)):
-        vel_l_array[i] = vel_i2l(
-            vel_i_array[i], rocket.launch_site, simulation_output["time"][i]
-        )
+    vel_l_array = vel_i2l(
+        vel_i_array, rocket.launch_site, np.array(simulation_output["time"])
+    )
 
     vx_l = vel_l_array[:, 0]
     vy_l = vel_l_array[:, 1]
@@ -304,7 +280,7 @@ def plot_altitude_time(simulation_output, rocket):
     axs[1, 1].set_ylabel("Velocity/m/s")
 
     fig.tight_layout()
-    
+
     st.pyplot(fig)
 
 
@@ -382,7 +358,9 @@ def plot_aero(simulation_output, rocket):
                         rocket.launch_site,
                         output_dict["time"][i],
                     )
-                    - rocket.launch_site.wind.get_wind(lat, long, alt)
+                    - rocket.launch_site.wind.get_wind(
+                        lat, long, alt, output_dict["time"][i]
+                    )
                 ),
                 rocket.launch_site,
                 output_dict["time"][i],
@@ -676,18 +654,11 @@ def animate_orientation(simulation_output, frames=500):
     output_dict = simulation_output.to_dict(orient="list")
 
     # Get data
-    yaw = []
-    pitch = []
-    roll = []
-    altitude = []
-    time = output_dict["time"]
-
-    for i in range(len(time)):
-        ypr = Rotation.from_matrix(output_dict["b2imat"][i]).as_euler("zyx")
-        yaw.append(ypr[0])
-        pitch.append(ypr[1])
-        roll.append(ypr[2])
-        altitude.append(pos_i2alt(output_dict["pos_i"][i], output_dict["time"]))
+    time = np.array(output_dict["time"])
+    yaw, pitch, roll = (
+        Rotation.from_matrix(np.stack(output_dict["b2imat"])).as_euler("zyx").T
+    )
+    altitude = pos_i2alt(np.stack(output_dict["pos_i"]), time)
 
     # Create figure
     fig, axs = plt.subplots(2, 2)
@@ -49,16 +49,7 @@ def ypr_i(simulation_output):
     roll : list
     """
     output_dict = simulation_output.to_dict(orient="list")
-    time = output_dict["time"]
+    # All the rotations at once rather than a Rotation per row
+    ypr = Rotation.from_matrix(np.stack(output_dict["b2imat"])).as_euler("zyx")
 
-    yaw = []
-    pitch = []
-    roll = []
-
-    for i in range(len(time)):
-        ypr = Rotation.from_matrix(output_dict["b2imat"][i]).as_euler("zyx")
-        yaw.append(ypr[0])
-        pitch.append(ypr[1])
-        roll.append(ypr[2])
-
-    return yaw, pitch, roll
+    return list(ypr[:, 0]), list(ypr[:, 1]), list(ypr[:, 2])
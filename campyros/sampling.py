@@ -0,0 +1,130 @@
+"""
+Design matrices for stochastic campaigns, i.e. every random draw of every run generated up front.
+
+Notes
+-----
+
+- Designs are generated in the unit hypercube and mapped to standard normals with the inverse CDF. Inputs that aren't
+  normal (e.g. uniform angles or failure events) are mapped back with the CDF.
+- Scrambled Sobol points are a low discrepancy sequence so the sample means converge faster than Monte Carlo (close to
+  1/N rather than 1/sqrt(N) for smooth responses). They are best used with a power of two runs, and the first few
+  dimensions are the most evenly covered, so the most important inputs should come first.
+- Latin hypercube sampling stratifies each input separately, which helps most when the output is dominated by a few
+  inputs.
+- Designs can be extended with more rows (start > 0). Random rows are seeded from (seed, row) and Sobol rows are the
+  next points of the same sequence, so a row never depends on how many were generated. A Latin hypercube can't be
+  extended without breaking its strata so the extra rows are a new hypercube of their own.
+
+"""
+import numpy as np
+import scipy.stats
+from scipy.stats import qmc
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+METHODS = ["random", "sobol", "latin_hypercube"]
+
+
+def unit_design(n, dims, method="random", seed=None, start=0):
+    """Points in the unit hypercube
+
+    Parameters
+    ----------
+    n : int
+        Number of points (runs)
+    dims : int
+        Number of dimensions (random draws per run)
+    method : string, optional
+        "random", "sobol" (scrambled) or "latin_hypercube", defaults to "random"
+    seed : int, optional
+        Seed, defaults to None (random)
+    start : int, optional
+        Index of the first row, to extend a design of start rows, defaults to 0
+
+    Returns
+    -------
+    numpy array
+        Design, a row per point with every value in (0,1)
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    if method == "random":
+        points = np.array(
+            [
+                np.random.default_rng([seed, row]).random(dims)
+                for row in range(start, start + n)
+            ]
+        ).reshape(n, dims)
+    elif method == "sobol":
+        sampler = qmc.Sobol(dims, scramble=True, seed=seed)
+        if start > 0:
+            sampler.fast_forward(start)
+        points = sampler.random(n)
+    elif method == "latin_hypercube":
+        points = qmc.LatinHypercube(
+            dims, seed=np.random.default_rng([seed, start])
+        ).random(n)
+    else:
+        raise ValueError(
+            "Sampling method must be one of %s, not %s" % (METHODS, method)
+        )
+    # The normal inverse CDF is infinite at 0 and 1
+    tiny = np.finfo(float).eps
+    return np.clip(points, tiny, 1 - tiny)
+
+
+def design_matrix(n, dims, method="random", seed=None, start=0):
+    """Standard normal draws for every run
+
+    Parameters
+    ----------
+    n : int
+        Number of runs
+    dims : int
+        Number of random draws per run
+    method : string, optional
+        "random", "sobol" (scrambled) or "latin_hypercube", defaults to "random"
+    seed : int, optional
+        Seed, defaults to None (random)
+    start : int, optional
+        Index of the first row, to extend a design of start rows, defaults to 0
+
+    Returns
+    -------
+    numpy array
+        Standard normal draws, a row per run
+    """
+    return scipy.stats.norm.ppf(unit_design(n, dims, method, seed, start))
+
+
+def uniform(z):
+    """Maps a standard normal draw to a uniform one on (0,1)
+
+    Parameters
+    ----------
+    z : float
+        Standard normal draw
+
+    Returns
+    -------
+    float
+        Uniform draw
+    """
+    return scipy.stats.norm.cdf(z)
@@ -0,0 +1,550 @@
+"""
+Runs several campaigns at once on one persistent pool of workers, e.g. a campaign for each launch date.
+
+Notes
+-----
+
+- The scheduler starts its backend once (one ray.init or process pool) and keeps it until it's shut down, rather than
+  every run_model call starting and stopping its own. Each campaign's model is shared with the workers once.
+- Each campaign's runs are split into chunks as in StatisticalModel.run_model and whenever there's room for another
+  chunk it comes from the campaign that has had the least of the pool for its priority (stride scheduling). While
+  they are both running, a campaign with priority 2 gets twice the runs of one with priority 1. A campaign added
+  later starts level with those running rather than catching up on what it missed.
+- Each campaign is stored in its own CampaignStore exactly as run_model would store it (the same design, seeds and
+  results), so it can be resumed, extended or analysed in the same way.
+- Other processes queue campaigns for a running scheduler by writing job files to its queue folder with submit().
+  A job is claimed by moving its file, so two schedulers sharing a queue never both run it. Scheduler.serve keeps
+  picking up jobs until stop() is called on the queue and everything queued has finished.
+
+"""
+import os
+import json
+import time
+import warnings
+import traceback
+import collections
+import concurrent.futures
+
+from .parallel import get_backend, chunks
+from .store import CampaignStore
+from .statistical import StatisticalModel, run_chunk
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+QUEUE_FOLDER = "results/queue"
+STOP_FILE = "STOP"
+# Sub folders of the queue for jobs that have been taken, finished or couldn't be started
+CLAIMED, DONE, FAILED = "claimed", "done", "failed"
+
+
+def submit(
+    settings, priority=1, seed=None, resume=False, save_loc=None, queue=QUEUE_FOLDER
+):
+    """Queues a campaign for a scheduler serving the queue, this can be called from any process
+
+    Parameters
+    ----------
+    settings : string
+        Settings file of the StatisticalModel
+    priority : float, optional
+        Share of the workers relative to the other campaigns, defaults to 1
+    seed : int, optional
+        Campaign seed, defaults to None (random)
+    resume : bool, optional
+        Carry on with the campaign already stored, see StatisticalModel.run_model, defaults to False
+    save_loc : string, optional
+        Where to store the campaign, defaults to None (results/<name> in the scheduler's working directory)
+    queue : string, optional
+        Queue folder, defaults to QUEUE_FOLDER
+
+    Returns
+    -------
+    string
+        Path of the job file
+    """
+    os.makedirs(queue, exist_ok=True)
+    job = {
+        "settings": os.path.abspath(settings),
+        "priority": priority,
+        "seed": seed,
+        "resume": resume,
+        "save_loc": None if save_loc is None else os.path.abspath(save_loc),
+    }
+    # Named by submission time so the jobs are picked up in order
+    name = "%020d_%s.json" % (time.time_ns(), os.getpid())
+    tmp = os.path.join(queue, ".%s.tmp" % name)
+    with open(tmp, "w") as f:
+        json.dump(job, f, indent=4)
+    # The scheduler only looks at .json files, so it never sees a half written job
+    os.replace(tmp, os.path.join(queue, name))
+    return os.path.join(queue, name)
+
+
+def stop(queue=QUEUE_FOLDER):
+    """Asks a scheduler serving the queue to return once everything queued has finished
+
+    Parameters
+    ----------
+    queue : string, optional
+        Queue folder, defaults to QUEUE_FOLDER
+    """
+    os.makedirs(queue, exist_ok=True)
+    open(os.path.join(queue, STOP_FILE), "w").close()
+
+
+class Campaign:
+    """A campaign being run by a Scheduler
+
+    Parameters
+    ----------
+    model : StatisticalModel
+        The model, with its campaign already started (see StatisticalModel.start_campaign)
+    store : CampaignStore
+        Where the campaign is stored
+    runs : list
+        Run numbers still to do
+    priority : float
+        Share of the workers relative to the other campaigns
+    chunksize : int
+        Runs sent to a worker at a time
+    shared : shared object handle
+        Handle to the model from the backend's share()
+    passed : float
+        Virtual time the campaign starts at, see Scheduler
+    debug : bool, optional
+        Passed to Rocket.run, defaults to False
+    progress : bool or callable, optional
+        Print progress, or a function to call with each progress line, defaults to True
+    reservoir_size : int, optional
+        Number of trajectories to keep in the model's monitor, defaults to 20
+
+    Attributes
+    ----------
+    status : string
+        "running", "finished" or "stopped" (interrupted, it can be resumed)
+    pending : collections.deque
+        Chunks not submitted yet, each (run numbers, times submitted before)
+    in_flight : int
+        Chunks submitted but not finished
+    finished : int
+        Runs finished (including failures)
+    passed : float
+        Runs submitted divided by the priority, plus the starting virtual time
+    job : string or None
+        Job file the campaign came from, if it was queued
+    """
+
+    def __init__(
+        self,
+        model,
+        store,
+        runs,
+        priority,
+        chunksize,
+        shared,
+        passed,
+        debug=False,
+        progress=True,
+        reservoir_size=20,
+    ):
+        self.model = model
+        self.store = store
+        self.runs = runs
+        self.priority = priority
+        self.shared = shared
+        self.passed = passed
+        self.debug = debug
+        self.status = "running"
+        self.job = None
+        self.pending = collections.deque(
+            (chunk, 0) for chunk in chunks(runs, chunksize)
+        )
+        self.in_flight = 0
+        # The same bookkeeping as run_model, so the model looks the same afterwards
+        self._stored = model._begin_monitor(store, reservoir_size)
+        self.finished = 0
+        self.tracker = model._progress(len(runs), progress)
+
+    @property
+    def name(self):
+        """Name of the campaign's model"""
+        return self.model.name
+
+    def waiting(self):
+        """Whether the campaign has chunks to submit"""
+        return len(self.pending) > 0 and not self.model.converged
+
+    def idle(self):
+        """Whether the campaign has nothing submitted and nothing more to submit"""
+        return self.in_flight == 0 and not self.waiting()
+
+    def record(self, ids, result, error):
+        """Keeps the results of a chunk
+
+        Parameters
+        ----------
+        ids : list
+            Run numbers of the chunk
+        result : tuple or None
+            What run_chunk returned, None if the chunk failed as a whole
+        error : string or None
+            Why the chunk failed as a whole
+        """
+        total = self.model._record_chunk(
+            ids, result, error, self._stored + self.finished, self.tracker
+        )
+        self.finished = total - self._stored
+
+    def finish(self, stopped=False):
+        """Compacts the store and reports failures, once nothing more will be submitted
+
+        Parameters
+        ----------
+        stopped : bool, optional
+            The campaign was interrupted before it finished, defaults to False
+        """
+        self.status = "stopped" if stopped == True else "finished"
+        self.model._finish_campaign(
+            self.store,
+            len(self.runs),
+            self._stored,
+            self._stored + self.finished,
+            stopped,
+        )
+
+
+class Scheduler:
+    """Runs the chunks of several campaigns on one pool of workers with fair share priorities
+
+    Note
+    ----
+    Each campaign has a virtual time, the runs it has submitted divided by its priority, and the next chunk always
+    comes from the running campaign with the lowest. A new campaign starts at the lowest virtual time of those
+    running, so it shares the pool from then on rather than having it to itself until it catches up.
+
+    Parameters
+    ----------
+    backend : string or backend object, optional
+        Execution backend, see campyros.parallel.get_backend, defaults to "auto". A backend that's given isn't shut
+        down with the scheduler
+    workers : int, optional
+        Number of workers, defaults to None (one per CPU)
+    queue : string, optional
+        Folder other processes submit jobs to (see submit), defaults to None (no queue)
+    max_in_flight : int, optional
+        Maximum number of chunks submitted at once across all the campaigns, defaults to None (twice the number of
+        workers)
+    retries : int, optional
+        Times to retry a chunk that failed as a whole, defaults to 2
+    progress : bool or callable, optional
+        Print progress, or a function to call with each progress line, defaults to True
+    poll : float, optional
+        How often to check the queue /s, defaults to 1
+
+    Attributes
+    ----------
+    executor : SerialBackend, ProcessPoolBackend or RayBackend
+        The worker pool
+    campaigns : list
+        Every Campaign added, in order
+    """
+
+    def __init__(
+        self,
+        backend="auto",
+        workers=None,
+        queue=None,
+        max_in_flight=None,
+        retries=2,
+        progress=True,
+        poll=1.0,
+    ):
+        self.executor = get_backend(backend, workers)
+        self._own_executor = self.executor is not backend
+        self.queue = queue
+        if max_in_flight is None:
+            max_in_flight = 2 * self.executor.workers
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.progress = progress
+        self.poll_interval = poll
+        self.campaigns = []
+        self._in_flight = {}
+        self._clock = 0.0
+
+    def load(self, settings):
+        """Makes the model of a queued job
+
+        Parameters
+        ----------
+        settings : string
+            Settings file
+
+        Returns
+        -------
+        StatisticalModel
+            The model
+        """
+        return StatisticalModel(settings)
+
+    def running(self):
+        """Campaigns that haven't finished
+
+        Returns
+        -------
+        list
+            Campaigns
+        """
+        return [campaign for campaign in self.campaigns if campaign.status == "running"]
+
+    def add(
+        self,
+        model,
+        priority=1,
+        seed=None,
+        resume=False,
+        save_loc=None,
+        chunksize=None,
+        debug=False,
+        reservoir_size=20,
+    ):
+        """Adds a campaign, its chunks start being submitted by run or serve (or straight away if they're running)
+
+        Parameters
+        ----------
+        model : StatisticalModel or string
+            The model or its settings file
+        priority : float, optional
+            Share of the workers relative to the other campaigns, defaults to 1
+        seed : int, optional
+            Campaign seed, defaults to None (random, stored in the model's seed)
+        resume : bool, optional
+            Carry on with the campaign already stored, see StatisticalModel.run_model, defaults to False
+        save_loc : string, optional
+            Where to store the campaign, defaults to None (results/<name>)
+        chunksize : int, optional
+            Runs sent to a worker at a time, defaults to None (as run_model)
+        debug : bool, optional
+            Passed to Rocket.run, defaults to False
+        reservoir_size : int, optional
+            Number of trajectories to keep in the model's monitor, defaults to 20
+
+        Returns
+        -------
+        Campaign
+            The campaign
+        """
+        if isinstance(model, str):
+            model = self.load(model)
+        if not priority > 0:
+            raise ValueError("Priority must be positive, not %s" % priority)
+        if save_loc is None:
+            save_loc = "results/%s" % model.name
+        for campaign in self.running():
+            if os.path.abspath(campaign.store.path) == os.path.abspath(save_loc):
+                raise ValueError(
+                    "%s is already being stored in %s" % (campaign.name, save_loc)
+                )
+        store = CampaignStore(save_loc)
+        done = model.start_campaign(store, seed, resume)
+        runs = [id for id in range(1, model.itterations + 1) if id not in done]
+        if chunksize is None:
+            chunksize = model._chunksize(len(runs), self.executor.workers)
+        running = [campaign.passed for campaign in self.running() if campaign.waiting()]
+        campaign = Campaign(
+            model,
+            store,
+            runs,
+            priority,
+            chunksize,
+            self.executor.share(model),
+            min(running, default=self._clock),
+            debug=debug,
+            progress=self.progress,
+            reservoir_size=reservoir_size,
+        )
+        self.campaigns.append(campaign)
+        return campaign
+
+    def poll(self):
+        """Adds the campaigns queued by submit
+
+        Returns
+        -------
+        list
+            Campaigns added
+        """
+        if self.queue is None or not os.path.isdir(self.queue):
+            return []
+        added = []
+        for name in sorted(os.listdir(self.queue)):
+            if not name.endswith(".json"):
+                continue
+            claimed = os.path.join(self.queue, CLAIMED, name)
+            os.makedirs(os.path.dirname(claimed), exist_ok=True)
+            try:
+                os.replace(os.path.join(self.queue, name), claimed)
+            except FileNotFoundError:
+                # Another scheduler took it
+                continue
+            try:
+                with open(claimed) as f:
+                    job = json.load(f)
+                settings = job.pop("settings")
+                campaign = self.add(self.load(settings), **job)
+            except Exception:
+                failed = os.path.join(self.queue, FAILED, name)
+                os.makedirs(os.path.dirname(failed), exist_ok=True)
+                os.replace(claimed, failed)
+                with open("%s.error" % failed, "w") as f:
+                    f.write(traceback.format_exc())
+                warnings.warn(
+                    "Couldn't start queued job %s, see %s.error" % (name, failed)
+                )
+                continue
+            campaign.job = claimed
+            added.append(campaign)
+        return added
+
+    def _submit(self):
+        """Fills the pool up to max_in_flight chunks, each from the campaign with the lowest virtual time"""
+        while len(self._in_flight) < self.max_in_flight:
+            waiting = [campaign for campaign in self.running() if campaign.waiting()]
+            if len(waiting) == 0:
+                return
+            campaign = min(waiting, key=lambda campaign: campaign.passed)
+            self._clock = campaign.passed
+            chunk, attempts = campaign.pending.popleft()
+            campaign.passed += len(chunk) / campaign.priority
+            campaign.in_flight += 1
+            future = self.executor.submit(
+                run_chunk,
+                campaign.shared,
+                chunk,
+                campaign.store.path,
+                campaign.model.seed,
+                campaign.debug,
+            )
+            self._in_flight[future] = (campaign, chunk, attempts + 1)
+
+    def _collect(self, future):
+        """Records a finished chunk, resubmitting it if it failed as a whole and has retries left"""
+        campaign, chunk, attempts = self._in_flight.pop(future)
+        campaign.in_flight -= 1
+        try:
+            result = future.result()
+        except Exception as e:
+            if attempts <= self.retries:
+                campaign.pending.appendleft((chunk, attempts))
+                return
+            campaign.record(
+                chunk,
+                None,
+                "".join(traceback.format_exception(type(e), e, e.__traceback__)),
+            )
+            return
+        campaign.record(chunk, result, None)
+
+    def _finish(self, campaign, stopped=False):
+        """Finishes a campaign and frees its model on the workers"""
+        self.executor.release(campaign.shared)
+        campaign.finish(stopped)
+        if campaign.job is not None and stopped == False:
+            done = os.path.join(self.queue, DONE, os.path.basename(campaign.job))
+            os.makedirs(os.path.dirname(done), exist_ok=True)
+            os.replace(campaign.job, done)
+            campaign.job = done
+
+    def _stopping(self):
+        """Whether stop() has been called on the queue"""
+        return self.queue is not None and os.path.isfile(
+            os.path.join(self.queue, STOP_FILE)
+        )
+
+    def run(self, serve=False):
+        """Runs the campaigns until they've all finished
+
+        Note
+        ----
+        If it's interrupted (e.g. ctrl+c) the runs that finished are kept and each campaign can be resumed.
+
+        Parameters
+        ----------
+        serve : bool, optional
+            Keep running and picking up queued jobs until stop() is called on the queue and everything queued has
+            finished, defaults to False
+
+        Returns
+        -------
+        list
+            Every Campaign added
+        """
+        try:
+            while True:
+                stopping = self._stopping()
+                self.poll()
+                self._submit()
+                for campaign in self.running():
+                    if campaign.idle():
+                        self._finish(campaign)
+                if len(self._in_flight) == 0:
+                    if len(self.running()) > 0:
+                        continue
+                    if serve == False or stopping:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                done, _ = concurrent.futures.wait(
+                    self._in_flight,
+                    timeout=self.poll_interval if self.queue is not None else None,
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                for future in done:
+                    self._collect(future)
+        except KeyboardInterrupt:
+            for campaign in self.running():
+                self._finish(campaign, stopped=True)
+            self._in_flight = {}
+        if serve == True and self._stopping():
+            os.remove(os.path.join(self.queue, STOP_FILE))
+        return self.campaigns
+
+    def serve(self):
+        """Runs queued jobs until stop() is called on the queue, see run
+
+        Returns
+        -------
+        list
+            Every Campaign added
+        """
+        if self.queue is None:
+            raise ValueError("Can't serve without a queue folder")
+        return self.run(serve=True)
+
+    def shutdown(self):
+        """Stops the workers, unless the backend was given"""
+        if self._own_executor:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
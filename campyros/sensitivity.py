@@ -0,0 +1,249 @@
+"""
+Variance based (Sobol) global sensitivity indices of the summary metrics to a campaign's random inputs.
+
+Notes
+-----
+
+- The first order index of an input is the fraction of a metric's variance it causes on its own, its total index also
+  counts its interactions with the other inputs. An input with a small total index can be fixed (or measured less
+  carefully) without changing the dispersion.
+- The indices are estimated with the Saltelli scheme: two independent designs A and B of base_runs rows each, and for
+  each input group a design AB that is A with that group's columns taken from B. That is base_runs*(groups+2) runs,
+  every one of which is used by the estimators (Saltelli 2010 for the first order indices, Jansen for the total ones).
+- Inputs can be grouped (e.g. the three thrust alignment draws), a group's indices are those of its inputs together.
+  The inputs that aren't in any group vary together as "other" so the indices still add up.
+- Confidence intervals are from bootstrapping the base runs, a failed run drops its base run from every design.
+
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from .store import CampaignStore
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+PLAN_FILE = "sensitivity.json"
+
+# Draws that are one physical input between them
+COMBINED = {"thrust_alignment": ["thrust_x", "thrust_y", "thrust_z"]}
+
+
+def input_groups(names, groups=None):
+    """Groups of design variables to find the indices of
+
+    Parameters
+    ----------
+    names : list
+        Design variables
+    groups : list or dict, optional
+        Variables each with their own index, or {group name: [variables]}. The rest are grouped as "other". Defaults
+        to None (every variable on its own, apart from those in COMBINED)
+
+    Returns
+    -------
+    dict
+        {group name: [variables]}, covering every design variable once
+    """
+    if groups is None:
+        combined = [name for members in COMBINED.values() for name in members]
+        groups = {name: [name] for name in names if name not in combined}
+        groups.update(
+            {
+                group: members
+                for group, members in COMBINED.items()
+                if all(name in names for name in members)
+            }
+        )
+    elif not isinstance(groups, dict):
+        groups = {name: [name] for name in groups}
+    grouped = [name for members in groups.values() for name in members]
+    unknown = [name for name in grouped if name not in names]
+    if len(unknown) > 0:
+        raise ValueError("%s aren't design variables" % unknown)
+    if len(set(grouped)) < len(grouped):
+        raise ValueError("A variable can only be in one group")
+    rest = [name for name in names if name not in grouped]
+    if len(rest) > 0:
+        groups = dict(groups, other=rest)
+    return groups
+
+
+def saltelli_design(a, b, columns):
+    """Design of the Saltelli scheme
+
+    Parameters
+    ----------
+    a : numpy array
+        First base design, a row per base run
+    b : numpy array
+        Second (independent) base design, the same shape
+    columns : list
+        Columns of each group
+
+    Returns
+    -------
+    numpy array
+        A, B then an AB for each group (A with the group's columns from B), stacked
+    """
+    blocks = [a, b]
+    for group in columns:
+        ab = np.array(a, dtype=float)
+        ab[:, group] = b[:, group]
+        blocks.append(ab)
+    return np.concatenate(blocks)
+
+
+def sobol_indices(a, b, ab):
+    """First order and total Sobol indices from the Saltelli scheme's evaluations
+
+    Parameters
+    ----------
+    a : numpy array
+        Metric for the A runs, shape (..., n)
+    b : numpy array
+        Metric for the B runs, shape (..., n)
+    ab : numpy array
+        Metric for each group's AB runs, shape (groups, ..., n)
+
+    Returns
+    -------
+    numpy array
+        First order index of each group, shape (groups, ...)
+    numpy array
+        Total index of each group, shape (groups, ...)
+    """
+    variance = np.var(np.concatenate([a, b], axis=-1), axis=-1)
+    first = np.mean(b * (ab - a), axis=-1) / variance
+    total = 0.5 * np.mean((a - ab) ** 2, axis=-1) / variance
+    return first, total
+
+
+def sensitivity_table(a, b, ab, names, resamples=1000, level=0.95, seed=0):
+    """Ranked table of the Sobol indices of a metric, with bootstrap confidence intervals
+
+    Parameters
+    ----------
+    a : numpy array
+        Metric for the A runs, shape (n,)
+    b : numpy array
+        Metric for the B runs, shape (n,)
+    ab : numpy array
+        Metric for each group's AB runs, shape (groups, n)
+    names : list
+        Name of each group
+    resamples : int, optional
+        Number of bootstrap resamples, defaults to 1000
+    level : float, optional
+        Confidence level, defaults to 0.95
+    seed : int, optional
+        Seed of the bootstrap, defaults to 0
+
+    Returns
+    -------
+    pandas DataFrame
+        "first" and "total" index of each group with their confidence intervals ("first_low", "first_high",
+        "total_low", "total_high"), most influential (by total index) first
+    """
+    a, b, ab = np.asarray(a, float), np.asarray(b, float), np.asarray(ab, float)
+    first, total = sobol_indices(a, b, ab)
+    resampled = np.random.default_rng(seed).integers(0, len(a), (resamples, len(a)))
+    tails = [50 * (1 - level), 50 * (1 + level)]
+    columns = {"first": first, "total": total}
+    bounds = {key: np.empty((len(names), 2)) for key in columns}
+    # A group at a time so the resamples don't take too much memory
+    for n in range(len(names)):
+        boot_first, boot_total = sobol_indices(
+            a[resampled], b[resampled], ab[n][resampled]
+        )
+        bounds["first"][n] = np.percentile(boot_first, tails)
+        bounds["total"][n] = np.percentile(boot_total, tails)
+    for key in ["first", "total"]:
+        columns["%s_low" % key] = bounds[key][:, 0]
+        columns["%s_high" % key] = bounds[key][:, 1]
+    table = pd.DataFrame(columns, index=pd.Index(names, name="input"))
+    table = table[
+        ["first", "first_low", "first_high", "total", "total_low", "total_high"]
+    ]
+    return table.sort_values("total", ascending=False)
+
+
+def write_plan(path, base_runs, groups):
+    """Stores how a sensitivity campaign's runs are laid out, next to its results
+
+    Parameters
+    ----------
+    path : string
+        Campaign folder
+    base_runs : int
+        Rows of each base design
+    groups : dict
+        {group name: [variables]}, in the order of the AB designs
+    """
+    with open(os.path.join(path, PLAN_FILE), "w") as f:
+        json.dump({"base_runs": base_runs, "groups": groups}, f, indent=4)
+
+
+def campaign_sensitivity(store, metrics=None, resamples=1000, level=0.95, seed=0):
+    """Sobol indices of the summary metrics from a stored sensitivity campaign (see write_plan)
+
+    Parameters
+    ----------
+    store : CampaignStore or string
+        The campaign or its folder
+    metrics : list, optional
+        Metrics to find the indices of, defaults to None (every stored metric, and "landing_distance", the distance
+        from the mean landing point, if the landing is stored)
+    resamples : int, optional
+        Number of bootstrap resamples, defaults to 1000
+    level : float, optional
+        Confidence level, defaults to 0.95
+    seed : int, optional
+        Seed of the bootstrap, defaults to 0
+
+    Returns
+    -------
+    dict
+        Table of each metric's indices, see sensitivity_table
+    """
+    if not isinstance(store, CampaignStore):
+        store = CampaignStore(store)
+    with open(os.path.join(store.path, PLAN_FILE)) as f:
+        plan = json.load(f)
+    n, names = plan["base_runs"], list(plan["groups"])
+    summary = store.summary()
+    if "landing_x" in summary and "landing_y" in summary:
+        summary["landing_distance"] = np.hypot(
+            summary["landing_x"] - summary["landing_x"].mean(),
+            summary["landing_y"] - summary["landing_y"].mean(),
+        )
+    if metrics is None:
+        metrics = list(summary.columns)
+    summary = summary.reindex(np.arange(1, n * (len(names) + 2) + 1))
+    tables = {}
+    for metric in metrics:
+        # A block of rows per design, dropping base runs that failed in any of them
+        values = summary[metric].to_numpy(dtype=float).reshape(len(names) + 2, n)
+        values = values[:, np.all(np.isfinite(values), axis=0)]
+        tables[metric] = sensitivity_table(
+            values[0], values[1], values[2:], names, resamples, level, seed
+        )
+    return tables
@@ -1,27 +1,28 @@
-import random, os, copy, json, warnings
+import random, os, copy, json, warnings, traceback, time
 import numpy as np
 import pandas as pd
+import scipy.stats
 from .main import *
-from .transforms import pos_i2l, vel_i2l
+from .transforms import pos_i2l, vel_i2l, i2lla, i2airspeed
+from ambiance import Atmosphere
 from .aero import *
 from .mass import *
 from .motor import *
+from .turbulence import TurbulentWind
+from .parallel import get_backend, seed_task, new_seed, chunks, run_tasks, Progress
+from .store import CampaignStore, TRAJECTORY_COLUMNS, padded, subset
+from .sampling import METHODS, design_matrix, uniform
+from .online import DispersionMonitor, StoppingRule
+from .ensemble import Ensemble, PointMass
+from .surrogate import Surrogate
+from .importance import pilot_shift, campaign_exceedance, mixture, shifted_design
+from .catalog import Catalog
+from .sensitivity import input_groups, saltelli_design, write_plan, campaign_sensitivity
 
 from .plot import *
 from datetime import datetime
 from datetime import date
 
-try:
-    import ray
-
-    RAY_AVAILABLE = True
-except:
-    RAY_AVAILABLE = False
-    import os, sys
-
-    sys.path.append(os.path.dirname(__file__))
-    import ray_alt as ray
-
 
 __copyright__ = """
 
@@ -43,6 +44,30 @@ __copyright__ = """
 """
 
 
+ENGINES = ["single", "ensemble"]
+# Limits on each run, see Rocket.run
+BUDGETS = ["max_steps", "max_evaluations", "max_wall_time"]
+
+SUMMARY_METRICS = [
+    "apogee_x",
+    "apogee_y",
+    "apogee_alt",
+    "apogee_time",
+    "landing_x",
+    "landing_y",
+    "landing_time",
+    "max_mach",
+    "max_q",
+    "rail_exit_velocity",
+]
+
+# Positions the dispersion is estimated for by multi_fidelity_estimate
+DISPERSION = {
+    "landing": ["landing_x", "landing_y"],
+    "apogee": ["apogee_x", "apogee_y", "apogee_alt"],
+}
+
+
 def variable_name(**variables):
     return [x for x in variables][0]
 
@@ -58,7 +83,9 @@ class StatisticalModel:
     -----
     Every variable specified has a value and a standard deviation in a list (i.e. [mean,st_dev])
     Currenrly only supports aero import from rasaero file.
-    Wind will currently not vary
+    If launch_site has "ensemble_members" each run uses a randomly selected member of the GEFS ensemble forcast (see EnsembleWind),
+    otherwise the forcast wind does not vary. If the run file has a "turbulence" section (arguments for TurbulentWind, e.g. {"model":"dryden","W20":7.7})
+    each run gets its own random gust profile on top of it
 
     Parameters
     ----------
@@ -73,6 +100,8 @@ class StatisticalModel:
         Dictionary of variables for mass model object. Must contain: dry_mass, prop_mass, time_data, length, radius
     aero_file : string
         Location of RASAero data file
+    aero_base : AeroData
+        Unpeterbed aero data, parsed once and each run uses a cheap perturbed copy (see AeroData.perturbed)
     aero_error : dict
         Standard deviaiton for the aero coefficients in format COP, CN and CA
     motor_base : MotorObject
@@ -87,8 +116,9 @@ class StatisticalModel:
         Date for forcast data in format YYYYMMDD, defaults to current date
     forcast_time : string, optional
         Forcast run time, must be 00,06,12 or 18, defaults to 00
-    forcast_plus_time : string, optional
-        Hours forcast forward from forcast time, must be three digits between 000 and 123 (?), defaults to 000
+    forcast_plus_time : string or list, optional
+        Hours forcast forward from forcast time, must be three digits between 000 and 123 (?), defaults to 000.
+        A list of hours interpolates the wind in time, starting from the optional "launch_time" (hours after the forcast run)
     thrust_error : float
         Standard deviation of thrust magnitude error /%
     thrust_alignment : float
@@ -101,7 +131,41 @@ class StatisticalModel:
     type_name : list
         The different types of errors to itterate over later
     wind_base : wind object
-        Unpeterbed wind model
+        Unpeterbed wind model, an EnsembleWind (memory mapped so workers share it) if "ensemble_members" is set
+    turbulence : dict or None
+        Arguments for the TurbulentWind added to each run, None for no turbulence
+    metrics : list
+        Summary metrics stored for every run, from SUMMARY_METRICS. Set by "metrics" in the optional "output" section,
+        defaults to all of them
+    trajectories : string, list or float
+        Runs to store the full trajectory of, "all", "none", a list of run numbers or the fraction of runs to store
+        (chosen at random). Set by "trajectories" in the optional "output" section, defaults to "all"
+    convergence : StoppingRule or None
+        Stops the campaign early once the landing statistics have converged, from the optional "convergence" section
+        (arguments of campyros.online.StoppingRule). itterations is then the most runs that will be done. Can't be used
+        with importance sampling, as the landing statistics it checks aren't weighted
+    sampling : string
+        How the random draws are sampled, "random", "sobol" (scrambled) or "latin_hypercube" (see campyros.sampling).
+        Set by the optional "sampling" entry, defaults to "random"
+    design_variables : list
+        Names of the random draws each run makes, the columns of the design matrix
+    design : numpy array or None
+        Standard normal draws for every run, a row per run and a column per design variable. Generated by run_model,
+        runs without a row (e.g. run_itteration called directly) draw their own
+    engine : string
+        "single" runs each rocket on its own with Rocket.run, "ensemble" runs each chunk of runs together with
+        campyros.ensemble.Ensemble, which is much faster for big chunks. Set by the optional "engine" entry, defaults
+        to "single"
+    budget : dict
+        Limits on each run, {"max_steps": accepted steps, "max_evaluations": evaluations of the equations of motion,
+        "max_wall_time": seconds of real time} (any of them, see Rocket.run). A run that uses up its budget is stopped
+        and recorded as failed rather than holding up the campaign. With the ensemble engine a run's wall time is its
+        share of its chunk's (see Ensemble.run). Set by the optional "budget" entry, defaults to no limits
+    importance : dict or None
+        Importance sampling distribution of the design, {"shift": mean of each shifted draw in each component,
+        "fractions": share of each component, "defensive": fraction of the runs that aren't shifted} (see
+        campyros.importance.mixture), or None for plain sampling. Set by the optional "importance" entry or
+        plan_importance, defaults to None
     """
 
     def __init__(self, run_file):
@@ -118,92 +182,380 @@ class StatisticalModel:
         self.launch_site_vars = data["launch_site"]
         self.aero_file = data["aero_file"]
         self.aero_vars = data["aero"]
+        # Parsed once, each run only perturbs a copy
+        self.aero_base = AeroData.from_rasaero(
+            self.aero_file, self.aero_vars["ref_area"][0]
+        )
         self.parachute_vars = data["parachute"]
         self.enviromental = data["enviromental"]
         self.thrust_error = data["thrust_error"]
         self.mass_vars = data["mass"]
+        self.turbulence = data.get("turbulence")
+        output = data.get("output", {})
+        self.metrics = output.get("metrics", SUMMARY_METRICS)
+        unknown = [name for name in self.metrics if name not in SUMMARY_METRICS]
+        if len(unknown) > 0:
+            raise ValueError(
+                "Unknown summary metrics %s, must be from %s"
+                % (unknown, SUMMARY_METRICS)
+            )
+        self.trajectories = output.get("trajectories", "all")
+        if "convergence" in data:
+            self.convergence = StoppingRule(**data["convergence"])
+        else:
+            self.convergence = None
+        self.sampling = data.get("sampling", "random")
+        if self.sampling not in METHODS:
+            raise ValueError(
+                "Sampling must be one of %s, not %s" % (METHODS, self.sampling)
+            )
 
-        self.wind_base = Wind(
-            self.launch_site_vars["long"][0],
-            self.launch_site_vars["lat"][0],
-            variable=bool(self.launch_site_vars["variable_wind"]),
-            run_date=self.launch_site_vars["run_date"],
-            forcast_time=self.launch_site_vars["run_time"],
-            forcast_plus_time=self.launch_site_vars["run_plus_time"],
-            fast=self.launch_site_vars["fast_wind"],
-        )
+        self.engine = data.get("engine", "single")
+        if self.engine not in ENGINES:
+            raise ValueError(
+                "Engine must be one of %s, not %s" % (ENGINES, self.engine)
+            )
+        self.budget = data.get("budget", {})
+        unknown = [name for name in self.budget if name not in BUDGETS]
+        if len(unknown) > 0:
+            raise ValueError("Unknown budgets %s, must be from %s" % (unknown, BUDGETS))
+
+        self.ensemble_members = self.launch_site_vars.get("ensemble_members")
+        if self.ensemble_members is not None:
+            self.wind_base = EnsembleWind(
+                self.launch_site_vars["long"][0],
+                self.launch_site_vars["lat"][0],
+                members=self.ensemble_members,
+                run_date=self.launch_site_vars["run_date"],
+                forcast_time=self.launch_site_vars["run_time"],
+                forcast_plus_time=self.launch_site_vars["run_plus_time"],
+            )
+        else:
+            self.wind_base = load_wind(
+                self.launch_site_vars["long"][0],
+                self.launch_site_vars["lat"][0],
+                forcast_plus_time=self.launch_site_vars["run_plus_time"],
+                launch_time=self.launch_site_vars.get("launch_time"),
+                variable=bool(self.launch_site_vars["variable_wind"]),
+                run_date=self.launch_site_vars["run_date"],
+                forcast_time=self.launch_site_vars["run_time"],
+                fast=self.launch_site_vars["fast_wind"],
+            )
+        # Download (and for an ensemble, build the shared array) once here rather than in every run
+        self.wind_base.preload()
 
         print(data["motor_file"])
-        self.motor_data = load_motor(data["motor_file"])
+        # numpy arrays rather than pandas series so the mass model interpolation is fast
+        self.motor_data = {
+            key: value.to_numpy() if isinstance(value, pd.Series) else value
+            for key, value in load_motor(data["motor_file"]).items()
+        }
         self.motor_base = Motor.from_novus(data["motor_file"], pos=data["motor_pos"])
+        self.design_variables = self._design_variables()
+        self.design = None
+        self.importance = data.get("importance")
+        if self.importance is not None:
+            unknown = [
+                name
+                for name in self.importance["shift"]
+                if name not in self.design_variables
+            ]
+            if len(unknown) > 0:
+                raise ValueError(
+                    "Can't shift %s, they aren't design variables" % unknown
+                )
+
+    def _design_variables(self):
+        """Names of the random draws of a run, roughly the most influential first since low discrepancy sequences
+        cover their first dimensions best"""
+        names = ["thrust"]
+        if self.ensemble_members is not None:
+            names.append("ensemble_member")
+        if self.turbulence is not None:
+            names.append("turbulence_seed")
+        names += ["parachute_failed", "CA", "CN", "COP", "rail_yaw", "rail_pitch"]
+        names += [
+            "dry_mass",
+            "rocket_length",
+            "rocket_radius",
+            "rocket_wall_thickness",
+            "pos_tank_bottom",
+            "pos_solidfuel_bottom",
+            "ref_area",
+            "area_per_fin",
+            "lmass",
+            "lden",
+            "vmass",
+            "vden",
+            "smass",
+            "sden",
+            "rail_length",
+            "alt",
+            "long",
+            "lat",
+            "main_s",
+            "main_c_d",
+            "drogue_s",
+            "drogue_c_d",
+            "main_alt",
+            "attatch_distance",
+        ]
+        names += list(self.enviromental)
+        names += ["thrust_x", "thrust_y", "thrust_z"]
+        return names
+
+    def design_rows(self, n, start=0):
+        """Rows of the campaign's design matrix, from its sampling method and importance sampling distribution
+
+        Parameters
+        ----------
+        n : int
+            Number of rows
+        start : int, optional
+            Row to start from (random and Sobol rows don't depend on how many were generated), defaults to 0
+
+        Returns
+        -------
+        numpy array
+            Draws, a row per run
+        """
+        design = design_matrix(
+            n, len(self.design_variables), self.sampling, self.seed, start=start
+        )
+        if self.importance is None:
+            return design
+        columns, shifts, fractions = mixture(self.importance, self.design_variables)
+        return shifted_design(
+            design,
+            columns,
+            shifts,
+            fractions,
+            self.importance["defensive"],
+            self.seed,
+            start=start,
+        )
+
+    def draws(self, id):
+        """Standard normal draws for a run, its row of the design matrix
+
+        Parameters
+        ----------
+        id : int
+            Run number
 
-    @ray.remote
-    def run_itteration(self, id, save_loc, debug=False):
+        Returns
+        -------
+        dict
+            Draw for each design variable
+        """
+        if self.design is not None and id <= len(self.design):
+            row = self.design[id - 1]
+        else:
+            row = np.random.standard_normal(len(self.design_variables))
+        return dict(zip(self.design_variables, row))
+
+    def __getstate__(self):
+        # The monitor (and its figure) from a previous campaign isn't needed by the workers
+        state = self.__dict__.copy()
+        state.pop("monitor", None)
+        return state
+
+    def keep_trajectory(self, id, seed):
+        """Whether to store the full trajectory of a run, see the trajectories attribute
+
+        Parameters
+        ----------
+        id : int
+            Run number
+        seed : int
+            Campaign seed, used to pick the runs when storing a fraction of them
+
+        Returns
+        -------
+        bool
+            True if the trajectory should be stored
+        """
+        if self.trajectories == "all":
+            return True
+        elif self.trajectories == "none":
+            return False
+        elif isinstance(self.trajectories, list):
+            return id in self.trajectories
+        # A generator of its own so the choice doesn't change the run's draws
+        return np.random.default_rng([seed, id, 1]).random() < self.trajectories
+
+    def run_itteration(self, id, debug=False, trajectory=True):
         """Runs an instance of the rocket with random errors
 
         Note
         ----
-        Assumes gaussian errors for all variables, wind currenly not varied.
+        Assumes gaussian errors for all variables, wind is varied by the ensemble member and turbulence if they are set up.
+        The draws are the run's row of the design matrix (see draws). A run stopped by its budget (see the budget
+        attribute) raises BudgetExceeded, so a campaign records it as failed.
 
         Parameters
         ----------
         id : int
-            Run number, used to name runs output
-        save_loc : string
-            Folder to store results
+            Run number
+        debug : bool, optional
+            Passed to Rocket.run, defaults to False
+        trajectory : bool, optional
+            Return the full trajectory, otherwise only the summary, defaults to True
+
+        Returns
+        -------
+        dict
+            Sampled input parameters, multipliers for the ones given as relative errors
+        dict
+            Summary metrics listed in the metrics attribute, see flight_summary
+        numpy array or None
+            Trajectory in the launch frame, columns as campyros.store.TRAJECTORY_COLUMNS
         """
-        motor = copy.copy(self.motor_base)
-        thrust_e = np.random.normal(1, self.thrust_error["magnitude"])
-        motor.thrust_array = [t * thrust_e for t in motor.thrust_array]
+        inputs, rocket = self.build_rocket(id)
+        run_output = rocket.run(debug=debug, **self.budget)
+        status = run_output.attrs["status"]
+        if status.budget_exceeded:
+            raise BudgetExceeded(
+                status,
+                "Run %s stopped at t=%.2f s after %s steps and %s evaluations, its %s budget was used up"
+                % (
+                    id,
+                    rocket.time,
+                    run_output.attrs["steps"],
+                    run_output.attrs["evaluations"],
+                    status.value,
+                ),
+            )
+        summary, out = self.run_outputs(rocket, run_output, trajectory)
+        return inputs, summary, out
 
-        wind = copy.copy(self.wind_base)  # Wind variability coming soon
+    def run_ensemble(self, ids, seed, debug=False, trajectories=None, point_mass=False):
+        """Runs several instances of the rocket together with campyros.ensemble.Ensemble
 
-        dry_mass = self.mass_vars["dry_mass"][0] * np.random.normal(
-            1, self.mass_vars["dry_mass"][1]
-        )
-        rocket_length = self.mass_vars["rocket_length"][0] * np.random.normal(
-            1, self.mass_vars["rocket_length"][1]
-        )
-        rocket_radius = self.mass_vars["rocket_radius"][0] * np.random.normal(
-            1, self.mass_vars["rocket_radius"][1]
-        )
-        rocket_wall_thickness = self.mass_vars["rocket_wall_thickness"][
-            0
-        ] * np.random.normal(1, self.mass_vars["rocket_wall_thickness"][1])
-        pos_tank_bottom = self.mass_vars["pos_tank_bottom"][0] * np.random.normal(
-            1, self.mass_vars["pos_tank_bottom"][1]
-        )
+        Note
+        ----
+        The global random state is seeded for each run as it is built, so the inputs are the same as run_itteration's.
+        With point_mass=True the runs are the cheap 3-DOF approximation (campyros.ensemble.PointMass) used as the low
+        fidelity model of run_multi_fidelity
+
+        Parameters
+        ----------
+        ids : list
+            Run numbers
+        seed : int
+            Campaign seed
+        debug : bool, optional
+            Passed to Ensemble.run, defaults to False
+        trajectories : list, optional
+            Whether to return the full trajectory of each run, defaults to None (all of them)
+        point_mass : bool, optional
+            Run point masses rather than the full 6-DOF rockets, defaults to False
+
+        Returns
+        -------
+        dict
+            (inputs, summary, trajectory) for each run number that succeeded, as run_itteration
+        dict
+            Error message for each run number that failed
+        """
+        if trajectories is None:
+            trajectories = [True] * len(ids)
+        built, errors = [], {}
+        for id, trajectory in zip(ids, trajectories):
+            seed_task(seed, id)
+            try:
+                built.append((id, trajectory) + self.build_rocket(id))
+            except Exception:
+                errors[id] = traceback.format_exc()
+        engine = PointMass if point_mass == True else Ensemble
+        ensemble = engine([rocket for _, _, _, rocket in built])
+        results = {}
+        outputs = ensemble.run(debug=debug, **self.budget)
+        for n, run_output in enumerate(outputs):
+            id, trajectory, inputs, rocket = built[n]
+            if run_output is None:
+                errors[id] = ensemble.failures[n]
+                continue
+            try:
+                summary, out = self.run_outputs(rocket, run_output, trajectory)
+            except Exception:
+                errors[id] = traceback.format_exc()
+                continue
+            results[id] = (inputs, summary, out)
+        return results, errors
+
+    def build_rocket(self, id):
+        """Makes the randomly perturbed rocket for a run, without running it
+
+        Parameters
+        ----------
+        id : int
+            Run number
+
+        Returns
+        -------
+        dict
+            Sampled input parameters, multipliers for the ones given as relative errors
+        Rocket
+            The rocket, ready to run
+        """
+        z = self.draws(id)
+        inputs = {}
+        inputs["thrust"] = 1 + self.thrust_error["magnitude"] * z["thrust"]
+        motor = self.motor_base.perturbed(inputs["thrust"])
+
+        for name in [
+            "dry_mass",
+            "rocket_length",
+            "rocket_radius",
+            "rocket_wall_thickness",
+            "pos_tank_bottom",
+        ]:
+            inputs[name] = self.mass_vars[name][0] * (
+                1 + self.mass_vars[name][1] * z[name]
+            )
+        dry_mass = inputs["dry_mass"]
+        rocket_length = inputs["rocket_length"]
+        rocket_radius = inputs["rocket_radius"]
+        rocket_wall_thickness = inputs["rocket_wall_thickness"]
+        pos_tank_bottom = inputs["pos_tank_bottom"]
         s_l = (
             self.motor_data["s_l"] * rocket_length / self.mass_vars["rocket_length"][0]
         )  # Solid fuel length
         pos_solidfuel_bottom = (
             self.mass_vars["pos_solidfuel_bottom_base"][0]
-            * np.random.normal(1, self.mass_vars["pos_solidfuel_bottom_base"][1])
+            * (
+                1
+                + self.mass_vars["pos_solidfuel_bottom_base"][1]
+                * z["pos_solidfuel_bottom"]
+            )
             + s_l
         )  # m - Distance between the nose tip and bottom of the solid fuel grain
-        ref_area = self.aero_vars["ref_area"][0] * np.random.normal(
-            1, self.aero_vars["ref_area"][1]
+        inputs["pos_solidfuel_bottom"] = pos_solidfuel_bottom
+        inputs["ref_area"] = self.aero_vars["ref_area"][0] * (
+            1 + self.aero_vars["ref_area"][1] * z["ref_area"]
         )
 
         ###Aero
+        inputs["area_per_fin"] = self.aero_vars["area_per_fin"][0] * (
+            1 + self.aero_vars["area_per_fin"][1] * z["area_per_fin"]
+        )
         c_damp_pitch = pitch_damping_coefficient(
             rocket_length,
             rocket_radius,
             fin_number=self.aero_vars["fins"],
-            area_per_fin=self.aero_vars["area_per_fin"][0]
-            * np.random.normal(1, self.aero_vars["area_per_fin"][1]),
+            area_per_fin=inputs["area_per_fin"],
         )
         c_damp_roll = 0
-        aero_data = AeroData.from_rasaero(
-            self.aero_file,
-            ref_area,
-            c_damp_pitch,
-            c_damp_roll,
-            error={
-                "CN": np.random.normal(1, self.aero_vars["CN"]),
-                "CA": np.random.normal(1, self.aero_vars["CA"]),
-                "COP": np.random.normal(1, self.aero_vars["COP"]),
-            },
+        error = {
+            name: 1 + self.aero_vars[name] * z[name] for name in ["CN", "CA", "COP"]
+        }
+        inputs.update(error)
+        aero_data = self.aero_base.perturbed(
+            ref_area=inputs["ref_area"],
+            pitch_damping_coefficient=c_damp_pitch,
+            roll_damping_coefficient=c_damp_roll,
+            error=error,
         )
 
         ###Mass
@@ -215,89 +567,121 @@ class StatisticalModel:
             rocket_length,
             rocket_length / 2,
         )
+        for name in ["lmass", "lden", "vmass", "vden", "smass", "sden"]:
+            inputs[name] = 1 + self.mass_vars[name] * z[name]
         mass_model.add_liquidtank(
-            self.motor_data["lmass"] * np.random.normal(1, self.mass_vars["lmass"]),
-            self.motor_data["lden"] * np.random.normal(1, self.mass_vars["lden"]),
+            self.motor_data["lmass"],
+            self.motor_data["lden"],
             self.motor_data["time"],
             rocket_radius,
             pos_tank_bottom,
-            self.motor_data["vmass"] * np.random.normal(1, self.mass_vars["vmass"]),
-            self.motor_data["vden"] * np.random.normal(1, self.mass_vars["vden"]),
+            self.motor_data["vmass"],
+            self.motor_data["vden"],
+            lmass_scale=inputs["lmass"],
+            lden_scale=inputs["lden"],
+            vmass_scale=inputs["vmass"],
+            vden_scale=inputs["vden"],
         )
         mass_model.add_solidfuel(
-            self.motor_data["smass"] * np.random.normal(1, self.mass_vars["smass"]),
+            self.motor_data["smass"],
             self.motor_data["time"],
-            self.motor_data["sden"] * np.random.normal(1, self.mass_vars["sden"]),
+            self.motor_data["sden"] * inputs["sden"],
             self.motor_data["s_rout"]
             * rocket_radius
             / self.mass_vars["rocket_radius"][0],
             s_l,
             pos_solidfuel_bottom,
+            mass_scale=inputs["smass"],
         )
 
         ###Launchsite
+        if self.ensemble_members is not None:
+            inputs["ensemble_member"] = int(
+                uniform(z["ensemble_member"]) * self.ensemble_members
+            )
+            wind = self.wind_base.select(inputs["ensemble_member"])
+        else:
+            wind = self.wind_base
         if (
             self.launch_site_vars["rail_yaw"][0] == 0
             and self.launch_site_vars["rail_pitch"][0] == 0
         ):
-            rail_yaw = 2 * np.pi * np.random.rand()
-            rail_pitch = np.random.normal(1, self.launch_site_vars["rail_pitch"][1])
-        else:
-            rail_yaw = self.launch_site_vars["rail_yaw"][0] * np.random.normal(
-                1, self.launch_site_vars["rail_yaw"][1]
+            inputs["rail_yaw"] = 2 * np.pi * uniform(z["rail_yaw"])
+            inputs["rail_pitch"] = (
+                1 + self.launch_site_vars["rail_pitch"][1] * z["rail_pitch"]
             )
-            rail_pitch = self.launch_site_vars["rail_pitch"][0] * np.random.normal(
-                1, self.launch_site_vars["rail_pitch"][1]
+        else:
+            for name in ["rail_yaw", "rail_pitch"]:
+                inputs[name] = self.launch_site_vars[name][0] * (
+                    1 + self.launch_site_vars[name][1] * z[name]
+                )
+        inputs["rail_length"] = self.launch_site_vars["rail_length"][0] * (
+            1 + self.launch_site_vars["rail_length"][1] * z["rail_length"]
+        )
+        # Not sure this is the correct way to make it >0 and still normally distrobuted, probably clusters just above 0
+        inputs["alt"] = abs(
+            self.launch_site_vars["alt"][0]
+            * (1 + self.launch_site_vars["alt"][1] * z["alt"])
+        )
+        for name in ["long", "lat"]:
+            inputs[name] = self.launch_site_vars[name][0] * (
+                1 + self.launch_site_vars[name][1] * z[name]
             )
         launch_site = LaunchSite(
-            rail_length=self.launch_site_vars["rail_length"][0]
-            * np.random.normal(1, self.launch_site_vars["rail_length"][1]),
-            rail_yaw=rail_yaw,
-            rail_pitch=rail_pitch,
-            alt=abs(
-                self.launch_site_vars["alt"][0]
-                * np.random.normal(1, self.launch_site_vars["alt"][1])
-            ),  # Not sure this is the correct way to make it >0 and still normally distrobuted, probably clusters just above 0
-            longi=self.launch_site_vars["long"][0]
-            * np.random.normal(1, self.launch_site_vars["long"][1]),
-            lat=self.launch_site_vars["lat"][0]
-            * np.random.normal(1, self.launch_site_vars["lat"][1]),
-            variable_wind=bool(self.launch_site_vars["variable_wind"]),
-            run_date=self.launch_site_vars["run_date"],
-            forcast_plus_time=self.launch_site_vars["run_plus_time"],
-            forcast_time=self.launch_site_vars["run_time"],
-            fast_wind=bool(self.launch_site_vars["fast_wind"]),
+            rail_length=inputs["rail_length"],
+            rail_yaw=inputs["rail_yaw"],
+            rail_pitch=inputs["rail_pitch"],
+            alt=inputs["alt"],
+            longi=inputs["long"],
+            lat=inputs["lat"],
+            wind=wind,
         )
+        if self.turbulence is not None:
+            launch_site.wind = TurbulentWind(
+                launch_site.wind,
+                seed=int(uniform(z["turbulence_seed"]) * 2 ** 31),
+                **self.turbulence,
+            )
 
         ###Parachute
-        if np.random.binomial(1, self.parachute_vars["failure_rate"]) == 0:
+        parachute_names = [
+            "main_s",
+            "main_c_d",
+            "drogue_s",
+            "drogue_c_d",
+            "main_alt",
+            "attatch_distance",
+        ]
+        inputs["parachute_failed"] = int(
+            uniform(z["parachute_failed"]) < self.parachute_vars["failure_rate"]
+        )
+        if inputs["parachute_failed"] == 0:
+            for name in parachute_names:
+                inputs[name] = self.parachute_vars[name][0] * (
+                    1 + self.parachute_vars[name][1] * z[name]
+                )
             parachute = Parachute(
-                main_s=self.parachute_vars["main_s"][0]
-                * np.random.normal(1, self.parachute_vars["main_s"][1]),
-                main_c_d=self.parachute_vars["main_c_d"][0]
-                * np.random.normal(1, self.parachute_vars["main_c_d"][1]),
-                drogue_s=self.parachute_vars["drogue_s"][0]
-                * np.random.normal(1, self.parachute_vars["drogue_s"][1]),
-                drogue_c_d=self.parachute_vars["drogue_c_d"][0]
-                * np.random.normal(1, self.parachute_vars["drogue_c_d"][1]),
-                main_alt=self.parachute_vars["main_alt"][0]
-                * np.random.normal(1, self.parachute_vars["main_alt"][1]),
-                attach_distance=self.parachute_vars["attatch_distance"][0]
-                * np.random.normal(1, self.parachute_vars["attatch_distance"][1]),
+                main_s=inputs["main_s"],
+                main_c_d=inputs["main_c_d"],
+                drogue_s=inputs["drogue_s"],
+                drogue_c_d=inputs["drogue_c_d"],
+                main_alt=inputs["main_alt"],
+                attach_distance=inputs["attatch_distance"],
             )
         else:
+            inputs.update({name: np.nan for name in parachute_names})
             parachute = Parachute(0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
 
-        env_errors = {k: np.random.normal(1, v) for k, v in self.enviromental.items()}
+        env_errors = {k: 1 + v * z[k] for k, v in self.enviromental.items()}
+        inputs.update(env_errors)
 
-        thrust_alignment = np.array(
-            [
-                np.random.normal(1, self.thrust_error["alignment"]),
-                np.random.normal(0, self.thrust_error["alignment"]),
-                np.random.normal(0, self.thrust_error["alignment"]),
-            ]
-        )
+        thrust_alignment = np.array([1.0, 0.0, 0.0]) + self.thrust_error[
+            "alignment"
+        ] * np.array([z["thrust_x"], z["thrust_y"], z["thrust_z"]])
         thrust_alignment = thrust_alignment / np.linalg.norm(thrust_alignment)
+        inputs.update(
+            {"thrust_%s" % axis: v for axis, v in zip("xyz", thrust_alignment)}
+        )
 
         rocket = Rocket(
             mass_model,
@@ -311,91 +695,1134 @@ class StatisticalModel:
             errors=env_errors,
             thrust_vector=thrust_alignment,
         )
+        return inputs, rocket
+
+    def run_outputs(self, rocket, run_output, trajectory=True):
+        """Summary metrics and trajectory of a run
+
+        Parameters
+        ----------
+        rocket : Rocket
+            The rocket that was run
+        run_output : pandas dataframe or dict
+            Output of Rocket.run, or of Ensemble.run for the rocket
+        trajectory : bool, optional
+            Return the full trajectory, otherwise only the summary, defaults to True
+
+        Returns
+        -------
+        dict
+            Summary metrics listed in the metrics attribute, see flight_summary
+        numpy array or None
+            Trajectory in the launch frame, columns as campyros.store.TRAJECTORY_COLUMNS
+        """
+        time = np.asarray(run_output["time"], dtype=float)
+        positions = pos_i2l(np.stack(run_output["pos_i"]), rocket.launch_site, time)
+        summary = flight_summary(rocket, run_output, positions, self.metrics)
+        if trajectory == False:
+            return summary, None
 
-        run_output = rocket.run(debug=debug)
-        run_save = pd.DataFrame()
-        run_save["time"] = run_output["time"]
-        x, y, z = [], [], []
-        v_x, v_y, v_z = [], [], []
+        out = np.zeros((len(run_output["time"]), len(TRAJECTORY_COLUMNS)))
+        out[:, 0] = run_output["time"]
+        out[:, 1:4] = positions
+        out[:, 4:7] = vel_i2l(np.stack(run_output["vel_i"]), rocket.launch_site, time)
+        return summary, out
 
-        for index, pos in enumerate(run_output["pos_i"]):
-            pos_l = pos_i2l(pos, rocket.launch_site, run_output["time"][index])
-            x.append(pos_l[0])
-            y.append(pos_l[1])
-            z.append(pos_l[2])
+    def _resume(self, store, manifest, seed=None, itterations=None, design=None):
+        """Picks up the seed and design of a stored campaign, extending the design if there are now more itterations
+        (or checking it's the one given)"""
+        if seed is not None and seed != manifest["seed"]:
+            raise ValueError(
+                "Can't resume %s with seed %s, it was run with seed %s"
+                % (self.name, seed, manifest["seed"])
+            )
+        current = {
+            "sampling": self.sampling,
+            "design_variables": self.design_variables,
+            "importance": self.importance,
+        }
+        for key, value in current.items():
+            if manifest.get(key) != value:
+                raise ValueError(
+                    "Can't resume %s, its %s has changed from %s to %s"
+                    % (self.name, key, manifest.get(key), value)
+                )
+        self.seed = manifest["seed"]
+        self.design = store.design().to_numpy()
+        if design is not None:
+            if not np.array_equal(design, self.design):
+                raise ValueError("Can't resume %s, its design has changed" % self.name)
+            return
+        itterations = self.itterations if itterations is None else itterations
+        if itterations > len(self.design):
+            extra = self.design_rows(
+                itterations - len(self.design), start=len(self.design)
+            )
+            self.design = np.concatenate([self.design, extra])
+
+    def start_campaign(self, store, seed=None, resume=False, design=None):
+        """Sets the seed and design of a campaign and stores them with its manifest, the first step of run_model
+
+        Parameters
+        ----------
+        store : CampaignStore
+            Where the campaign is stored, cleared unless resuming
+        seed : int, optional
+            Campaign seed, defaults to None (random, or the stored one if resuming)
+        resume : bool, optional
+            Carry on with the campaign already stored (if there is one), defaults to False
+        design : numpy array, optional
+            Standard normal draws to run instead of generating the design, defaults to None
 
-            vel_l = vel_i2l(
-                run_output["vel_i"][index],
-                rocket.launch_site,
-                run_output["time"][index],
+        Returns
+        -------
+        set
+            Run numbers already stored
+        """
+        if self.importance is not None and self.convergence is not None:
+            # The monitor's landing statistics are unweighted, so they'd be of the shifted distribution
+            raise ValueError(
+                "Can't check convergence of an importance sampled campaign, set convergence to None"
             )
-            v_x.append(vel_l[0])
-            v_y.append(vel_l[1])
-            v_z.append(vel_l[2])
-
-        run_save["x"] = x
-        run_save["y"] = y
-        run_save["z"] = z
-        run_save["v_x"] = v_x
-        run_save["v_y"] = v_y
-        run_save[
-            "v_z"
-        ] = v_z  # These were'nt saving properly as vectors but really should
-
-        with open("%s/%s.csv" % (save_loc, id), "w+") as f:
-            run_save.to_csv(path_or_buf=f)
-
-        self.wind_base = copy.copy(
-            launch_site.wind
-        )  # incase more data has been downloaded
-
-    def run_model(self, test_mode=False, debug=False, num_cpus=False):
+        if design is None:
+            itterations = self.itterations
+        else:
+            if self.importance is not None:
+                raise ValueError("Can't importance sample a given design")
+            design = np.asarray(design, dtype=float)
+            itterations = len(design)
+        manifest = store.manifest() if resume == True else None
+        if manifest is None:
+            # A new campaign replaces anything stored under the same name
+            store.clear()
+            self.seed = new_seed() if seed is None else seed
+            if design is None:
+                self.design = self.design_rows(itterations)
+            else:
+                self.design = design
+            done = set()
+        else:
+            self._resume(store, manifest, seed, itterations, design)
+            done = set(store.completed())
+        store.write_design(self.design, self.design_variables, self.sampling)
+        store.write_manifest(
+            {
+                "name": self.name,
+                "seed": int(self.seed),
+                "sampling": self.sampling,
+                "design_variables": self.design_variables,
+                "itterations": len(self.design),
+                "importance": self.importance,
+            }
+        )
+        return done
+
+    def _chunksize(self, runs, workers):
+        """Default number of runs sent to a worker at a time, about four chunks per worker
+
+        Parameters
+        ----------
+        runs : int
+            Number of runs to do
+        workers : int
+            Number of workers
+
+        Returns
+        -------
+        int
+            Chunk size
+        """
+        chunksize = max(1, runs // (4 * workers))
+        if self.convergence is not None:
+            # Small enough chunks that the checks aren't delayed by much
+            chunksize = max(1, min(chunksize, self.convergence.check_every // workers))
+        return chunksize
+
+    def _begin_monitor(self, store, reservoir_size=20):
+        """Resets the failures, monitor and convergence of a campaign, with the runs already stored in the monitor
+
+        Parameters
+        ----------
+        store : CampaignStore
+            Where the campaign is stored
+        reservoir_size : int, optional
+            Number of trajectories to keep in self.monitor, defaults to 20
+
+        Returns
+        -------
+        int
+            Number of runs already stored
+        """
+        self.failures = {}
+        self.monitor = DispersionMonitor(reservoir_size, seed=self.seed)
+        self.converged = False
+        stored = len(store.completed())
+        if self.convergence is not None:
+            # The checks count from the start of this campaign
+            self.convergence.checked = 0
+        if stored > 0:
+            for summary in store.summary().to_dict("records"):
+                self.monitor.update(summary)
+            if self.convergence is not None and self.convergence.due(stored):
+                self.converged = self.convergence.check(self.monitor, stored)
+        return stored
+
+    def _progress(self, runs, progress=True, live=False):
+        """Progress tracker of a campaign, reporting the dispersion with each line
+
+        Parameters
+        ----------
+        runs : int
+            Number of runs to do
+        progress : bool or callable, optional
+            Print progress, or a function to call with each progress line, defaults to True
+        live : bool, optional
+            Plot the dispersion every time progress is reported, defaults to False
+
+        Returns
+        -------
+        Progress or None
+            The tracker, None if progress is False
+        """
+        if progress == False:
+            return None
+        stream = print if progress == True else progress
+
+        def report(line):
+            stream("%s, %s" % (line, self.monitor.report()))
+            if live == True:
+                self.monitor.plot()
+
+        return Progress(runs, name="%s runs" % self.name, stream=report)
+
+    def _record_chunk(self, ids, result, error, finished, tracker=None):
+        """Keeps the results of a finished chunk in the monitor and failures, and checks for convergence
+
+        Parameters
+        ----------
+        ids : list
+            Run numbers of the chunk
+        result : tuple or None
+            What run_chunk returned, None if the chunk failed as a whole
+        error : string or None
+            Why the chunk failed as a whole
+        finished : int
+            Runs of the campaign finished before this chunk (including failures and those already stored)
+        tracker : Progress, optional
+            Progress tracker, defaults to None
+
+        Returns
+        -------
+        int
+            Runs finished including this chunk
+        """
+        if error is not None:
+            errors = {id: error for id in ids}
+        else:
+            errors, summaries, trajectories = result
+            for id, summary in summaries.items():
+                self.monitor.update(summary, trajectories.get(id))
+        finished += len(errors)
+        self.failures.update(
+            {id: message for id, message in errors.items() if message is not None}
+        )
+        if (
+            self.convergence is not None
+            and not self.converged
+            and self.convergence.due(finished)
+        ):
+            self.converged = self.convergence.check(self.monitor, finished)
+            if self.converged == True and tracker is not None:
+                tracker.stream(
+                    "%s converged after %s runs: %s"
+                    % (self.name, finished, self.convergence.reason)
+                )
+        if tracker is not None:
+            tracker.update(
+                len(errors), sum(message is not None for message in errors.values())
+            )
+        return finished
+
+    def _finish_campaign(self, store, runs, stored, finished, stopped=False):
+        """Compacts a campaign's store and reports whether it converged and which runs failed
+
+        Parameters
+        ----------
+        store : CampaignStore
+            Where the campaign is stored
+        runs : int
+            Number of runs there were to do
+        stored : int
+            Runs already stored when it started
+        finished : int
+            Runs finished (including failures and those already stored)
+        stopped : bool, optional
+            It was interrupted before it finished, defaults to False
+        """
+        store.compact()
+        if stopped == True:
+            warnings.warn(
+                "Stopped %s early, keeping the %s of %s runs that finished, "
+                "run_model(resume=True) carries on from here"
+                % (self.name, finished - stored, runs)
+            )
+        elif self.convergence is not None and not self.converged:
+            self.converged = self.convergence.check(self.monitor, finished)
+            if not self.converged:
+                warnings.warn(
+                    "%s not converged after %s runs: %s"
+                    % (self.name, finished, self.convergence.reason)
+                )
+        if len(self.failures) > 0:
+            with open(os.path.join(store.path, "failures.json"), "w") as f:
+                json.dump(self.failures, f, indent=4)
+            warnings.warn(
+                "%s of %s runs failed, see %s/failures.json"
+                % (len(self.failures), runs, store.path)
+            )
+
+    def run_model(
+        self,
+        test_mode=False,
+        debug=False,
+        num_cpus=False,
+        backend="auto",
+        chunksize=None,
+        seed=None,
+        max_in_flight=None,
+        retries=2,
+        progress=True,
+        live=False,
+        reservoir_size=20,
+        resume=False,
+        design=None,
+        save_loc=None,
+    ):
         """Runs the stochastic model
 
+        Note
+        ----
+        The runs are split into chunks which are sent to the backend's workers, keeping at most max_in_flight chunks
+        submitted at a time (see campyros.parallel.run_tasks). Every random draw of every run is generated up front from
+        the campaign seed as a design matrix (self.design, with the sampling method set by self.sampling) and each run
+        reads its row, so the results don't depend on the backend, worker count or chunk size. The design is stored
+        with the results.
+        A chunk that fails as a whole (e.g. a worker died) is retried, a run that raises an error is recorded rather than
+        retried since it would fail the same way again. Failed runs are listed with their errors in self.failures and
+        failures.json in the save location. This only returns once every run has finished or failed, or it is
+        interrupted (e.g. ctrl+c) in which case the runs that finished are kept.
+        The results are stored in results/<name> as a campyros.store.CampaignStore, which replaces anything already
+        there unless resuming. With resume=True the campaign stored there (its seed, sampling and design, see the
+        store's manifest) carries on and only the runs that aren't stored yet are done, e.g. after the campaign was
+        interrupted or to extend a finished one by raising self.itterations. Every run is seeded from the campaign
+        seed and its run number, so a resumed campaign gives the same results as one that was never stopped.
+        As the results arrive the landing and apogee dispersion and a sample of the trajectories are kept in
+        self.monitor (a campyros.online.DispersionMonitor), and reported with the progress.
+        If the model has a convergence rule it is checked every so many runs, once it passes no more chunks are
+        submitted and the campaign finishes with the ones already running (self.converged is set). Which runs those
+        are depends on timing, but each run's result only depends on its number.
+
         Parameters
         ----------
-        itters : int
-            Number of times to run the rocket
+        test_mode : bool, optional
+            Run everything in this process (unless a backend is given), defaults to False
+        debug : bool, optional
+            Passed to Rocket.run, defaults to False
+        num_cpus : int, optional
+            Number of workers, defaults to False (one per CPU)
+        backend : string or backend object, optional
+            "process", "ray", "serial" or "auto" (ray if installed, otherwise a process pool), see campyros.parallel, defaults to "auto"
+        chunksize : int, optional
+            Runs sent to a worker at a time, defaults to None (about four chunks per worker)
+        seed : int, optional
+            Campaign seed, defaults to None (random, stored in self.seed)
+        max_in_flight : int, optional
+            Maximum number of chunks submitted at once, defaults to None (twice the number of workers)
+        retries : int, optional
+            Times to retry a chunk that failed as a whole, defaults to 2
+        progress : bool or callable, optional
+            Print progress, or a function to call with each progress line, defaults to True
+        live : bool, optional
+            Plot the dispersion every time progress is reported, defaults to False
+        reservoir_size : int, optional
+            Number of trajectories to keep in self.monitor, defaults to 20
+        resume : bool, optional
+            Carry on with the campaign already stored (if there is one) rather than starting again, defaults to False
+        design : numpy array, optional
+            Standard normal draws to run instead of generating the design, a row per run (e.g. the Saltelli design of
+            run_sensitivity). Can't be used with importance sampling. Defaults to None
         save_loc : string, optional
-            Folder to store results, defaults to None (is generated based on date if None)
+            Where to store the campaign, defaults to None (results/<name>)
         Returns
         -------
         string
             save location, if not specified is generated so needs to be returned to be known
         """
-        save_loc = "results/%s" % self.name
-        if not os.path.exists(save_loc):
-            os.makedirs(save_loc)
+        if save_loc is None:
+            save_loc = "results/%s" % self.name
+        store = CampaignStore(save_loc)
+        done = self.start_campaign(store, seed, resume, design)
+        itterations = self.itterations if design is None else len(design)
+        if test_mode == True and backend == "auto":
+            backend = "serial"
+        workers = None if num_cpus == False else num_cpus
+        executor = get_backend(backend, workers)
 
-        if RAY_AVAILABLE == True:
-            if num_cpus != False:
-                ray.init(num_cpus=num_cpus)
-            else:
-                ray.init(local_mode=test_mode)
+        runs = [id for id in range(1, itterations + 1) if id not in done]
+        if chunksize is None:
+            chunksize = self._chunksize(len(runs), executor.workers)
+        # The model (aero tables, motor, wind...) is only sent to the workers once, tasks just get a handle to it
+        shared = executor.share(self)
+        tasks = [
+            (shared, chunk, save_loc, self.seed, debug)
+            for chunk in chunks(runs, chunksize)
+        ]
+        stored = self._begin_monitor(store, reservoir_size)
+        finished = stored
+        tracker = self._progress(len(runs), progress, live)
 
-            runs = []
-            for run in range(1, self.itterations + 1):
-                runs.append(
-                    self.run_itteration.remote(self, run, save_loc, debug=debug)
-                )
-            ray.wait(runs)
+        def on_done(index, result, error):
+            nonlocal finished
+            finished = self._record_chunk(
+                tasks[index][1], result, error, finished, tracker
+            )
+
+        stopped = False
+        try:
+            run_tasks(
+                executor,
+                run_chunk,
+                tasks,
+                max_in_flight=max_in_flight,
+                retries=retries,
+                on_done=on_done,
+                stop=lambda: self.converged,
+            )
+        except KeyboardInterrupt:
+            stopped = True
+        finally:
+            executor.release(shared)
+            if executor is not backend:
+                executor.shutdown()
+        self._finish_campaign(store, len(runs), stored, finished, stopped)
+        return save_loc
+
+    def run_multi_fidelity(
+        self,
+        point_mass_runs,
+        seed=None,
+        backend="auto",
+        num_cpus=False,
+        progress=True,
+        **kwargs,
+    ):
+        """Runs a multi-fidelity campaign, the landing and apogee dispersion from a few full runs and many cheap 3-DOF
+        ones
+
+        Note
+        ----
+        The full (6-DOF) runs are done by run_model, then point_mass_runs runs with the design extended to that many
+        rows are flown again as point masses (campyros.ensemble.PointMass). The first runs are the same rockets in
+        both, so the point masses make a control variate for the full runs (see multi_fidelity_estimate). Point masses
+        cost a small fraction of a full run and their apogee and landing are strongly correlated with the full ones,
+        so for the same compute the dispersion is known much more precisely than from full runs alone.
+        The point mass results are stored (summaries only) in the point_mass folder of the save location, they are
+        always rerun. The estimates are kept in self.multi_fidelity and the table of statistics is saved as
+        multi_fidelity.csv.
+
+        Parameters
+        ----------
+        point_mass_runs : int
+            Number of point mass runs, at least self.itterations (the number of full runs)
+        seed : int, optional
+            Campaign seed, defaults to None (random)
+        backend : string or backend object, optional
+            Execution backend, see run_model, defaults to "auto"
+        num_cpus : int, optional
+            Number of workers, defaults to False (one per CPU)
+        progress : bool or callable, optional
+            Print progress, or a function to call with each progress line, defaults to True
+        **kwargs
+            Other arguments for run_model
+
+        Returns
+        -------
+        string
+            Save location
+        """
+        if point_mass_runs < self.itterations:
+            raise ValueError(
+                "Need at least as many point mass runs as full runs (%s), not %s"
+                % (self.itterations, point_mass_runs)
+            )
+        start = time.perf_counter()
+        save_loc = self.run_model(
+            seed=seed, backend=backend, num_cpus=num_cpus, progress=progress, **kwargs
+        )
+        high_time = time.perf_counter() - start
+        high = CampaignStore(save_loc).summary()
+
+        # Random and Sobol rows don't depend on how many were generated, so the first rows are the full runs'
+        if point_mass_runs > len(self.design):
+            extra = self.design_rows(
+                point_mass_runs - len(self.design), start=len(self.design)
+            )
+            self.design = np.concatenate([self.design, extra])
+        store = CampaignStore("%s/point_mass" % save_loc)
+        store.clear()
+        store.write_design(self.design, self.design_variables, self.sampling)
+
+        if kwargs.get("test_mode") == True and backend == "auto":
+            backend = "serial"
+        executor = get_backend(backend, None if num_cpus == False else num_cpus)
+        runs = list(range(1, point_mass_runs + 1))
+        # The runs in a chunk are integrated together, so big chunks are quicker
+        chunksize = min(256, -(-len(runs) // executor.workers))
+        shared = executor.share(self)
+        tasks = [
+            (shared, chunk, store.path, self.seed, False, True)
+            for chunk in chunks(runs, chunksize)
+        ]
+        failures = {}
+        if progress == False:
+            tracker = None
         else:
-            for run in range(1, self.itterations + 1):
-                self.run_itteration(self, run, save_loc)
+            tracker = Progress(
+                len(runs),
+                name="point mass runs",
+                stream=print if progress == True else progress,
+            )
+
+        def on_done(index, result, error):
+            if error is not None:
+                errors = {id: error for id in tasks[index][1]}
+            else:
+                errors = result[0]
+            failures.update(
+                {id: message for id, message in errors.items() if message is not None}
+            )
+            if tracker is not None:
+                tracker.update(
+                    len(errors),
+                    sum(message is not None for message in errors.values()),
+                )
+
+        start = time.perf_counter()
+        try:
+            run_tasks(executor, run_chunk, tasks, on_done=on_done)
+        finally:
+            executor.release(shared)
+            if executor is not backend:
+                executor.shutdown()
+        low_time = time.perf_counter() - start
+        store.compact()
+        if len(failures) > 0:
+            warnings.warn(
+                "%s of %s point mass runs failed, they are left out of the estimates"
+                % (len(failures), len(runs))
+            )
+
+        low = store.summary()
+        self.multi_fidelity = multi_fidelity_estimate(
+            high,
+            low,
+            high_cost=high_time / max(len(high), 1),
+            low_cost=low_time / max(len(low), 1),
+        )
+        self.multi_fidelity["statistics"].to_csv("%s/multi_fidelity.csv" % save_loc)
         return save_loc
 
+    def run_sensitivity(
+        self,
+        base_runs,
+        groups=None,
+        seed=None,
+        resamples=1000,
+        level=0.95,
+        save_loc=None,
+        **kwargs,
+    ):
+        """Finds which random inputs drive the dispersion of each summary metric, as Sobol indices
+
+        Note
+        ----
+        The Saltelli design (see campyros.sensitivity) is run like any other campaign by run_model, so on the same
+        backends and resumable, and by default stored in the sensitivity folder of results/<name>. It takes base_runs*(groups+2)
+        runs, so group inputs that don't need telling apart. The base designs use the model's sampling method, Sobol
+        sampling with base_runs a power of 2 converges fastest.
+        The tables of indices (one per metric, ranked by total index, with bootstrap confidence intervals) are kept
+        in self.sensitivity and saved together as sensitivity.csv.
+
+        Parameters
+        ----------
+        base_runs : int
+            Rows of each base design
+        groups : list or dict, optional
+            Inputs (design variables) to find the indices of, or {group name: [inputs]}, the rest are grouped as
+            "other". Defaults to None (every input, with the thrust alignment draws together)
+        seed : int, optional
+            Campaign seed, defaults to None (random)
+        resamples : int, optional
+            Number of bootstrap resamples, defaults to 1000
+        level : float, optional
+            Confidence level, defaults to 0.95
+        save_loc : string, optional
+            Where to store the campaign, defaults to None (results/<name>/sensitivity)
+        **kwargs
+            Other arguments for run_model, e.g. the backend
+
+        Returns
+        -------
+        string
+            Save location
+        """
+        if self.importance is not None:
+            raise ValueError(
+                "The indices are for the model's own distribution, set importance to None"
+            )
+        groups = input_groups(self.design_variables, groups)
+        if save_loc is None:
+            save_loc = "results/%s/sensitivity" % self.name
+        manifest = CampaignStore(save_loc).manifest()
+        if kwargs.get("resume") == True and manifest is not None and seed is None:
+            seed = manifest["seed"]
+        elif seed is None:
+            seed = new_seed()
+        variables = len(self.design_variables)
+        base = design_matrix(base_runs, 2 * variables, self.sampling, seed)
+        design = saltelli_design(
+            base[:, :variables],
+            base[:, variables:],
+            [
+                [self.design_variables.index(name) for name in members]
+                for members in groups.values()
+            ],
+        )
+        self.run_model(seed=seed, design=design, save_loc=save_loc, **kwargs)
+        write_plan(save_loc, base_runs, groups)
+        self.sensitivity = campaign_sensitivity(
+            save_loc, resamples=resamples, level=level
+        )
+        pd.concat(self.sensitivity, names=["metric"]).to_csv(
+            "%s/sensitivity.csv" % save_loc
+        )
+        return save_loc
+
+    def run_paired(
+        self,
+        configurations,
+        labels=None,
+        seed=None,
+        level=0.95,
+        save_loc=None,
+        **kwargs,
+    ):
+        """Runs this model and other configurations of the vehicle (e.g. a fin change or another motor file) with
+        common random numbers, and compares each with this one
+
+        Note
+        ----
+        Every configuration's run n has the same random draws, they share a design matrix (drawn with this model's
+        sampling method) by the names of their design variables, and the same campaign seed. The random differences
+        between the configurations then mostly cancel, so a small change in e.g. the apogee or landing is resolved
+        with far fewer runs than comparing independent campaigns (see paired_difference). Each configuration does
+        self.itterations runs, they are stored in the <label> folders of save_loc (by default results/<name>/paired).
+        The comparisons (a table per configuration) are kept in self.paired and saved together as paired.csv.
+
+        Parameters
+        ----------
+        configurations : list
+            The other configurations, StatisticalModels or the paths of their settings files
+        labels : list, optional
+            Name of each configuration, defaults to None (their model names, which must differ from this one's and
+            each other's)
+        seed : int, optional
+            Campaign seed, defaults to None (random)
+        level : float, optional
+            Confidence level of the differences, defaults to 0.95
+        save_loc : string, optional
+            Folder to store the configurations' campaigns in, defaults to None (results/<name>/paired)
+        **kwargs
+            Other arguments for run_model, e.g. the backend
+
+        Returns
+        -------
+        string
+            Save location
+        """
+        models = [
+            StatisticalModel(model) if isinstance(model, str) else model
+            for model in configurations
+        ]
+        labels = [model.name for model in models] if labels is None else list(labels)
+        if len(set([self.name] + labels)) < len(models) + 1:
+            raise ValueError(
+                "The configurations need different labels, not %s" % labels
+            )
+        if save_loc is None:
+            save_loc = "results/%s/paired" % self.name
+        manifest = CampaignStore("%s/%s" % (save_loc, self.name)).manifest()
+        if kwargs.get("resume") == True and manifest is not None and seed is None:
+            seed = manifest["seed"]
+        elif seed is None:
+            seed = new_seed()
+        # The draws of variables that only some configurations have are shared too
+        names = list(self.design_variables)
+        for model in models:
+            names += [name for name in model.design_variables if name not in names]
+        design = design_matrix(self.itterations, len(names), self.sampling, seed)
+
+        summaries = {}
+        for label, model in zip([self.name] + labels, [self] + models):
+            location = "%s/%s" % (save_loc, label)
+            model.run_model(
+                seed=seed,
+                design=design[
+                    :, [names.index(name) for name in model.design_variables]
+                ],
+                save_loc=location,
+                **kwargs,
+            )
+            summaries[label] = CampaignStore(location).summary()
+        self.paired = {
+            label: paired_difference(summaries[self.name], summaries[label], level)
+            for label in labels
+        }
+        pd.concat(self.paired, names=["configuration"]).to_csv(
+            "%s/paired.csv" % save_loc
+        )
+        return save_loc
+
+    def surrogate(self, save_loc=None, **kwargs):
+        """Surrogate model of the summary metrics, fitted to a stored campaign of this model
+
+        Parameters
+        ----------
+        save_loc : string, optional
+            Where the campaign is stored, defaults to None (results/<name>)
+        **kwargs
+            Arguments of campyros.surrogate.Surrogate, e.g. the variables or degree
+
+        Returns
+        -------
+        Surrogate
+            The fitted surrogate
+        """
+        if save_loc is None:
+            save_loc = "results/%s" % self.name
+        return Surrogate.from_campaign(save_loc, **kwargs)
+
+    def catalog(self, save_loc=None):
+        """Catalog of a stored campaign of this model, for querying its runs (see campyros.catalog)
+
+        Parameters
+        ----------
+        save_loc : string, optional
+            Where the campaign is stored, defaults to None (results/<name>)
+
+        Returns
+        -------
+        Catalog
+            The catalog
+        """
+        if save_loc is None:
+            save_loc = "results/%s" % self.name
+        return Catalog(save_loc)
+
+    def plan_importance(self, pilot, polygon, variables=None, elite=0.1, defensive=0.1):
+        """Sets up importance sampling towards landing outside a polygon, e.g. the range safety area, from a pilot
+        campaign
+
+        Note
+        ----
+        The pilot is normally a few hundred plain runs of this model under another name. The draws that dominate the
+        landing (by default those of campyros.importance.IMPORTANCE_VARIABLES the model has: rail yaw and pitch, thrust
+        misalignment, parachute failure and wind ensemble member) are shifted towards where the pilot runs that came
+        closest to leaving the polygon were, with a shifted component for each edge they went towards (see
+        campyros.importance.pilot_shift). The next run_model then samples from the shifted distribution, and
+        exceedance gives the weighted probability.
+
+        Parameters
+        ----------
+        pilot : string
+            Folder of the pilot campaign, e.g. the return value of its run_model
+        polygon : numpy array
+            Vertices [x,y] of the landing area, in the launch frame (m)
+        variables : list, optional
+            Draws to shift, defaults to None (the dominant ones)
+        elite : float, optional
+            Fraction of the pilot runs the shift is the mean of, defaults to 0.1
+        defensive : float, optional
+            Fraction of the runs that aren't shifted, which bounds the weights by 1/defensive, defaults to 0.1
+
+        Returns
+        -------
+        dict
+            The importance sampling distribution, also set as self.importance
+        """
+        self.importance = pilot_shift(
+            pilot, polygon, variables=variables, elite=elite, defensive=defensive
+        )
+        return self.importance
+
+    def exceedance(self, polygon, level=0.95, save_loc=None):
+        """Probability of landing outside a polygon, from a stored campaign of this model
+
+        Parameters
+        ----------
+        polygon : numpy array
+            Vertices [x,y] of the landing area, in the launch frame (m)
+        level : float, optional
+            Confidence level, defaults to 0.95
+        save_loc : string, optional
+            Where the campaign is stored, defaults to None (results/<name>)
+
+        Returns
+        -------
+        dict
+            Likelihood ratio weighted "probability", its "std_error" and confidence "interval", and the number of
+            "hits", "runs" and "effective_runs" (see campyros.importance.exceedance_probability)
+        """
+        if save_loc is None:
+            save_loc = "results/%s" % self.name
+        return campaign_exceedance(save_loc, polygon, level)
+
+
+def flight_summary(rocket, run_output, positions, metrics=SUMMARY_METRICS):
+    """Summary metrics of a flight
+
+    Note
+    ----
+    Everything is evaluated at the integrator's output steps, so the maxima can be slightly low. The rail exit velocity
+    is the ground speed at the end of the rail (where the step it cleared the rail in ends), NaN if it never did.
+
+    Parameters
+    ----------
+    rocket : Rocket
+        The rocket after it has been run
+    run_output : pandas dataframe
+        Output of Rocket.run
+    positions : numpy array
+        Position at each output step in the launch frame [x,y,z] /m
+    metrics : list, optional
+        Metrics to return, from SUMMARY_METRICS, defaults to all of them
+
+    Returns
+    -------
+    dict
+        Metric values. Positions in the launch frame /m, times /s, q /Pa, velocity /m/s
+    """
+    time = np.asarray(run_output["time"], dtype=float)
+    apogee = np.argmax(positions[:, 2])
+    values = {
+        "apogee_x": positions[apogee, 0],
+        "apogee_y": positions[apogee, 1],
+        "apogee_alt": positions[apogee, 2],
+        "apogee_time": time[apogee],
+        "landing_x": positions[-1, 0],
+        "landing_y": positions[-1, 1],
+        "landing_time": time[-1],
+    }
+
+    if "mach" in run_output and "q" in run_output:
+        # Recorded by Ensemble.run
+        values["max_mach"] = np.max(run_output["mach"])
+        values["max_q"] = np.max(run_output["q"])
+    elif "max_mach" in metrics or "max_q" in metrics:
+        pos_i, vel_i = np.stack(run_output["pos_i"]), np.stack(run_output["vel_i"])
+        lat, long, alts = i2lla(pos_i, time)
+        air_speed = np.linalg.norm(
+            i2airspeed(pos_i, vel_i, rocket.launch_site, time)
+            - rocket.launch_site.wind.get_winds(lat, long, alts, time),
+            axis=1,
+        )
+        # Same limits as Rocket.fdot
+        atmosphere = Atmosphere(np.clip(alts, -5000, 81020))
+        speed_of_sound = atmosphere.speed_of_sound * rocket.env_vars["speed_of_sound"]
+        density = atmosphere.density * rocket.env_vars["density"]
+        values["max_mach"] = np.max(air_speed / speed_of_sound)
+        values["max_q"] = np.max(0.5 * density * air_speed ** 2)
+
+    if "rail_exit_velocity" in metrics:
+        values["rail_exit_velocity"] = np.nan
+        for n, events in enumerate(run_output["events"]):
+            if "Cleared rail" in events:
+                values["rail_exit_velocity"] = np.linalg.norm(
+                    vel_i2l(run_output["vel_i"][n], rocket.launch_site, time[n])
+                )
+                break
+    return {name: values[name] for name in metrics}
+
+
+def run_chunk(shared, ids, save_loc, seed, debug=False, point_mass=False):
+    """Runs a group of itterations of a StatisticalModel, this is the task the execution backends run
+
+    Parameters
+    ----------
+    shared : shared object handle
+        Handle to the StatisticalModel from the backend's share()
+    ids : list
+        Run numbers
+    save_loc : string
+        Folder to store results, the chunk is written as one shard of a CampaignStore
+    seed : int
+        Campaign seed
+    debug : bool, optional
+        Passed to Rocket.run (or Ensemble.run), defaults to False
+    point_mass : bool, optional
+        Run the 3-DOF approximation of each run (see StatisticalModel.run_ensemble) and only store its summary,
+        defaults to False
+
+    Returns
+    -------
+    dict
+        For each run number None if it succeeded, otherwise the error traceback
+    dict
+        Summary metrics of each run that succeeded
+    dict
+        Trajectory of each run that stored one
+    """
+    model = shared.get()
+    if point_mass == True:
+        results, errors = model.run_ensemble(
+            ids, seed, debug=debug, trajectories=[False] * len(ids), point_mass=True
+        )
+    elif model.engine == "ensemble":
+        results, errors = model.run_ensemble(
+            ids,
+            seed,
+            debug=debug,
+            trajectories=[model.keep_trajectory(id, seed) for id in ids],
+        )
+    else:
+        results, errors = {}, {}
+        for id in ids:
+            seed_task(seed, id)
+            try:
+                results[id] = model.run_itteration(
+                    id, debug=debug, trajectory=model.keep_trajectory(id, seed)
+                )
+            except Exception:
+                errors[id] = traceback.format_exc()
+    ran, inputs, summaries, trajectories = [], [], [], []
+    for id in ids:
+        if id not in results:
+            continue
+        errors[id] = None
+        ran.append(id)
+        inputs.append(results[id][0])
+        summaries.append(results[id][1])
+        trajectories.append(results[id][2])
+    if len(ran) > 0:
+        CampaignStore(save_loc).write_shard(ran, inputs, trajectories, summaries)
+    return (
+        errors,
+        dict(zip(ran, summaries)),
+        {id: run for id, run in zip(ran, trajectories) if run is not None},
+    )
+
+
+def _control_variate(high, low, low_all):
+    """Control variate estimate of the mean of high, using the mean of low over more runs
+
+    Returns the estimate, its variance, the variance of the plain mean of high and the correlation of high and low
+    """
+    n, N = len(high), len(low_all)
+    var_high = np.var(high, ddof=1)
+    var_low = np.var(low, ddof=1)
+    covariance = np.cov(high, low)[0, 1]
+    if var_low > 0 and var_high > 0:
+        correlation = covariance / np.sqrt(var_high * var_low)
+        gain = covariance / var_low
+    else:
+        correlation, gain = 0.0, 0.0
+    estimate = np.mean(high) + gain * (np.mean(low_all) - np.mean(low))
+    variance = var_high / n * (1 - (1 - n / N) * correlation ** 2)
+    return estimate, variance, var_high / n, correlation
+
+
+def multi_fidelity_estimate(high, low, high_cost=None, low_cost=None):
+    """Landing and apogee mean and covariance from a few high fidelity runs and many correlated low fidelity ones
+
+    Note
+    ----
+    Each statistic (every mean, variance and covariance of the landing and apogee positions) has its own control
+    variate, the same statistic of the low fidelity runs: the high fidelity estimate from the runs done at both
+    fidelities is corrected by how far the low fidelity estimate from those runs is from its value over all the low
+    fidelity runs, weighted by the regression of the high on the low fidelity values. The better the two are
+    correlated (rho) and the more low fidelity runs there are the more of the variance is removed, the variance is
+    that of the plain high fidelity estimate times 1 - (1 - n/N) rho^2 for n high and N low fidelity runs. The
+    standard errors assume independent runs, so are conservative for low discrepancy (e.g. Sobol) designs.
+    The covariance estimates are not guaranteed to be positive definite, though with well correlated models they are.
+
+    Parameters
+    ----------
+    high : pandas dataframe
+        Summary metrics of the high fidelity runs, indexed by run number (e.g. CampaignStore.summary())
+    low : pandas dataframe
+        Summary metrics of the low fidelity runs, indexed by run number. The runs with the same number as a high
+        fidelity run must be the same rocket, these pair the two models
+    high_cost : float, optional
+        Cost (e.g. time) of a high fidelity run, defaults to None
+    low_cost : float, optional
+        Cost of a low fidelity run, defaults to None
+
+    Returns
+    -------
+    dict
+        "landing_mean", "landing_cov", "apogee_mean" and "apogee_cov" (numpy arrays, as analyse), the "statistics"
+        table, and the number of "high_runs" (that have a low fidelity pair) and "low_runs".
+        The statistics table (a pandas dataframe) has a row for each mean, variance and covariance with its
+        "estimate", "std_error", the "monte_carlo" estimate from the high fidelity runs alone and its
+        "monte_carlo_std_error", the "correlation" of the two models, the "variance_reduction" factor and the number
+        of high fidelity runs the same precision would take on their own ("equivalent_runs"). If the costs are
+        given, "cost_fraction" is the cost of the runs done as a fraction of the cost of the equivalent runs.
+    """
+    paired = high.index.intersection(low.index)
+    pairs = low.index.get_indexer(paired)
+    n, N = len(paired), len(low)
+    if n < 3:
+        raise ValueError(
+            "Need at least 3 runs done at both fidelities to estimate the correlation, there are %s"
+            % n
+        )
+
+    rows, out = {}, {"high_runs": n, "low_runs": N}
+
+    def add(name, high_values, low_values, low_all):
+        estimate, variance, mc_variance, correlation = _control_variate(
+            high_values, low_values, low_all
+        )
+        rows[name] = {
+            "estimate": estimate,
+            "std_error": np.sqrt(variance),
+            "monte_carlo": np.mean(high_values),
+            "monte_carlo_std_error": np.sqrt(mc_variance),
+            "correlation": correlation,
+            "variance_reduction": mc_variance / variance if variance > 0 else np.nan,
+        }
+        return estimate
+
+    for position, names in DISPERSION.items():
+        names = [name for name in names if name in high and name in low]
+        if len(names) == 0:
+            continue
+        Y = high.loc[paired, names].to_numpy(dtype=float)
+        X_all = low[names].to_numpy(dtype=float)
+        X = X_all[pairs]
+        mean = np.array(
+            [
+                add("mean %s" % name, Y[:, k], X[:, k], X_all[:, k])
+                for k, name in enumerate(names)
+            ]
+        )
+        # Second moments about fixed centres, then shifted to the estimated mean
+        high_centre, low_centre = Y.mean(axis=0), X_all.mean(axis=0)
+        cov = np.zeros((len(names), len(names)))
+        for a in range(len(names)):
+            for b in range(a, len(names)):
+                label = (
+                    "var %s" % names[a]
+                    if a == b
+                    else "cov %s %s" % (names[a], names[b])
+                )
+                products = (Y[:, a] - high_centre[a]) * (Y[:, b] - high_centre[b])
+                low_products = (X_all[:, a] - low_centre[a]) * (
+                    X_all[:, b] - low_centre[b]
+                )
+                moment = add(
+                    label, products * n / (n - 1), low_products[pairs], low_products
+                )
+                cov[a, b] = cov[b, a] = moment - (mean[a] - high_centre[a]) * (
+                    mean[b] - high_centre[b]
+                )
+                rows[label]["estimate"] = cov[a, b]
+        out["%s_mean" % position] = mean
+        out["%s_cov" % position] = cov
+
+    statistics = pd.DataFrame.from_dict(rows, orient="index")
+    statistics["equivalent_runs"] = n * statistics["variance_reduction"]
+    if high_cost is not None and low_cost is not None:
+        statistics["cost_fraction"] = (n * high_cost + N * low_cost) / (
+            statistics["equivalent_runs"] * high_cost
+        )
+    out["statistics"] = statistics
+    return out
+
+
+def paired_difference(base, other, level=0.95):
+    """Difference of each summary metric between two configurations flown with common random numbers
+
+    Note
+    ----
+    Run n of both campaigns must have had the same random draws (see StatisticalModel.run_paired), so the noise in
+    the metrics mostly cancels in their difference. The better the metric is correlated between the two the fewer
+    runs it takes to resolve the difference, compared with two independent campaigns of the same size. The standard
+    errors assume independent runs, so are conservative for low discrepancy (e.g. Sobol) designs.
+
+    Parameters
+    ----------
+    base : pandas dataframe
+        Summary metrics of the baseline configuration, indexed by run number (e.g. CampaignStore.summary())
+    other : pandas dataframe
+        Summary metrics of the other configuration, indexed by run number. Runs that only one has (e.g. because the
+        other failed) are left out
+    level : float, optional
+        Confidence level, defaults to 0.95
+
+    Returns
+    -------
+    pandas dataframe
+        A row per metric with the "mean_difference" (other - base), its "std_error", confidence interval
+        ("interval_low", "interval_high", from the t distribution) and "p_value" (of no difference), the "correlation"
+        of the two, the standard error two independent campaigns of as many runs would give
+        ("independent_std_error") and the number of runs each of those would need for the same precision
+        ("equivalent_runs")
+    """
+    paired = base.index.intersection(other.index)
+    metrics = [name for name in base.columns if name in other.columns]
+    n = len(paired)
+    if n < 3:
+        raise ValueError("Need at least 3 paired runs, there are %s" % n)
+    base, other = base.loc[paired, metrics], other.loc[paired, metrics]
+    difference = other - base
+    mean = difference.mean()
+    std_error = difference.std(ddof=1) / np.sqrt(n)
+    independent = np.sqrt((base.var(ddof=1) + other.var(ddof=1)) / n)
+    half = scipy.stats.t.ppf(0.5 + level / 2, n - 1) * std_error
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p_value = 2 * scipy.stats.t.sf(np.abs(mean / std_error), n - 1)
+        equivalent = n * (independent / std_error) ** 2
+    return pd.DataFrame(
+        {
+            "mean_difference": mean,
+            "std_error": std_error,
+            "interval_low": mean - half,
+            "interval_high": mean + half,
+            "p_value": p_value,
+            "correlation": base.corrwith(other),
+            "independent_std_error": independent,
+            "equivalent_runs": equivalent,
+        }
+    )
+
 
 def analyse(results_path, itterations, full_results=True, velocity=False):
     """Loads stats model results to put them in a more useful form for use, see stats_analysis_example notebook for example use
 
+    Note
+    ----
+    The apogees and landings come from the summary metrics, so the apogee_x/y/alt and landing_x/y metrics need to have
+    been stored.
+
     Parameters
     ----------
     results_path : string
         Folder containing results
     itterations : int
-        Number of runs used for the model
+        Number of runs used for the model, runs with no output (because they failed) are skipped
     full_results : bool, optional
-        Return the full x,y,z,t for every run of the model
+        Return the full x,y,z,t for every run of the model that stored its trajectory
     velocity : bool, optional
         Return velocity analys, defaults to False - currently not implimented
 
@@ -433,32 +1860,30 @@ def analyse(results_path, itterations, full_results=True, velocity=False):
             apogee position covariant matrix
 
     """
-    x, y, z, t = pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-    itts = range(1, itterations + 1)
-
-    for itt in itts:
-        tmp = pd.read_csv("%s/%s.csv" % (results_path, itt))
-
-        x = pd.concat([x, pd.DataFrame({itt: tmp["x"]})], ignore_index=True, axis=1)
-        y = pd.concat([y, pd.DataFrame({itt: tmp["y"]})], ignore_index=True, axis=1)
-        z = pd.concat([z, pd.DataFrame({itt: tmp["z"]})], ignore_index=True, axis=1)
-        t = pd.concat([t, pd.DataFrame({itt: tmp["time"]})], ignore_index=True, axis=1)
-
-    apogee = pd.DataFrame()
-    apogee["index"] = z.idxmax()
-    # I know this isn't the proper pandas way todo this but I can't see how todo it right
-    apogee["x"] = [
-        x[itt][apogee["index"].tolist()[itt]] for itt in range(0, itterations)
-    ]
-    apogee["y"] = [
-        y[itt][apogee["index"].tolist()[itt]] for itt in range(0, itterations)
+    store = CampaignStore(results_path)
+    if not store.exists():
+        # Results from older versions, stored as a csv per run
+        store.import_csv(range(1, itterations + 1))
+    data = store.load()
+    # Runs that failed have no output
+    data = subset(data, data["ids"] <= itterations)
+    summary = pd.DataFrame(data["summary"], columns=list(data["summary_names"]))
+
+    # Only some runs may have their full trajectory stored
+    data = subset(data, np.diff(data["offsets"]) > 0)
+    x, y, z, t = [
+        pd.DataFrame(
+            padded(
+                data["trajectory"], data["offsets"], TRAJECTORY_COLUMNS.index(column)
+            )
+        )
+        for column in ["x", "y", "z", "time"]
     ]
-    apogee["alt"] = z.max()
-    apogee = apogee.drop("index", axis=1)
 
-    landing = pd.DataFrame()
-    landing["x"] = [x[itt].dropna().iloc[-1] for itt in range(0, itterations)]
-    landing["y"] = [y[itt].dropna().iloc[-1] for itt in range(0, itterations)]
+    apogee = summary[["apogee_x", "apogee_y", "apogee_alt"]].set_axis(
+        ["x", "y", "alt"], axis=1
+    )
+    landing = summary[["landing_x", "landing_y"]].set_axis(["x", "y"], axis=1)
 
     landing_mu = np.array([landing["x"].mean(), landing["y"].mean()])
     landing_cov = landing.cov()
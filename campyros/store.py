@@ -0,0 +1,500 @@
+"""
+Columnar storage for the results of a stochastic campaign.
+
+Notes
+-----
+
+- Each chunk of runs is written by its worker as one .npz shard, named after the first run in the chunk. Shards are
+  written to a temporary file and renamed into place so a reader never sees half a shard, and since no two chunks
+  share a name workers never need to coordinate. A chunk that is retried simply replaces its shard.
+- Once the campaign finishes the shards are compacted into a single campaign.npz.
+- Trajectories have different lengths so they are stored end to end in one (rows, columns) array with an offsets
+  index, run n is trajectory[offsets[n]:offsets[n+1]]. The sampled inputs and summary metrics of each run (apogee,
+  landing...) are stored as (runs, columns) arrays alongside, with their names.
+- Runs can be stored with only their summary (an empty trajectory), which is all most dispersion analysis needs.
+- The design matrix the runs were sampled from (see campyros.sampling) is kept in design.npz, a row per run.
+- A campyros.catalog.Catalog of the campaign caches its table (catalog.npz) and trajectories (trajectory.npy) here too.
+- manifest.json records how the campaign was set up (seed, sampling...) so it can be resumed or extended. The runs
+  that have finished are the ones stored, since a shard is only ever there complete.
+
+"""
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+TRAJECTORY_COLUMNS = ["time", "x", "y", "z", "v_x", "v_y", "v_z"]
+SUMMARY_COLUMNS = [
+    "apogee_x",
+    "apogee_y",
+    "apogee_alt",
+    "apogee_time",
+    "landing_x",
+    "landing_y",
+    "landing_time",
+]
+
+CAMPAIGN_FILE = "campaign.npz"
+DESIGN_FILE = "design.npz"
+MANIFEST_FILE = "manifest.json"
+# Cache of campyros.catalog.Catalog
+CATALOG_FILE = "catalog.npz"
+TRAJECTORY_FILE = "trajectory.npy"
+
+
+def summarise(trajectory, offsets):
+    """Apogee and landing of each run, from trajectories stored end to end
+
+    Parameters
+    ----------
+    trajectory : numpy array
+        Trajectories of all the runs, columns as TRAJECTORY_COLUMNS
+    offsets : numpy array
+        Start of each run in trajectory, with the total length at the end
+
+    Returns
+    -------
+    numpy array
+        Summary of each run, columns as SUMMARY_COLUMNS
+    """
+    starts, ends = offsets[:-1], offsets[1:]
+    summary = np.full((len(starts), len(SUMMARY_COLUMNS)), np.nan)
+    ran = ends > starts
+    if not np.any(ran):
+        return summary
+    starts, ends = starts[ran], ends[ran]
+    time, x, y, z = (
+        trajectory[:, 0],
+        trajectory[:, 1],
+        trajectory[:, 2],
+        trajectory[:, 3],
+    )
+
+    # Index of the highest point of each run
+    apogee = starts + _segment_argmax(z, starts, ends)
+    last = ends - 1
+    summary[ran] = np.stack(
+        [x[apogee], y[apogee], z[apogee], time[apogee], x[last], y[last], time[last]],
+        axis=1,
+    )
+    return summary
+
+
+def _segment_argmax(values, starts, ends):
+    """Position of the (first) maximum within each [start, end) segment of values"""
+    segment_max = np.maximum.reduceat(values, starts)
+    segment = np.repeat(np.arange(len(starts)), ends - starts)
+    at_max = np.flatnonzero(values[starts[0] : ends[-1]] == segment_max[segment])
+    at_max = at_max + starts[0]
+    # The first hit in each segment
+    first = np.searchsorted(at_max, starts)
+    return at_max[first] - starts
+
+
+def padded(trajectory, offsets, column):
+    """One trajectory column as a (longest run, runs) array, padded with NaN
+
+    Parameters
+    ----------
+    trajectory : numpy array
+        Trajectories of all the runs
+    offsets : numpy array
+        Start of each run in trajectory, with the total length at the end
+    column : int
+        Column to extract
+
+    Returns
+    -------
+    numpy array
+        Column of each run, a row per output time and a column per run
+    """
+    lengths = np.diff(offsets)
+    rows = lengths.max() if len(lengths) > 0 else 0
+    out = np.full((len(lengths), rows), np.nan)
+    out[np.arange(rows) < lengths[:, None]] = trajectory[
+        offsets[0] : offsets[-1], column
+    ]
+    return out.T
+
+
+class CampaignStore:
+    """Results of a stochastic campaign, kept in a folder
+
+    Parameters
+    ----------
+    path : string
+        Folder the results are stored in, created if needed
+
+    Attributes
+    ----------
+    path : string
+        Folder the results are stored in
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def shards(self):
+        """Returns the paths of the shards that have not been compacted yet
+
+        Returns
+        -------
+        list
+            Shard files, in run order
+        """
+        return sorted(glob.glob(os.path.join(self.path, "shard_*.npz")))
+
+    def exists(self):
+        """Returns True if there are any results stored
+
+        Returns
+        -------
+        bool
+            Whether any results are stored
+        """
+        return (
+            os.path.isfile(os.path.join(self.path, CAMPAIGN_FILE))
+            or len(self.shards()) > 0
+        )
+
+    def write_shard(self, ids, inputs, trajectories, summaries=None):
+        """Stores a group of runs as one shard, safe to call from several workers at once (with different ids)
+
+        Parameters
+        ----------
+        ids : list
+            Run numbers
+        inputs : list
+            Dictionary of the sampled input parameters for each run, every run should have the same keys
+        trajectories : list
+            Trajectory of each run, an array with columns as TRAJECTORY_COLUMNS or None to only store the summary
+        summaries : list, optional
+            Dictionary of summary metrics for each run, every run should have the same keys. Defaults to None
+            (SUMMARY_COLUMNS worked out from the trajectories)
+
+        Returns
+        -------
+        string
+            Path of the shard
+        """
+        trajectories = [
+            np.zeros((0, len(TRAJECTORY_COLUMNS)))
+            if run is None
+            else np.asarray(run, dtype=float).reshape(-1, len(TRAJECTORY_COLUMNS))
+            for run in trajectories
+        ]
+        offsets = np.concatenate([[0], np.cumsum([len(run) for run in trajectories])])
+        trajectory = (
+            np.concatenate(trajectories)
+            if len(trajectories) > 0
+            else np.zeros((0, len(TRAJECTORY_COLUMNS)))
+        )
+        if summaries is None:
+            summary = summarise(trajectory, offsets)
+            summary_names = np.array(SUMMARY_COLUMNS)
+        else:
+            summary, summary_names = _table(summaries)
+        inputs, input_names = _table(inputs)
+        path = os.path.join(self.path, "shard_%08d.npz" % min(ids))
+        self._save(
+            path,
+            ids=np.asarray(ids, dtype=int),
+            offsets=offsets,
+            trajectory=trajectory,
+            inputs=inputs,
+            input_names=input_names,
+            summary=summary,
+            summary_names=summary_names,
+        )
+        return path
+
+    def load(self):
+        """Loads everything stored, runs stored more than once keep their latest result
+
+        Returns
+        -------
+        dict
+            ids, offsets, trajectory, inputs, input_names, summary and summary_names arrays, sorted by run number.
+            Runs stored without a trajectory have the same start and end offset
+        """
+        parts = []
+        campaign = os.path.join(self.path, CAMPAIGN_FILE)
+        if os.path.isfile(campaign):
+            parts.append(_read(campaign))
+        parts += [_read(shard) for shard in self.shards()]
+        return _merge(parts)
+
+    def completed(self):
+        """Run numbers that have been stored, without loading their results
+
+        Returns
+        -------
+        numpy array
+            Sorted run numbers
+        """
+        parts = self.shards()
+        campaign = os.path.join(self.path, CAMPAIGN_FILE)
+        if os.path.isfile(campaign):
+            parts.append(campaign)
+        ids = [np.zeros(0, dtype=int)]
+        for path in parts:
+            with np.load(path) as f:
+                ids.append(f["ids"])
+        return np.unique(np.concatenate(ids))
+
+    def compact(self):
+        """Merges the shards into the single campaign file and removes them
+
+        Returns
+        -------
+        string
+            Path of the campaign file
+        """
+        shards = self.shards()
+        path = os.path.join(self.path, CAMPAIGN_FILE)
+        if len(shards) > 0 or not os.path.isfile(path):
+            data = self.load()
+            self._save(path, **data)
+            for shard in shards:
+                os.remove(shard)
+        return path
+
+    def clear(self):
+        """Deletes all the stored results"""
+        campaign = os.path.join(self.path, CAMPAIGN_FILE)
+        design = os.path.join(self.path, DESIGN_FILE)
+        manifest = os.path.join(self.path, MANIFEST_FILE)
+        catalog = [
+            os.path.join(self.path, name) for name in [CATALOG_FILE, TRAJECTORY_FILE]
+        ]
+        for path in self.shards() + [campaign, design, manifest] + catalog:
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def summary(self):
+        """Summary metrics of every run
+
+        Returns
+        -------
+        pandas dataframe
+            A column per metric, indexed by run number
+        """
+        data = self.load()
+        return pd.DataFrame(
+            data["summary"], index=data["ids"], columns=list(data["summary_names"])
+        )
+
+    def inputs(self):
+        """Sampled input parameters of every run
+
+        Returns
+        -------
+        pandas dataframe
+            A column per parameter, indexed by run number
+        """
+        data = self.load()
+        return pd.DataFrame(
+            data["inputs"], index=data["ids"], columns=list(data["input_names"])
+        )
+
+    def write_design(self, design, names, method):
+        """Stores the design matrix the runs are sampled from
+
+        Parameters
+        ----------
+        design : numpy array
+            Standard normal draws, a row per run (starting from run 1) and a column per variable
+        names : list
+            Name of each column
+        method : string
+            Sampling method used to generate it
+        """
+        self._save(
+            os.path.join(self.path, DESIGN_FILE),
+            design=np.asarray(design, dtype=float),
+            names=np.array(names, dtype=str),
+            method=np.array(method),
+        )
+
+    def design(self):
+        """Design matrix the runs were sampled from
+
+        Returns
+        -------
+        pandas dataframe
+            A column per variable, indexed by run number, with the sampling method in .attrs["method"]
+        """
+        data = _read(os.path.join(self.path, DESIGN_FILE))
+        design = pd.DataFrame(
+            data["design"],
+            index=np.arange(1, len(data["design"]) + 1),
+            columns=list(data["names"]),
+        )
+        design.attrs["method"] = str(data["method"])
+        return design
+
+    def write_manifest(self, manifest):
+        """Stores the campaign's set up, replacing any already stored
+
+        Parameters
+        ----------
+        manifest : dict
+            JSON serialisable description of the campaign
+        """
+        path = os.path.join(self.path, MANIFEST_FILE)
+        tmp = os.path.join(self.path, ".%s.%s.tmp" % (MANIFEST_FILE, os.getpid()))
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(tmp, path)
+
+    def manifest(self):
+        """The campaign's set up, as stored by write_manifest
+
+        Returns
+        -------
+        dict or None
+            Description of the campaign, None if there isn't one
+        """
+        path = os.path.join(self.path, MANIFEST_FILE)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def import_csv(self, ids):
+        """Stores the output of older versions (a csv per run) as a shard, runs without a csv are skipped
+
+        Parameters
+        ----------
+        ids : list
+            Run numbers to look for
+        """
+        found, trajectories = [], []
+        for id in ids:
+            path = os.path.join(self.path, "%s.csv" % id)
+            if os.path.isfile(path):
+                found.append(id)
+                trajectories.append(pd.read_csv(path)[TRAJECTORY_COLUMNS].to_numpy())
+        if len(found) > 0:
+            self.write_shard(found, [{} for _ in found], trajectories)
+
+    def _save(self, path, **arrays):
+        """Writes arrays to path atomically"""
+        # Hidden so it isn't picked up as a shard, and np.savez adds .npz to names without it
+        directory, name = os.path.split(path)
+        tmp = os.path.join(directory, ".%s.%s.tmp.npz" % (name[:-4], os.getpid()))
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+
+def subset(data, keep):
+    """Selects some of the runs from loaded results
+
+    Parameters
+    ----------
+    data : dict
+        Results, as returned by CampaignStore.load
+    keep : numpy array
+        Boolean mask or indices of the runs to keep
+
+    Returns
+    -------
+    dict
+        The same arrays for only the selected runs
+    """
+    lengths = np.diff(data["offsets"])[keep]
+    starts = data["offsets"][:-1][keep]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(int)
+    rows = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+    return {
+        "ids": data["ids"][keep],
+        "offsets": offsets,
+        "trajectory": data["trajectory"][rows],
+        "inputs": data["inputs"][keep],
+        "input_names": data["input_names"],
+        "summary": data["summary"][keep],
+        "summary_names": data["summary_names"],
+    }
+
+
+def _table(rows):
+    """Converts a list of dictionaries with the same keys to a 2D array and the column names"""
+    names = list(rows[0]) if len(rows) > 0 else []
+    values = np.array([[row[name] for name in names] for row in rows], dtype=float)
+    return values.reshape(len(rows), len(names)), np.array(names, dtype=str)
+
+
+def _read(path):
+    with np.load(path) as f:
+        return {key: f[key] for key in f.files}
+
+
+def _columns(parts, key, names_key):
+    """Combines the key arrays of the parts, matching up the columns by their names_key (missing values are NaN)"""
+    names = []
+    for part in parts:
+        names += [name for name in part[names_key] if name not in names]
+    values = np.full((sum(len(part["ids"]) for part in parts), len(names)), np.nan)
+    row = 0
+    for part in parts:
+        columns = [names.index(name) for name in part[names_key]]
+        values[row : row + len(part["ids"]), columns] = part[key]
+        row += len(part["ids"])
+    return values, np.array(names, dtype=str)
+
+
+def _merge(parts):
+    """Combines loaded shards into one set of arrays sorted by run number, later parts win for repeated runs"""
+    if len(parts) == 0:
+        return {
+            "ids": np.zeros(0, dtype=int),
+            "offsets": np.zeros(1, dtype=int),
+            "trajectory": np.zeros((0, len(TRAJECTORY_COLUMNS))),
+            "inputs": np.zeros((0, 0)),
+            "input_names": np.array([], dtype=str),
+            "summary": np.zeros((0, 0)),
+            "summary_names": np.array([], dtype=str),
+        }
+
+    trajectory = np.concatenate([part["trajectory"] for part in parts])
+    starts = np.cumsum([0] + [len(part["trajectory"]) for part in parts])
+    offsets = np.concatenate(
+        [start + part["offsets"][:-1] for start, part in zip(starts, parts)]
+        + [[len(trajectory)]]
+    )
+    inputs, input_names = _columns(parts, "inputs", "input_names")
+    summary, summary_names = _columns(parts, "summary", "summary_names")
+    ids = np.concatenate([part["ids"] for part in parts])
+    data = {
+        "ids": ids,
+        "offsets": offsets,
+        "trajectory": trajectory,
+        "inputs": inputs,
+        "input_names": input_names,
+        "summary": summary,
+        "summary_names": summary_names,
+    }
+    # Keep the last copy of each run, np.unique also puts them in run order
+    return subset(data, len(ids) - 1 - np.unique(ids[::-1], return_index=True)[1])
@@ -0,0 +1,422 @@
+"""
+Surrogate models of a stochastic campaign, to answer "what if" questions about the inputs without running it again.
+
+Notes
+-----
+
+- The surrogate is a polynomial chaos expansion of each summary metric in the campaign's design variables (the
+  standard normal draws of each run, see campyros.sampling), fitted to the stored runs by least squares. The basis is
+  the orthonormal (probabilists') Hermite polynomials, so the mean and variance of a metric over the campaign's
+  distribution are read straight off the coefficients.
+- The terms are every product of polynomials up to a total degree, in at most interaction variables at once. There
+  must be more runs than terms, and a good few times more for a reliable fit.
+- The leave one out error is worked out exactly from the least squares fit (the residual divided by one minus the
+  leverage), so it costs nothing extra. It is the error to expect when predicting a run that wasn't in the campaign.
+- Draws that aren't a smooth influence, like the turbulence seed or the ensemble member, are left out by default.
+  Their effect is part of the residual scatter, which distribution() adds back by resampling the leave one out
+  residuals.
+- Polynomials extrapolate badly, so a query is flagged as outside the trained region if any design variable is
+  beyond the range of the campaign's draws.
+- Stored inputs that are a linear function of a design variable (e.g. dry_mass = mean * (1 + st_dev * z)) let
+  queries be given in their own units.
+
+"""
+import itertools
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy.special import factorial
+
+from .store import CampaignStore
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# Draws that change the flight in a way a polynomial can't follow
+NOISE_VARIABLES = ["ensemble_member", "turbulence_seed", "parachute_failed"]
+
+
+def hermite(z, degree):
+    """Orthonormal probabilists' Hermite polynomials, He_n(z)/sqrt(n!)
+
+    Parameters
+    ----------
+    z : numpy array
+        Points
+    degree : int
+        Highest degree
+
+    Returns
+    -------
+    numpy array
+        Values, shape z.shape + (degree + 1,)
+    """
+    z = np.asarray(z, dtype=float)
+    values = np.ones(z.shape + (degree + 1,))
+    if degree > 0:
+        values[..., 1] = z
+    for n in range(1, degree):
+        values[..., n + 1] = z * values[..., n] - n * values[..., n - 1]
+    return values / np.sqrt(factorial(np.arange(degree + 1)))
+
+
+def multi_indices(dims, degree, interaction):
+    """Terms of a polynomial chaos expansion
+
+    Parameters
+    ----------
+    dims : int
+        Number of variables
+    degree : int
+        Highest total degree of a term
+    interaction : int
+        Most variables in a term
+
+    Returns
+    -------
+    numpy array
+        Degree of each variable in each term, shape (terms, dims), starting with the constant term
+    """
+    terms = [np.zeros(dims, dtype=int)]
+    for order in range(1, min(interaction, dims) + 1):
+        for variables in itertools.combinations(range(dims), order):
+            for degrees in itertools.product(range(1, degree + 1), repeat=order):
+                if sum(degrees) <= degree:
+                    term = np.zeros(dims, dtype=int)
+                    term[list(variables)] = degrees
+                    terms.append(term)
+    return np.array(terms).reshape(-1, dims)
+
+
+class Surrogate:
+    """Polynomial chaos expansion of the summary metrics of a campaign, fitted to its runs
+
+    Parameters
+    ----------
+    design : pandas dataframe
+        Design variables (standard normal draws) of each run, indexed by run number (e.g. CampaignStore.design())
+    summary : pandas dataframe
+        Summary metrics of each run, indexed by run number (e.g. CampaignStore.summary())
+    variables : list, optional
+        Design variables to use, defaults to None (all of them except NOISE_VARIABLES)
+    metrics : list, optional
+        Summary metrics to fit, defaults to None (all of them)
+    degree : int, optional
+        Highest total degree of the polynomials, defaults to 2
+    interaction : int, optional
+        Most variables in a term, defaults to 1 (no interactions, which needs the fewest runs)
+    inputs : pandas dataframe, optional
+        Sampled inputs of each run, indexed by run number (e.g. CampaignStore.inputs()), to allow queries in their
+        units. Defaults to None
+
+    Attributes
+    ----------
+    variables : list
+        Design variables of the expansion
+    metrics : list
+        Metrics fitted
+    indices : numpy array
+        Degree of each variable in each term, see multi_indices
+    coefficients : pandas dataframe
+        Coefficient of each term (row) for each metric (column)
+    loo : pandas dataframe
+        Leave one out error of each metric: "rmse" and "relative" (the mean square error as a fraction of the
+        metric's variance, so 0 is perfect and 1 is no better than the mean)
+    residuals : pandas dataframe
+        Leave one out residual of each run for each metric
+    bounds : numpy array
+        Smallest and largest draw of each variable in the campaign, shape (2, variables)
+    units : dict
+        (offset, scale) for each design variable with an input that is a linear function of it,
+        input = offset + scale * draw
+    runs : int
+        Number of runs fitted to
+    """
+
+    def __init__(
+        self,
+        design,
+        summary,
+        variables=None,
+        metrics=None,
+        degree=2,
+        interaction=1,
+        inputs=None,
+    ):
+        if variables is None:
+            variables = [name for name in design if name not in NOISE_VARIABLES]
+        if metrics is None:
+            metrics = list(summary.columns)
+        self.variables = list(variables)
+        self.metrics = list(metrics)
+        self.degree = degree
+        self.indices = multi_indices(len(self.variables), degree, interaction)
+
+        runs = design.index.intersection(summary.index)
+        z = design.loc[runs, self.variables].to_numpy(dtype=float)
+        y = summary.loc[runs, self.metrics].to_numpy(dtype=float)
+        self.runs = len(runs)
+        if len(self.indices) >= self.runs:
+            raise ValueError(
+                "%s terms need more than %s runs, use fewer variables, a lower degree or fewer interactions"
+                % (len(self.indices), self.runs)
+            )
+        self.bounds = np.array([z.min(axis=0), z.max(axis=0)])
+
+        basis = self._basis(z)
+        coefficients = np.full((len(self.indices), len(self.metrics)), np.nan)
+        residuals = np.full(y.shape, np.nan)
+        for k in range(len(self.metrics)):
+            rows = np.isfinite(y[:, k])
+            if np.count_nonzero(rows) <= len(self.indices):
+                continue
+            q, r = np.linalg.qr(basis[rows])
+            coefficients[:, k] = np.linalg.solve(r, q.T @ y[rows, k])
+            leverage = np.sum(q ** 2, axis=1)
+            residuals[rows, k] = (y[rows, k] - basis[rows] @ coefficients[:, k]) / (
+                1 - leverage
+            )
+        self.coefficients = pd.DataFrame(
+            coefficients, index=self.term_names(), columns=self.metrics
+        )
+        self.residuals = pd.DataFrame(residuals, index=runs, columns=self.metrics)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.loo = pd.DataFrame(
+                {
+                    "rmse": np.sqrt(np.nanmean(residuals ** 2, axis=0)),
+                    "relative": np.nanmean(residuals ** 2, axis=0)
+                    / np.nanvar(y, axis=0),
+                },
+                index=self.metrics,
+            )
+
+        self.units = {}
+        if inputs is not None:
+            for k, name in enumerate(self.variables):
+                if name not in inputs:
+                    continue
+                values = inputs.loc[runs, name].to_numpy(dtype=float)
+                if not np.all(np.isfinite(values)):
+                    continue
+                A = np.column_stack([np.ones(len(values)), z[:, k]])
+                (offset, scale), *_ = np.linalg.lstsq(A, values, rcond=None)
+                if scale != 0 and np.allclose(
+                    A @ [offset, scale], values, rtol=1e-9, atol=0
+                ):
+                    self.units[name] = (offset, scale)
+
+    @classmethod
+    def from_campaign(cls, path, **kwargs):
+        """Fits a surrogate to a stored campaign
+
+        Parameters
+        ----------
+        path : string
+            Folder of the campaign (see campyros.store.CampaignStore)
+        **kwargs
+            Other arguments of Surrogate
+
+        Returns
+        -------
+        Surrogate
+            The fitted surrogate
+        """
+        store = CampaignStore(path)
+        return cls(store.design(), store.summary(), inputs=store.inputs(), **kwargs)
+
+    def term_names(self):
+        """Names of the terms, e.g. "1", "dry_mass", "dry_mass^2" or "CA*CN"
+
+        Returns
+        -------
+        list
+            Name of each term
+        """
+        names = []
+        for term in self.indices:
+            factors = [
+                name if power == 1 else "%s^%s" % (name, power)
+                for name, power in zip(self.variables, term)
+                if power > 0
+            ]
+            names.append("*".join(factors) if len(factors) > 0 else "1")
+        return names
+
+    def _basis(self, z):
+        """Value of each term at each point, shape (points, terms)"""
+        values = hermite(z, self.degree)
+        basis = np.ones((len(z), len(self.indices)))
+        for k in range(len(self.variables)):
+            used = self.indices[:, k] > 0
+            if np.any(used):
+                basis[:, used] *= values[:, k, self.indices[used, k]]
+        return basis
+
+    def _points(self, design):
+        """Design as an array with a column per variable, unspecified variables are 0 (their mean)"""
+        if isinstance(design, dict):
+            design = pd.DataFrame(
+                {name: np.atleast_1d(value) for name, value in design.items()}
+            )
+        if isinstance(design, pd.DataFrame):
+            unknown = [name for name in design if name not in self.variables]
+            if len(unknown) > 0:
+                raise ValueError(
+                    "%s aren't variables of the surrogate, which are %s"
+                    % (unknown, self.variables)
+                )
+            return design.reindex(columns=self.variables, fill_value=0.0).to_numpy(
+                dtype=float
+            )
+        return np.asarray(design, dtype=float).reshape(-1, len(self.variables))
+
+    def predict(self, design):
+        """Predicted summary metrics
+
+        Parameters
+        ----------
+        design : pandas dataframe, dict or numpy array
+            Design variable values (standard normal draws) of each point, a column per variable. Variables that
+            aren't given are 0, their mean. An array must have a column for every variable, in order
+
+        Returns
+        -------
+        pandas dataframe
+            A column per metric, a row per point
+        """
+        return pd.DataFrame(
+            self._basis(self._points(design)) @ self.coefficients.to_numpy(),
+            columns=self.metrics,
+        )
+
+    def outside(self, design):
+        """Whether each point is outside the trained region, where predictions are extrapolation and should be
+        checked with real runs
+
+        Parameters
+        ----------
+        design : pandas dataframe, dict or numpy array
+            Design variable values, as predict
+
+        Returns
+        -------
+        numpy array
+            True for each point with a variable outside the range of the campaign's draws
+        """
+        z = self._points(design)
+        return np.any((z < self.bounds[0]) | (z > self.bounds[1]), axis=1)
+
+    def moments(self):
+        """Mean and standard deviation of each metric over the campaign's distribution, from the coefficients
+
+        Returns
+        -------
+        pandas dataframe
+            "mean" and "std" of each metric (not including the residual scatter)
+        """
+        return pd.DataFrame(
+            {
+                "mean": self.coefficients.iloc[0],
+                "std": np.sqrt(np.sum(self.coefficients.iloc[1:] ** 2, axis=0)),
+            }
+        )
+
+    def to_design(self, values):
+        """Converts inputs in their own units to design variable values
+
+        Parameters
+        ----------
+        values : dict
+            Value of each input
+
+        Returns
+        -------
+        dict
+            Design variable value of each input
+        """
+        missing = [name for name in values if name not in self.units]
+        if len(missing) > 0:
+            raise ValueError(
+                "%s can't be converted, the inputs with units are %s"
+                % (missing, list(self.units))
+            )
+        return {
+            name: (np.asarray(value) - self.units[name][0]) / self.units[name][1]
+            for name, value in values.items()
+        }
+
+    def distribution(
+        self, shift=None, fix=None, samples=10000, seed=None, residuals=True
+    ):
+        """Samples of the metrics for a changed campaign, e.g. with a heavier rocket
+
+        Note
+        ----
+        Every variable is drawn from its distribution in the campaign, then the shifted ones are moved and the fixed
+        ones set. shift and fix are in the inputs' own units (see to_design and the units attribute), e.g.
+        shift={"dry_mass": 2} is the same campaign with the dry mass 2 kg heavier. A warning is given if more than 10%
+        of the samples have a changed input outside the trained region.
+
+        Parameters
+        ----------
+        shift : dict, optional
+            Change to the mean of each input, defaults to None
+        fix : dict, optional
+            Value to fix each input at, defaults to None
+        samples : int, optional
+            Number of samples, defaults to 10000
+        seed : int, optional
+            Seed for the samples, defaults to None (random)
+        residuals : bool, optional
+            Add resampled leave one out residuals, for the scatter the surrogate doesn't explain, defaults to True
+
+        Returns
+        -------
+        pandas dataframe
+            A column per metric, a row per sample. .attrs["outside"] is the fraction of samples with a changed input
+            outside the trained region
+        """
+        rng = np.random.default_rng(seed)
+        z = pd.DataFrame(
+            rng.standard_normal((samples, len(self.variables))),
+            columns=self.variables,
+        )
+        if shift is not None:
+            # Checks they all have units
+            self.to_design(shift)
+            for name, change in shift.items():
+                z[name] += change / self.units[name][1]
+        if fix is not None:
+            for name, value in self.to_design(fix).items():
+                z[name] = value
+        out = self.predict(z)
+        if residuals == True:
+            rows = rng.integers(0, len(self.residuals), samples)
+            out += np.nan_to_num(self.residuals.to_numpy()[rows])
+        # The other variables cover the trained region the way the campaign did
+        changed = list(shift or {}) + list(fix or {})
+        outside = np.mean(self.outside(z[changed]))
+        if outside > 0.1:
+            warnings.warn(
+                "%.0f%% of the samples are outside the trained region, the predictions there are extrapolation"
+                % (100 * outside)
+            )
+        out.attrs["outside"] = outside
+        return out
@@ -0,0 +1,134 @@
+import sys, os
+
+sys.path.append(
+    "/".join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))).split("/")[:-1]
+    )
+)
+from campyros.statistical import StatisticalModel
+from campyros.online import StoppingRule
+import numpy as np
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+# Settings of the small real rocket the campaign tests fly, its paths are relative to the repository
+STATS_SETTINGS = os.path.join(TESTS, "test_stats.json")
+
+
+class StubModel(StatisticalModel):
+    """A StatisticalModel that skips the flight, each run's summary is a function of its draws
+
+    Note
+    ----
+    Has every attribute StatisticalModel.__init__ sets that a campaign uses, without a settings file. The inputs of
+    each run are {"noise": a draw from the global random state}, which is seeded for each run too.
+
+    Parameters
+    ----------
+    name : string
+        Campaign name
+    itterations : int, optional
+        Number of runs, defaults to 64
+    design_variables : list, optional
+        Names of the draws, defaults to ["landing_x", "landing_y"]
+    sampling : string, optional
+        Sampling method of the design, defaults to "random"
+    response : callable, optional
+        Summary metrics of a run from its draws, called as response({name: draw}), defaults to None (the draws)
+    convergence : dict, optional
+        Arguments of the StoppingRule, defaults to None (no early stopping)
+    fail : list, optional
+        Run numbers that raise an error, defaults to []
+    interrupt : int, optional
+        Run number that raises KeyboardInterrupt (before it's counted in ran), defaults to None
+    log : list, optional
+        Shared list each run appends (name, run number) to, e.g. to see the order of several campaigns, defaults to None
+
+    Attributes
+    ----------
+    ran : list
+        Run numbers done in this process, in order
+    """
+
+    def __init__(
+        self,
+        name,
+        itterations=64,
+        design_variables=["landing_x", "landing_y"],
+        sampling="random",
+        response=None,
+        convergence=None,
+        fail=[],
+        interrupt=None,
+        log=None,
+    ):
+        self.name = name
+        self.itterations = itterations
+        self.trajectories = "none"
+        self.convergence = None if convergence is None else StoppingRule(**convergence)
+        self.sampling = sampling
+        self.design_variables = list(design_variables)
+        self.design = None
+        self.importance = None
+        self.engine = "single"
+        self.budget = {}
+        self.response = response
+        self.fail = fail
+        self.interrupt = interrupt
+        self.log = log
+        self.ran = []
+
+    def run_itteration(self, id, debug=False, trajectory=True):
+        if id == self.interrupt:
+            raise KeyboardInterrupt
+        self.ran.append(id)
+        if self.log is not None:
+            self.log.append((self.name, id))
+        z = self.draws(id)
+        if id in self.fail:
+            raise ValueError("A failed run")
+        inputs = {"noise": np.random.random()}
+        if self.response is None:
+            return inputs, dict(z), None
+        return inputs, self.response(z), None
+
+
+def flying_model(name, itterations=2):
+    """The small real rocket of test_stats.json, run with the ensemble engine so a chunk of runs is quick
+
+    Parameters
+    ----------
+    name : string
+        Campaign name
+    itterations : int, optional
+        Number of runs, defaults to 2
+
+    Returns
+    -------
+    StatisticalModel
+        The model
+    """
+    model = StatisticalModel(STATS_SETTINGS)
+    model.name = name
+    model.itterations = itterations
+    model.engine = "ensemble"
+    model.trajectories = "none"
+    return model
@@ -215,6 +215,9 @@ class ExampleTest(unittest.TestCase):
             ran,
             msg="Statistical model run failed, no further information automatically available",
         )
+        summary = stats.CampaignStore("results/stats_testcase").summary()
+        self.assertEqual(stats.SUMMARY_METRICS, list(summary.columns))
+        self.assertTrue(0.1 < summary["max_mach"][1] < 5)
 
 
 if __name__ == "__main__":
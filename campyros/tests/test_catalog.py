@@ -0,0 +1,141 @@
+import unittest
+import sys, os
+import tempfile
+import time
+
+sys.path.append(
+    "/".join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))).split("/")[:-1]
+    )
+)
+from campyros.catalog import Catalog
+from campyros.store import CampaignStore, CATALOG_FILE, TRAJECTORY_FILE
+import numpy as np
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+
+def runs(ids):
+    """Inputs, trajectories and summaries of fake runs, run n lands n km north"""
+    inputs = [{"parachute_failed": id % 3 == 0, "thrust": 1 + id / 100} for id in ids]
+    trajectories = [
+        None if id % 5 == 0 else np.full((id % 4 + 2, 7), float(id)) for id in ids
+    ]
+    summaries = [
+        {"landing_x": 1000.0 * id, "landing_y": 0.0, "max_q": (id * 7) % 11}
+        for id in ids
+    ]
+    return inputs, trajectories, summaries
+
+
+class CatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = CampaignStore(self.tmp.name)
+        self.store.write_shard(range(1, 11), *runs(range(1, 11)))
+        self.store.write_shard(range(11, 21), *runs(range(11, 21)))
+        self.store.compact()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_queries(self):
+        catalog = Catalog(self.tmp.name)
+        self.assertEqual(20, len(catalog))
+        self.assertIn("landing_range", catalog.columns)
+        failed_far = catalog.where(parachute_failed=1, landing_range=(5000, None))
+        self.assertEqual([6, 9, 12, 15, 18], list(failed_far))
+        self.assertEqual(
+            list(failed_far),
+            list(catalog.query("parachute_failed == 1 and landing_range >= 5000")),
+        )
+        self.assertEqual([2, 3, 4], list(catalog.range("landing_x", 2000, 4000)))
+        # max_q is 10 for runs 3 and 14, then 9 for run 17, and lowest 0 for run 11 then 1 for run 8
+        highest = catalog.top("max_q", 3)
+        self.assertEqual([3, 14], sorted(highest[:2]))
+        self.assertEqual(17, highest[2])
+        self.assertEqual([11, 8], list(catalog.top("max_q", 2, largest=False)))
+        self.assertEqual(10, catalog.rows([3])["max_q"].iloc[0])
+        self.assertEqual([], list(catalog.where(thrust=(5, None))))
+        with self.assertRaises(KeyError):
+            catalog.where(apogee=1)
+
+    def test_trajectories(self):
+        Catalog(self.tmp.name)
+        # Cached, then only the runs asked for are read
+        catalog = Catalog(self.tmp.name)
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp.name, CATALOG_FILE)))
+        trajectories = catalog.trajectories([7, 10, 3])
+        self.assertIsInstance(catalog._trajectory, np.memmap)
+        self.assertEqual([7, 10, 3], list(trajectories))
+        np.testing.assert_array_equal(np.full((5, 7), 7.0), trajectories[7])
+        self.assertEqual((0, 7), trajectories[10].shape)
+        with self.assertRaises(KeyError):
+            catalog.trajectories([21])
+
+    def test_rebuilt(self):
+        Catalog(self.tmp.name)
+        # Runs that haven't been compacted are included, without caching them
+        self.store.write_shard([21], *runs([21]))
+        catalog = Catalog(self.tmp.name)
+        self.assertEqual(21, len(catalog))
+        np.testing.assert_array_equal(
+            np.full((3, 7), 21.0), catalog.trajectories([21])[21]
+        )
+        self.store.compact()
+        catalog = Catalog(self.tmp.name)
+        self.assertEqual([21], list(catalog.top("landing_range", 1)))
+        self.assertEqual(3, len(catalog.trajectories([21])[21]))
+        self.store.clear()
+        self.assertFalse(os.path.isfile(os.path.join(self.tmp.name, TRAJECTORY_FILE)))
+
+    def test_speed(self):
+        n = 100000
+        rng = np.random.default_rng(0)
+        ids = np.arange(1, n + 1)
+        self.store._save(
+            os.path.join(self.tmp.name, "campaign.npz"),
+            ids=ids,
+            offsets=np.zeros(n + 1, dtype=int),
+            trajectory=np.zeros((0, 7)),
+            inputs=(rng.random((n, 30)) < 0.01).astype(float),
+            input_names=np.array(["parachute_failed"] + ["x%s" % i for i in range(29)]),
+            summary=rng.normal(0, 3000, (n, 10)),
+            summary_names=np.array(
+                ["landing_x", "landing_y"] + ["metric_%s" % i for i in range(8)]
+            ),
+        )
+        Catalog(self.tmp.name)
+        start = time.perf_counter()
+        catalog = Catalog(self.tmp.name)
+        failed_far = catalog.where(parachute_failed=1, landing_range=(5000, None))
+        highest = catalog.top("metric_3", 20)
+        rows = catalog.rows(failed_far)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(n, len(catalog))
+        self.assertTrue(np.all(rows["landing_range"] >= 5000))
+        self.assertEqual(
+            list(catalog.table["metric_3"].nlargest(20).index), list(highest)
+        )
+        self.assertLess(elapsed, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
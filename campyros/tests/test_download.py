@@ -0,0 +1,164 @@
+import unittest
+import sys, os
+import hashlib
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(
+    "/".join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))).split("/")[:-1]
+    )
+)
+from campyros.download import download_file, DownloadError
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+PAYLOAD = b"GRIB" + bytes(range(256)) * 40 + b"7777"
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Serves PAYLOAD, misbehaving in different ways depending on the path
+
+    /flaky      drops the connection half way through the first response, honours ranges after
+    /norange    drops the connection on the first response and ignores range requests
+    /busy       returns 503 twice before working
+    /missing    always returns 404
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        log = self.server.requests.setdefault(self.path, [])
+        log.append(self.headers.get("Range"))
+        first = len(log) == 1
+
+        if self.path == "/missing":
+            self.send_error(404)
+        elif self.path == "/busy" and len(log) <= 2:
+            self.send_error(503)
+        elif self.path in ["/flaky", "/norange"] and first:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(PAYLOAD)))
+            self.end_headers()
+            self.wfile.write(PAYLOAD[: len(PAYLOAD) // 2])
+            self.close_connection = True
+        elif self.headers.get("Range") is not None and self.path != "/norange":
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header(
+                "Content-Range",
+                "bytes %s-%s/%s" % (start, len(PAYLOAD) - 1, len(PAYLOAD)),
+            )
+            self.send_header("Content-Length", str(len(PAYLOAD) - start))
+            self.end_headers()
+            self.wfile.write(PAYLOAD[start:])
+        else:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(PAYLOAD)))
+            self.end_headers()
+            self.wfile.write(PAYLOAD)
+
+
+class DownloadTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+        cls.server.requests = {}
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = "http://127.0.0.1:%s" % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "wind", "file.grb2")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def test_resume(self):
+        download_file(self.url + "/flaky", self.path, backoff=0, chunk_size=1024)
+        self.assertEqual(PAYLOAD, self.read())
+        ranges = self.server.requests["/flaky"]
+        self.assertEqual(2, len(ranges))
+        self.assertIsNone(ranges[0])
+        # Whatever was received before the connection dropped is kept
+        self.assertGreater(int(ranges[1].split("=")[1].rstrip("-")), 0)
+        self.assertFalse(os.path.exists(self.path + ".part"))
+
+    def test_range_ignored(self):
+        download_file(self.url + "/norange", self.path, backoff=0)
+        self.assertEqual(PAYLOAD, self.read())
+
+    def test_retry_status(self):
+        download_file(self.url + "/busy", self.path, backoff=0)
+        self.assertEqual(PAYLOAD, self.read())
+        self.assertEqual(3, len(self.server.requests["/busy"]))
+
+    def test_fatal_status(self):
+        with self.assertRaises(DownloadError):
+            download_file(self.url + "/missing", self.path, backoff=0)
+        self.assertEqual(1, len(self.server.requests["/missing"]))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_checksum(self):
+        download_file(
+            self.url + "/flaky",
+            self.path,
+            backoff=0,
+            sha256=hashlib.sha256(PAYLOAD).hexdigest(),
+            expected_size=len(PAYLOAD),
+        )
+        self.assertEqual(PAYLOAD, self.read())
+
+        os.remove(self.path)
+        with self.assertRaises(DownloadError):
+            download_file(self.url + "/busy", self.path, backoff=0, sha256="0" * 64)
+        self.assertEqual(3, len(self.server.requests["/busy"]))
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + ".part"))
+
+    def test_validation(self):
+        with self.assertRaises(DownloadError):
+            download_file(
+                self.url + "/busy",
+                self.path,
+                backoff=0,
+                retries=3,
+                validate=lambda loc: False,
+            )
+        self.assertFalse(os.path.exists(self.path))
+        # The 503s are retried but the complete download that fails validation isn't
+        self.assertEqual(3, len(self.server.requests["/busy"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
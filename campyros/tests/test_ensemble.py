@@ -0,0 +1,341 @@
+import unittest
+import sys, os
+import tempfile
+import itertools
+from unittest import mock
+
+sys.path.append(
+    "/".join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))).split("/")[:-1]
+    )
+)
+from campyros import ensemble
+from campyros import parallel
+from campyros.aero import AeroData
+from campyros.main import RunStatus
+from campyros.statistical import StatisticalModel, run_chunk
+from campyros.store import CampaignStore
+from campyros.turbulence import TurbulentWind
+from campyros.transforms import (
+    i2lla,
+    direction_i2l,
+    pos_i2l,
+    vel_i2l,
+    lla2i,
+    i2airspeed,
+    pos_i2alt,
+)
+import numpy as np
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+
+class Site:
+    lat = 52.1
+    longi = 0.11
+    alt = 30.0
+
+
+class VectorisedTest(unittest.TestCase):
+    """The array versions agree with the functions Rocket.fdot uses"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.time = rng.uniform(0, 200, 20)
+        self.pos_i = np.array(
+            [
+                lla2i(lat, long, alt, t)
+                for lat, long, alt, t in zip(
+                    rng.uniform(-89, 89, 20),
+                    rng.uniform(-180, 180, 20),
+                    rng.uniform(-100, 30000, 20),
+                    self.time,
+                )
+            ]
+        )
+        self.vel_i = rng.normal(0, 300, (20, 3))
+
+    def test_i2lla(self):
+        np.testing.assert_allclose(
+            [i2lla(pos, t) for pos, t in zip(self.pos_i, self.time)],
+            np.column_stack(ensemble.i2lla(self.pos_i, self.time)),
+            rtol=1e-12,
+            atol=1e-6,
+        )
+
+    def test_frames(self):
+        matrices = ensemble.i2l_matrices(Site.lat, Site.longi, self.time)
+        for matrix, vector, t in zip(matrices, self.vel_i, self.time):
+            np.testing.assert_allclose(
+                direction_i2l(vector, Site, t), matrix @ vector, atol=1e-9
+            )
+        positions, velocities = ensemble.launch_frame(
+            self.pos_i, self.vel_i, Site, self.time
+        )
+        for n, t in enumerate(self.time):
+            np.testing.assert_allclose(
+                pos_i2l(self.pos_i[n], Site, t), positions[n], atol=1e-6
+            )
+            np.testing.assert_allclose(
+                vel_i2l(self.vel_i[n], Site, t), velocities[n], atol=1e-9
+            )
+
+    def test_batched_transforms(self):
+        # A whole trajectory at once gives the same as a row at a time
+        for func, args in [
+            (pos_i2l, (self.pos_i, Site)),
+            (vel_i2l, (self.vel_i, Site)),
+            (direction_i2l, (self.vel_i, Site)),
+            (i2airspeed, (self.pos_i, self.vel_i, Site)),
+        ]:
+            rows = [
+                func(
+                    *[arg[n] if isinstance(arg, np.ndarray) else arg for arg in args], t
+                )
+                for n, t in enumerate(self.time)
+            ]
+            np.testing.assert_allclose(rows, func(*args, self.time), atol=1e-6)
+        np.testing.assert_allclose(
+            [pos_i2alt(pos, t) for pos, t in zip(self.pos_i, self.time)],
+            pos_i2alt(self.pos_i, self.time),
+            atol=1e-6,
+        )
+
+    def test_bilinear(self):
+        aero = AeroData.from_rasaero(os.path.join(TESTS, "testaero.csv"), 0.03)
+        rng = np.random.default_rng(1)
+        mach = rng.uniform(-1, 30, 200)
+        alpha = rng.uniform(-0.5, 2, 200)
+        expected = [
+            [func(m, a)[0] for m, a in zip(mach, alpha)]
+            for func in [aero.CA_func, aero.CN_func, aero.COP_func]
+        ]
+        tables = np.array([aero.CA_grid, aero.CN_grid, aero.COP_grid])
+        np.testing.assert_allclose(
+            expected,
+            ensemble.bilinear(aero.Mach_grid, aero.alpha_grid, tables, mach, alpha),
+            rtol=1e-12,
+            atol=1e-12,
+        )
+
+
+class EnsembleTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.model = StatisticalModel(os.path.join(TESTS, "test_stats.json"))
+
+    def build(self, ids, seed=5):
+        rockets = []
+        for id in ids:
+            parallel.seed_task(seed, id)
+            rockets.append(self.model.build_rocket(id)[1])
+        return rockets
+
+    def test_fdot(self):
+        self.check_fdot(self.build([1, 2, 3]))
+
+    def test_turbulence(self):
+        model = StatisticalModel(os.path.join(TESTS, "test_stats_turbulence.json"))
+        self.assertIn("turbulence_seed", model.design_variables)
+        rockets = []
+        for id in [1, 2, 3]:
+            parallel.seed_task(5, id)
+            rockets.append(model.build_rocket(id)[1])
+        winds = [rocket.launch_site.wind for rocket in rockets]
+        self.assertTrue(all(isinstance(wind, TurbulentWind) for wind in winds))
+        # Each run has its own gusts
+        self.assertFalse(np.array_equal(winds[0].gusts, winds[1].gusts))
+        self.check_fdot(rockets)
+
+    def check_fdot(self, rockets):
+        members = ensemble.Ensemble(rockets)
+        p = members._initial_state()
+        time = np.array([0.0, 2.0, 30.0])
+        # Spin the rockets a bit so the moments matter
+        p["y"][:, 6:9] = [[0.1, -0.2, 0.3], [0, 0.5, 0], [1, 0, -1]]
+        p["y"][:, 3:6] += p["y"][:, 9:12] * 100
+        for on_rail in [True, False]:
+            p["on_rail"][:] = on_rail
+            rates = members.fdot(time, p["y"], p)[0]
+            for n, rocket in enumerate(rockets):
+                rocket.on_rail = on_rail
+                np.testing.assert_allclose(
+                    rocket.fdot(time[n], p["y"][n]), rates[n], rtol=1e-6, atol=1e-9
+                )
+
+    def test_failed_member(self):
+        rockets = self.build([1, 2])
+        rockets[1].vel_i = rockets[1].vel_i * np.nan
+        members = ensemble.Ensemble(rockets)
+        outputs = members.run(max_time=1)
+        self.assertIsNone(outputs[1])
+        self.assertEqual([1], list(members.failures))
+        self.assertGreaterEqual(outputs[0]["time"][-1], 1)
+        self.assertIn(["Cleared rail"], outputs[0]["events"])
+
+    def test_non_finite_trial_step(self):
+        members = ensemble.Ensemble(self.build([1]))
+        fdot = members.fdot
+        poisoned = []
+
+        def flaky(time, y, p):
+            out = fdot(time, y, p)
+            if len(poisoned) == 0 and np.min(time) > 0.5:
+                poisoned.append(time)
+                out[0][:] = np.inf
+            return out
+
+        members.fdot = flaky
+        outputs = members.run(max_time=1)
+        # The step is tried again with a shorter step instead of failing the member
+        self.assertEqual(1, len(poisoned))
+        self.assertEqual({}, members.failures)
+        self.assertGreaterEqual(outputs[0]["time"][-1], 1)
+
+    def test_rail_exit(self):
+        rocket = self.build([1])[0]
+        run = rocket.run(max_time=2)
+        member = ensemble.Ensemble(self.build([1])).run(max_time=2)[0]
+        exits = []
+        for times, positions, events in [
+            (run["time"], np.array(list(run["pos_i"])), run["events"]),
+            (member["time"], member["pos_i"], member["events"]),
+        ]:
+            row = [n for n, event in enumerate(events) if "Cleared rail" in event]
+            self.assertEqual(1, len(row))
+            exits.append(times[row[0]])
+            # The step ends at the end of the rail, not wherever it happened to
+            self.assertAlmostEqual(
+                rocket.launch_site.rail_length,
+                rocket.rail_distance(positions[row[0]], times[row[0]]),
+                places=6,
+            )
+        self.assertAlmostEqual(exits[0], exits[1], places=5)
+
+    def test_budgets(self):
+        status = RunStatus
+        rocket = self.build([1])[0]
+        output = rocket.run(max_steps=5)
+        self.assertEqual(status.MAX_STEPS, output.attrs["status"])
+        self.assertEqual(5, len(output))
+        rocket = self.build([1])[0]
+        output = rocket.run(max_evaluations=60)
+        self.assertEqual(status.MAX_EVALUATIONS, rocket.status)
+        self.assertGreaterEqual(output.attrs["evaluations"], 60)
+        self.assertEqual(0, len(self.build([1])[0].run(max_wall_time=0)))
+        output = self.build([1])[0].run(max_time=1)
+        self.assertEqual(status.MAX_TIME, output.attrs["status"])
+        self.assertFalse(status.MAX_TIME.budget_exceeded)
+
+        members = ensemble.Ensemble(self.build([1, 2]))
+        self.assertEqual([None, None], members.run(max_steps=5))
+        self.assertEqual([status.MAX_STEPS] * 2, members.status)
+        self.assertIn("max_steps", members.failures[0])
+        members.run(max_time=1, max_wall_time=1e9)
+        self.assertEqual([status.MAX_TIME] * 2, members.status)
+        self.assertEqual([None, None], members.run(max_wall_time=0))
+        self.assertEqual([status.MAX_WALL_TIME] * 2, members.status)
+        # The wall time is each member's share, so two identical members get twice the steps of one on its own
+        stopped = []
+        for ids in [[1], [1, 1]]:
+            members = ensemble.Ensemble(self.build(ids))
+            with mock.patch.object(
+                ensemble.time, "perf_counter", side_effect=itertools.count()
+            ):
+                members.run(max_wall_time=20)
+            self.assertEqual([status.MAX_WALL_TIME] * len(ids), members.status)
+            stopped.append(float(members.failures[0].split("=")[1].split(" ")[0]))
+        self.assertGreater(stopped[1], stopped[0])
+
+        # Runs that use up their budget are failures in a campaign, with either engine
+        self.model.budget = {"max_steps": 5}
+        try:
+            for engine in ["single", "ensemble"]:
+                self.model.engine = engine
+                with tempfile.TemporaryDirectory() as tmp:
+                    errors = run_chunk(parallel.LocalObject(self.model), [1], tmp, 5)[0]
+                self.assertIn("max_steps", errors[1])
+        finally:
+            self.model.budget = {}
+            self.model.engine = "single"
+
+    def test_point_mass(self):
+        rockets = self.build([1, 2])
+        full = ensemble.Ensemble(rockets).run(max_time=30)
+        point_masses = ensemble.PointMass(rockets).run()
+        for rocket, run, point_mass in zip(rockets, full, point_masses):
+            self.assertNotIn("w_b", point_mass)
+            events = sum(point_mass["events"], [])
+            self.assertEqual(["Cleared rail", "Parachute deployed"], events)
+            apogee = [
+                max(ensemble.i2lla(output["pos_i"], output["time"])[2])
+                for output in [run, point_mass]
+            ]
+            self.assertAlmostEqual(1, apogee[1] / apogee[0], delta=0.02)
+            self.assertAlmostEqual(
+                1, max(point_mass["mach"]) / max(run["mach"]), delta=0.02
+            )
+
+    def test_campaign(self):
+        # The ensemble engine is a drop in replacement for running each rocket
+        self.model.engine = "ensemble"
+        self.model.trajectories = "all"
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                errors, summaries, trajectories = run_chunk(
+                    parallel.LocalObject(self.model), [1, 2], tmp, 5
+                )
+                stored = CampaignStore(tmp).inputs()
+        finally:
+            self.model.engine = "single"
+        self.assertEqual({1: None, 2: None}, errors)
+        self.assertEqual([1, 2], list(stored.index))
+
+        parallel.seed_task(5, 1)
+        inputs, summary, trajectory = self.model.run_itteration(1)
+        # Built from the same draws
+        np.testing.assert_array_equal(
+            [inputs[name] for name in stored.columns], stored.loc[1]
+        )
+        # Both engines end the step the rocket leaves the rail in at the end of the rail
+        self.assertAlmostEqual(
+            1, summaries[1]["rail_exit_velocity"] / summary["rail_exit_velocity"], 5
+        )
+        for name in ["apogee_alt", "max_mach", "max_q"]:
+            self.assertAlmostEqual(1, summaries[1][name] / summary[name], places=3)
+        # The parachute is deployed at the start of a step, so the landing is only as close as the steps near apogee
+        self.assertLess(
+            np.hypot(
+                summaries[1]["landing_x"] - summary["landing_x"],
+                summaries[1]["landing_y"] - summary["landing_y"],
+            ),
+            0.01 * np.hypot(summary["landing_x"], summary["landing_y"]) + 1,
+        )
+        # The landing is the first step below the ground, which is only as close as the (long) steps under the parachute
+        self.assertLess(
+            abs(summaries[1]["landing_time"] - summary["landing_time"]),
+            trajectory[-1, 0] - trajectory[-2, 0],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import unittest
+import sys, os
+import shutil
+
+sys.path.append(
+    "/".join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))).split("/")[:-1]
+    )
+)
+from campyros import importance
+from campyros.store import CampaignStore
+from campyros.online import StoppingRule
+from campyros.tests.helpers import StubModel
+import numpy as np
+import scipy.stats
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# Landing area, the landing is 100 m per unit draw so leaving it is a 3.8 sigma event in each direction
+HALF_WIDTH = 380
+SQUARE = HALF_WIDTH * np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]])
+TRUTH = 1 - (1 - 2 * scipy.stats.norm.cdf(-HALF_WIDTH / 100)) ** 2
+
+
+class PolygonTest(unittest.TestCase):
+    def test_distance(self):
+        square = [[0, 0], [10, 0], [10, 10], [0, 10]]
+        distance, edge = importance.polygon_distance(
+            [[5, 4], [15, 5], [13, 14], [5, -1]], square, return_edge=True
+        )
+        np.testing.assert_allclose([-4, 5, 5, 1], distance)
+        self.assertEqual([0, 1, 0], list(edge[[0, 1, 3]]))
+
+
+class MixtureTest(unittest.TestCase):
+    def test_weights(self):
+        columns = [0, 2]
+        shifts = np.array([[2.0, 0.5], [-1.0, 1.5]])
+        fractions = np.array([0.7, 0.3])
+        design = importance.shifted_design(
+            np.random.default_rng(0).standard_normal((20000, 3)),
+            columns,
+            shifts,
+            fractions,
+            0.1,
+            seed=4,
+        )
+        # The rows are drawn from the mixture, so the weights average to 1
+        weights = importance.likelihood_ratio(design, columns, shifts, fractions, 0.1)
+        self.assertAlmostEqual(1, np.mean(weights), delta=0.03)
+        self.assertLessEqual(np.max(weights), 10)
+        # Each row's component only depends on its number
+        np.testing.assert_array_equal(
+            importance.mixture_component(range(100, 120), 4, 0.1, fractions),
+            importance.mixture_component(range(120), 4, 0.1, fractions)[100:],
+        )
+        self.assertAlmostEqual(
+            0.1,
+            np.mean(importance.mixture_component(range(2000), 4, 0.1, fractions) == -1),
+            delta=0.02,
+        )
+
+    def test_rare_probability(self):
+        rng = np.random.default_rng(1)
+        pilot = rng.standard_normal((500, 2))
+        scores, edges = importance.polygon_distance(
+            100 * pilot, SQUARE, return_edge=True
+        )
+        # None of the pilot runs leave, but they show the way
+        self.assertTrue(np.all(scores < 0))
+        shifts, fractions = importance.cross_entropy_shift(pilot, scores, groups=edges)
+        self.assertEqual(4, len(shifts))
+        design = importance.shifted_design(
+            rng.standard_normal((4000, 2)), [0, 1], shifts, fractions, 0.1, seed=1
+        )
+        outside = importance.polygon_distance(100 * design, SQUARE) > 0
+        result = importance.exceedance_probability(
+            outside,
+            importance.likelihood_ratio(design, [0, 1], shifts, fractions, 0.1),
+        )
+        self.assertGreater(result["hits"], 100)
+        self.assertLess(result["std_error"], 0.2 * TRUTH)
+        low, high = result["interval"]
+        self.assertTrue(low < TRUTH < high)
+        # Plain sampling with the same runs would most likely see one hit or none
+        self.assertLess(4000 * TRUTH, 2)
+
+
+def landing_model(name, itterations):
+    """The landing is 100 m per unit draw"""
+    return StubModel(
+        name, itterations, response=lambda z: {key: 100 * z[key] for key in z}
+    )
+
+
+class CampaignTest(unittest.TestCase):
+    def tearDown(self):
+        for name in ["importance_pilot", "importance_test"]:
+            shutil.rmtree("results/%s" % name, ignore_errors=True)
+
+    def test_campaign(self):
+        pilot = landing_model("importance_pilot", 300)
+        pilot_loc = pilot.run_model(backend="serial", seed=1, progress=False)
+        self.assertEqual(0, pilot.exceedance(SQUARE)["hits"])
+        # The landing draws aren't the usual dominant inputs
+        with self.assertRaises(ValueError):
+            pilot.plan_importance(pilot_loc, SQUARE)
+
+        model = landing_model("importance_test", 2000)
+        planned = model.plan_importance(
+            pilot_loc, SQUARE, variables=["landing_x", "landing_y"]
+        )
+        self.assertEqual(["landing_x", "landing_y"], list(planned["shift"]))
+        model.run_model(backend="serial", seed=2, progress=False)
+        self.assertEqual(
+            planned, CampaignStore("results/importance_test").manifest()["importance"]
+        )
+        result = model.exceedance(SQUARE)
+        self.assertEqual(2000, result["runs"])
+        self.assertEqual(300, model.exceedance(SQUARE, save_loc=pilot_loc)["runs"])
+        low, high = result["interval"]
+        self.assertTrue(low < TRUTH < high)
+        self.assertLess(result["std_error"], 0.3 * TRUTH)
+
+        # The design is extended from the same mixture, and can't be resumed with another
+        model.itterations = 2100
+        model.run_model(backend="serial", progress=False, resume=True)
+        self.assertEqual(2100, model.exceedance(SQUARE)["runs"])
+        # The convergence checks would be of the shifted distribution
+        model.convergence = StoppingRule(landing_mean=1)
+        with self.assertRaises(ValueError):
+            model.run_model(backend="serial", progress=False, resume=True)
+        model.convergence = None
+        model.importance = None
+        with self.assertRaises(ValueError):
+            model.run_model(backend="serial", progress=False, resume=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
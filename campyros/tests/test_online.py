@@ -0,0 +1,199 @@
+import unittest
+import sys, os
+import io
+import shutil
+
+sys.path.append(
+    "/".join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))).split("/")[:-1]
+    )
+)
+import matplotlib
+
+matplotlib.use("Agg")
+from campyros import online
+from campyros.store import CampaignStore
+from campyros.tests.helpers import StubModel
+import numpy as np
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+
+class RunningStatsTest(unittest.TestCase):
+    def test_matches_numpy(self):
+        rng = np.random.default_rng(0)
+        # A large offset is where the naive sum of squares loses precision
+        samples = rng.multivariate_normal(
+            [1e7, -3, 50], [[4, 1, 0], [1, 2, 0.5], [0, 0.5, 9]], 500
+        )
+        single, batches, merged = [online.RunningStats(3) for _ in range(3)]
+        for sample in samples:
+            single.update(sample)
+        for batch in np.array_split(samples, 7):
+            batches.update(batch)
+            part = online.RunningStats(3)
+            part.update(batch)
+            merged.merge(part)
+        for stats in [single, batches, merged]:
+            self.assertEqual(500, stats.n)
+            np.testing.assert_allclose(samples.mean(axis=0), stats.mean)
+            np.testing.assert_allclose(np.cov(samples.T), stats.cov, atol=1e-7)
+
+    def test_nan_and_interval(self):
+        stats = online.RunningStats(2)
+        stats.update([[1, 2], [np.nan, 0], [3, 6]])
+        self.assertEqual(2, stats.n)
+        low, high = stats.confidence_interval(0.95)
+        np.testing.assert_allclose([2, 4], (low + high) / 2)
+        np.testing.assert_allclose(
+            1.959964 * np.array([1, 2]), high - [2, 4], rtol=1e-6
+        )
+
+
+class ReservoirTest(unittest.TestCase):
+    def test_uniform(self):
+        counts = np.zeros(50)
+        for seed in range(400):
+            reservoir = online.Reservoir(5, seed)
+            for item in range(50):
+                reservoir.add(item)
+            self.assertEqual(5, len(reservoir.items))
+            counts[reservoir.items] += 1
+        # Each item is kept with probability 0.1
+        self.assertTrue(np.all(np.abs(counts - 40) < 25))
+
+
+class MonitorTest(unittest.TestCase):
+    def test_ellipse(self):
+        cov = np.array([[4.0, 1.0], [1.0, 2.0]])
+        outline = online.ellipse([10, 5], cov, sigma=2) - [10, 5]
+        # Every point is on the 2 sigma contour
+        distance = np.einsum("ij,jk,ik->i", outline, np.linalg.inv(cov), outline)
+        np.testing.assert_allclose(4, distance)
+
+    def test_monitor(self):
+        monitor = online.DispersionMonitor(reservoir_size=3, seed=1)
+        self.assertIn("not enough", monitor.report())
+        for n in range(10):
+            trajectory = np.zeros((5, 7))
+            trajectory[:, 3] = np.arange(5)
+            monitor.update(
+                {
+                    "landing_x": n,
+                    "landing_y": -n,
+                    "apogee_x": 0,
+                    "apogee_y": 0,
+                    "apogee_alt": 1000 + n,
+                },
+                trajectory if n % 2 == 0 else None,
+            )
+        self.assertEqual(10, monitor.landing.n)
+        self.assertEqual(5, monitor.trajectories.seen)
+        self.assertTrue(monitor.report().startswith("landing x 4±2 m"))
+        figure = monitor.plot(pause=0)
+        figure.savefig(io.BytesIO())
+        # Redrawing reuses the figure
+        self.assertIs(figure, monitor.plot(pause=0))
+
+
+class StoppingRuleTest(unittest.TestCase):
+    def monitor(self, n, seed=0):
+        monitor = online.DispersionMonitor()
+        for x, y in np.random.default_rng(seed).normal(0, 10, (n, 2)):
+            monitor.update({"landing_x": x, "landing_y": y})
+        return monitor
+
+    def test_tolerances(self):
+        monitor = self.monitor(400)
+        # The mean is known to about 1.96*10/sqrt(400) ~ 1 m and the standard deviation to about 0.7 m
+        self.assertTrue(online.StoppingRule(landing_mean=1.5).check(monitor))
+        self.assertFalse(online.StoppingRule(landing_mean=0.5).check(monitor))
+        self.assertTrue(online.StoppingRule(landing_std=1).check(monitor))
+        rule = online.StoppingRule(landing_mean=1.5, landing_std=0.3)
+        self.assertFalse(rule.check(monitor))
+        self.assertIn("standard deviation", rule.reason)
+
+        # The correlation is known to about 1.96/sqrt(397) ~ 0.1
+        rule = online.StoppingRule(landing_correlation=0.15)
+        self.assertTrue(rule.check(monitor))
+        self.assertTrue(rule.reason.startswith("landing correlation ±0.09"))
+        self.assertFalse(online.StoppingRule(landing_correlation=0.05).check(monitor))
+        # A correlated dispersion is pinned down more tightly
+        correlated = online.DispersionMonitor()
+        for x, y in np.random.default_rng(1).normal(0, 10, (400, 2)):
+            correlated.update({"landing_x": x, "landing_y": x + 0.1 * y})
+        self.assertTrue(online.StoppingRule(landing_correlation=0.05).check(correlated))
+
+        # The 99% radius of a circular normal is 10*sqrt(-2 ln 0.01) ~ 30 m
+        rule = online.StoppingRule(landing_quantile=[0.99, 100])
+        self.assertTrue(rule.check(self.monitor(4000)))
+        width = float(rule.reason.split("±")[1].split(" ")[0])
+        self.assertTrue(0.5 < width < 5)
+        self.assertFalse(
+            online.StoppingRule(landing_quantile=[0.99, 0.1]).check(monitor)
+        )
+
+        with self.assertRaises(ValueError):
+            online.StoppingRule()
+
+    def test_batches(self):
+        rule = online.StoppingRule(landing_mean=100, check_every=50, min_runs=120)
+        self.assertFalse(rule.due(100))
+        self.assertTrue(rule.due(120))
+        self.assertFalse(rule.check(self.monitor(100), 120))
+        self.assertFalse(rule.due(150))
+        self.assertTrue(rule.due(170))
+
+
+def quick_model(convergence):
+    """The landing is 10 m per unit draw"""
+    return StubModel(
+        "convergence_test",
+        itterations=10000,
+        response=lambda z: {name: 10 * z[name] for name in z},
+        convergence=convergence,
+    )
+
+
+class ConvergenceTest(unittest.TestCase):
+    def tearDown(self):
+        shutil.rmtree("results/convergence_test", ignore_errors=True)
+
+    def test_stops_early(self):
+        model = quick_model({"landing_mean": 2, "check_every": 20, "min_runs": 20})
+        model.run_model(backend="serial", seed=1, progress=False)
+        self.assertTrue(model.converged)
+        # Should need about (1.96*10/2)**2 ~ 100 runs, certainly not the cap
+        runs = model.monitor.landing.n
+        self.assertTrue(40 <= runs <= 300)
+        self.assertEqual(0, runs % 20)
+        self.assertEqual(runs, len(CampaignStore("results/convergence_test").summary()))
+
+    def test_cap(self):
+        model = quick_model({"landing_mean": 0.01, "check_every": 20, "min_runs": 20})
+        model.itterations = 60
+        with self.assertWarns(UserWarning):
+            model.run_model(backend="serial", seed=1, progress=False)
+        self.assertFalse(model.converged)
+        self.assertEqual(60, model.monitor.landing.n)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,267 @@
+import unittest
+import sys, os
+import pickle
+import tempfile
+import time
+import threading
+import concurrent.futures
+from multiprocessing import shared_memory
+
+sys.path.append(
+    "/".join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))).split("/")[:-1]
+    )
+)
+from campyros import parallel
+from campyros.statistical import run_chunk
+from campyros.store import CampaignStore
+import numpy as np
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+
+def draw(seed, ids):
+    """A stand in task, returns a random number per id"""
+    out = []
+    for id in ids:
+        parallel.seed_task(seed, id)
+        out.append(np.random.normal())
+    return ids, out
+
+
+def blas_threads():
+    return os.environ.get("OPENBLAS_NUM_THREADS")
+
+
+def fail():
+    raise ValueError("failed")
+
+
+def crash_once(marker):
+    """Kills the worker the first time it is called"""
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return "ok"
+
+
+class CountingBackend(parallel.SerialBackend):
+    """Runs tasks in threads and records the most that were ever in flight at once"""
+
+    def __init__(self):
+        self.workers = 2
+        self.executor = concurrent.futures.ThreadPoolExecutor(4)
+        self.in_flight = 0
+        self.most = 0
+        self.lock = threading.Lock()
+
+    def submit(self, func, *args):
+        with self.lock:
+            self.in_flight += 1
+            self.most = max(self.most, self.in_flight)
+        future = self.executor.submit(func, *args)
+        future.add_done_callback(self.finished)
+        return future
+
+    def finished(self, future):
+        with self.lock:
+            self.in_flight -= 1
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+class FakeModel:
+    def __init__(self):
+        self.runs = []
+        self.engine = "single"
+
+    def keep_trajectory(self, id, seed):
+        return id != 3
+
+    def run_itteration(self, id, debug=False, trajectory=True):
+        if id == 2:
+            raise FloatingPointError("run %s diverged" % id)
+        self.runs.append((id, np.random.normal()))
+        return (
+            {"draw": self.runs[-1][1]},
+            {"apogee_alt": id},
+            np.full((id, 7), float(id)) if trajectory else None,
+        )
+
+
+def shared_sum(shared, n):
+    return n, float(shared.get()["table"].sum())
+
+
+def run(backend, seed, chunksize):
+    results = {}
+    futures = [
+        backend.submit(draw, seed, chunk)
+        for chunk in parallel.chunks(list(range(20)), chunksize)
+    ]
+    for future in concurrent.futures.as_completed(futures):
+        ids, out = future.result()
+        results.update(zip(ids, out))
+    return [results[n] for n in range(20)]
+
+
+class ParallelTest(unittest.TestCase):
+    def test_seeding(self):
+        serial = run(parallel.SerialBackend(), 7, 20)
+        with parallel.ProcessPoolBackend(2) as backend:
+            pooled = run(backend, 7, 3)
+        self.assertEqual(serial, pooled)
+        self.assertEqual(20, len(set(serial)))
+        self.assertNotEqual(serial, run(parallel.SerialBackend(), 8, 20))
+
+    def test_blas_threads(self):
+        with parallel.ProcessPoolBackend(2) as backend:
+            self.assertEqual("1", backend.submit(blas_threads).result())
+        with parallel.ProcessPoolBackend(1, blas_threads=None) as backend:
+            self.assertEqual(blas_threads(), backend.submit(blas_threads).result())
+
+    def test_errors(self):
+        for backend in [parallel.SerialBackend(), parallel.ProcessPoolBackend(1)]:
+            with backend:
+                with self.assertRaises(ValueError):
+                    backend.submit(fail).result()
+
+    def test_get_backend(self):
+        self.assertIsInstance(parallel.get_backend("serial"), parallel.SerialBackend)
+        backend = parallel.get_backend("process", 3)
+        self.assertEqual(3, backend.workers)
+        backend.shutdown()
+        self.assertIs(backend, parallel.get_backend(backend))
+        with self.assertRaises(ValueError):
+            parallel.get_backend("threads")
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_bounded(self):
+        with CountingBackend() as backend:
+            tasks = [(0.01,)] * 30
+            results, failures = parallel.run_tasks(
+                backend, lambda wait: time.sleep(wait) or wait, tasks, max_in_flight=3
+            )
+        self.assertEqual([0.01] * 30, results)
+        self.assertEqual({}, failures)
+        self.assertLessEqual(backend.most, 3)
+
+    def test_retry_and_record(self):
+        attempts = []
+
+        def flaky(n):
+            attempts.append(n)
+            if n == 1 and attempts.count(1) < 3:
+                raise RuntimeError("temporary")
+            if n == 2:
+                raise RuntimeError("permanent")
+            return n
+
+        finished = []
+        results, failures = parallel.run_tasks(
+            parallel.SerialBackend(),
+            flaky,
+            [(0,), (1,), (2,)],
+            retries=2,
+            on_done=lambda index, result, error: finished.append(index),
+        )
+        self.assertEqual([0, 1, None], results)
+        self.assertEqual([2], list(failures))
+        self.assertIn("permanent", failures[2])
+        self.assertEqual(3, attempts.count(2))
+        self.assertEqual([0, 1, 2], sorted(finished))
+
+    def test_stop(self):
+        finished = []
+        results, failures = parallel.run_tasks(
+            parallel.SerialBackend(),
+            lambda n: n,
+            [(n,) for n in range(10)],
+            max_in_flight=1,
+            on_done=lambda index, result, error: finished.append(index),
+            stop=lambda: len(finished) >= 3,
+        )
+        self.assertEqual([0, 1, 2] + [None] * 7, results)
+        self.assertEqual({}, failures)
+
+    def test_worker_crash(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with parallel.ProcessPoolBackend(1) as backend:
+                results, failures = parallel.run_tasks(
+                    backend, crash_once, [(os.path.join(tmp, "marker"),)]
+                )
+        self.assertEqual(["ok"], results)
+        self.assertEqual({}, failures)
+
+    def test_run_errors_recorded(self):
+        model = FakeModel()
+        with tempfile.TemporaryDirectory() as tmp:
+            errors, summaries, trajectories = run_chunk(
+                parallel.LocalObject(model), [1, 2, 3], tmp, 5
+            )
+            stored = CampaignStore(tmp).load()
+        self.assertIsNone(errors[1])
+        self.assertIn("run 2 diverged", errors[2])
+        self.assertEqual([1, 3], [id for id, _ in model.runs])
+        # Only the runs that worked are stored
+        self.assertEqual([1, 3], list(stored["ids"]))
+        self.assertEqual([[1], [3]], stored["summary"].tolist())
+        # Run 3 only stored its summary
+        self.assertEqual([0, 1, 1], list(stored["offsets"]))
+        self.assertEqual({1: {"apogee_alt": 1}, 3: {"apogee_alt": 3}}, summaries)
+        self.assertEqual([1], list(trajectories))
+
+    def test_progress(self):
+        lines = []
+        progress = parallel.Progress(10, interval=1000, stream=lines.append)
+        for n in range(10):
+            progress.update(failed=int(n == 4))
+        # The first update and the end are always reported
+        self.assertEqual(2, len(lines))
+        self.assertTrue(lines[-1].startswith("10/10 runs finished (1 failed)"))
+
+
+class ShareTest(unittest.TestCase):
+    def test_shared_memory(self):
+        inputs = {"table": np.arange(1e6)}
+        with parallel.ProcessPoolBackend(2) as backend:
+            shared = backend.share(inputs)
+            # The handle sent with each task doesn't grow with the data
+            self.assertLess(len(pickle.dumps(shared)), 200)
+            results = [backend.submit(shared_sum, shared, n) for n in range(4)]
+            self.assertEqual(
+                [(n, inputs["table"].sum()) for n in range(4)],
+                [future.result() for future in results],
+            )
+            backend.release(shared)
+            with self.assertRaises(FileNotFoundError):
+                shared_memory.SharedMemory(name=shared.name)
+
+    def test_serial(self):
+        inputs = {"table": np.ones(3)}
+        shared = parallel.SerialBackend().share(inputs)
+        self.assertIs(inputs, shared.get())
+        self.assertEqual((0, 3.0), shared_sum(shared, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import sys, os
+
+sys.path.append(
+    "/".join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))).split("/")[:-1]
+    )
+)
+from campyros.aero import AeroData
+from campyros.motor import Motor, load_motor
+from campyros.mass import LiquidTank, SolidFuel
+import numpy as np
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+
+class PerturbTest(unittest.TestCase):
+    def test_aero(self):
+        base = AeroData.from_rasaero(os.path.join(TESTS, "testaero.csv"), 0.03)
+        error = {"CA": 1.1, "CN": 0.9, "COP": 1.05}
+        aero = base.perturbed(ref_area=0.04, pitch_damping_coefficient=2, error=error)
+        # The interpolators are shared rather than rebuilt
+        self.assertIs(base.CA_func, aero.CA_func)
+        self.assertEqual((0.03, 0.04), (base.ref_area, aero.ref_area))
+        self.assertEqual(2, aero.pitch_damping_coefficient)
+        self.assertEqual(base.roll_damping_coefficient, aero.roll_damping_coefficient)
+        for key in error:
+            np.testing.assert_allclose(
+                error[key] * getattr(base, key)(0.5, 0.05),
+                getattr(aero, key)(0.5, 0.05),
+            )
+
+    def test_motor(self):
+        base = Motor.from_novus(os.path.join(TESTS, "testmotor.csv"), pos=5)
+        motor = base.perturbed(1.2).perturbed(0.5)
+        self.assertIs(base.thrust_array, motor.thrust_array)
+        self.assertAlmostEqual(0.6 * base.thrust(1.3), motor.thrust(1.3))
+
+    def test_mass(self):
+        data = load_motor(os.path.join(TESTS, "testmotor.csv"))
+        plain = LiquidTank(data["lmass"], data["lden"], data["time"], 0.1, 3)
+        scaled = LiquidTank(
+            data["lmass"],
+            data["lden"],
+            data["time"],
+            0.1,
+            3,
+            lmass_scale=1.1,
+            lden_scale=0.9,
+        )
+        self.assertAlmostEqual(1.1 * plain.lmass(1.3), scaled.lmass(1.3))
+        self.assertAlmostEqual(1.1 / 0.9 * plain.lvol(1.3), scaled.lvol(1.3))
+
+        args = (
+            data["smass"],
+            data["time"],
+            data["sden"],
+            data["s_rout"],
+            data["s_l"],
+            2,
+        )
+        self.assertAlmostEqual(
+            0.8 * SolidFuel(*args).mass(1.3), SolidFuel(*args, mass_scale=0.8).mass(1.3)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
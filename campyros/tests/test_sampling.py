@@ -0,0 +1,158 @@
+import unittest
+import sys, os
+import shutil
+
+sys.path.append(
+    "/".join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))).split("/")[:-1]
+    )
+)
+from campyros import sampling
+from campyros.store import CampaignStore
+from campyros.tests.helpers import StubModel
+import numpy as np
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+
+class DesignTest(unittest.TestCase):
+    def test_methods(self):
+        for method in sampling.METHODS:
+            design = sampling.design_matrix(256, 5, method, seed=3)
+            self.assertEqual((256, 5), design.shape)
+            self.assertTrue(np.all(np.isfinite(design)))
+            np.testing.assert_array_equal(
+                design, sampling.design_matrix(256, 5, method, seed=3)
+            )
+            self.assertFalse(
+                np.array_equal(design, sampling.design_matrix(256, 5, method, seed=4))
+            )
+        with self.assertRaises(ValueError):
+            sampling.design_matrix(10, 2, "halton")
+
+    def test_extend(self):
+        # Random and Sobol rows don't depend on how many were generated
+        for method in ["random", "sobol"]:
+            np.testing.assert_array_equal(
+                sampling.design_matrix(20, 3, method, seed=5)[12:],
+                sampling.design_matrix(8, 3, method, seed=5, start=12),
+            )
+
+    def test_latin_hypercube_strata(self):
+        points = sampling.unit_design(50, 4, "latin_hypercube", seed=1)
+        # Exactly one point in each of the 50 equal slices of every dimension
+        for column in points.T:
+            self.assertEqual(list(range(50)), sorted((column * 50).astype(int)))
+
+    def test_sobol_converges_faster(self):
+        # Error in the mean of a smooth function of the draws, over a few seeds
+        def error(method):
+            return np.mean(
+                [
+                    abs(
+                        np.mean(
+                            np.exp(sampling.design_matrix(512, 3, method, seed).sum(1))
+                        )
+                        - np.exp(1.5)
+                    )
+                    for seed in range(10)
+                ]
+            )
+
+        self.assertLess(error("sobol"), error("random") / 3)
+
+    def test_uniform(self):
+        self.assertAlmostEqual(0.5, sampling.uniform(0.0))
+        points = sampling.unit_design(8, 2, "sobol", seed=0)
+        np.testing.assert_allclose(
+            points, sampling.uniform(sampling.design_matrix(8, 2, "sobol", seed=0))
+        )
+
+
+class CampaignDesignTest(unittest.TestCase):
+    def tearDown(self):
+        shutil.rmtree("results/sampling_test", ignore_errors=True)
+
+    def test_runs_read_their_row(self):
+        model = StubModel("sampling_test", sampling="sobol")
+        model.run_model(backend="serial", seed=2, progress=False, chunksize=5)
+        store = CampaignStore("results/sampling_test")
+        design = store.design()
+        self.assertEqual("sobol", design.attrs["method"])
+        self.assertEqual(["landing_x", "landing_y"], list(design.columns))
+        np.testing.assert_array_equal(model.design, design.to_numpy())
+        summary = store.summary()
+        np.testing.assert_array_equal(
+            design.loc[summary.index, ["landing_x", "landing_y"]].to_numpy(),
+            summary[["landing_x", "landing_y"]].to_numpy(),
+        )
+        # The same seed gives the same design
+        model.run_model(backend="serial", seed=2, progress=False)
+        np.testing.assert_array_equal(design.to_numpy(), store.design().to_numpy())
+
+    def test_resume(self):
+        store = CampaignStore("results/sampling_test")
+        whole = StubModel("sampling_test", sampling="sobol")
+        whole.run_model(backend="serial", seed=2, progress=False, chunksize=8)
+        expected = store.load()
+
+        model = StubModel("sampling_test", sampling="sobol", interrupt=30)
+        with self.assertWarns(UserWarning):
+            model.run_model(backend="serial", seed=2, progress=False, chunksize=8)
+        # The chunk that was interrupted isn't stored
+        self.assertEqual(list(range(1, 25)), list(store.completed()))
+        model.interrupt = None
+        model.ran = []
+        model.run_model(backend="serial", progress=False, chunksize=8, resume=True)
+        self.assertEqual(list(range(25, 65)), model.ran)
+        self.assertEqual(64, model.monitor.landing.n)
+        resumed = store.load()
+        for key in expected:
+            np.testing.assert_array_equal(expected[key], resumed[key])
+
+        # Extending a finished campaign only does the new runs
+        model.itterations = 100
+        model.ran = []
+        model.run_model(backend="serial", progress=False, resume=True)
+        self.assertEqual(list(range(65, 101)), model.ran)
+        self.assertEqual(100, len(store.design()))
+        np.testing.assert_array_equal(
+            expected["summary"], store.summary().loc[1:64].to_numpy()
+        )
+        with self.assertRaises(ValueError):
+            model.run_model(backend="serial", seed=3, progress=False, resume=True)
+
+    def test_surrogate(self):
+        model = StubModel("sampling_test", sampling="sobol")
+        model.run_model(backend="serial", seed=2, progress=False)
+        # The landing is exactly its draws
+        fitted = model.surrogate(metrics=["landing_x", "landing_y"])
+        self.assertLess(fitted.loo.loc["landing_x", "rmse"], 1e-9)
+        np.testing.assert_allclose(
+            [[1.5, -0.5]], fitted.predict({"landing_x": 1.5, "landing_y": -0.5})
+        )
+
+    def test_draws_without_design(self):
+        model = StubModel("sampling_test", sampling="random")
+        self.assertEqual(["landing_x", "landing_y"], list(model.draws(1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+import sys, os
+import shutil
+
+sys.path.append(
+    "/".join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))).split("/")[:-1]
+    )
+)
+from campyros import scheduler, parallel
+from campyros.store import CampaignStore
+from campyros.tests.helpers import StubModel, flying_model
+import numpy as np
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+# Order the runs of every campaign were done in
+RAN = []
+
+
+def draw_model(name, itterations=24):
+    """The landing is just the draws, the runs are logged in RAN"""
+    return StubModel(name, itterations, log=RAN)
+
+
+def cached_models():
+    """Number of shared models the worker running this has kept"""
+    return len(parallel._shared_objects)
+
+
+class QueueScheduler(scheduler.Scheduler):
+    """Settings files are just the model's name"""
+
+    def load(self, settings):
+        return draw_model(os.path.basename(settings))
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        RAN.clear()
+
+    def tearDown(self):
+        for name in ["sched_a", "sched_b", "sched_c", "queue"]:
+            shutil.rmtree("results/%s" % name, ignore_errors=True)
+
+    def test_fair_share(self):
+        with scheduler.Scheduler("serial", progress=False) as pool:
+            a = pool.add(draw_model("sched_a"), seed=1, chunksize=1)
+            b = pool.add(draw_model("sched_b"), priority=3, seed=2, chunksize=1)
+            pool.run()
+        self.assertEqual(["finished", "finished"], [a.status, b.status])
+        # Three runs of b for every run of a while both are going
+        names = [name for name, id in RAN]
+        self.assertEqual(6, names[:8].count("sched_b"))
+        self.assertEqual(24, names[:32].count("sched_b"))
+        self.assertEqual(48, len(RAN))
+
+    def test_same_as_run_model(self):
+        with scheduler.Scheduler("serial", progress=False) as pool:
+            pool.add(draw_model("sched_a"), seed=4, chunksize=5)
+            pool.add(draw_model("sched_b"), seed=5)
+            pool.run()
+        scheduled = CampaignStore("results/sched_a").load()
+        draw_model("sched_a").run_model(backend="serial", seed=4, progress=False)
+        alone = CampaignStore("results/sched_a").load()
+        for key in alone:
+            np.testing.assert_array_equal(alone[key], scheduled[key])
+        self.assertEqual(24, len(CampaignStore("results/sched_b").completed()))
+
+    def test_worker_cache(self):
+        with parallel.ProcessPoolBackend(1) as backend:
+            with scheduler.Scheduler(backend, progress=False) as pool:
+                for seed, name in enumerate(["sched_a", "sched_b", "sched_c"]):
+                    campaign = pool.add(draw_model(name, 8), seed=seed, chunksize=2)
+                    pool.run()
+                    self.assertEqual("finished", campaign.status)
+                    # The models of the campaigns that finished before aren't kept
+                    self.assertEqual(1, backend.submit(cached_models).result())
+
+    def test_queue(self):
+        queue = "results/queue"
+        scheduler.submit("sched_a", seed=1, queue=queue)
+        scheduler.submit("sched_b", priority=2, seed=2, queue=queue)
+        scheduler.stop(queue)
+        with QueueScheduler("serial", queue=queue, progress=False, poll=0.01) as pool:
+            campaigns = pool.serve()
+        self.assertEqual(["sched_a", "sched_b"], [c.name for c in campaigns])
+        self.assertEqual(2, campaigns[1].priority)
+        self.assertEqual(2, len(os.listdir(os.path.join(queue, scheduler.DONE))))
+        self.assertFalse(os.path.exists(os.path.join(queue, scheduler.STOP_FILE)))
+        for name in ["sched_a", "sched_b"]:
+            self.assertEqual(24, len(CampaignStore("results/%s" % name).completed()))
+
+        # A job that can't be started doesn't stop the others
+        os.makedirs(queue, exist_ok=True)
+        with open(os.path.join(queue, "0_bad.json"), "w") as f:
+            f.write("{")
+        scheduler.submit("sched_c", queue=queue)
+        scheduler.stop(queue)
+        pool = QueueScheduler("serial", queue=queue, progress=False, poll=0.01)
+        with self.assertWarns(UserWarning):
+            campaigns = pool.serve()
+        self.assertEqual(["sched_c"], [c.name for c in campaigns])
+        self.assertTrue(
+            os.path.isfile(os.path.join(queue, scheduler.FAILED, "0_bad.json.error"))
+        )
+
+    def test_one_campaign_per_store(self):
+        pool = scheduler.Scheduler("serial", progress=False)
+        pool.add(draw_model("sched_a"), seed=1)
+        with self.assertRaises(ValueError):
+            pool.add(draw_model("sched_a"), seed=2)
+        with self.assertRaises(ValueError):
+            pool.add(draw_model("sched_b"), priority=0)
+        pool.run()
+        # Once it's finished the name can be used again
+        pool.add(draw_model("sched_a"), seed=2)
+
+
+class FlightTest(unittest.TestCase):
+    def tearDown(self):
+        for name in ["sched_flight_a", "sched_flight_b"]:
+            shutil.rmtree("results/%s" % name, ignore_errors=True)
+
+    def test_campaigns(self):
+        with scheduler.Scheduler("serial", progress=False) as pool:
+            campaigns = [
+                pool.add(flying_model(name), seed=n, chunksize=2)
+                for n, name in enumerate(["sched_flight_a", "sched_flight_b"])
+            ]
+            pool.run()
+        for campaign in campaigns:
+            self.assertEqual("finished", campaign.status)
+            self.assertEqual({}, campaign.model.failures)
+            summary = campaign.store.summary()
+            self.assertEqual([1, 2], list(summary.index))
+            self.assertTrue(np.all(summary["apogee_alt"] > 1000))
+
+
+if __name__ == "__main__":
+    unittest.main()
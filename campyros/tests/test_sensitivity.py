@@ -0,0 +1,176 @@
+import unittest
+import sys, os
+import shutil
+
+sys.path.append(
+    "/".join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))).split("/")[:-1]
+    )
+)
+from campyros import sensitivity
+from campyros.store import CampaignStore
+from campyros.tests.helpers import StubModel, flying_model
+import numpy as np
+import pandas as pd
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+
+def response(z):
+    """Var = 6: z1 alone gives 1/6, z2 4/6 and z1*z3 1/6"""
+    return z[..., 0] + 2 * z[..., 1] + z[..., 0] * z[..., 2]
+
+
+FIRST = [1 / 6, 4 / 6, 0]
+TOTAL = [2 / 6, 4 / 6, 1 / 6]
+
+
+class IndicesTest(unittest.TestCase):
+    def test_groups(self):
+        names = ["CA", "thrust_x", "thrust_y", "thrust_z", "dry_mass"]
+        self.assertEqual(
+            {"CA": ["CA"], "dry_mass": ["dry_mass"], "thrust_alignment": names[1:4]},
+            sensitivity.input_groups(names),
+        )
+        self.assertEqual(
+            {"CA": ["CA"], "other": names[1:]},
+            sensitivity.input_groups(names, ["CA"]),
+        )
+        with self.assertRaises(ValueError):
+            sensitivity.input_groups(names, ["CN"])
+        with self.assertRaises(ValueError):
+            sensitivity.input_groups(names, {"a": ["CA"], "b": ["CA", "dry_mass"]})
+
+    def test_analytic(self):
+        rng = np.random.default_rng(0)
+        n = 4000
+        design = sensitivity.saltelli_design(
+            rng.standard_normal((n, 3)), rng.standard_normal((n, 3)), [[0], [1], [2]]
+        )
+        self.assertEqual((5 * n, 3), design.shape)
+        values = response(design).reshape(5, n)
+        table = sensitivity.sensitivity_table(
+            values[0], values[1], values[2:], ["z1", "z2", "z3"], resamples=200
+        )
+        # Ranked by total index
+        self.assertEqual(["z2", "z1", "z3"], list(table.index))
+        table = table.loc[["z1", "z2", "z3"]]
+        np.testing.assert_allclose(FIRST, table["first"], atol=0.06)
+        np.testing.assert_allclose(TOTAL, table["total"], atol=0.03)
+        for key, truth in [("first", FIRST), ("total", TOTAL)]:
+            self.assertTrue(np.all(table["%s_low" % key] <= table[key]))
+            self.assertTrue(np.all(table[key] <= table["%s_high" % key]))
+            self.assertTrue(
+                np.all(table["%s_high" % key] - table["%s_low" % key] < 0.2)
+            )
+
+
+def response_model():
+    """The landing is a known function of the draws, run 3 fails"""
+
+    def landing(z):
+        z = np.array(list(z.values()))
+        return {"landing_x": response(z) + z[3], "landing_y": z[1]}
+
+    return StubModel(
+        "sensitivity_test",
+        10,
+        design_variables=["z1", "z2", "z3", "z4"],
+        sampling="sobol",
+        response=landing,
+        fail=[3],
+    )
+
+
+class CampaignTest(unittest.TestCase):
+    def tearDown(self):
+        shutil.rmtree("results/sensitivity_test", ignore_errors=True)
+
+    def test_campaign(self):
+        model = response_model()
+        with self.assertWarns(UserWarning):
+            save_loc = model.run_sensitivity(
+                512,
+                ["z1", "z2"],
+                seed=1,
+                backend="serial",
+                progress=False,
+                resamples=100,
+            )
+        self.assertEqual("results/sensitivity_test/sensitivity", save_loc)
+        # Base runs, the other base runs, then z1, z2 and the other two swapped
+        self.assertEqual(512 * 5, len(model.ran))
+        self.assertEqual(
+            ["landing_x", "landing_y", "landing_distance"], list(model.sensitivity)
+        )
+        # Var = 7, z4 adds 1 on its own and z3 only interacts with z1
+        table = model.sensitivity["landing_x"].loc[["z1", "z2", "other"]]
+        np.testing.assert_allclose([1 / 7, 4 / 7, 1 / 7], table["first"], atol=0.05)
+        np.testing.assert_allclose([2 / 7, 4 / 7, 2 / 7], table["total"], atol=0.05)
+        # Inputs the metric doesn't depend on have no effect at all
+        landing_y = model.sensitivity["landing_y"].loc[["z1", "z2", "other"], "total"]
+        np.testing.assert_allclose([0, 1, 0], landing_y, atol=0.01)
+        self.assertEqual(0, landing_y["z1"])
+        saved = pd.read_csv("%s/sensitivity.csv" % save_loc, index_col=[0, 1])
+        np.testing.assert_allclose(
+            model.sensitivity["landing_x"]["total"],
+            saved.loc["landing_x"].loc[model.sensitivity["landing_x"].index, "total"],
+        )
+        self.assertEqual(2560, len(CampaignStore(save_loc).design()))
+
+        # Nothing left to do when resumed
+        model.ran = []
+        model.run_sensitivity(
+            512,
+            ["z1", "z2"],
+            backend="serial",
+            progress=False,
+            resume=True,
+            resamples=100,
+        )
+        self.assertEqual([3], model.ran)
+
+
+class FlightTest(unittest.TestCase):
+    def tearDown(self):
+        shutil.rmtree("results/sensitivity_flight", ignore_errors=True)
+
+    def test_campaign(self):
+        model = flying_model("sensitivity_flight")
+        save_loc = model.run_sensitivity(
+            4,
+            ["thrust"],
+            seed=1,
+            backend="serial",
+            progress=False,
+            chunksize=16,
+            resamples=20,
+            save_loc="results/sensitivity_flight/thrust",
+        )
+        self.assertEqual("results/sensitivity_flight/thrust", save_loc)
+        # Base runs, the other base runs, then the thrust and everything else swapped
+        self.assertEqual(list(range(1, 17)), list(CampaignStore(save_loc).completed()))
+        table = model.sensitivity["apogee_alt"]
+        self.assertEqual({"thrust", "other"}, set(table.index))
+        self.assertTrue(np.all(np.isfinite(table[["first", "total"]])))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,260 @@
+import unittest
+import sys, os
+import shutil
+
+sys.path.append(
+    "/".join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))).split("/")[:-1]
+    )
+)
+from campyros.statistical import multi_fidelity_estimate, paired_difference
+from campyros.store import CampaignStore
+from campyros.tests.helpers import StubModel, flying_model
+import numpy as np
+import pandas as pd
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+MEAN = np.array([200.0, -100.0])
+COV = np.array([[900.0, 300.0], [300.0, 400.0]])
+
+
+def landings(rng, n, N):
+    """Correlated high and low fidelity landings, the low fidelity ones biased and scaled"""
+    high = rng.multivariate_normal(MEAN, COV, N)
+    low = 0.8 * high + 30 + rng.normal(0, 5, (N, 2))
+    columns = ["landing_x", "landing_y"]
+    ids = np.arange(1, N + 1)
+    return (
+        pd.DataFrame(high[:n], index=ids[:n], columns=columns),
+        pd.DataFrame(low, index=ids, columns=columns),
+    )
+
+
+class MultiFidelityTest(unittest.TestCase):
+    def test_estimate(self):
+        rng = np.random.default_rng(0)
+        estimates, errors = [], []
+        for _ in range(200):
+            high, low = landings(rng, 50, 2000)
+            result = multi_fidelity_estimate(high, low, high_cost=100, low_cost=1)
+            estimates.append(
+                np.concatenate([result["landing_mean"], result["landing_cov"].ravel()])
+            )
+            errors.append(result["statistics"]["std_error"])
+        self.assertNotIn("apogee_mean", result)
+        statistics = result["statistics"]
+        self.assertEqual(
+            [
+                "mean landing_x",
+                "mean landing_y",
+                "var landing_x",
+                "cov landing_x landing_y",
+                "var landing_y",
+            ],
+            list(statistics.index),
+        )
+        self.assertTrue(np.all(statistics["correlation"] > 0.8))
+        self.assertTrue(np.all(statistics["variance_reduction"] > 3))
+        self.assertTrue(np.all(statistics["cost_fraction"] < 0.5))
+
+        # Unbiased, and the standard errors are right
+        estimates = np.array(estimates)
+        truth = np.concatenate([MEAN, COV.ravel()])
+        spread = np.std(estimates, axis=0)
+        np.testing.assert_array_less(
+            abs(estimates.mean(axis=0) - truth), 4 * spread / np.sqrt(200)
+        )
+        np.testing.assert_allclose(
+            spread[[0, 1, 2, 3, 5]], np.mean(errors, axis=0), rtol=0.25
+        )
+
+    def test_uncorrelated(self):
+        # An unrelated low fidelity model changes nothing
+        rng = np.random.default_rng(1)
+        high, low = landings(rng, 40, 400)
+        low[:] = rng.normal(size=low.shape)
+        statistics = multi_fidelity_estimate(high, low)["statistics"]
+        np.testing.assert_allclose(1, statistics["variance_reduction"], atol=0.2)
+        self.assertNotIn("cost_fraction", statistics)
+        with self.assertRaises(ValueError):
+            multi_fidelity_estimate(high.iloc[:2], low)
+
+
+class TwoFidelityModel(StubModel):
+    """Both fidelities' landings are functions of the draws, the point masses land 90% as far"""
+
+    def __init__(self):
+        super().__init__(
+            "multi_fidelity_test",
+            16,
+            sampling="sobol",
+            response=lambda z: {name: 100 * z[name] for name in z},
+        )
+
+    def run_ensemble(self, ids, seed, debug=False, trajectories=None, point_mass=False):
+        return {
+            id: ({}, {name: 90 * z for name, z in self.draws(id).items()}, None)
+            for id in ids
+        }, {}
+
+
+class MultiFidelityCampaignTest(unittest.TestCase):
+    def tearDown(self):
+        shutil.rmtree("results/multi_fidelity_test", ignore_errors=True)
+
+    def test_campaign(self):
+        model = TwoFidelityModel()
+        save_loc = model.run_multi_fidelity(
+            256, backend="serial", seed=3, progress=False
+        )
+        high = CampaignStore(save_loc).summary()
+        low = CampaignStore("%s/point_mass" % save_loc).summary()
+        self.assertEqual(list(range(1, 17)), list(high.index))
+        self.assertEqual(list(range(1, 257)), list(low.index))
+        # The same rockets at both fidelities
+        np.testing.assert_allclose(0.9 * high, low.loc[high.index])
+        self.assertEqual(256, len(model.design))
+        statistics = model.multi_fidelity["statistics"]
+        np.testing.assert_allclose(
+            1, statistics.loc[["mean landing_x", "mean landing_y"], "correlation"]
+        )
+        self.assertTrue(os.path.isfile(os.path.join(save_loc, "multi_fidelity.csv")))
+        with self.assertRaises(ValueError):
+            model.run_multi_fidelity(8, backend="serial", progress=False)
+
+
+class MultiFidelityFlightTest(unittest.TestCase):
+    def tearDown(self):
+        shutil.rmtree("results/multi_fidelity_flight", ignore_errors=True)
+
+    def test_campaign(self):
+        model = flying_model("multi_fidelity_flight", 3)
+        save_loc = model.run_multi_fidelity(
+            6, backend="serial", seed=1, progress=False, chunksize=3
+        )
+        high = CampaignStore(save_loc).summary()
+        low = CampaignStore("%s/point_mass" % save_loc).summary()
+        self.assertEqual([1, 2, 3], list(high.index))
+        self.assertEqual(list(range(1, 7)), list(low.index))
+        # The point masses are the same rockets
+        np.testing.assert_allclose(
+            high["apogee_alt"], low.loc[high.index, "apogee_alt"], rtol=0.05
+        )
+        self.assertIn("mean landing_x", model.multi_fidelity["statistics"].index)
+
+
+class PairedTest(unittest.TestCase):
+    def test_difference(self):
+        rng = np.random.default_rng(2)
+        base = pd.DataFrame(
+            rng.normal(0, 100, (400, 2)),
+            index=np.arange(1, 401),
+            columns=["apogee_alt", "landing_x"],
+        )
+        other = base + 1 + rng.normal(0, 2, base.shape)
+        # A failed run is left out
+        other = other.drop(7)
+        table = paired_difference(base, other)
+        self.assertEqual(["apogee_alt", "landing_x"], list(table.index))
+        np.testing.assert_allclose(1, table["mean_difference"], atol=0.3)
+        np.testing.assert_allclose(2 / np.sqrt(399), table["std_error"], rtol=0.1)
+        self.assertTrue(np.all(table["interval_low"] < 1))
+        self.assertTrue(np.all(table["interval_high"] > 1))
+        self.assertTrue(np.all(table["p_value"] < 1e-6))
+        self.assertTrue(np.all(table["correlation"] > 0.99))
+        # Independent campaigns would need thousands of times the runs
+        self.assertTrue(np.all(table["equivalent_runs"] > 1000 * 399))
+
+
+def configuration_model(name, scale, offset, extra=[]):
+    """The landing is a function of the draws that depends on the configuration"""
+
+    def landing(z):
+        summary = {key: scale * z[key] + offset for key in ["landing_x", "landing_y"]}
+        # The global random state is seeded for each run too
+        summary["apogee_alt"] = 1000 + np.random.random()
+        return summary
+
+    return StubModel(
+        name, design_variables=["landing_x", "landing_y"] + extra, response=landing
+    )
+
+
+class PairedCampaignTest(unittest.TestCase):
+    def tearDown(self):
+        shutil.rmtree("results/baseline", ignore_errors=True)
+
+    def test_campaign(self):
+        base = configuration_model("baseline", 100, 0)
+        other = configuration_model("longer_fins", 101, 2, extra=["CN"])
+        save_loc = base.run_paired([other], seed=4, backend="serial", progress=False)
+        self.assertEqual("results/baseline/paired", save_loc)
+        designs = [
+            CampaignStore("%s/%s" % (save_loc, name)).design()
+            for name in ["baseline", "longer_fins"]
+        ]
+        np.testing.assert_array_equal(
+            designs[0].to_numpy(), designs[1][["landing_x", "landing_y"]].to_numpy()
+        )
+        table = base.paired["longer_fins"]
+        np.testing.assert_allclose(
+            1, table.loc[["landing_x", "landing_y"], "correlation"]
+        )
+        self.assertEqual(0, table.loc["apogee_alt", "mean_difference"])
+        self.assertTrue(
+            np.all(table.loc[["landing_x", "landing_y"], "equivalent_runs"] > 64 * 1000)
+        )
+        saved = pd.read_csv("%s/paired.csv" % save_loc, index_col=[0, 1])
+        self.assertEqual(["longer_fins"], list(saved.index.levels[0]))
+        with self.assertRaises(ValueError):
+            base.run_paired([configuration_model("baseline", 100, 1)], progress=False)
+
+
+class PairedFlightTest(unittest.TestCase):
+    def tearDown(self):
+        shutil.rmtree("results/paired_flight", ignore_errors=True)
+
+    def test_campaign(self):
+        base = flying_model("paired_flight", 3)
+        heavier = flying_model("heavier", 3)
+        heavier.mass_vars["dry_mass"] = [70, 0.01]
+        save_loc = base.run_paired(
+            [heavier],
+            seed=2,
+            backend="serial",
+            progress=False,
+            chunksize=3,
+            save_loc="results/paired_flight/mass",
+        )
+        self.assertEqual("results/paired_flight/mass", save_loc)
+        for name in ["paired_flight", "heavier"]:
+            self.assertEqual(
+                [1, 2, 3],
+                list(CampaignStore("%s/%s" % (save_loc, name)).completed()),
+            )
+        # The same draws, so the extra 10 kg is all that changes
+        table = base.paired["heavier"]
+        self.assertLess(table.loc["apogee_alt", "mean_difference"], 0)
+        self.assertLess(table.loc["apogee_alt", "interval_high"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+import unittest
+import sys, os
+import tempfile
+import types
+
+sys.path.append(
+    "/".join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))).split("/")[:-1]
+    )
+)
+from campyros import store
+from campyros.statistical import analyse, StatisticalModel
+import numpy as np
+import pandas as pd
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+
+def flight(id):
+    """A parabolic flight sampled every second, drifting east at id m/s"""
+    time = np.arange(0, 10 + id, 1.0)
+    z = time * (10 + id - time)
+    trajectory = np.zeros((len(time), 7))
+    trajectory[:, 0] = time
+    trajectory[:, 1] = id * time
+    trajectory[:, 3] = z
+    return trajectory
+
+
+class StoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = store.CampaignStore(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, ids):
+        self.store.write_shard(
+            ids, [{"id": id, "half": id / 2} for id in ids], [flight(id) for id in ids]
+        )
+
+    def test_round_trip(self):
+        self.write([3, 4])
+        self.write([1, 2])
+        data = self.store.load()
+        self.assertEqual([1, 2, 3, 4], list(data["ids"]))
+        for n, id in enumerate(data["ids"]):
+            run = data["trajectory"][data["offsets"][n] : data["offsets"][n + 1]]
+            np.testing.assert_array_equal(flight(id), run)
+        self.assertEqual(["id", "half"], list(data["input_names"]))
+        np.testing.assert_array_equal([1, 2, 3, 4], data["inputs"][:, 0])
+
+        summary = self.store.summary()
+        np.testing.assert_allclose(
+            [5, 6, 6, 7], summary["apogee_time"].loc[[1, 2, 3, 4]]
+        )
+        np.testing.assert_allclose([10, 36], summary["landing_x"].loc[[1, 3]])
+
+    def test_compact(self):
+        self.write([1, 2])
+        self.write([3])
+        # A retried chunk replaces the first copy
+        self.store.write_shard([3], [{"id": 30, "half": 0}], [flight(3)])
+        before = self.store.load()
+        self.store.compact()
+        self.assertEqual([], self.store.shards())
+        self.assertEqual(
+            ["campaign.npz"],
+            [f for f in os.listdir(self.tmp.name) if not f.startswith(".")],
+        )
+        after = self.store.load()
+        for key in before:
+            np.testing.assert_array_equal(before[key], after[key])
+        self.assertEqual(30, self.store.inputs()["id"].loc[3])
+
+        self.store.clear()
+        self.assertFalse(self.store.exists())
+
+    def test_manifest(self):
+        self.assertIsNone(self.store.manifest())
+        self.assertEqual([], list(self.store.completed()))
+        self.store.write_manifest({"seed": 4, "sampling": "sobol"})
+        self.write([3, 4])
+        self.store.compact()
+        self.write([1])
+        self.assertEqual({"seed": 4, "sampling": "sobol"}, self.store.manifest())
+        self.assertEqual([1, 3, 4], list(self.store.completed()))
+        self.store.write_design(np.ones((4, 2)), ["a", "b"], "sobol")
+        self.assertEqual((4, 2), self.store.design().shape)
+        self.store.clear()
+        self.assertEqual([], os.listdir(self.tmp.name))
+
+    def test_analyse(self):
+        self.write([1, 2, 3])
+        self.write([5])
+        (
+            landing_mu,
+            landing_cov,
+            apogee_mu,
+            apogee_cov,
+            apogee,
+            landing,
+            x,
+            y,
+            z,
+            t,
+        ) = analyse(self.tmp.name, 5)
+        np.testing.assert_allclose([1 * 5, 2 * 6, 3 * 6, 5 * 7], apogee["x"])
+        np.testing.assert_allclose([30, 36, 42, 56], apogee["alt"])
+        np.testing.assert_allclose([10, 2 * 11, 3 * 12, 5 * 14], landing["x"])
+        self.assertEqual((15, 4), x.shape)
+        self.assertTrue(np.isnan(x[0][11]))
+        self.assertEqual(4, len(analyse(self.tmp.name, 3)[4]) + 1)
+
+    def test_summary_only(self):
+        self.write([1, 2])
+        self.store.write_shard(
+            [3, 4],
+            [{"id": 3, "half": 1.5}, {"id": 4, "half": 2}],
+            [None, flight(4)],
+            [
+                {"apogee_x": 18, "apogee_y": 0, "apogee_alt": 42, "landing_x": 36},
+                {"apogee_x": 28, "apogee_y": 0, "apogee_alt": 49, "landing_x": 52},
+            ],
+        )
+        data = self.store.load()
+        self.assertEqual([0, 11, 23, 23, 37], list(data["offsets"]))
+        summary = self.store.summary()
+        # Metrics that weren't stored for a run are NaN
+        self.assertEqual(4, summary["landing_x"].count())
+        self.assertEqual(2, summary["apogee_time"].count())
+
+        results = analyse(self.tmp.name, 4)
+        np.testing.assert_allclose([30, 36, 42, 49], results[4]["alt"])
+        self.assertEqual([0, 1, 2], list(results[6].columns))
+
+    def test_keep_trajectory(self):
+        model = types.SimpleNamespace(trajectories=0.25)
+        kept = [StatisticalModel.keep_trajectory(model, id, 5) for id in range(400)]
+        self.assertTrue(60 < sum(kept) < 140)
+        self.assertEqual(
+            kept, [StatisticalModel.keep_trajectory(model, id, 5) for id in range(400)]
+        )
+        model.trajectories = [2, 3]
+        self.assertEqual(
+            [False, True],
+            [StatisticalModel.keep_trajectory(model, id, 5) for id in [1, 2]],
+        )
+        model.trajectories = "none"
+        self.assertFalse(StatisticalModel.keep_trajectory(model, 1, 5))
+
+    def test_import_csv(self):
+        for id in [1, 3]:
+            frame = pd.DataFrame(flight(id), columns=store.TRAJECTORY_COLUMNS)
+            frame.to_csv(os.path.join(self.tmp.name, "%s.csv" % id))
+        apogee = analyse(self.tmp.name, 3)[4]
+        np.testing.assert_allclose([30, 42], apogee["alt"])
+        self.assertTrue(self.store.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import unittest
+import sys, os
+import tempfile
+import time
+
+sys.path.append(
+    "/".join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))).split("/")[:-1]
+    )
+)
+from campyros import surrogate
+from campyros.sampling import design_matrix
+from campyros.store import CampaignStore
+import numpy as np
+import pandas as pd
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+NAMES = ["dry_mass", "CA", "rail_yaw", "turbulence_seed"]
+
+
+def campaign(runs=200, seed=0):
+    """A stand in campaign, the landing is a quadratic in the dry mass and drag with some turbulence scatter"""
+    design = design_matrix(runs, len(NAMES), "sobol", seed)
+    z = dict(zip(NAMES, design.T))
+    dry_mass = 60 * (1 + 0.01 * z["dry_mass"])
+    CA = 1 + 0.05 * z["CA"]
+    landing_x = 300 + 40 * (dry_mass - 60) - 200 * (CA - 1) + 5 * z["CA"] ** 2
+    landing_x += 10 * np.sin(1e3 * z["turbulence_seed"])
+    ids = np.arange(1, runs + 1)
+    return (
+        pd.DataFrame(design, index=ids, columns=NAMES),
+        pd.DataFrame({"landing_x": landing_x, "apogee_alt": 2500 - 20 * z["CA"]}, ids),
+        pd.DataFrame({"dry_mass": dry_mass, "CA": CA}, ids),
+    )
+
+
+class HermiteTest(unittest.TestCase):
+    def test_orthonormal(self):
+        # Gauss-Hermite quadrature is exact for these degrees
+        points, weights = np.polynomial.hermite_e.hermegauss(10)
+        values = surrogate.hermite(points, 4)
+        gram = values.T @ (values * weights[:, None]) / np.sqrt(2 * np.pi)
+        np.testing.assert_allclose(np.eye(5), gram, atol=1e-12)
+
+    def test_multi_indices(self):
+        indices = surrogate.multi_indices(3, 2, 1)
+        self.assertEqual(7, len(indices))
+        self.assertEqual([0, 0, 0], list(indices[0]))
+        self.assertEqual(10, len(surrogate.multi_indices(3, 2, 2)))
+        self.assertTrue(np.all(surrogate.multi_indices(4, 3, 2).sum(axis=1) <= 3))
+
+
+class SurrogateTest(unittest.TestCase):
+    def setUp(self):
+        self.design, self.summary, self.inputs = campaign()
+        self.model = surrogate.Surrogate(self.design, self.summary, inputs=self.inputs)
+
+    def test_fit(self):
+        model = self.model
+        self.assertEqual(["dry_mass", "CA", "rail_yaw"], model.variables)
+        self.assertEqual(["1", "dry_mass", "dry_mass^2"], model.term_names()[:3])
+        # Only the turbulence is left over
+        np.testing.assert_allclose(
+            10 / np.sqrt(2), model.loo.loc["landing_x", "rmse"], rtol=0.15
+        )
+        self.assertLess(model.loo.loc["landing_x", "relative"], 0.2)
+        self.assertLess(model.loo.loc["apogee_alt", "relative"], 1e-20)
+        np.testing.assert_allclose(
+            [2500, 20], model.moments().loc["apogee_alt"], rtol=1e-12
+        )
+        with self.assertRaises(ValueError):
+            surrogate.Surrogate(self.design.iloc[:5], self.summary)
+
+    def test_predict(self):
+        model = self.model
+        start = time.perf_counter()
+        prediction = model.predict({"dry_mass": [0, 1], "CA": [0, -1]})
+        self.assertLess(time.perf_counter() - start, 0.1)
+        # 0.6 kg heavier and 5% less drag
+        np.testing.assert_allclose(
+            [300, 300 + 24 + 10 + 5], prediction["landing_x"], atol=2
+        )
+        np.testing.assert_allclose(
+            prediction, model.predict(np.array([[0, 0, 0], [1, -1, 0]]))
+        )
+        self.assertEqual([False, True], list(model.outside({"CA": [0.5, 7]})))
+        with self.assertRaises(ValueError):
+            model.predict({"length": 1})
+
+    def test_distribution(self):
+        model = self.model
+        self.assertEqual(["dry_mass", "CA"], list(model.units))
+        np.testing.assert_allclose(1, model.to_design({"dry_mass": 60.6})["dry_mass"])
+        base = model.distribution(samples=20000, seed=1)
+        heavier = model.distribution(shift={"dry_mass": 0.6}, samples=20000, seed=1)
+        # 40 m/kg further
+        self.assertAlmostEqual(
+            24, heavier["landing_x"].mean() - base["landing_x"].mean(), delta=1
+        )
+        self.assertEqual(0, base.attrs["outside"])
+        self.assertLess(heavier.attrs["outside"], 0.1)
+        fixed = model.distribution(fix={"CA": 1}, samples=100, seed=1)
+        self.assertLess(fixed["apogee_alt"].std(), 1e-9)
+        with self.assertWarns(UserWarning):
+            far = model.distribution(shift={"dry_mass": 3}, samples=1000, seed=1)
+        self.assertGreater(far.attrs["outside"], 0.5)
+        with self.assertRaises(ValueError):
+            model.distribution(shift={"rail_yaw": 1})
+
+    def test_from_campaign(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = CampaignStore(tmp)
+            store.write_design(self.design.to_numpy(), NAMES, "sobol")
+            ids = list(self.summary.index)
+            store.write_shard(
+                ids,
+                self.inputs.to_dict("records"),
+                [None] * len(ids),
+                self.summary.to_dict("records"),
+            )
+            model = surrogate.Surrogate.from_campaign(tmp, metrics=["landing_x"])
+        pd.testing.assert_frame_equal(
+            self.model.coefficients[["landing_x"]], model.coefficients
+        )
+        self.assertEqual(self.model.units, model.units)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,369 @@
+import unittest
+import sys, os
+import pickle
+import tempfile
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(
+    "/".join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))).split("/")[:-1]
+    )
+)
+from campyros import wind
+from campyros.turbulence import TurbulentWind
+from campyros.main import LaunchSite
+import numpy as np
+import pandas as pd
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright & Daniel Gibbons
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+LAT, LONG = 52.1, 0.1
+
+
+def synthetic_decode(file_loc):
+    """Stands in for decode_grib (which needs iris), the wind blows north at (forcast hour) m/s everywhere"""
+    hour = int(os.path.basename(file_loc).split("_")[-1].split(".")[0])
+    rows = []
+    for lat in wind.closest(LAT, 0.25):
+        for long in wind.closest(LONG, 0.25):
+            for alt in np.linspace(0, 40000, 20):
+                rows.append(
+                    {"lat": lat, "long": long, "alt": alt, "w_x": 0.0, "w_y": hour}
+                )
+    return pd.DataFrame(rows), [[row["lat"], row["long"]] for row in rows[::20]]
+
+
+def synthetic_ensemble_decode(file_loc):
+    """Member n has wind blowing north at n m/s at sea level, rising by 1 m/s per km, with the levels in a random order"""
+    name = os.path.basename(file_loc).split("_")[0]
+    member = int(name[3:])
+    rows = []
+    for lat in wind.closest(LAT, 0.5):
+        for long in wind.closest(LONG, 0.5):
+            for alt in np.random.permutation(np.linspace(0, 45000, 11)):
+                rows.append(
+                    {
+                        "lat": lat,
+                        "long": long,
+                        "alt": alt,
+                        "w_x": 0.0,
+                        "w_y": member + alt / 1000,
+                    }
+                )
+    return pd.DataFrame(rows), []
+
+
+class WindTestCase(unittest.TestCase):
+    """Runs with fake (but complete looking) GRIB files in a temporary data folder and the synthetic decoder"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        lat, long = wind.validate_lat_long(LAT, LONG)
+        lat_bottom = min(wind.closest(lat, 0.25))
+        long_left = min(wind.closest(long, 0.25))
+        for hour in range(0, 6):
+            with open(
+                "%s/%s_%s_20210216_00_%03d.grb2"
+                % (self.tmp.name, lat_bottom, long_left, hour),
+                "wb",
+            ) as f:
+                f.write(b"GRIB" + bytes(2000) + b"7777")
+
+        self.decode = mock.patch.object(
+            wind, "decode_grib", side_effect=synthetic_decode
+        )
+        self.decoder = self.decode.start()
+        wind._decoded.clear()
+
+    def tearDown(self):
+        self.decode.stop()
+        wind._decoded.clear()
+        self.tmp.cleanup()
+
+    def make_wind(self, hours, launch_time=None):
+        return wind.ForecastWind(
+            LONG,
+            LAT,
+            hours,
+            launch_time=launch_time,
+            data_loc=self.tmp.name,
+            run_date="20210216",
+            fast=True,
+        )
+
+
+class ForecastWindTest(WindTestCase):
+    def test_time_interpolation(self):
+        forecast = self.make_wind(range(0, 6), launch_time=1.5)
+        self.assertAlmostEqual(-1.5, forecast.get_wind(LAT, LONG, 1000)[0])
+        self.assertAlmostEqual(-2.0, forecast.get_wind(LAT, LONG, 1000, 1800)[0])
+        # Clamped at the end of the available hours
+        self.assertAlmostEqual(-5.0, forecast.get_wind(LAT, LONG, 1000, 1e5)[0])
+
+    def test_get_winds(self):
+        forecast = self.make_wind(range(0, 6), launch_time=1.5)
+        alts = np.array([0.0, 1000, 5000, 30000])
+        times = np.array([0.0, 1800, 7000, 1e5])
+        expected = [
+            forecast.get_wind(LAT, LONG, alt, time) for alt, time in zip(alts, times)
+        ]
+        np.testing.assert_allclose(
+            expected, forecast.get_winds(np.full(4, LAT), np.full(4, LONG), alts, times)
+        )
+
+    def test_lazy_hours(self):
+        forecast = self.make_wind(range(0, 6), launch_time=0)
+        self.assertEqual([], sorted(forecast.winds))
+        forecast.preload()
+        self.assertEqual([0, 1], sorted(forecast.winds))
+        forecast.get_wind(LAT, LONG, 1000, 3.5 * 3600)
+        self.assertEqual([0, 1, 3, 4], sorted(forecast.winds))
+
+    def test_decode_cache(self):
+        self.make_wind(range(0, 6), launch_time=0.5).preload()
+        calls = self.decoder.call_count
+        sweep = [
+            self.make_wind(range(0, 6), launch_time=t).preload() for t in [0, 0.5, 1.0]
+        ]
+        self.assertEqual(calls, self.decoder.call_count)
+        self.assertAlmostEqual(
+            -0.25, sweep[1].at_launch_time(0.25).get_wind(LAT, LONG, 1000)[0]
+        )
+
+    def test_decode_cache_bounded(self):
+        with mock.patch.object(wind, "DECODED_CACHE_SIZE", 2):
+            for hours in [range(0, 1), range(1, 2), range(0, 1), range(2, 3)]:
+                self.make_wind(hours, launch_time=hours[0]).preload()
+            # Hour 1 was the least recently used
+            self.assertEqual(2, len(wind._decoded))
+            calls = self.decoder.call_count
+            self.make_wind(range(0, 1), launch_time=0).preload()
+            self.assertEqual(calls, self.decoder.call_count)
+            self.make_wind(range(1, 2), launch_time=1).preload()
+            self.assertEqual(calls + 1, self.decoder.call_count)
+
+    def test_single_hour(self):
+        single = wind.load_wind(
+            LONG,
+            LAT,
+            forcast_plus_time="002",
+            data_loc=self.tmp.name,
+            run_date="20210216",
+            fast=True,
+        )
+        self.assertIsInstance(single, wind.Wind)
+        self.assertEqual(0, self.decoder.call_count)
+        self.assertAlmostEqual(-2.0, single.get_wind(LAT, LONG, 1000, 600)[0])
+
+
+class LazyLoadTest(WindTestCase):
+    def test_launch_site(self):
+        site = LaunchSite(
+            10,
+            0,
+            0,
+            0,
+            LONG,
+            LAT,
+            wind_data_loc=self.tmp.name,
+            run_date="20210216",
+            forcast_plus_time="001",
+            fast_wind=True,
+        )
+        self.assertFalse(site.wind.loaded)
+        self.assertEqual(0, self.decoder.call_count)
+        self.assertAlmostEqual(-1.0, site.wind.get_wind(LAT, LONG, 1000)[0])
+        self.assertEqual(1, self.decoder.call_count)
+
+        site = LaunchSite(
+            10,
+            0,
+            0,
+            0,
+            LONG,
+            LAT,
+            wind_data_loc=self.tmp.name,
+            run_date="20210216",
+            forcast_plus_time="002",
+            fast_wind=True,
+        ).preload()
+        self.assertTrue(site.wind.loaded)
+        self.assertEqual(2, self.decoder.call_count)
+
+    def test_pickle_forecast(self):
+        forecast = pickle.loads(pickle.dumps(self.make_wind(range(0, 6), 1)))
+        self.assertAlmostEqual(-1.5, forecast.get_wind(LAT, LONG, 1000, 1800)[0])
+
+
+class EnsembleWindTest(unittest.TestCase):
+    """Uses fake GRIB member files and the synthetic ensemble decoder"""
+
+    members = 4
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        lat, long = wind.validate_lat_long(
+            min(wind.closest(LAT, 0.5)), min(wind.closest(LONG, 0.5))
+        )
+        for n in range(self.members):
+            name = "gec00" if n == 0 else "gep%02d" % n
+            with open(
+                "%s/%s_%s_%s_20210216_00_000.grb2" % (self.tmp.name, name, lat, long),
+                "wb",
+            ) as f:
+                f.write(b"GRIB" + bytes(2000) + b"7777")
+        self.decode = mock.patch.object(
+            wind, "decode_grib", side_effect=synthetic_ensemble_decode
+        )
+        self.decoder = self.decode.start()
+
+    def tearDown(self):
+        self.decode.stop()
+        self.tmp.cleanup()
+
+    def make_wind(self):
+        return wind.EnsembleWind(
+            LONG,
+            LAT,
+            members=self.members,
+            data_loc=self.tmp.name,
+            run_date="20210216",
+            max_workers=2,
+        )
+
+    def test_members(self):
+        ensemble = self.make_wind().preload()
+        self.assertEqual((self.members, 2, 2, 451, 2), ensemble.data.shape)
+        self.assertIsInstance(ensemble.data, np.memmap)
+        for n in range(self.members):
+            np.testing.assert_allclose(
+                [-(n + 2.25), 0, 0], ensemble.select(n).get_wind(LAT, LONG, 2250)
+            )
+        # Clamped outside the grid and the levels
+        np.testing.assert_allclose(
+            [-47, 0, 0], ensemble.select(2).get_wind(LAT + 3, LONG - 3, 60000)
+        )
+        with self.assertRaises(ValueError):
+            ensemble.select(self.members)
+
+    def test_get_winds(self):
+        ensemble = self.make_wind().preload()
+        lats = LAT + np.array([0.0, 0.1, -0.3, 3])
+        longs = LONG + np.array([0.0, -0.2, 0.4, -3])
+        alts = np.array([0.0, 2250, 9000, 60000])
+        members = np.array([0, 3, 1, 2])
+        expected = [
+            ensemble.select(member).get_wind(lat, long, alt)
+            for lat, long, alt, member in zip(lats, longs, alts, members)
+        ]
+        np.testing.assert_allclose(
+            expected, ensemble.get_winds(lats, longs, alts, member=members)
+        )
+        np.testing.assert_allclose(
+            expected[:1], ensemble.select(0).get_winds(lats[:1], longs[:1], alts[:1])
+        )
+
+    def test_storage_reused(self):
+        self.make_wind().preload()
+        calls = self.decoder.call_count
+        self.assertEqual(self.members, calls)
+        self.make_wind().preload()
+        self.assertEqual(calls, self.decoder.call_count)
+
+    def test_concurrent_builds(self):
+        ensembles = [self.make_wind() for _ in range(2)]
+        with ThreadPoolExecutor(2) as pool:
+            list(pool.map(lambda ensemble: ensemble.build(self.members, 2), ensembles))
+        # Each build wrote its own temporary file, and neither is left behind
+        self.assertEqual([], [f for f in os.listdir(self.tmp.name) if "part" in f])
+        ensemble = self.make_wind().preload()
+        np.testing.assert_allclose(
+            [-5.25, 0, 0], ensemble.select(3).get_wind(LAT, LONG, 2250)
+        )
+
+    def test_pickle_shares_storage(self):
+        ensemble = self.make_wind().preload().select(3)
+        pickled = pickle.dumps(ensemble)
+        # Only the file location is sent, not the array
+        self.assertLess(len(pickled), ensemble.data.nbytes / 10)
+        copy = pickle.loads(pickled)
+        np.testing.assert_allclose(
+            ensemble.get_wind(LAT, LONG, 1000), copy.get_wind(LAT, LONG, 1000)
+        )
+        self.assertIsInstance(copy.data, np.memmap)
+        self.assertEqual(ensemble.path, copy.data.filename)
+
+
+class TurbulenceTest(unittest.TestCase):
+    def setUp(self):
+        self.still = wind.Wind(LONG, LAT, variable=False)
+
+    def test_reproducible(self):
+        a = TurbulentWind(self.still, seed=3)
+        b = TurbulentWind(self.still, seed=3)
+        c = TurbulentWind(self.still, seed=4)
+        self.assertTrue(np.array_equal(a.gusts, b.gusts))
+        self.assertFalse(np.array_equal(a.gusts, c.gusts))
+
+    def test_lookup(self):
+        gusty = TurbulentWind(self.still, seed=1, resolution=5)
+        np.testing.assert_allclose(gusty.gusts[200], gusty.get_wind(LAT, LONG, 1000))
+        # Between nodes it should be a smooth blend of the neighbours
+        between = gusty.get_wind(LAT, LONG, 1002.5)
+        self.assertTrue(
+            np.all(
+                np.abs(between - (gusty.gusts[200] + gusty.gusts[201]) / 2)
+                < np.abs(gusty.gusts[201] - gusty.gusts[200]) + 1e-3
+            )
+        )
+        np.testing.assert_allclose(np.zeros(3), gusty.get_wind(LAT, LONG, 50000))
+
+    def test_get_winds(self):
+        gusty = TurbulentWind(wind.Wind(LONG, LAT, variable=False, default=[1, 2, 0]))
+        alts = np.array([-10, 0, 2.5, 1002.5, 19999, 50000])
+        np.testing.assert_allclose(
+            [gusty.get_wind(LAT, LONG, alt) for alt in alts],
+            gusty.get_winds(np.full(6, LAT), np.full(6, LONG), alts),
+        )
+
+    def test_validate_lat_longs(self):
+        lats = np.array([0, -0.0, 91, -95, 45.123456])
+        longs = np.array([-0.0, -10, 170, 10, 400])
+        lat, long = wind.validate_lat_longs(lats, longs)
+        np.testing.assert_array_equal(
+            [wind.validate_lat_long(a, b) for a, b in zip(lats, longs)],
+            np.column_stack([lat, long]),
+        )
+
+    def test_intensity(self):
+        # Above 2000 ft every component should have an intensity of 0.1*W20
+        gusts = np.array(
+            [
+                TurbulentWind(self.still, seed=n, W20=10, min_wavelength=0).gusts[1600]
+                for n in range(300)
+            ]
+        )
+        np.testing.assert_allclose([1, 1, 1], gusts.std(axis=0), rtol=0.15)
+        np.testing.assert_allclose([0, 0, 0], gusts.mean(axis=0), atol=0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -33,11 +33,13 @@ def pos_i2alt(pos_i, time):
     Parameters
     ----------
     pos_i : numpy array
-        Position of the rocket in the inertial coordinate system [x,y,z] /m
+        Position of the rocket in the inertial coordinate system [x,y,z] /m, or a row per time
+    time : float or numpy array
+        Time since ignition /s
 
     Returns
     -------
-    float
+    float or numpy array
         Altitude /m
 
     """
@@ -78,20 +80,21 @@ def pos_i2l(position, launch_site, time):
     ----
     -Converting spherical coordinates to Cartesian
     -https://math.libretexts.org/Bookshelves/Calculus/Book%3A_Calculus_(OpenStax)/12%3A_Vectors_in_Space/12.7%3A_Cylindrical_and_Spherical_Coordinates#:~:text=To%20convert%20a%20point%20from,y2%2Bz2)
+    -Converts a whole trajectory at once if time is an array
     Parameters
     ----------
     position : numpy array
-        Position in the inertial frame [x,y,z] /m
+        Position in the inertial frame [x,y,z] /m, or a row per time
     launch_site : LaunchSite object
         Holds the launch site parameters
-    time : float
+    time : float or numpy array
         Time since ignition /s
     Returns
     -------
     numpy array
-        Position in the launch frame
+        Position in the launch frame, a row per time if time is an array
     """
-    pos_launch_site_i = lla2i(launch_site.lat, launch_site.longi, launch_site.alt, time)
+    pos_launch_site_i = site_i(launch_site, time)
 
     pos_rocket_i = position
     pos_rocket_l = direction_i2l(pos_rocket_i - pos_launch_site_i, launch_site, time)
@@ -104,21 +107,22 @@ def vel_i2l(vel_i, launch_site, time):
     Note
     ----
     -v = w x r for a rigid body, where v, w and r are vectors
+    -Converts a whole trajectory at once if time is an array
     Parameters
     ----------
     vel_i : numpy array
-        Velocity in the inertial frame [x,y,z] /m/s
+        Velocity in the inertial frame [x,y,z] /m/s, or a row per time
     launch_site : LaunchSite object
         Holds the launch site parameters
-    time : float
+    time : float or numpy array
         Time since ignition /s
     Returns
     -------
     numpy array
-        Velocity in the launch frame
+        Velocity in the launch frame, a row per time if time is an array
     """
     w_earth = np.array([0, 0, ang_vel_earth])
-    pos_launch_site_i = lla2i(launch_site.lat, launch_site.longi, launch_site.alt, time)
+    pos_launch_site_i = site_i(launch_site, time)
 
     launch_site_velocity_i = np.cross(w_earth, pos_launch_site_i)
 
@@ -156,19 +160,26 @@ def direction_i2l(vector, launch_site, time):
     Note
     ----
     -Problem in the yaw pitch conversions, unexplained negative sign needed
+    -Converts a vector for each time at once if time is an array, see i2l_matrices
     Parameters
     ----------
     vector : numpy array
-        Vector in the inertial frame [x,y,z] /m/s
+        Vector in the inertial frame [x,y,z] /m/s, or a row per time
     launch_site : LaunchSite object
         Holds the launch site parameters
-    time : float
+    time : float or numpy array
         Time since ignition /s
     Returns
     -------
     numpy array
-        Vector in the launch frame
+        Vector in the launch frame, a row per time if time is an array
     """
+    if np.ndim(time) > 0:
+        return np.einsum(
+            "nij,nj->ni",
+            i2l_matrices(launch_site.lat, launch_site.longi, time),
+            np.asarray(vector, dtype=float),
+        )
     return Rotation.from_euler(
         "zy",
         [
@@ -222,17 +233,17 @@ def i2airspeed(pos_i, vel_i, launch_site, time):
     Parameters
     ----------
     vel_i : numpy array
-        Velocity in the inertial frame [x,y,z] /m/s
+        Velocity in the inertial frame [x,y,z] /m/s, or a row per time
     pos_i : numpy array
-        Position in the intertial frame [x,y,z] /m
+        Position in the intertial frame [x,y,z] /m, or a row per time
     launch_site : LaunchSite object
         Holds the launch site parameters
-    time : float
+    time : float or numpy array
         Time since ignition /s
     Returns
     -------
     numpy array
-        Airspeed (assuming no wind), given using launch site coordinates
+        Airspeed (assuming no wind), given using launch site coordinates, a row per time if time is an array
     """
     w_earth = np.array([0, 0, ang_vel_earth])
     atmosphere_velocity_i = np.cross(w_earth, pos_i)
@@ -240,6 +251,31 @@ def i2airspeed(pos_i, vel_i, launch_site, time):
     return direction_i2l(vel_i - atmosphere_velocity_i, launch_site, time)
 
 
+def site_i(launch_site, time):
+    """Position of the launch site in the inertial frame
+
+    Parameters
+    ----------
+    launch_site : LaunchSite object
+        Holds the launch site parameters
+    time : float or numpy array
+        Time since ignition /s
+    Returns
+    -------
+    numpy array
+        Position [x,y,z] /m, a row per time if time is an array
+    """
+    if np.ndim(time) > 0:
+        time = np.asarray(time, dtype=float)
+        return lla2i(
+            np.full(time.shape, launch_site.lat),
+            launch_site.longi,
+            launch_site.alt,
+            time,
+        ).T
+    return lla2i(launch_site.lat, launch_site.longi, launch_site.alt, time)
+
+
 def lla2i(lat, lon, alt, time):
     # see http://www.mathworks.de/help/toolbox/aeroblks/llatoecefposition.html
     cosLat = np.cos(lat * np.pi / 180)
@@ -256,6 +292,8 @@ def lla2i(lat, lon, alt, time):
 
 def i2lla(pos_i, time):
     # https://uk.mathworks.com/help/aeroblks/ecefpositiontolla.html
+    if np.ndim(pos_i) > 1:
+        return _i2lla_rows(pos_i, np.asarray(time))
     x, y, z = pos_i[0], pos_i[1], pos_i[2]
     longi = np.angle(x + 1j * y)
 
@@ -285,3 +323,78 @@ def i2lla(pos_i, time):
     longi = (longi - ang_vel_earth * time) * 180 / np.pi
 
     return lat, longi, h
+
+
+def _i2lla_rows(pos_i, time):
+    """i2lla for several positions at once
+
+    Parameters
+    ----------
+    pos_i : numpy array
+        Positions in the inertial frame, shape (n, 3) /m
+    time : numpy array
+        Time since ignition of each position /s
+
+    Returns
+    -------
+    numpy array, numpy array, numpy array
+        Latitudes /degrees, longitudes /degrees and altitudes /m
+    """
+    x, y, z = pos_i[:, 0], pos_i[:, 1], pos_i[:, 2]
+    longi = np.arctan2(y, x)
+    s = np.sqrt(x ** 2 + y ** 2)
+    e = np.sqrt(1 - (1 - f) ** 2)
+
+    def latitude(beta, rows):
+        return np.arctan2(
+            z[rows] + e ** 2 * (1 - f) * r_earth * np.sin(beta) ** 3 / (1 - e ** 2),
+            s[rows] - e ** 2 * r_earth * np.cos(beta) ** 3,
+        )
+
+    # The same iteration as i2lla, each position stops once its own latitude has converged
+    mu = np.zeros(len(x))
+    mu_ = latitude(np.arctan2(z, (1 - f) * s), slice(None))
+    todo = np.flatnonzero(abs(mu_ - mu) > 1e-2)
+    while len(todo) > 0:
+        mu[todo] = mu_[todo]
+        mu_[todo] = latitude(
+            np.arctan2((1 - f) * np.sin(mu[todo]), np.cos(mu[todo])), todo
+        )
+        todo = todo[abs(mu_[todo] - mu[todo]) > 1e-2]
+    n = r_earth / np.sqrt(1 - e ** 2 * np.sin(mu) ** 2)
+    h = s * np.cos(mu) + (z + e ** 2 * n * np.sin(mu)) * np.sin(mu) - n
+    return mu * 180 / np.pi, (longi - ang_vel_earth * time) * 180 / np.pi, h
+
+
+def i2l_matrices(lat, longi, time):
+    """Rotation matrices from the inertial to the launch frame, the vectorised version of direction_i2l
+
+    Parameters
+    ----------
+    lat : numpy array
+        Launch site latitudes /degrees
+    longi : numpy array
+        Launch site longitudes /degrees
+    time : numpy array
+        Time since ignition /s
+
+    Returns
+    -------
+    numpy array
+        Matrices, shape (n, 3, 3), that take a vector in the inertial frame to the launch frame. The transpose goes the
+        other way (direction_l2i).
+    """
+    yaw = -np.radians(longi) - ang_vel_earth * np.asarray(time)
+    pitch = np.radians(-90 + np.asarray(lat))
+    cy, sy, cp, sp = np.cos(yaw), np.sin(yaw), np.cos(pitch), np.sin(pitch)
+    cy, sy, cp, sp = np.broadcast_arrays(cy, sy, cp, sp)
+    zero = np.zeros(cy.shape)
+    # Extrinsic z then y rotations, R_y(pitch) R_z(yaw)
+    return np.stack(
+        [
+            np.stack([cp * cy, -cp * sy, sp], -1),
+            np.stack([sy, cy, zero], -1),
+            np.stack([-sp * cy, sp * sy, cp], -1),
+        ],
+        -2,
+    )
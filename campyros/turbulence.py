@@ -0,0 +1,360 @@
+"""
+Stochastic turbulence (gust) models layered on top of the wind forcast.
+
+Notes
+-----
+
+- The gusts are a frozen field in altitude, i.e. the rocket sees the gust profile it flies through. Since the flight is
+  mostly vertical the separation is along z, so the vertical component uses the longitudinal spectrum and the two
+  horizontal components use the lateral spectrum.
+- Intensities and length scales follow the MIL-F-8785C low altitude model below 1000 ft, linearly blended into
+  constant medium/high altitude values by 2000 ft. Above that the intensity is held at 0.1*W20 and tapered to zero at
+  the ceiling, which is a simplification of the probability of exceedance tables.
+- The whole profile is generated once from a seed with FFT-filtered white noise. Altitude varying length scales are
+  handled by generating unit length scale turbulence in a stretched coordinate xi = int(dh/L(h)).
+- Wavelengths shorter than min_wavelength are filtered out and the profile is interpolated with a cubic so the wind
+  has a continuous derivative, otherwise the adaptive integrator takes tiny steps at every kink (roughly 6x more fdot
+  calls). Gusts that short barely affect the trajectory anyway.
+
+"""
+import numpy as np
+import scipy.ndimage
+
+__copyright__ = """
+
+    Copyright 2021 Jago Strong-Wright
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+
+FT = 0.3048  # m
+
+
+def dryden_psd(omega, longitudinal):
+    """One sided Dryden power spectral density for unit intensity and length scale
+
+    Parameters
+    ----------
+    omega : numpy array
+        Spatial frequency /rad per length scale
+    longitudinal : bool
+        Longitudinal (True) or lateral (False) component
+
+    Returns
+    -------
+    numpy array
+        Power spectral density
+    """
+    if longitudinal == True:
+        return (2 / np.pi) / (1 + omega ** 2)
+    return (1 / np.pi) * (1 + 3 * omega ** 2) / (1 + omega ** 2) ** 2
+
+
+def von_karman_psd(omega, longitudinal):
+    """One sided von Kármán power spectral density for unit intensity and length scale
+
+    Parameters
+    ----------
+    omega : numpy array
+        Spatial frequency /rad per length scale
+    longitudinal : bool
+        Longitudinal (True) or lateral (False) component
+
+    Returns
+    -------
+    numpy array
+        Power spectral density
+    """
+    a = (1.339 * omega) ** 2
+    if longitudinal == True:
+        return (2 / np.pi) / (1 + a) ** (5 / 6)
+    return (1 / np.pi) * (1 + 8 / 3 * a) / (1 + a) ** (11 / 6)
+
+
+MODELS = {
+    "dryden": (dryden_psd, 1750 * FT),
+    "von_karman": (von_karman_psd, 2500 * FT),
+}
+
+
+def mil_parameters(alt, w20, high_length, ceiling):
+    """Turbulence intensities and length scales by altitude
+
+    Parameters
+    ----------
+    alt : numpy array
+        Altitude /m
+    w20 : float
+        Wind speed at 20 ft, sets the intensity (light ~7.7, moderate ~15, severe ~23) /m/s
+    high_length : float
+        Length scale above 2000 ft /m
+    ceiling : float
+        Altitude the turbulence has died out by /m
+
+    Returns
+    -------
+    numpy array, numpy array, numpy array, numpy array
+        Horizontal intensity /m/s, vertical intensity /m/s, horizontal length scale /m, vertical length scale /m
+    """
+    h = np.clip(np.asarray(alt, dtype=float) / FT, 10, None)
+    sigma_w = 0.1 * w20
+    low = np.clip(h, None, 1000)
+    sigma_h_low = sigma_w / (0.177 + 0.000823 * low) ** 0.4
+    length_h_low = low / (0.177 + 0.000823 * low) ** 1.2 * FT
+    length_v_low = low * FT
+
+    # Linear blend between 1000 ft and 2000 ft, the low altitude values are already constant above 1000 ft
+    blend = np.clip((h - 1000) / 1000, 0, 1)
+    sigma_h = (1 - blend) * sigma_h_low + blend * sigma_w
+    sigma_v = np.full(h.shape, sigma_w)
+    length_h = (1 - blend) * length_h_low + blend * high_length
+    length_v = (1 - blend) * length_v_low + blend * high_length
+
+    taper = np.clip((ceiling - h * FT) / (0.2 * ceiling), 0, 1)
+    return sigma_h * taper, sigma_v * taper, length_h, length_v
+
+
+def unit_turbulence(n, d_xi, psd, longitudinal, rng):
+    """Generates unit intensity, unit length scale turbulence by filtering white noise in the frequency domain
+
+    Parameters
+    ----------
+    n : int
+        Number of samples
+    d_xi : float
+        Sample spacing /length scales
+    psd : callable
+        Power spectral density function, e.g. dryden_psd
+    longitudinal : bool
+        Longitudinal (True) or lateral (False) component
+    rng : numpy.random.Generator
+        Random number generator
+
+    Returns
+    -------
+    numpy array
+        Turbulence samples
+    """
+    # Generate twice as many points so the periodicity of the FFT doesn't correlate the two ends
+    m = 2 * n
+    noise = np.fft.rfft(rng.standard_normal(m))
+    omega = 2 * np.pi * np.fft.rfftfreq(m, d_xi)
+    # White noise with unit variance per sample has a one sided PSD of d_xi/pi
+    noise *= np.sqrt(np.pi * psd(omega, longitudinal) / d_xi)
+    noise[0] = 0
+    return np.fft.irfft(noise, m)[:n]
+
+
+def interpolate_gusts(gusts, resolution, alt, profile=None):
+    """Gusts at several altitudes at once, the array version of TurbulentWind.gust
+
+    Parameters
+    ----------
+    gusts : numpy array
+        Gust profile (levels, 3), or several profiles (profiles, levels, 3)
+    resolution : float
+        Altitude spacing of the profiles /m
+    alt : numpy array
+        Altitudes /m
+    profile : numpy array, optional
+        Index of the profile to use for each altitude when there are several, defaults to None
+
+    Returns
+    -------
+    numpy array
+        Gust vector [x,y,z] /m/s at each altitude, shape (n, 3)
+    """
+    position = np.asarray(alt, dtype=float) / resolution
+    last = gusts.shape[-2] - 1
+    inside = (position >= 0) & (position < last)
+    position = np.where(inside, position, 0)
+    n = position.astype(int)
+    f = (position - n)[:, None]
+    if gusts.ndim == 2:
+        at = lambda k: gusts[k]
+    else:
+        at = lambda k: gusts[profile, k]
+    g0 = at(np.maximum(n - 1, 0))
+    g1 = at(n)
+    g2 = at(n + 1)
+    g3 = at(np.minimum(n + 2, last))
+    out = g1 + 0.5 * f * (
+        g2 - g0 + f * (2 * g0 - 5 * g1 + 4 * g2 - g3 + f * (3 * (g1 - g2) + g3 - g0))
+    )
+    out[~inside] = 0
+    return out
+
+
+class TurbulentWind:
+    """Adds stochastic gusts to a wind object
+
+    Note
+    ----
+    The gust profile is generated once when the object is made (from the seed), so during the flight getting the wind
+    only costs the underlying wind plus an O(1) lookup and the integrator doesn't need to carry any filter states.
+
+    Parameters
+    ----------
+    wind : Wind or ForecastWind
+        Underlying mean wind
+    seed : int or numpy.random.SeedSequence, optional
+        Seed for the gust profile, defaults to None (random)
+    model : string, optional
+        "dryden" or "von_karman", defaults to "dryden"
+    W20 : float, optional
+        Wind speed at 20 ft, sets the turbulence intensity (light ~7.7, moderate ~15, severe ~23) /m/s, defaults to 7.7
+    ceiling : float, optional
+        Altitude the turbulence has died out by /m, defaults to 20000
+    resolution : float, optional
+        Altitude spacing of the stored profile /m, defaults to 5
+    min_wavelength : float, optional
+        Shorter wavelengths are smoothed out /m, defaults to 50
+
+    Attributes
+    ----------
+    wind : Wind or ForecastWind
+        Underlying mean wind
+    resolution : float
+        Altitude spacing of the stored profile /m
+    gusts : numpy array
+        Gust vector [x,y,z] /m/s in the launch frame at each altitude 0, resolution, 2*resolution... up to the ceiling
+    """
+
+    def __init__(
+        self,
+        wind,
+        seed=None,
+        model="dryden",
+        W20=7.7,
+        ceiling=20000,
+        resolution=5,
+        min_wavelength=50,
+    ):
+        if model not in MODELS:
+            raise ValueError(
+                "Turbulence model must be one of %s, not %s" % (list(MODELS), model)
+            )
+        self.wind = wind
+        self.model = model
+        self.resolution = resolution
+        self.ceiling = ceiling
+
+        psd, high_length = MODELS[model]
+        rng = np.random.default_rng(seed)
+        alts = np.arange(0, ceiling + resolution, resolution)
+        sigma_h, sigma_v, length_h, length_v = mil_parameters(
+            alts, W20, high_length, ceiling
+        )
+
+        self.gusts = np.zeros((len(alts), 3))
+        for n, (sigma, length, longitudinal) in enumerate(
+            [(sigma_h, length_h, False), (sigma_h, length_h, False)]
+            + [(sigma_v, length_v, True)]
+        ):
+            # Stretched coordinate in which the length scale is 1
+            xi = np.concatenate([[0], np.cumsum(resolution / length[1:])])
+            d_xi = min(0.02, xi[-1] / len(alts))
+            samples = unit_turbulence(
+                int(np.ceil(xi[-1] / d_xi)) + 2, d_xi, psd, longitudinal, rng
+            )
+            self.gusts[:, n] = sigma * np.interp(
+                xi, d_xi * np.arange(len(samples)), samples
+            )
+        if min_wavelength > 0:
+            self.gusts = scipy.ndimage.gaussian_filter1d(
+                self.gusts, min_wavelength / np.pi / resolution, axis=0, mode="nearest"
+            )
+
+    def gust(self, alt):
+        """Returns the gust at an altitude, using cubic (Catmull-Rom) interpolation of the stored profile
+
+        Parameters
+        ----------
+        alt : float
+            Altitude /m
+
+        Returns
+        -------
+        numpy array
+            Gust vector [x,y,z] /m/s
+        """
+        position = alt / self.resolution
+        last = len(self.gusts) - 1
+        if not 0 <= position < last:
+            return np.zeros(3)
+        n = int(position)
+        f = position - n
+        g0 = self.gusts[max(n - 1, 0)]
+        g1 = self.gusts[n]
+        g2 = self.gusts[n + 1]
+        g3 = self.gusts[min(n + 2, last)]
+        return g1 + 0.5 * f * (
+            g2
+            - g0
+            + f * (2 * g0 - 5 * g1 + 4 * g2 - g3 + f * (3 * (g1 - g2) + g3 - g0))
+        )
+
+    def preload(self):
+        """Loads the underlying wind now rather than on the first get_wind call
+
+        Returns
+        -------
+        TurbulentWind
+            self
+        """
+        self.wind.preload()
+        return self
+
+    def get_wind(self, lat, long, alt, time=0):
+        """Returns wind for a specific lat,long,alt including gusts
+
+        Parameters
+        ----------
+        lat : float:
+            Requested latitude /degrees
+        longi : float:
+            Requested longitude /degrees
+        alt : float:
+            Requested altitude /m
+        time : float, optional
+            Time since ignition /s, defaults to 0
+        Returns
+        -------
+        numpy array
+            Wind speed vector [x,y,z]/m/s
+        """
+        return self.wind.get_wind(lat, long, alt, time) + self.gust(alt)
+
+    def get_winds(self, lat, long, alt, time=0):
+        """Returns the wind including gusts at several points at once
+
+        Parameters
+        ----------
+        lat : numpy array
+            Requested latitudes /degrees
+        long : numpy array
+            Requested longitudes /degrees
+        alt : numpy array
+            Requested altitudes /m
+        time : float or numpy array, optional
+            Time since ignition /s, defaults to 0
+        Returns
+        -------
+        numpy array
+            Wind speed vector [x,y,z]/m/s for each point, shape (n, 3)
+        """
+        return self.wind.get_winds(lat, long, alt, time) + interpolate_gusts(
+            self.gusts, self.resolution, alt
+        )
@@ -6,7 +6,6 @@ Notes
 
 Known issues:
 
-- Downloading is somewhat finnicky, if in doubt, delete the content of your data/wind/gfs folder
 - "normal" mode may not work because of changes since it was last used and is very slow even if it does, for now please use "fast_wind=True" since it 
 makes essentially no difference and we don't have error estimates yet anyway
 
@@ -27,14 +26,19 @@ except:
 import scipy
 import scipy.interpolate
 import warnings
+import copy
 import os
+import collections
+import threading
 import numpy as np
-import requests
 import numexpr as ne
 import pandas as pd
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 
+from .download import download_file, DownloadError
+
 __copyright__ = """
 
     Copyright 2021 Jago Strong-Wright
@@ -74,6 +78,12 @@ def warning_on_one_line(message, category, filename, lineno, file=None, line=Non
 
 warnings.formatwarning = warning_on_one_line
 
+# Decoded GRIB files by file location, so Wind objects for the same forcast (e.g. when sweeping launch times) don't decode it again.
+# Only the most recently used DECODED_CACHE_SIZE are kept, so long sweeps over many forcasts don't keep them all in memory
+DECODED_CACHE_SIZE = 32
+_decoded = collections.OrderedDict()
+_decoded_lock = threading.Lock()
+
 
 class Wind:
     """Wind object
@@ -82,6 +92,7 @@ class Wind:
     ----
     Can give the wind vector for any lat long alt in the launch frame.
     Data collected from the NOAA's 0.25 degree 1 hour GFS forcast (https://nomads.ncep.noaa.gov/)
+    Nothing is downloaded or decoded until the first get_wind call, or preload() if you want to pay that cost up front.
 
     Parameters
     ----------
@@ -124,6 +135,8 @@ class Wind:
         Hours forcast forward from forcast time, must be three digits between 000 and 123 (?)
     df : pandas DataFrame
         Dataframe holding wind data with columns lat, long, alt, wind x, wind y
+    loaded : bool
+        Whether the data has been loaded yet
     """
 
     def __init__(
@@ -146,6 +159,7 @@ class Wind:
         self.default = default
         self.points = []
         self.fast = fast
+        self.loaded = False
 
         if variable == True:
             if lat < 2:
@@ -172,12 +186,23 @@ class Wind:
             self.date = run_date
             self.forcast_time = forcast_time
             self.run_time = forcast_plus_time
+
+    def preload(self):
+        """Loads (downloading if needed) the wind data now rather than on the first get_wind call
+
+        Returns
+        -------
+        Wind
+            self
+        """
+        if self.variable == True and self.loaded == False:
             self.df, self.points = self.load_data(
                 closest(self.centre_lat, 0.25), closest(self.centre_long, 0.25)
             )
-
             if self.fast == True:
-                self.winds = self.load_fast(lat, long)
+                self.winds = self.load_fast(self.centre_lat, self.centre_long)
+            self.loaded = True
+        return self
 
     def load_fast(self, lat, long):
         """Returns an interpolation object of wind by altitude for the specified location
@@ -238,11 +263,8 @@ class Wind:
         Notes
         -----
         Checks if the file corespondin to the requested lat long at the time and date of the object is available.
-        If not downloads. Then reads into the dataframe.
-        The file has cubes for geopotential height, wind x and wind y by pressure at a square grid of lat longs.
-        The wind x and y are itterated throgh the pressures for each lat long and the altitude found for each point
-        by finding the geopotential height at the particular pressure which can be converted to altitude.
-        Each point is then stored in the df separatly for ease of searching (because the library Iris is complelty inept for this).
+        If not downloads. Then reads into the dataframe with decode_grib.
+        Decoded files are cached for the session so other Wind objects using the same file don't decode it again.
 
         Parameters
         ----------
@@ -265,17 +287,20 @@ class Wind:
         lat_top, long_left = validate_lat_long(lat_top, long_left)
         lat_bottom, long_right = validate_lat_long(lat_bottom, long_right)
 
-        if not os.path.isfile(
-            "%s/%s_%s_%s_%s_%s.grb2"
-            % (
-                self.data_loc,
-                lat_bottom,
-                long_left,
-                self.date,
-                self.forcast_time,
-                self.run_time,
-            )
-        ):
+        file_loc = "%s/%s_%s_%s_%s_%s.grb2" % (
+            self.data_loc,
+            lat_bottom,
+            long_left,
+            self.date,
+            self.forcast_time,
+            self.run_time,
+        )
+        with _decoded_lock:
+            if file_loc in _decoded:
+                _decoded.move_to_end(file_loc)
+                return _decoded[file_loc]
+
+        if not os.path.isfile(file_loc) or not is_complete_grib(file_loc):
             # This does download 3 rows that aren't needed but I can't work out how to yeet them
             print("Downloading files")
             if long_left > long_right:
@@ -292,143 +317,21 @@ class Wind:
                 run=self.forcast_time,
                 hour=self.run_time,
             )
-            r = requests.get(url, stream=True)
-            with open(
-                "%s/%s_%s_%s_%s_%s.grb2"
-                % (
-                    self.data_loc,
-                    lat_bottom,
-                    long_left,
-                    self.date,
-                    self.forcast_time,
-                    self.run_time,
-                ),
-                "wb",
-            ) as f:
-                for chunk in r.iter_content(chunk_size=1024):
-                    if chunk:
-                        f.write(chunk)
-        if (
-            os.path.getsize(
-                "%s/%s_%s_%s_%s_%s.grb2"
-                % (
-                    self.data_loc,
-                    lat_bottom,
-                    long_left,
-                    self.date,
-                    self.forcast_time,
-                    self.run_time,
-                )
-            )
-            < 1000
-        ):
-            raise RuntimeError(
-                "The weather data you requested was not found, this is usually because it was for an invalid date/time. lat=%s,long=%s was requested at %s"
-                % (lat_bottom, long_left, self.date)
-            )
-        data = iris.load(
-            "%s/%s_%s_%s_%s_%s.grb2"
-            % (
-                self.data_loc,
-                lat_bottom,
-                long_left,
-                self.date,
-                self.forcast_time,
-                self.run_time,
-            )
-        )
-        for index, row in enumerate(data):
             try:
-                row.coord("pressure")
-                if row.standard_name == "x_wind":
-                    row_x_wind = index
-                elif row.standard_name == "y_wind":
-                    row_y_wind = index
-                elif row.standard_name == "geopotential_height":
-                    row_geo = index
-            except:
-                pass
-        lats = list(data[row_geo].coord("latitude").points)
-        longs = list(data[row_geo].coord("longitude").points)
-        df = pd.DataFrame(columns=["lat", "long", "alt", "w_x", "w_y"])
-        points = []
-        for long in longs:
-            for lat in lats:
-                press_1 = (
-                    data[row_x_wind]
-                    .extract(iris.Constraint(latitude=lat, longitude=long))
-                    .coord("pressure")
-                    .points
-                )
-                press_2 = (
-                    data[row_y_wind]
-                    .extract(iris.Constraint(latitude=lat, longitude=long))
-                    .coord("pressure")
-                    .points
-                )
-                press_3 = (
-                    data[row_geo]
-                    .extract(iris.Constraint(latitude=lat, longitude=long))
-                    .coord("pressure")
-                    .points
-                )
-                press = []
-                for pres in press_1:
-                    if pres in press_2 and pres in press_3:
-                        press.append(pres)
-                for pres in press:
-                    try:
-                        if [lat, long] not in self.points or [lat, long] not in points:
-                            w_x = (
-                                data[row_x_wind]
-                                .extract(
-                                    iris.Constraint(
-                                        latitude=lat, longitude=long, pressure=pres
-                                    )
-                                )
-                                .data
-                            )
-                            w_y = (
-                                data[row_y_wind]
-                                .extract(
-                                    iris.Constraint(
-                                        latitude=lat, longitude=long, pressure=pres
-                                    )
-                                )
-                                .data
-                            )
-                            alt = (
-                                data[row_geo]
-                                .extract(
-                                    iris.Constraint(
-                                        latitude=lat, longitude=long, pressure=pres
-                                    )
-                                )
-                                .data
-                            )
-                            row = {
-                                "lat": lat,
-                                "long": np.mod(long, 360),
-                                "alt": alt,
-                                "w_x": w_x,
-                                "w_y": w_y,
-                            }
-                            df = df.append(row, ignore_index=True)
-                    except KeyError:
-                        warnings.warn(
-                            "Wind datapoint lat=%s, long=%s, pres=%s was missed because of an unknown Iris error, this is non fatal as it will be interpolated from other values"
-                            % (lat, long, pres)
-                        )
-                    except:
-                        warnings.warn(
-                            "Wind datapoint lat=%s, long=%s, pres=%s was missed because of an unknown Iris error, this may be a fatal result if there are many instances in one dataset"
-                            % (lat, long, pres)
-                        )
-                # Add a lookup check here (i.e. query for lat long and check not none)
-                points.append([lat, long])
+                download_file(url, file_loc, validate=is_complete_grib)
+            except DownloadError as e:
+                raise RuntimeError(
+                    "The weather data you requested was not found, this is usually because it was for an invalid date/time. lat=%s,long=%s was requested at %s (%s)"
+                    % (lat_bottom, long_left, self.date, e)
+                ) from None
+        df, points = decode_grib(file_loc)
+        with _decoded_lock:
+            _decoded[file_loc] = (df, points)
+            while len(_decoded) > DECODED_CACHE_SIZE:
+                _decoded.popitem(last=False)
         return df, points
 
-    def get_wind(self, lat, long, alt):
+    def get_wind(self, lat, long, alt, time=0):
         """Returns wind for a specific lat,long,alt
 
         Parameters
@@ -439,20 +342,24 @@ class Wind:
             Requested longitude /degrees
         alt : float:
             Requested altitude /m
+        time : float, optional
+            Time since ignition /s, not used since there is only one forcast hour but
+            accepted so this can be swapped for a ForecastWind, defaults to 0
         Returns
         -------
         numpy array
             Wind speed vector [x,y,z]/m/s
         """
+        if self.variable == True and self.loaded == False:
+            self.preload()
         lat, long = validate_lat_long(lat, long)
         if self.variable == True and self.fast == False and 0 < alt < 80000:
             lats = closest(lat, 0.25)
             longs = closest(long, 0.25)
             if not all(point in self.points for point in points(lats, longs)):
                 new_df, new_points = self.load_data(lats, longs)
-                self.df += new_df
-                self.points += new_points
-                # would self.df,self.points+=self.load_data(lats,longs) be valid?
+                self.df = pd.concat([self.df, new_df], ignore_index=True)
+                self.points = self.points + new_points
 
             search_lats = self.df.lat.values
             # This search method was approx an order of magnitude faster in my testing
@@ -501,6 +408,759 @@ class Wind:
         else:
             return self.default
 
+    def get_winds(self, lat, long, alt, time=0):
+        """Returns the wind at several points at once
+
+        Note
+        ----
+        Only the fast and non variable modes are vectorised, the full interpolation calls get_wind for each point.
+
+        Parameters
+        ----------
+        lat : numpy array
+            Requested latitudes /degrees
+        long : numpy array
+            Requested longitudes /degrees
+        alt : numpy array
+            Requested altitudes /m
+        time : float or numpy array, optional
+            Time since ignition /s, not used, defaults to 0
+        Returns
+        -------
+        numpy array
+            Wind speed vector [x,y,z]/m/s for each point, shape (n, 3)
+        """
+        alt = np.asarray(alt, dtype=float)
+        if self.variable == True and self.loaded == False:
+            self.preload()
+        if self.variable == True and self.fast == True:
+            return self.winds(alt).T
+        elif self.variable == True:
+            return np.array(
+                [self.get_wind(*point) for point in zip(lat, long, alt)]
+            ).reshape(len(alt), 3)
+        return np.tile(np.asarray(self.default, dtype=float), (len(alt), 1))
+
+
+def decode_grib(file_loc):
+    """Reads the wind out of a GRIB file downloaded by Wind.load_data
+
+    Notes
+    -----
+    The file has cubes for geopotential height, wind x and wind y by pressure at a square grid of lat longs.
+    The wind x and y are itterated throgh the pressures for each lat long and the altitude found for each point
+    by finding the geopotential height at the particular pressure which can be converted to altitude.
+    Each point is then stored in the df separatly for ease of searching (because the library Iris is complelty inept for this).
+
+    Parameters
+    ----------
+    file_loc : string
+        Location of the GRIB file
+
+    Returns
+    -------
+    pandas DataFrame
+        The wind points with columns lat, long, alt, w_x, w_y
+    points
+        list of [lat,long] in the file
+    """
+    data = iris.load(file_loc)
+    for index, row in enumerate(data):
+        try:
+            row.coord("pressure")
+            if row.standard_name == "x_wind":
+                row_x_wind = index
+            elif row.standard_name == "y_wind":
+                row_y_wind = index
+            elif row.standard_name == "geopotential_height":
+                row_geo = index
+        except:
+            pass
+    lats = list(data[row_geo].coord("latitude").points)
+    longs = list(data[row_geo].coord("longitude").points)
+    df = pd.DataFrame(columns=["lat", "long", "alt", "w_x", "w_y"])
+    points = []
+    for long in longs:
+        for lat in lats:
+            press_1 = (
+                data[row_x_wind]
+                .extract(iris.Constraint(latitude=lat, longitude=long))
+                .coord("pressure")
+                .points
+            )
+            press_2 = (
+                data[row_y_wind]
+                .extract(iris.Constraint(latitude=lat, longitude=long))
+                .coord("pressure")
+                .points
+            )
+            press_3 = (
+                data[row_geo]
+                .extract(iris.Constraint(latitude=lat, longitude=long))
+                .coord("pressure")
+                .points
+            )
+            press = []
+            for pres in press_1:
+                if pres in press_2 and pres in press_3:
+                    press.append(pres)
+            for pres in press:
+                try:
+                    if [lat, long] not in points:
+                        w_x = (
+                            data[row_x_wind]
+                            .extract(
+                                iris.Constraint(
+                                    latitude=lat, longitude=long, pressure=pres
+                                )
+                            )
+                            .data
+                        )
+                        w_y = (
+                            data[row_y_wind]
+                            .extract(
+                                iris.Constraint(
+                                    latitude=lat, longitude=long, pressure=pres
+                                )
+                            )
+                            .data
+                        )
+                        alt = (
+                            data[row_geo]
+                            .extract(
+                                iris.Constraint(
+                                    latitude=lat, longitude=long, pressure=pres
+                                )
+                            )
+                            .data
+                        )
+                        row = {
+                            "lat": lat,
+                            "long": np.mod(long, 360),
+                            "alt": alt,
+                            "w_x": w_x,
+                            "w_y": w_y,
+                        }
+                        df = df.append(row, ignore_index=True)
+                except KeyError:
+                    warnings.warn(
+                        "Wind datapoint lat=%s, long=%s, pres=%s was missed because of an unknown Iris error, this is non fatal as it will be interpolated from other values"
+                        % (lat, long, pres)
+                    )
+                except:
+                    warnings.warn(
+                        "Wind datapoint lat=%s, long=%s, pres=%s was missed because of an unknown Iris error, this may be a fatal result if there are many instances in one dataset"
+                        % (lat, long, pres)
+                    )
+            # Add a lookup check here (i.e. query for lat long and check not none)
+            points.append([lat, long])
+    return df, points
+
+
+class ForecastWind:
+    """Wind object covering several forcast hours
+
+    Note
+    ----
+    Holds a Wind object for each forcast hour and linearly interpolates between the two either side of the current time,
+    so long flights and launch window studies don't have to pick one snapshot.
+    The hours needed for the flight window are fetched and decoded concurrently by preload() (or the first get_wind call), any others
+    are loaded the first time they are needed. Decoded files are cached for the whole session so objects with different launch times share the work.
+
+    Parameters
+    ----------
+    initial_lat : float
+        Initial latitude /degrees
+    initial_long : float
+        Initial longitude /degrees
+    forcast_hours : list
+        Hours forcast forward from forcast time that are available to interpolate between, e.g. range(0, 6)
+    launch_time : float, optional
+        Time of ignition in hours after the forcast run time, defaults to the first forcast hour
+    flight_window : float, optional
+        Length of flight to load up front /hours, defaults to 1
+    max_workers : int, optional
+        Number of threads used to load forcast hours, defaults to 4
+    variable : bool, optional
+        Vary the wind or just use defaut for whole flight, defaults to True
+    default : numpy array, optional
+        Default wind vector [wind_x,wind_y,wind_z]/m/s, defauts to [0,0,0]
+    data_loc : string, optional
+        Route to folder where the data will be stored, defaults to data/wind/gfs
+    run_date : string, optional
+        Date for forcast data in format YYYYMMDD, defaults to current date
+    forcast_time : string, optional
+        Forcast run time, must be 00,06,12 or 18, defaults to 00
+    fast : bool, optional
+        Use the fast (altitude only) wind interpolation, defaults to False
+
+    Attributes
+    ----------
+    hours : list
+        Sorted forcast hours available
+    launch_time : float
+        Time of ignition in hours after the forcast run time
+    winds : dict
+        Wind object for each forcast hour that has been loaded so far
+    """
+
+    def __init__(
+        self,
+        initial_long,
+        initial_lat,
+        forcast_hours,
+        launch_time=None,
+        flight_window=1,
+        max_workers=4,
+        variable=True,
+        default=np.array([0, 0, 0]),
+        data_loc="data/wind/gfs",
+        run_date=date.today().strftime("%Y%m%d"),
+        forcast_time="00",
+        fast=False,
+    ):
+        self.hours = sorted(int(hour) for hour in forcast_hours)
+        if len(self.hours) == 0:
+            raise ValueError("At least one forcast hour is needed")
+        self.launch_time = self.hours[0] if launch_time is None else launch_time
+        self.max_workers = max_workers
+        self.variable = variable
+        self.default = default
+        self.wind_kwargs = {
+            "variable": variable,
+            "default": default,
+            "data_loc": data_loc,
+            "run_date": run_date,
+            "forcast_time": forcast_time,
+            "fast": fast,
+        }
+        self.centre_long = initial_long
+        self.centre_lat = initial_lat
+        self.flight_window = flight_window
+        self.winds = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def preload(self):
+        """Loads the forcast hours covering the flight window now rather than on the first get_wind call
+
+        Returns
+        -------
+        ForecastWind
+            self
+        """
+        if self.variable == True:
+            start = self._bracket(self.launch_time)[0]
+            end = self._bracket(self.launch_time + self.flight_window)[1]
+            self.load_hours(self.hours[start : end + 1])
+        return self
+
+    def load_hours(self, hours):
+        """Makes sure the listed forcast hours are loaded, fetching and decoding any missing ones in a thread pool
+
+        Parameters
+        ----------
+        hours : list
+            Forcast hours to load
+        """
+        with self._lock:
+            missing = [hour for hour in hours if hour not in self.winds]
+            if len(missing) == 1:
+                self.winds[missing[0]] = self._load_hour(missing[0])
+            elif len(missing) > 1:
+                with ThreadPoolExecutor(
+                    max_workers=min(self.max_workers, len(missing))
+                ) as pool:
+                    for hour, wind in zip(missing, pool.map(self._load_hour, missing)):
+                        self.winds[hour] = wind
+
+    def _load_hour(self, hour):
+        return Wind(
+            self.centre_long,
+            self.centre_lat,
+            forcast_plus_time="%03d" % hour,
+            **self.wind_kwargs,
+        ).preload()
+
+    def _bracket(self, hour):
+        """Indices of the forcast hours either side of hour (the same index twice if it is on one or outside the range)"""
+        n = np.searchsorted(self.hours, hour)
+        if n == len(self.hours):
+            return n - 1, n - 1
+        if n == 0 or self.hours[n] == hour:
+            return n, n
+        return n - 1, n
+
+    def at_launch_time(self, launch_time):
+        """Returns a copy with a different launch time that shares the forcast hours already loaded
+
+        Parameters
+        ----------
+        launch_time : float
+            Time of ignition in hours after the forcast run time
+
+        Returns
+        -------
+        ForecastWind
+            New wind object
+        """
+        new = copy.copy(self)
+        new.launch_time = launch_time
+        return new
+
+    def get_wind(self, lat, long, alt, time=0):
+        """Returns wind for a specific lat,long,alt and time, linearly interpolated between forcast hours
+
+        Parameters
+        ----------
+        lat : float:
+            Requested latitude /degrees
+        longi : float:
+            Requested longitude /degrees
+        alt : float:
+            Requested altitude /m
+        time : float, optional
+            Time since ignition /s, defaults to 0
+        Returns
+        -------
+        numpy array
+            Wind speed vector [x,y,z]/m/s
+        """
+        if self.variable == False:
+            return self.default
+
+        hour = self.launch_time + time / 3600
+        i, j = self._bracket(hour)
+        if self.hours[i] not in self.winds or self.hours[j] not in self.winds:
+            self.load_hours([self.hours[i], self.hours[j]])
+
+        wind_i = self.winds[self.hours[i]].get_wind(lat, long, alt)
+        if i == j:
+            return wind_i
+        wind_j = self.winds[self.hours[j]].get_wind(lat, long, alt)
+        f = (hour - self.hours[i]) / (self.hours[j] - self.hours[i])
+        return (1 - f) * wind_i + f * wind_j
+
+    def get_winds(self, lat, long, alt, time=0):
+        """Returns the wind at several points and times at once, linearly interpolated between forcast hours
+
+        Parameters
+        ----------
+        lat : numpy array
+            Requested latitudes /degrees
+        long : numpy array
+            Requested longitudes /degrees
+        alt : numpy array
+            Requested altitudes /m
+        time : float or numpy array, optional
+            Time since ignition /s, defaults to 0
+        Returns
+        -------
+        numpy array
+            Wind speed vector [x,y,z]/m/s for each point, shape (n, 3)
+        """
+        lat, long, alt = (np.asarray(v, dtype=float) for v in (lat, long, alt))
+        if self.variable == False:
+            return np.tile(np.asarray(self.default, dtype=float), (len(alt), 1))
+
+        hour = self.launch_time + np.broadcast_to(time, alt.shape) / 3600
+        unique, inverse = np.unique(hour, return_inverse=True)
+        i, j = np.array([self._bracket(h) for h in unique]).reshape(-1, 2)[inverse].T
+        needed = sorted(set(self.hours[k] for k in np.concatenate([i, j])))
+        if not all(h in self.winds for h in needed):
+            self.load_hours(needed)
+
+        out = np.zeros((len(alt), 3))
+        for k in np.unique(i):
+            rows = i == k
+            out[rows] = self.winds[self.hours[k]].get_winds(
+                lat[rows], long[rows], alt[rows]
+            )
+        later = i != j
+        if np.any(later):
+            hours = np.array(self.hours, dtype=float)
+            f = (hour[later] - hours[i[later]]) / (hours[j[later]] - hours[i[later]])
+            wind_j = np.zeros((np.count_nonzero(later), 3))
+            for k in np.unique(j[later]):
+                rows = j[later] == k
+                wind_j[rows] = self.winds[self.hours[k]].get_winds(
+                    lat[later][rows], long[later][rows], alt[later][rows]
+                )
+            out[later] = (1 - f[:, None]) * out[later] + f[:, None] * wind_j
+        return out
+
+
+class EnsembleWind:
+    """Wind from a forcast ensemble, e.g. the NOAA's GEFS, with one member selected at a time
+
+    Note
+    ----
+    Every member is resampled onto the same altitude levels and stored in one array of shape
+    members x lat x long x level x 2 (launch frame [x,y] wind), saved as a .npy file in data_loc and opened as a read only memory map.
+    When the object is pickled (e.g. sent to a worker process) only the file location is included and the
+    worker maps the same file when it first needs it, so all processes share one copy through the page cache rather than each getting their own.
+    Only the 2x2 grid of points around the launch site is loaded (like Wind with fast=True), positions outside it are clamped to the edge.
+    Nothing is loaded until the first get_wind call or preload().
+
+    Parameters
+    ----------
+    initial_lat : float
+        Initial latitude /degrees
+    initial_long : float
+        Initial longitude /degrees
+    members : int, optional
+        Number of ensemble members, the control (gec00) followed by the perturbed members gep01, gep02... defaults to 31
+    data_loc : string, optional
+        Route to folder where the data will be stored, defaults to data/wind/gefs
+    run_date : string, optional
+        Date for forcast data in format YYYYMMDD, defaults to current date
+    forcast_time : string, optional
+        Forcast run time, must be 00,06,12 or 18, defaults to 00
+    forcast_plus_time : string, optional
+        Hours forcast forward from forcast time, must be three digits, defaults to 000
+    resolution : float, optional
+        Grid spacing of the forcast /degrees, defaults to 0.5
+    top : float, optional
+        Highest altitude level /m, defaults to 45000
+    spacing : float, optional
+        Spacing of the altitude levels /m, defaults to 100
+    max_workers : int, optional
+        Number of threads used to fetch and decode members, defaults to 4
+
+    Attributes
+    ----------
+    path : string
+        Location of the array file
+    lats : list
+        Grid latitudes /degrees
+    longs : list
+        Grid longitudes /degrees
+    levels : numpy array
+        Altitude levels /m
+    data : numpy memmap
+        Wind for every member, None until loaded
+    n_members : int
+        Number of members
+    member : int
+        Selected member
+    """
+
+    def __init__(
+        self,
+        initial_long,
+        initial_lat,
+        members=31,
+        data_loc="data/wind/gefs",
+        run_date=date.today().strftime("%Y%m%d"),
+        forcast_time="00",
+        forcast_plus_time="000",
+        resolution=0.5,
+        top=45000,
+        spacing=100,
+        max_workers=4,
+    ):
+        lat, long = validate_lat_long(initial_lat, initial_long)
+        self.lats = sorted(closest(lat, resolution))
+        self.longs = sorted(closest(long, resolution))
+        self.levels = np.arange(0, top + spacing, spacing)
+        self.spacing = spacing
+        self.data_loc = data_loc
+        self.date = run_date
+        self.forcast_time = forcast_time
+        self.run_time = forcast_plus_time
+        self.max_workers = max_workers
+        self.member = 0
+        self.n_members = members
+        self.data = None
+
+        lat_bottom, long_left = validate_lat_long(self.lats[0], self.longs[0])
+        self.path = "%s/ensemble_%s_%s_%s_%s_%s.npy" % (
+            data_loc,
+            lat_bottom,
+            long_left,
+            run_date,
+            forcast_time,
+            forcast_plus_time,
+        )
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["data"] = None
+        return state
+
+    def preload(self):
+        """Opens the array file now rather than on the first get_wind call, building it first if it doesn't exist
+
+        Returns
+        -------
+        EnsembleWind
+            self
+        """
+        if self.data is None:
+            shape = (self.n_members, 2, 2, len(self.levels), 2)
+            if (
+                not os.path.isfile(self.path)
+                or np.load(self.path, mmap_mode="r").shape != shape
+            ):
+                self.build(self.n_members, self.max_workers)
+            self.data = np.load(self.path, mmap_mode="r")
+        return self
+
+    def build(self, members, max_workers=4):
+        """Fetches and decodes every member and writes them to the array file
+
+        Note
+        ----
+        The array is written to a temporary file unique to the process and thread, and renamed once it is complete,
+        so a half written file is never used and builds of the same ensemble at once don't write over each other.
+
+        Parameters
+        ----------
+        members : int
+            Number of members
+        max_workers : int, optional
+            Number of threads used to fetch and decode members, defaults to 4
+        """
+        os.makedirs(self.data_loc, exist_ok=True)
+        part = "%s.%s.%s.part" % (self.path, os.getpid(), threading.get_ident())
+        try:
+            data = np.lib.format.open_memmap(
+                part, mode="w+", shape=(members, 2, 2, len(self.levels), 2)
+            )
+            with ThreadPoolExecutor(max_workers=min(max_workers, members)) as pool:
+                for n, grid in enumerate(pool.map(self._load_member, range(members))):
+                    data[n] = grid
+            data.flush()
+            del data
+            os.replace(part, self.path)
+        except BaseException:
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+
+    def _load_member(self, n):
+        """Downloads (if needed) and decodes member n, returning its lat x long x level x 2 grid"""
+        name = "gec00" if n == 0 else "gep%02d" % n
+        lat_bottom, long_left = validate_lat_long(self.lats[0], self.longs[0])
+        lat_top, long_right = validate_lat_long(self.lats[1], self.longs[1])
+        file_loc = "%s/%s_%s_%s_%s_%s_%s.grb2" % (
+            self.data_loc,
+            name,
+            lat_bottom,
+            long_left,
+            self.date,
+            self.forcast_time,
+            self.run_time,
+        )
+        if not os.path.isfile(file_loc) or not is_complete_grib(file_loc):
+            if long_left > long_right:
+                long_left = long_left - 360
+            url = "https://nomads.ncep.noaa.gov/cgi-bin/filter_gefs_atmos_0p50a.pl?file={name}.t{run}z.pgrb2a.0p50.f{hour}&lev_10_mb=on&lev_50_mb=on&lev_100_mb=on&lev_200_mb=on&lev_250_mb=on&lev_300_mb=on&lev_500_mb=on&lev_700_mb=on&lev_850_mb=on&lev_925_mb=on&lev_1000_mb=on&var_HGT=on&var_UGRD=on&var_VGRD=on&subregion=&leftlon={leftlon}&rightlon={rightlon}&toplat={toplat}&bottomlat={bottomlat}&dir=%2Fgefs.{date}%2F{run}%2Fatmos%2Fpgrb2ap5".format(
+                name=name,
+                leftlon=long_left,
+                rightlon=long_right,
+                toplat=lat_top,
+                bottomlat=lat_bottom,
+                date=self.date,
+                run=self.forcast_time,
+                hour=self.run_time,
+            )
+            try:
+                download_file(url, file_loc, validate=is_complete_grib)
+            except DownloadError as e:
+                raise RuntimeError(
+                    "The ensemble member %s was not found, this is usually because it was for an invalid date/time (%s)"
+                    % (name, e)
+                ) from None
+
+        df, _ = decode_grib(file_loc)
+        grid = np.zeros((2, 2, len(self.levels), 2))
+        for i, lat in enumerate(self.lats):
+            for j, long in enumerate(self.longs):
+                column = df[
+                    np.isclose(df.lat.values.astype(float), lat)
+                    & np.isclose(
+                        df.long.values.astype(float), validate_lat_long(lat, long)[1]
+                    )
+                ].sort_values("alt")
+                if len(column) == 0:
+                    raise RuntimeError(
+                        "Ensemble member %s has no data at lat=%s, long=%s"
+                        % (name, lat, long)
+                    )
+                alt = column.alt.values.astype(float)
+                grid[i, j, :, 0] = -np.interp(
+                    self.levels, alt, column.w_y.values.astype(float)
+                )
+                grid[i, j, :, 1] = np.interp(
+                    self.levels, alt, column.w_x.values.astype(float)
+                )
+        return grid
+
+    def select(self, member):
+        """Returns a copy using a different member that shares the same storage
+
+        Parameters
+        ----------
+        member : int
+            Member index
+
+        Returns
+        -------
+        EnsembleWind
+            New wind object
+        """
+        if not 0 <= member < self.n_members:
+            raise ValueError(
+                "Member %s requested but there are only %s" % (member, self.n_members)
+            )
+        new = copy.copy(self)
+        # copy goes through __getstate__ which drops the memory map
+        new.data = self.data
+        new.member = member
+        return new
+
+    def get_wind(self, lat, long, alt, time=0):
+        """Returns wind from the selected member for a specific lat,long,alt
+
+        Parameters
+        ----------
+        lat : float:
+            Requested latitude /degrees
+        longi : float:
+            Requested longitude /degrees
+        alt : float:
+            Requested altitude /m
+        time : float, optional
+            Time since ignition /s, not used, defaults to 0
+        Returns
+        -------
+        numpy array
+            Wind speed vector [x,y,z]/m/s
+        """
+        if self.data is None:
+            self.preload()
+        lat, long = validate_lat_long(lat, long)
+        if long - self.longs[0] > 180:
+            long -= 360
+        f_lat = min(max((lat - self.lats[0]) / (self.lats[1] - self.lats[0]), 0), 1)
+        f_long = min(
+            max((long - self.longs[0]) / (self.longs[1] - self.longs[0]), 0), 1
+        )
+        position = min(max(alt / self.spacing, 0), len(self.levels) - 1)
+        n = min(int(position), len(self.levels) - 2)
+        f = position - n
+
+        grid = self.data[self.member, :, :, n : n + 2]
+        grid = (1 - f) * grid[:, :, 0] + f * grid[:, :, 1]
+        grid = (1 - f_lat) * grid[0] + f_lat * grid[1]
+        x, y = (1 - f_long) * grid[0] + f_long * grid[1]
+        return np.array([x, y, 0.0])
+
+    def get_winds(self, lat, long, alt, time=0, member=None):
+        """Returns the wind at several points at once, optionally each from a different member
+
+        Parameters
+        ----------
+        lat : numpy array
+            Requested latitudes /degrees
+        long : numpy array
+            Requested longitudes /degrees
+        alt : numpy array
+            Requested altitudes /m
+        time : float or numpy array, optional
+            Time since ignition /s, not used, defaults to 0
+        member : int or numpy array, optional
+            Member for each point, defaults to None (the selected member)
+        Returns
+        -------
+        numpy array
+            Wind speed vector [x,y,z]/m/s for each point, shape (n, 3)
+        """
+        if self.data is None:
+            self.preload()
+        lat, long = validate_lat_longs(lat, long)
+        long = np.where(long - self.longs[0] > 180, long - 360, long)
+        f_lat = np.clip((lat - self.lats[0]) / (self.lats[1] - self.lats[0]), 0, 1)
+        f_long = np.clip((long - self.longs[0]) / (self.longs[1] - self.longs[0]), 0, 1)
+        position = np.clip(
+            np.asarray(alt, dtype=float) / self.spacing, 0, len(self.levels) - 1
+        )
+        n = np.minimum(position.astype(int), len(self.levels) - 2)
+        f = (position - n)[:, None, None, None]
+        member = self.member if member is None else member
+        member = np.broadcast_to(member, n.shape)
+
+        grid = (1 - f) * self.data[member, :, :, n] + f * self.data[member, :, :, n + 1]
+        grid = (1 - f_lat[:, None, None]) * grid[:, 0] + f_lat[:, None, None] * grid[
+            :, 1
+        ]
+        xy = (1 - f_long[:, None]) * grid[:, 0] + f_long[:, None] * grid[:, 1]
+        return np.column_stack([xy, np.zeros(len(xy))])
+
+
+def load_wind(
+    initial_long, initial_lat, forcast_plus_time="000", launch_time=None, **kwargs
+):
+    """Makes a Wind object for a single forcast hour, or a ForecastWind if a list of hours is given
+
+    Parameters
+    ----------
+    initial_lat : float
+        Initial latitude /degrees
+    initial_long : float
+        Initial longitude /degrees
+    forcast_plus_time : string or list, optional
+        Three digit forcast hour string, or list of forcast hours to interpolate between, defaults to "000"
+    launch_time : float, optional
+        Time of ignition in hours after the forcast run time, only used with a list of hours
+    **kwargs
+        Passed to Wind/ForecastWind
+
+    Returns
+    -------
+    Wind or ForecastWind
+        Wind object
+    """
+    if isinstance(forcast_plus_time, str):
+        return Wind(
+            initial_long, initial_lat, forcast_plus_time=forcast_plus_time, **kwargs
+        )
+    return ForecastWind(
+        initial_long,
+        initial_lat,
+        forcast_plus_time,
+        launch_time=launch_time,
+        **kwargs,
+    )
+
+
+def is_complete_grib(file_loc):
+    """Checks a file looks like complete GRIB data, i.e. starts with a GRIB header and ends with the end section.
+    NOMADS returns an html page rather than an error code when the data isn't available so this catches that too.
+
+    Args:
+        file_loc (string): Location of the file
+
+    Returns:
+        bool: True if the file is complete
+    """
+    if os.path.getsize(file_loc) < 1000:
+        return False
+    with open(file_loc, "rb") as f:
+        start = f.read(4)
+        f.seek(-4, os.SEEK_END)
+        end = f.read(4)
+    return start == b"GRIB" and end == b"7777"
+
 
 def validate_lat_long(lat, long):
     """Makes latitude and longitude valid for wind
@@ -525,6 +1185,26 @@ def validate_lat_long(lat, long):
     return round(lat, 4), round(long, 4)
 
 
+def validate_lat_longs(lats, longs):
+    """Array version of validate_lat_long
+
+    Args:
+        lats (array): Latitudes
+        longs (array): Longitudes
+
+    Returns:
+        array, array: Valid latitudes and longitudes
+    """
+    lat = np.array(lats, dtype=float, ndmin=1)
+    long = np.array(longs, dtype=float, ndmin=1)
+    over = abs(lat) > 90
+    lat[over] = np.sign(lat[over]) * (180 - abs(lat[over]))
+    long[over] += 180
+    long = np.mod(long, 360)
+    # Adding 0 turns -0.0 into 0.0
+    return np.round(lat, 4) + 0.0, np.round(long, 4) + 0.0
+
+
 def closest(num, incriment):
     """[summary]
 
@@ -537,9 +1217,9 @@ def closest(num, incriment):
     """
     a = round(num / incriment) * incriment
     if a > num:
-        b = a - 0.25
+        b = a - incriment
     else:
-        b = a + 0.25
+        b = a + incriment
     return [a, b]
 
 